@@ -0,0 +1,76 @@
+"""
+Benchmark DetectionArrays.extract against the naive per-detection loop used in callbacks.
+
+A HailoROI is filled with synthetic tracked detections (and keypoints with --keypoints) and both
+extraction paths are timed for several detection counts. Both make per-detection binding calls, expect
+similar times: the columnar path pays off in the numpy work done on the arrays afterwards.
+
+Usage:
+    python benchmarks/benchmark_detection_arrays.py --iterations 2000
+"""
+import argparse
+import random
+import time
+import hailo
+from hailo_apps_infra.detection_arrays import DetectionArrays
+
+DETECTION_COUNTS = [1, 10, 50, 100, 200]
+
+
+def make_roi(num_detections, num_keypoints):
+    roi = hailo.HailoROI(hailo.HailoBBox(0.0, 0.0, 1.0, 1.0))
+    for index in range(num_detections):
+        xmin, ymin = random.random() * 0.8, random.random() * 0.8
+        detection = hailo.HailoDetection(bbox=hailo.HailoBBox(xmin, ymin, 0.1, 0.2), label='person', confidence=random.random())
+        detection.add_object(hailo.HailoUniqueID(index))
+        if num_keypoints:
+            points = [hailo.HailoPoint(random.random(), random.random(), random.random()) for _ in range(num_keypoints)]
+            detection.add_object(hailo.HailoLandmarks('centerpose', points, 0.0))
+        roi.add_object(detection)
+    return roi
+
+
+def naive_loop(roi, num_keypoints):
+    # The per-detection loop found in typical callbacks
+    results = []
+    for detection in roi.get_objects_typed(hailo.HAILO_DETECTION):
+        label = detection.get_label()
+        bbox = detection.get_bbox()
+        confidence = detection.get_confidence()
+        track_id = 0
+        track = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)
+        if len(track) == 1:
+            track_id = track[0].get_id()
+        points = None
+        if num_keypoints:
+            landmarks = detection.get_objects_typed(hailo.HAILO_LANDMARKS)
+            if len(landmarks) != 0:
+                points = [(p.x() * bbox.width() + bbox.xmin(), p.y() * bbox.height() + bbox.ymin()) for p in landmarks[0].get_points()]
+        results.append((label, (bbox.xmin(), bbox.ymin(), bbox.xmax(), bbox.ymax()), confidence, track_id, points))
+    return results
+
+
+def bench(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DetectionArrays against the naive detection loop")
+    parser.add_argument("--iterations", type=int, default=1000, help="Iterations per configuration")
+    parser.add_argument("--keypoints", type=int, default=0, help="Keypoints per detection (17 for pose)")
+    args = parser.parse_args()
+
+    arrays = DetectionArrays(num_keypoints=args.keypoints)
+    print(f"{'detections':>10} {'naive [us]':>11} {'columnar [us]':>14} {'ratio':>8}")
+    for num_detections in DETECTION_COUNTS:
+        roi = make_roi(num_detections, args.keypoints)
+        naive_time = bench(lambda: naive_loop(roi, args.keypoints), args.iterations)
+        columnar_time = bench(lambda: arrays.extract(roi), args.iterations)
+        print(f"{num_detections:>10} {naive_time * 1e6:>11.1f} {columnar_time * 1e6:>14.1f} {naive_time / columnar_time:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark zero-copy frame access (map_frame) against the copying path (get_numpy_from_buffer).
+
+Each iteration does what a typical callback does: access the frame, read a few pixels and
+crop a small ROI.
+
+Usage:
+    python benchmarks/benchmark_frame_access.py --iterations 500
+"""
+import argparse
+import time
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from hailo_apps_infra.hailo_rpi_common import get_numpy_from_buffer, map_frame
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+BYTES_PER_PIXEL = {'RGB': 3, 'NV12': 1.5, 'YUYV': 2}
+
+
+def make_buffer(format, width, height):
+    size = int(width * height * BYTES_PER_PIXEL[format])
+    return Gst.Buffer.new_wrapped(bytes(size))
+
+
+def callback_work(frame):
+    # Read a few pixels and crop a 64x64 ROI, as most callbacks do
+    if isinstance(frame, tuple):
+        frame = frame[0]
+    _ = frame[0, 0], frame[frame.shape[0] // 2, frame.shape[1] // 2]
+    return frame[:64, :64].copy()
+
+
+def bench_copy(buffer, format, width, height, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        callback_work(get_numpy_from_buffer(buffer, format, width, height))
+    return (time.perf_counter() - start) / iterations
+
+
+def bench_map(buffer, format, width, height, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with map_frame(buffer, format, width, height) as frame:
+            callback_work(frame)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark map_frame against get_numpy_from_buffer")
+    parser.add_argument("--iterations", type=int, default=300, help="Iterations per configuration")
+    parser.add_argument("--formats", nargs='+', default=['RGB', 'NV12', 'YUYV'], choices=list(BYTES_PER_PIXEL))
+    args = parser.parse_args()
+
+    Gst.init(None)
+    print(f"{'format':<6} {'resolution':<11} {'copy [us]':>10} {'map [us]':>10} {'speedup':>8}")
+    for format in args.formats:
+        for width, height in RESOLUTIONS:
+            buffer = make_buffer(format, width, height)
+            copy_time = bench_copy(buffer, format, width, height, args.iterations)
+            map_time = bench_map(buffer, format, width, height, args.iterations)
+            print(f"{format:<6} {f'{width}x{height}':<11} {copy_time * 1e6:>10.1f} {map_time * 1e6:>10.1f} {copy_time / map_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
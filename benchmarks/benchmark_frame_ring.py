@@ -0,0 +1,109 @@
+"""
+Benchmark the shared memory frame ring (SharedFrameRing) against multiprocessing.Queue(maxsize=3),
+the transport previously used by app_callback_class.set_frame / get_frame.
+
+A producer writes frames for a fixed duration while a consumer process reads them.
+Reported per resolution:
+- producer cost per frame (time spent in set_frame)
+- consumer cost per frame (time spent in get_frame, including unpickling for the queue)
+- frames delivered per second to the consumer
+
+Usage:
+    python benchmarks/benchmark_frame_ring.py --duration 3
+"""
+import argparse
+import multiprocessing
+import queue
+import time
+import numpy as np
+from hailo_apps_infra.shared_frame_ring import SharedFrameRing
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def queue_consumer(frame_queue, stop_event, result_queue):
+    received = 0
+    busy = 0.0
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        try:
+            frame_queue.get_nowait()
+        except queue.Empty:
+            time.sleep(0.0005)
+            continue
+        busy += time.perf_counter() - start
+        received += 1
+    result_queue.put((received, busy))
+
+
+def ring_consumer(ring, stop_event, result_queue):
+    received = 0
+    busy = 0.0
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        frame = ring.read()
+        if frame is None:
+            time.sleep(0.0005)
+            continue
+        busy += time.perf_counter() - start
+        received += 1
+    result_queue.put((received, busy))
+
+
+def run(transport, width, height, duration):
+    frame = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+    stop_event = multiprocessing.Event()
+    result_queue = multiprocessing.Queue()
+    if transport == 'queue':
+        frame_queue = multiprocessing.Queue(maxsize=3)
+        consumer = multiprocessing.Process(target=queue_consumer, args=(frame_queue, stop_event, result_queue))
+
+        def produce():
+            if not frame_queue.full():
+                frame_queue.put(frame)
+    else:
+        ring = SharedFrameRing(frame.nbytes)
+        consumer = multiprocessing.Process(target=ring_consumer, args=(ring, stop_event, result_queue))
+
+        def produce():
+            ring.write(frame)
+    consumer.start()
+
+    produced = 0
+    produce_time = 0.0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        produce()
+        produce_time += time.perf_counter() - start
+        produced += 1
+        # Pace the producer like a 30 fps pipeline would
+        time.sleep(1 / 30)
+    stop_event.set()
+    received, consume_time = result_queue.get()
+    consumer.join()
+    if transport == 'queue':
+        frame_queue.cancel_join_thread()
+    else:
+        ring.close()
+    return {
+        'produce_us': produce_time / max(produced, 1) * 1e6,
+        'consume_us': consume_time / max(received, 1) * 1e6,
+        'delivered_fps': received / duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SharedFrameRing against multiprocessing.Queue")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per configuration")
+    args = parser.parse_args()
+
+    print(f"{'transport':<9} {'resolution':<11} {'produce [us]':>13} {'consume [us]':>13} {'delivered fps':>14}")
+    for width, height in RESOLUTIONS:
+        for transport in ('queue', 'ring'):
+            result = run(transport, width, height, args.duration)
+            print(f"{transport:<9} {f'{width}x{height}':<11} {result['produce_us']:>13.1f} {result['consume_us']:>13.1f} {result['delivered_fps']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
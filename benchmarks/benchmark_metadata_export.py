@@ -0,0 +1,79 @@
+"""
+Benchmark the metadata export: the cost of MetadataExporter.add_frame on the streaming thread, the frames per
+second the writer thread serializes, and the time MetadataReader takes to map the files and scan a column.
+
+Synthetic detections are used (no Hailo device or hailo module needed), the files are written to a temporary
+directory unless --directory is given.
+
+Usage:
+    python benchmarks/benchmark_metadata_export.py --frames 20000
+    python benchmarks/benchmark_metadata_export.py --keypoints 17
+    python benchmarks/benchmark_metadata_export.py --masks
+"""
+import argparse
+import tempfile
+import time
+import types
+import numpy as np
+from hailo_apps_infra.metadata_export import MetadataExporter, MetadataReader
+
+DETECTION_COUNTS = [1, 10, 50, 100]
+MASK_SIZE = (40, 40)
+
+
+def make_detections(num_detections, num_keypoints):
+    rng = np.random.default_rng(num_detections)
+    return types.SimpleNamespace(
+        boxes=rng.random((num_detections, 4), dtype=np.float32),
+        scores=rng.random(num_detections, dtype=np.float32),
+        class_ids=rng.integers(0, 80, num_detections, dtype=np.int32),
+        track_ids=np.arange(num_detections, dtype=np.int32),
+        keypoints=rng.random((num_detections, num_keypoints, 3), dtype=np.float32) if num_keypoints else None,
+        labels=['person'] * num_detections,
+    )
+
+
+def bench(directory, num_detections, frames, num_keypoints, masks):
+    detections = make_detections(num_detections, num_keypoints)
+    frame_masks = None
+    if masks:
+        yy, xx = np.mgrid[:MASK_SIZE[0], :MASK_SIZE[1]]
+        ellipse = ((yy - MASK_SIZE[0] / 2) / (MASK_SIZE[0] / 2)) ** 2 + ((xx - MASK_SIZE[1] / 2) / (MASK_SIZE[1] / 2)) ** 2 < 1
+        frame_masks = [ellipse] * num_detections
+    # Enough pending chunks for the whole run: the writer throughput is measured, not the drop policy
+    exporter = MetadataExporter(directory, num_keypoints=num_keypoints, with_masks=masks, rotate_seconds=0,
+                                max_pending_chunks=frames // 256 + 2)
+    start = time.perf_counter()
+    for index in range(frames):
+        exporter.add_frame(detections, index * 33_333_333, 'stream_0', frame_masks)
+    add_time = (time.perf_counter() - start) / frames
+    exporter.close(timeout=None)
+    stats = exporter.get_stats()
+
+    start = time.perf_counter()
+    with MetadataReader(exporter.files) as reader:
+        mean_score = float(reader.column('scores').mean())
+        read_frames = reader.num_frames
+    read_time = time.perf_counter() - start
+    assert read_frames == frames and not np.isnan(mean_score)
+    return add_time, stats, read_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the metadata export writer and reader")
+    parser.add_argument("--frames", type=int, default=10000, help="Frames per configuration")
+    parser.add_argument("--keypoints", type=int, default=0, help="Keypoints per detection (17 for pose)")
+    parser.add_argument("--masks", action="store_true", help=f"Export a {MASK_SIZE[0]}x{MASK_SIZE[1]} mask per detection")
+    parser.add_argument("--directory", default=None, help="Where the files are written, a temporary directory by default")
+    args = parser.parse_args()
+
+    print(f"{'detections':>10} {'add_frame [us]':>15} {'writer [frames/s]':>18} {'bytes/frame':>12} {'read [ms]':>10}")
+    for num_detections in DETECTION_COUNTS:
+        with tempfile.TemporaryDirectory() as temporary:
+            add_time, stats, read_time = bench(args.directory or temporary, num_detections, args.frames, args.keypoints, args.masks)
+        print(f"{num_detections:>10} {add_time * 1e6:>15.1f} {stats['frames_per_second']:>18.0f} "
+              f"{stats['bytes'] / stats['written_frames']:>12.0f} {read_time * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
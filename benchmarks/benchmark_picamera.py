@@ -0,0 +1,172 @@
+"""
+Benchmark the Picamera2 appsrc ingestion (PicameraSource) against the previous picamera_thread loop
+(capture_array, cvtColor BGR2RGB, np.asarray, tobytes, Gst.Buffer.new_wrapped).
+
+Picamera2 is only available on the Pi, so a fake camera serves preallocated frames with a padded stride,
+like the camera buffers. The frames are pushed to `appsrc ! fakesink`, the rest of the pipeline is left out.
+Reported per resolution: frames per second and CPU time per frame of the pushing thread.
+
+With --sink-fps, a 30 fps camera feeds a pipeline which only takes sink-fps frames per second (the leaky appsrc of
+SOURCE_PIPELINE followed by a slow element). The frames captured, delivered and dropped show how much capture
+work is wasted by the tight loop compared to the need-data / enough-data flow control.
+
+Usage:
+    python benchmarks/benchmark_picamera.py --frames 300
+    python benchmarks/benchmark_picamera.py --sink-fps 10 --duration 5
+"""
+import argparse
+import contextlib
+import threading
+import time
+import numpy as np
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from hailo_apps_infra.picamera_source import PicameraSource
+
+RESOLUTIONS = [(640, 640), (1280, 720), (1920, 1080)]
+# Stride padding of the fake camera buffers, in pixels
+STRIDE_PADDING = 16
+
+
+class FakeRequest:
+    def __init__(self, camera, timestamp):
+        self.camera = camera
+        self.timestamp = timestamp
+
+    def get_metadata(self):
+        return {'SensorTimestamp': self.timestamp, 'FrameDuration': 33333}
+
+    def release(self):
+        pass
+
+
+class FakePicamera2:
+    """
+    Serves the same frame on every capture, with the API used by picamera_thread and PicameraSource.
+    With a frame_rate, the captures wait for the next frame of a camera running at that rate.
+    """
+    def __init__(self, width, height, frame_rate=None):
+        self.buffer = np.random.randint(0, 255, (height, width + STRIDE_PADDING, 3), dtype=np.uint8)
+        self.view = self.buffer[:, :width]
+        self.frame_rate = frame_rate
+        self.start = time.monotonic()
+        self.timestamp = 0
+
+    def _next_frame(self):
+        if self.frame_rate is None:
+            self.timestamp += 33333333
+            return
+        frame = int((time.monotonic() - self.start) * self.frame_rate) + 1
+        time.sleep(max(0, self.start + frame / self.frame_rate - time.monotonic()))
+        self.timestamp = int(frame * Gst.SECOND / self.frame_rate)
+
+    def capture_array(self, name):
+        self._next_frame()
+        # Picamera2 copies the frame out of the camera buffer
+        return self.view.copy()
+
+    def capture_request(self):
+        self._next_frame()
+        return FakeRequest(self, self.timestamp)
+
+
+@contextlib.contextmanager
+def fake_mapped_array(request, stream):
+    yield argparse.Namespace(array=request.camera.view)
+
+
+def create_pipeline():
+    pipeline = Gst.parse_launch('appsrc name=app_source block=true max-buffers=3 ! fakesink sync=false')
+    pipeline.set_state(Gst.State.PLAYING)
+    return pipeline, pipeline.get_by_name('app_source')
+
+
+def push_legacy(appsrc, camera, width, height, frames):
+    import cv2
+    appsrc.set_property("format", Gst.Format.TIME)
+    appsrc.set_property("caps", Gst.Caps.from_string(f"video/x-raw, format=RGB, width={width}, height={height}, framerate=30/1"))
+    for frame_count in range(frames):
+        frame_data = camera.capture_array('lores')
+        frame = cv2.cvtColor(frame_data, cv2.COLOR_BGR2RGB)
+        frame = np.asarray(frame)
+        buffer = Gst.Buffer.new_wrapped(frame.tobytes())
+        buffer_duration = Gst.util_uint64_scale_int(1, Gst.SECOND, 30)
+        buffer.pts = frame_count * buffer_duration
+        buffer.duration = buffer_duration
+        appsrc.emit('push-buffer', buffer)
+
+
+def push_pooled(appsrc, camera, width, height, frames):
+    config = {'lores': {'size': (width, height), 'format': 'BGR888'}}
+    source = PicameraSource(appsrc, camera, config, mapped_array=fake_mapped_array)
+    for _ in range(frames):
+        source.push_frame()
+    source.close()
+
+
+def run(push, width, height, frames):
+    pipeline, appsrc = create_pipeline()
+    camera = FakePicamera2(width, height)
+    start, start_cpu = time.perf_counter(), time.thread_time()
+    push(appsrc, camera, width, height, frames)
+    elapsed, cpu = time.perf_counter() - start, time.thread_time() - start_cpu
+    appsrc.emit('end-of-stream')
+    pipeline.get_bus().timed_pop_filtered(5 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    return frames / elapsed, cpu * 1000 / frames
+
+
+def run_backpressure(flow_control, width, height, sink_fps, duration):
+    """Returns (captured, delivered, dropped) of a 30 fps camera feeding a pipeline taking sink_fps."""
+    pipeline = Gst.parse_launch(
+        'appsrc name=app_source is-live=true leaky-type=downstream max-buffers=3 ! '
+        f'identity sleep-time={int(1e6 / sink_fps)} ! fakesink name=sink sync=false signal-handoffs=true'
+    )
+    appsrc = pipeline.get_by_name('app_source')
+    delivered = [0]
+    pipeline.get_by_name('sink').connect('handoff', lambda *args: delivered.__setitem__(0, delivered[0] + 1))
+    camera = FakePicamera2(width, height, frame_rate=30)
+    config = {'lores': {'size': (width, height), 'format': 'BGR888'}}
+    source = PicameraSource(appsrc, camera, config, mapped_array=fake_mapped_array)
+    pipeline.set_state(Gst.State.PLAYING)
+    threading.Timer(duration, source.stop).start()
+    if flow_control:
+        source.run()
+    else:
+        # The previous tight loop: capture and push every camera frame
+        while not source.stop_event.is_set():
+            source.push_frame()
+    pipeline.set_state(Gst.State.NULL)
+    source.close()
+    return source.captured, delivered[0], source.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Picamera2 appsrc ingestion")
+    parser.add_argument("--frames", type=int, default=300, help="Frames pushed per run")
+    parser.add_argument("--sink-fps", type=float, default=None, help="Run the backpressure benchmark with a pipeline taking this many fps")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per backpressure run")
+    args = parser.parse_args()
+    Gst.init(None)
+
+    if args.sink_fps:
+        width, height = RESOLUTIONS[1]
+        print(f"{'mode':<14} {'captured':>9} {'delivered':>10} {'dropped':>8}")
+        for name, flow_control in (('tight loop', False), ('flow control', True)):
+            captured, delivered, dropped = run_backpressure(flow_control, width, height, args.sink_fps, args.duration)
+            print(f"{name:<14} {captured:>9} {delivered:>10} {dropped:>8}")
+        return
+
+    print(f"{'resolution':<12} {'path':<8} {'fps':>10} {'CPU ms/frame':>14}")
+    for width, height in RESOLUTIONS:
+        results = {}
+        for name, push in (('legacy', push_legacy), ('pooled', push_pooled)):
+            results[name] = run(push, width, height, args.frames)
+            fps, cpu_ms = results[name]
+            print(f"{f'{width}x{height}':<12} {name:<8} {fps:>10.1f} {cpu_ms:>14.2f}")
+        print(f"{'':<12} speedup {results['pooled'][0] / results['legacy'][0]:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark the import time of the pipeline modules and the cached Hailo device detection.
+
+Every module is imported in a fresh interpreter, the time of an empty interpreter is subtracted.
+The heavy modules loaded by the import are listed, they should only be loaded when used.
+
+Usage:
+    python benchmarks/benchmark_startup.py --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from hailo_apps_infra.hailo_device import get_device_identity
+
+MODULES = [
+    'hailo_apps_infra.gstreamer_helper_pipelines',
+    'hailo_apps_infra.hailo_rpi_common',
+    'hailo_apps_infra.gstreamer_app',
+    'hailo_apps_infra.detection_pipeline',
+]
+HEAVY_MODULES = ('numpy', 'cv2', 'hailo', 'multiprocessing', 'picamera2')
+
+
+def run_python(code):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+
+def bench_import(module, runs):
+    code = f"import sys, json, {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    times = []
+    loaded = None
+    for _ in range(runs):
+        elapsed, result = run_python(code)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        times.append(elapsed)
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return statistics.median(times), loaded
+
+
+def bench_device_detection():
+    start = time.perf_counter()
+    identity = get_device_identity(use_cache=False)
+    uncached = time.perf_counter() - start
+    if identity is None:
+        return None
+    get_device_identity()
+    start = time.perf_counter()
+    get_device_identity()
+    return uncached, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the pipeline modules")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per module, the median is reported")
+    args = parser.parse_args()
+
+    baseline = statistics.median(run_python('pass')[0] for _ in range(args.runs))
+    print(f"{'module':<46} {'import [ms]':>12}  heavy modules loaded")
+    for module in MODULES:
+        elapsed, loaded = bench_import(module, args.runs)
+        if elapsed is None:
+            print(f"{module:<46} {'failed':>12}  {loaded}")
+            continue
+        print(f"{module:<46} {(elapsed - baseline) * 1000:>12.1f}  {', '.join(loaded) or '-'}")
+
+    detection = bench_device_detection()
+    if detection is None:
+        print("No Hailo device found, skipping the device detection benchmark.")
+    else:
+        uncached, cached = detection
+        print(f"Device detection: hailortcli {uncached * 1000:.1f} ms, cached {cached * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
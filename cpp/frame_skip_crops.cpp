@@ -0,0 +1,60 @@
+/**
+ * Copyright (c) 2021-2022 Hailo Technologies Ltd. All rights reserved.
+ * Distributed under the LGPL license (https://www.gnu.org/licenses/old-licenses/lgpl-2.1.txt)
+ **/
+#include <map>
+#include <mutex>
+#include <string>
+#include "frame_skip_crops.hpp"
+
+/**
+ * @brief Cropping algorithms sending only every Nth frame to the inference.
+ *
+ * Used by INFERENCE_PIPELINE_WRAPPER with inference_interval > 1, in place of the whole buffer crop
+ * (libwhole_buffer.so). On every Nth frame of a stream the whole frame is returned as the single crop,
+ * like create_crops of the whole buffer algorithm. On the other frames no crop is returned, the frame
+ * only takes the bypass branch of the hailocropper and reaches the hailoaggregator without detections,
+ * and its main ROI is marked with a HailoUserMeta (PREDICTED_FRAME_META), so that the tracker
+ * predictions on it can be told apart from inferred detections.
+ *
+ * The frames are counted per stream id, so a multi source pipeline skips frames in every stream.
+ * hailocropper takes the function name only, the intervals 2 to 10 each have their own function.
+ */
+
+static std::map<std::string, uint64_t> frame_counters;
+static std::mutex frame_counters_mutex;
+
+static std::vector<HailoROIPtr> create_crops_every(HailoROIPtr roi, uint64_t interval)
+{
+    uint64_t frame_index;
+    {
+        std::lock_guard<std::mutex> lock(frame_counters_mutex);
+        frame_index = frame_counters[roi->get_stream_id()]++;
+    }
+    std::vector<HailoROIPtr> crop_rois;
+    if (frame_index % interval == 0)
+    {
+        crop_rois.emplace_back(roi);
+    }
+    else
+    {
+        roi->add_object(std::make_shared<HailoUserMeta>(static_cast<int>(frame_index % interval), PREDICTED_FRAME_META, 0.0f));
+    }
+    return crop_rois;
+}
+
+#define CREATE_CROPS_INTERVAL(N)                                                                      \
+    std::vector<HailoROIPtr> create_crops_interval_##N(std::shared_ptr<HailoMat> image, HailoROIPtr roi) \
+    {                                                                                                 \
+        return create_crops_every(roi, N);                                                            \
+    }
+
+CREATE_CROPS_INTERVAL(2)
+CREATE_CROPS_INTERVAL(3)
+CREATE_CROPS_INTERVAL(4)
+CREATE_CROPS_INTERVAL(5)
+CREATE_CROPS_INTERVAL(6)
+CREATE_CROPS_INTERVAL(7)
+CREATE_CROPS_INTERVAL(8)
+CREATE_CROPS_INTERVAL(9)
+CREATE_CROPS_INTERVAL(10)
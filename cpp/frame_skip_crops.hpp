@@ -0,0 +1,24 @@
+/**
+ * Copyright (c) 2021-2022 Hailo Technologies Ltd. All rights reserved.
+ * Distributed under the LGPL license (https://www.gnu.org/licenses/old-licenses/lgpl-2.1.txt)
+ **/
+#pragma once
+#include <vector>
+#include "hailo_objects.hpp"
+#include "hailo_common.hpp"
+#include "hailomat.hpp"
+
+// Marks the main ROI of the frames which skipped the inference, see is_inferred_frame in gstreamer_app.py
+#define PREDICTED_FRAME_META "predicted_frame"
+
+__BEGIN_DECLS
+std::vector<HailoROIPtr> create_crops_interval_2(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_3(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_4(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_5(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_6(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_7(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_8(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_9(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+std::vector<HailoROIPtr> create_crops_interval_10(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+__END_DECLS
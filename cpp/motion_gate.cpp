@@ -0,0 +1,182 @@
+/**
+ * Copyright (c) 2021-2022 Hailo Technologies Ltd. All rights reserved.
+ * Distributed under the LGPL license (https://www.gnu.org/licenses/old-licenses/lgpl-2.1.txt)
+ **/
+#include <cstring>
+#include <map>
+#include <mutex>
+#include <string>
+#include <opencv2/imgproc.hpp>
+#include "motion_gate.hpp"
+
+/**
+ * @brief Cropping algorithm sending only the frames with motion to the inference.
+ *
+ * Used by INFERENCE_PIPELINE_WRAPPER with motion_gate=True, in place of the whole buffer crop
+ * (libwhole_buffer.so). Each frame is scaled down to gate_width pixels wide, converted to gray and
+ * compared to the frame last sent to the inference of the same stream. The mean absolute difference
+ * (0-255) is the motion score. Comparing to the last inferred frame, not the previous one, lets slow
+ * motion add up until it passes the threshold.
+ *
+ * Frames with a score above the threshold, the first frame of a stream and one frame every
+ * keepalive_frames are returned as the single crop and inferred. The other frames are gated: no crop is
+ * returned, they only take the bypass branch. Their main ROI is marked with a HailoUserMeta
+ * (GATED_FRAME_META, score in the float field).
+ *
+ * The detections of an inferred frame are complete only after the hailoaggregator, so they are carried
+ * over by carry_over_detections, a hailofilter function placed after the aggregator. The aggregator
+ * outputs the frames in order: an inferred frame caches a copy of its detections, the gated frames
+ * after it get their own copies (the tracker and the overlay modify the detections of each frame).
+ *
+ * The settings and the per stream counters are accessed from Python with ctypes (motion_gate.py), the
+ * library loaded by hailocropper and by ctypes is the same instance.
+ */
+
+struct StreamState
+{
+    cv::Mat reference;
+    std::vector<HailoDetectionPtr> last_detections;
+    unsigned long long frames = 0;
+    unsigned long long gated = 0;
+    unsigned int since_inference = 0;
+};
+
+static std::map<std::string, StreamState> streams;
+static std::mutex streams_mutex;
+static float motion_threshold = 2.0f;
+static unsigned int motion_keepalive_frames = 30;
+static unsigned int motion_gate_width = 64;
+
+static cv::Mat gate_frame(std::shared_ptr<HailoMat> image)
+{
+    cv::Mat &mat = image->get_mat();
+    // NV12 / I420: the Y plane is the top of the mat
+    cv::Mat source = mat.channels() == 1 ? mat(cv::Rect(0, 0, image->width(), image->height())) : mat;
+    int gate_height = std::max(1, static_cast<int>(motion_gate_width * source.rows / std::max(1, source.cols)));
+    // Scale first, the color conversion then only runs on gate_width pixels wide frames
+    cv::Mat small;
+    cv::resize(source, small, cv::Size(motion_gate_width, gate_height), 0, 0, cv::INTER_AREA);
+    if (small.channels() == 1)
+    {
+        return small;
+    }
+    cv::Mat luma;
+    if (small.channels() == 3)
+    {
+        cv::cvtColor(small, luma, cv::COLOR_RGB2GRAY);
+    }
+    else
+    {
+        cv::extractChannel(small, luma, 0);
+    }
+    return luma;
+}
+
+static HailoDetectionPtr clone_detection(const HailoDetectionPtr &detection)
+{
+    auto clone = std::make_shared<HailoDetection>(detection->get_bbox(), detection->get_class_id(),
+                                                  detection->get_label(), detection->get_confidence());
+    for (auto &object : detection->get_objects())
+    {
+        // The tracker gives the gated frames their own ids. Landmarks, masks and classifications are
+        // only read after the wrapper, they are shared.
+        if (object->get_type() != HAILO_UNIQUE_ID)
+        {
+            clone->add_object(object);
+        }
+    }
+    return clone;
+}
+
+static bool is_gated(HailoROIPtr roi)
+{
+    for (auto &object : roi->get_objects_typed(HAILO_USER_META))
+    {
+        if (std::dynamic_pointer_cast<HailoUserMeta>(object)->get_user_string() == GATED_FRAME_META)
+        {
+            return true;
+        }
+    }
+    return false;
+}
+
+std::vector<HailoROIPtr> create_crops_motion(std::shared_ptr<HailoMat> image, HailoROIPtr roi)
+{
+    cv::Mat current = gate_frame(image);
+    std::lock_guard<std::mutex> lock(streams_mutex);
+    StreamState &state = streams[roi->get_stream_id()];
+    state.frames++;
+
+    float score = 0.0f;
+    bool active = state.reference.empty() || state.reference.size() != current.size();
+    if (!active)
+    {
+        cv::Mat difference;
+        cv::absdiff(current, state.reference, difference);
+        score = static_cast<float>(cv::mean(difference)[0]);
+        active = score > motion_threshold || state.since_inference + 1 >= motion_keepalive_frames;
+    }
+
+    std::vector<HailoROIPtr> crop_rois;
+    if (active)
+    {
+        state.reference = current;
+        state.since_inference = 0;
+        crop_rois.emplace_back(roi);
+        return crop_rois;
+    }
+    state.gated++;
+    state.since_inference++;
+    roi->add_object(std::make_shared<HailoUserMeta>(static_cast<int>(state.since_inference), GATED_FRAME_META, score));
+    return crop_rois;
+}
+
+void carry_over_detections(HailoROIPtr roi)
+{
+    bool gated = is_gated(roi);
+    std::lock_guard<std::mutex> lock(streams_mutex);
+    StreamState &state = streams[roi->get_stream_id()];
+    if (!gated)
+    {
+        state.last_detections.clear();
+        for (auto &detection : hailo_common::get_hailo_detections(roi))
+        {
+            state.last_detections.emplace_back(clone_detection(detection));
+        }
+        return;
+    }
+    for (auto &detection : state.last_detections)
+    {
+        roi->add_object(clone_detection(detection));
+    }
+}
+
+void motion_gate_configure(float threshold, unsigned int keepalive_frames, unsigned int gate_width)
+{
+    std::lock_guard<std::mutex> lock(streams_mutex);
+    motion_threshold = threshold;
+    motion_keepalive_frames = std::max(1u, keepalive_frames);
+    motion_gate_width = std::max(8u, gate_width);
+}
+
+unsigned int motion_gate_stream_count()
+{
+    std::lock_guard<std::mutex> lock(streams_mutex);
+    return static_cast<unsigned int>(streams.size());
+}
+
+int motion_gate_stream_stats(unsigned int index, char *stream_id, unsigned int stream_id_size,
+                             unsigned long long *frames, unsigned long long *gated)
+{
+    std::lock_guard<std::mutex> lock(streams_mutex);
+    if (index >= streams.size() || stream_id_size == 0)
+    {
+        return -1;
+    }
+    auto it = std::next(streams.begin(), index);
+    std::strncpy(stream_id, it->first.c_str(), stream_id_size - 1);
+    stream_id[stream_id_size - 1] = '\0';
+    *frames = it->second.frames;
+    *gated = it->second.gated;
+    return 0;
+}
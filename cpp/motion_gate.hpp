@@ -0,0 +1,23 @@
+/**
+ * Copyright (c) 2021-2022 Hailo Technologies Ltd. All rights reserved.
+ * Distributed under the LGPL license (https://www.gnu.org/licenses/old-licenses/lgpl-2.1.txt)
+ **/
+#pragma once
+#include <vector>
+#include "hailo_objects.hpp"
+#include "hailo_common.hpp"
+#include "hailomat.hpp"
+
+// Marks the main ROI of the frames which were gated (not inferred), see motion_gate.py
+#define GATED_FRAME_META "gated_frame"
+
+__BEGIN_DECLS
+std::vector<HailoROIPtr> create_crops_motion(std::shared_ptr<HailoMat> image, HailoROIPtr roi);
+// hailofilter function after the hailoaggregator, gives the gated frames the detections of the last inferred frame
+void carry_over_detections(HailoROIPtr roi);
+// Called from Python with ctypes (motion_gate.py)
+void motion_gate_configure(float threshold, unsigned int keepalive_frames, unsigned int gate_width);
+unsigned int motion_gate_stream_count();
+int motion_gate_stream_stats(unsigned int index, char *stream_id, unsigned int stream_id_size,
+                             unsigned long long *frames, unsigned long long *gated);
+__END_DECLS
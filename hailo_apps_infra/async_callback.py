@@ -0,0 +1,329 @@
+import collections
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from hailo_apps_infra.video_frame import get_frame_layout, get_frame_layout_from_pad, map_video_frame
+
+# -----------------------------------------------------------------------------------------------
+# Asynchronous user callbacks
+# -----------------------------------------------------------------------------------------------
+# The pad probe running in the streaming thread only snapshots the metadata (and optionally the frame)
+# into a CallbackWorkItem and hands it to a bounded worker pool. Slow user code then no longer stalls
+# the pipeline. Each stream is always handled by the same worker, so work items of a stream are
+# processed in order.
+
+OVERFLOW_POLICIES = ('drop-oldest', 'drop-newest', 'block')
+
+Detection = collections.namedtuple('Detection', ['label', 'confidence', 'bbox', 'track_id'])
+
+
+class CallbackWorkItem:
+    """
+    A snapshot of a buffer passed to an asynchronous callback.
+
+    Attributes:
+        stream_id (str): The stream id of the buffer ('' for single stream pipelines).
+        index (int): Sequence number of the item within its stream.
+        pts (int): The buffer presentation timestamp in nanoseconds.
+        detections: The metadata snapshot, by default a list of Detection(label, confidence, bbox, track_id)
+            with bbox as normalized (xmin, ymin, xmax, ymax).
+        frame: A copy of the frame (see map_video_frame) when frame snapshots are enabled, otherwise None.
+        format, width, height: The frame format and size, None if the pad has no caps.
+        enqueue_time (float): time.monotonic() when the item was queued.
+    """
+    __slots__ = ('stream_id', 'index', 'pts', 'detections', 'frame', 'format', 'width', 'height', 'enqueue_time')
+
+    def __init__(self, stream_id, index, pts, detections, frame=None, format=None, width=None, height=None):
+        self.stream_id = stream_id
+        self.index = index
+        self.pts = pts
+        self.detections = detections
+        self.frame = frame
+        self.format = format
+        self.width = width
+        self.height = height
+        self.enqueue_time = time.monotonic()
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+
+def get_stream_id(roi):
+    # Multi stream pipelines tag the ROI with the stream id, older hailo modules do not expose it
+    try:
+        return roi.get_stream_id()
+    except AttributeError:
+        return ''
+
+
+def snapshot_detections(buffer):
+    """
+    Default metadata snapshot: copies the detections of a buffer into plain Python objects.
+
+    Returns:
+        tuple: (stream_id, list of Detection)
+    """
+    import hailo
+    roi = hailo.get_roi_from_buffer(buffer)
+    detections = []
+    for detection in roi.get_objects_typed(hailo.HAILO_DETECTION):
+        bbox = detection.get_bbox()
+        track = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)
+        track_id = track[0].get_id() if len(track) == 1 else 0
+        detections.append(Detection(
+            detection.get_label(),
+            detection.get_confidence(),
+            (bbox.xmin(), bbox.ymin(), bbox.xmax(), bbox.ymax()),
+            track_id,
+        ))
+    return get_stream_id(roi), detections
+
+
+def _run_item(callback, user_data, item, late_threshold, stats, on_result):
+    if time.monotonic() - item.enqueue_time > late_threshold:
+        stats['late'] += 1
+    try:
+        result = callback(item, user_data)
+        if on_result is not None:
+            on_result(item, result)
+    except Exception as e:
+        stats['errors'] += 1
+        print(f"Error in asynchronous callback: {e}")
+    stats['processed'] += 1
+
+
+def _process_worker(callback, user_data, work_queue, late_threshold, shared_stats, on_result):
+    stats = collections.Counter()
+    while True:
+        item = work_queue.get()
+        if item is None:
+            break
+        _run_item(callback, user_data, item, late_threshold, stats, on_result)
+        with shared_stats.get_lock():
+            shared_stats[0] = stats['processed']
+            shared_stats[1] = stats['late']
+            shared_stats[2] = stats['errors']
+
+
+class AsyncCallbackPool:
+    """
+    A bounded pool of workers running a user callback outside of the GStreamer streaming thread.
+
+    The callback is called as callback(item, user_data) with a CallbackWorkItem. Its return value is passed
+    to on_result(item, result), if given, in the same worker, so results of a stream are delivered in order.
+
+    Args:
+        callback (callable): The user callback.
+        user_data: The user data object passed to the callback.
+        num_workers (int, optional): Number of workers. Defaults to 1.
+        max_queue_size (int, optional): Maximum number of pending items per worker. Defaults to 8.
+        overflow_policy (str, optional): What to do when a worker queue is full: 'drop-oldest' (replace the
+            oldest pending item), 'drop-newest' (discard the new item) or 'block' (block the streaming thread).
+            Defaults to 'drop-oldest'.
+        executor (str, optional): 'thread' or 'process'. Process workers get a copy of user_data, use them for
+            CPU heavy work whose results are stored elsewhere. Defaults to 'thread'.
+        with_frame (bool, optional): Snapshot a copy of the frame into each item. Defaults to False.
+        late_threshold_ms (float, optional): Items waiting longer than this before being processed are counted
+            as late. Defaults to 100.
+        snapshot (callable, optional): Function returning (stream_id, detections) for a buffer.
+            Defaults to snapshot_detections.
+        on_result (callable, optional): Called with (item, result) after each callback.
+    """
+    def __init__(self, callback, user_data, num_workers=1, max_queue_size=8, overflow_policy='drop-oldest',
+                 executor='thread', with_frame=False, late_threshold_ms=100, snapshot=snapshot_detections, on_result=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported overflow policy: {overflow_policy}, use one of {OVERFLOW_POLICIES}")
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unsupported executor: {executor}, use 'thread' or 'process'")
+        self.callback = callback
+        self.user_data = user_data
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.executor = executor
+        self.with_frame = with_frame
+        self.late_threshold = late_threshold_ms / 1000
+        self.snapshot = snapshot
+        self.on_result = on_result
+        self.running = False
+        self._workers = []
+        self._queues = []
+        self._conditions = []
+        self._shared_stats = []
+        self._worker_stats = []
+        self._stream_index = collections.Counter()
+        self._layout_pad = None
+        self._layout = None
+        self.stats = collections.Counter()
+
+    def start(self):
+        self.running = True
+        for index in range(self.num_workers):
+            if self.executor == 'thread':
+                self._queues.append(collections.deque())
+                self._conditions.append(threading.Condition())
+                self._worker_stats.append(collections.Counter())
+                worker = threading.Thread(target=self._thread_worker, args=(index,), daemon=True)
+            else:
+                work_queue = multiprocessing.Queue(maxsize=self.max_queue_size)
+                shared_stats = multiprocessing.Array('q', 3)
+                self._queues.append(work_queue)
+                self._shared_stats.append(shared_stats)
+                worker = multiprocessing.Process(
+                    target=_process_worker,
+                    args=(self.callback, self.user_data, work_queue, self.late_threshold, shared_stats, self.on_result),
+                    daemon=True,
+                )
+            self._workers.append(worker)
+            worker.start()
+
+    def stop(self, timeout=2.0):
+        """Stops the workers after the pending items are processed (or the timeout expires)."""
+        self.running = False
+        for index, worker in enumerate(self._workers):
+            if self.executor == 'thread':
+                with self._conditions[index]:
+                    self._conditions[index].notify_all()
+            else:
+                try:
+                    self._queues[index].put(None, timeout=timeout)
+                except queue.Full:
+                    worker.terminate()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _thread_worker(self, index):
+        items = self._queues[index]
+        condition = self._conditions[index]
+        stats = self._worker_stats[index]
+        while True:
+            with condition:
+                while not items and self.running:
+                    condition.wait()
+                if not items:
+                    return
+                item = items.popleft()
+                condition.notify_all()
+            _run_item(self.callback, self.user_data, item, self.late_threshold, stats, self.on_result)
+
+    def _worker_index(self, stream_id):
+        return zlib.crc32(stream_id.encode()) % self.num_workers if self.num_workers > 1 else 0
+
+    def submit(self, item):
+        """
+        Queues a work item according to the overflow policy.
+
+        Returns:
+            bool: True if the item was queued.
+        """
+        index = self._worker_index(item.stream_id)
+        if self.executor == 'thread':
+            return self._submit_thread(index, item)
+        return self._submit_process(index, item)
+
+    def _submit_thread(self, index, item):
+        items = self._queues[index]
+        condition = self._conditions[index]
+        with condition:
+            if len(items) >= self.max_queue_size:
+                if self.overflow_policy == 'drop-newest':
+                    self.stats['dropped'] += 1
+                    return False
+                if self.overflow_policy == 'drop-oldest':
+                    items.popleft()
+                    self.stats['dropped'] += 1
+                else:
+                    while len(items) >= self.max_queue_size and self.running:
+                        condition.wait()
+            items.append(item)
+            self.stats['queued'] += 1
+            condition.notify_all()
+        return True
+
+    def _submit_process(self, index, item):
+        work_queue = self._queues[index]
+        if self.overflow_policy == 'block':
+            work_queue.put(item)
+        else:
+            try:
+                work_queue.put_nowait(item)
+            except queue.Full:
+                self.stats['dropped'] += 1
+                if self.overflow_policy == 'drop-newest':
+                    return False
+                try:
+                    work_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    work_queue.put_nowait(item)
+                except queue.Full:
+                    return False
+        self.stats['queued'] += 1
+        return True
+
+    def probe(self, pad, info, user_data):
+        """
+        Pad probe snapshotting the buffer into a work item. Attach it instead of the user callback.
+        """
+        buffer = info.get_buffer()
+        if buffer is None or not self.running:
+            return Gst.PadProbeReturn.OK
+        stream_id, detections = self.snapshot(buffer)
+        frame = format = width = height = None
+        layout = self._get_layout(pad)
+        if layout is not None:
+            format, width, height = layout.format, layout.width, layout.height
+            if self.with_frame:
+                with map_video_frame(buffer, layout, copy=True) as frame:
+                    pass
+        index = self._stream_index[stream_id]
+        self._stream_index[stream_id] += 1
+        self.submit(CallbackWorkItem(stream_id, index, buffer.pts, detections, frame, format, width, height))
+        return Gst.PadProbeReturn.OK
+
+    def _get_layout(self, pad):
+        # The layout is derived from the pad caps on the first buffer, then only when a caps event passes
+        if self._layout_pad is not pad:
+            self._layout_pad = pad
+            pad.add_probe(Gst.PadProbeType.EVENT_DOWNSTREAM, self._on_event)
+            self._layout = get_frame_layout_from_pad(pad)
+        return self._layout
+
+    def _on_event(self, pad, info):
+        event = info.get_event()
+        if event.type == Gst.EventType.CAPS:
+            try:
+                self._layout = get_frame_layout(event.parse_caps())
+            except ValueError:
+                # Not raw video
+                self._layout = None
+        return Gst.PadProbeReturn.OK
+
+    def get_stats(self):
+        """
+        Returns the pool counters: queued, processed, dropped, late and errors.
+        """
+        stats = {key: self.stats[key] for key in ('queued', 'processed', 'dropped', 'late', 'errors')}
+        for worker_stats in self._worker_stats:
+            for key in ('processed', 'late', 'errors'):
+                stats[key] += worker_stats[key]
+        for shared_stats in self._shared_stats:
+            with shared_stats.get_lock():
+                stats['processed'] += shared_stats[0]
+                stats['late'] += shared_stats[1]
+                stats['errors'] += shared_stats[2]
+        return stats
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print("Async callback: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
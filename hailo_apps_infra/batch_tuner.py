@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import sys
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from hailo_apps_infra.latency_tracer import measure_pipeline
+
+# -----------------------------------------------------------------------------------------------
+# Batch size auto tuning
+# -----------------------------------------------------------------------------------------------
+# The best hailonet batch size depends on the HEF, the device, the number of streams and the latency
+# budget. The tuner builds the app pipeline for every candidate (batch size, scheduler timeout), runs it
+# for a short calibration window and keeps the best one for the objective. The result is cached, so later
+# starts with the same HEF, architecture and resolution skip the calibration.
+
+OBJECTIVES = ('max-fps', 'latency')
+DEFAULT_BATCH_SIZES = (1, 2, 4, 8)
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'hailo_apps_infra', 'batch_tuning.json')
+
+
+def get_cache_key(hef_path, arch, width, height, num_streams=1, objective='max-fps', latency_budget_ms=None):
+    """
+    Returns the calibration cache key. The HEF is identified by its path, size and modification time,
+    so replacing the HEF invalidates the cached setting.
+    """
+    try:
+        stat = os.stat(hef_path)
+        hef_id = f'{os.path.realpath(hef_path)}:{stat.st_size}:{int(stat.st_mtime)}'
+    except (OSError, TypeError):
+        hef_id = str(hef_path)
+    key = f'{hef_id}|{arch}|{width}x{height}|{num_streams}|{objective}|{latency_budget_ms}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def select_best(results, objective='max-fps', latency_budget_ms=None, fps_tolerance=0.02):
+    """
+    Selects the best calibration result.
+
+    Args:
+        results (list): Dicts with 'batch_size', 'scheduler_timeout_ms', 'fps' and 'p95_ms'.
+        objective (str, optional): 'max-fps', or 'latency' for the highest FPS with a p95 latency within the budget.
+            Defaults to 'max-fps'.
+        latency_budget_ms (float, optional): The p95 latency budget for the 'latency' objective.
+        fps_tolerance (float, optional): Results within this fraction of the best FPS are considered equal,
+            the one with the lowest latency wins. Defaults to 0.02.
+
+    Returns:
+        dict: The selected result, None if results is empty.
+    """
+    if not results:
+        return None
+    candidates = results
+    if objective == 'latency':
+        within_budget = [result for result in results if result['p95_ms'] <= latency_budget_ms]
+        if not within_budget:
+            # Nothing meets the budget, get as close as possible
+            return min(results, key=lambda result: result['p95_ms'])
+        candidates = within_budget
+    best_fps = max(result['fps'] for result in candidates)
+    close = [result for result in candidates if result['fps'] >= best_fps * (1 - fps_tolerance)]
+    return min(close, key=lambda result: (result['p95_ms'], result['batch_size']))
+
+
+class BatchTuner:
+    """
+    Calibrates the batch size (and scheduler timeout) of a GStreamerApp.
+
+    Args:
+        app (GStreamerApp): The app, its get_pipeline_string() must use self.batch_size and self.scheduler_timeout_ms.
+        batch_sizes (tuple, optional): Candidate batch sizes. Defaults to (1, 2, 4, 8).
+        scheduler_timeouts (tuple, optional): Candidate scheduler timeouts in ms, None keeps the hailonet default.
+            Defaults to (None,).
+        objective (str, optional): 'max-fps' or 'latency'. Defaults to 'max-fps'.
+        latency_budget_ms (float, optional): p95 latency budget, required for the 'latency' objective.
+        window (float, optional): Measured seconds per candidate. Defaults to 3.
+        warmup (float, optional): Seconds before measuring each candidate. Defaults to 1.5.
+        cache_path (str, optional): The calibration cache file.
+    """
+    def __init__(self, app, batch_sizes=DEFAULT_BATCH_SIZES, scheduler_timeouts=(None,), objective='max-fps',
+                 latency_budget_ms=None, window=3.0, warmup=1.5, cache_path=CACHE_PATH):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unsupported objective: {objective}, use one of {OBJECTIVES}")
+        if objective == 'latency' and latency_budget_ms is None:
+            raise ValueError("The latency objective requires a latency budget")
+        self.app = app
+        self.batch_sizes = batch_sizes
+        self.scheduler_timeouts = scheduler_timeouts
+        self.objective = objective
+        self.latency_budget_ms = latency_budget_ms
+        self.window = window
+        self.warmup = warmup
+        self.cache_path = cache_path
+        self.results = []
+
+    def get_cache_key(self):
+        app = self.app
+        arch = getattr(app, 'arch', None)
+        return get_cache_key(app.hef_path, arch, app.video_width, app.video_height, len(app.video_sources),
+                             self.objective, self.latency_budget_ms)
+
+    def _measure(self, batch_size, scheduler_timeout_ms):
+        app = self.app
+        app.batch_size = batch_size
+        app.scheduler_timeout_ms = scheduler_timeout_ms
+        pipeline = Gst.parse_launch(app.get_pipeline_string())
+        if app.is_multi_stream():
+            sink_names = [f'hailo_display_{index}' for index in range(len(app.video_sources))]
+        else:
+            sink_names = ['hailo_display']
+        result = measure_pipeline(pipeline, self.window, self.warmup, sink_names)
+        latency = result['latency'] or {'p50_ms': 0.0, 'p95_ms': 0.0}
+        return {
+            'batch_size': batch_size,
+            'scheduler_timeout_ms': scheduler_timeout_ms,
+            'fps': result['fps'],
+            'p50_ms': latency['p50_ms'],
+            'p95_ms': latency['p95_ms'],
+            'cpu_percent': result['cpu_percent'],
+        }
+
+    def calibrate(self):
+        """
+        Runs the calibration windows and returns the selected result. The app settings are restored
+        before returning, use apply() to set the result.
+        """
+        app = self.app
+        saved = (app.batch_size, app.scheduler_timeout_ms, app.sync, app.headless)
+        # Calibrate without display and without syncing to the clock
+        app.sync, app.headless = 'false', True
+        self.results = []
+        try:
+            for batch_size in self.batch_sizes:
+                for scheduler_timeout_ms in self.scheduler_timeouts:
+                    try:
+                        result = self._measure(batch_size, scheduler_timeout_ms)
+                    except Exception as e:
+                        print(f"Calibration of batch size {batch_size}, timeout {scheduler_timeout_ms} failed: {e}", file=sys.stderr)
+                        continue
+                    print(f"Calibration: batch size {batch_size}, timeout {scheduler_timeout_ms}: "
+                          f"{result['fps']:.1f} FPS, p95 {result['p95_ms']:.1f} ms")
+                    self.results.append(result)
+        finally:
+            app.batch_size, app.scheduler_timeout_ms, app.sync, app.headless = saved
+        return select_best(self.results, self.objective, self.latency_budget_ms)
+
+    def apply(self, setting):
+        self.app.batch_size = setting['batch_size']
+        self.app.scheduler_timeout_ms = setting['scheduler_timeout_ms']
+
+    def tune(self, recalibrate=False):
+        """
+        Sets the app batch size and scheduler timeout from the cache, or from a calibration run.
+
+        Returns:
+            dict: The selected setting, None if no candidate could run (the app settings are left unchanged).
+        """
+        cache = load_cache(self.cache_path)
+        key = self.get_cache_key()
+        setting = None if recalibrate else cache.get(key)
+        if setting is not None:
+            print(f"Using cached batch size {setting['batch_size']}, scheduler timeout {setting['scheduler_timeout_ms']}")
+        else:
+            setting = self.calibrate()
+            if setting is None:
+                print("Batch size calibration failed, keeping the app defaults.", file=sys.stderr)
+                return None
+            cache[key] = setting
+            try:
+                save_cache(cache, self.cache_path)
+            except OSError as e:
+                print(f"Could not save the calibration cache: {e}", file=sys.stderr)
+            print(f"Selected batch size {setting['batch_size']}, scheduler timeout {setting['scheduler_timeout_ms']}: "
+                  f"{setting['fps']:.1f} FPS, p95 {setting['p95_ms']:.1f} ms")
+        self.apply(setting)
+        return setting
@@ -0,0 +1,135 @@
+import numpy as np
+import hailo
+
+# -----------------------------------------------------------------------------------------------
+# Columnar detection extraction
+# -----------------------------------------------------------------------------------------------
+# Walks the detections of a ROI and writes them into preallocated numpy arrays, instead of keeping
+# per-detection Python objects around. The arrays are reused between frames and only grow when a frame
+# has more detections than the current capacity.
+# The hailo bindings have no bulk accessor, reading the detections still takes a few calls per detection,
+# about the cost of a per-detection loop. The benefit is what follows: filtering, counting and exporting
+# use numpy operations on the whole frame.
+
+
+class DetectionArrays:
+    """
+    Reusable columnar storage for the detections of a frame.
+
+    After extract(), the following attributes are views of the first `count` rows. They are overwritten by the
+    next call to extract(), use copy() to keep them.
+        boxes (np.ndarray): (N, 4) float32 normalized (xmin, ymin, xmax, ymax).
+        scores (np.ndarray): (N,) float32 confidences.
+        class_ids (np.ndarray): (N,) int32 class ids.
+        track_ids (np.ndarray): (N,) int32 tracker unique ids, -1 for untracked detections.
+        keypoints (np.ndarray or None): (N, K, 3) float32 normalized (x, y, confidence) in frame coordinates,
+            when num_keypoints > 0.
+        masks (list or None): N references to the HailoConfClassMask of each detection (or None), when with_masks is set.
+        labels (list): N label strings.
+
+    Args:
+        capacity (int, optional): Initial number of rows. Defaults to 64.
+        num_keypoints (int, optional): Number of keypoints per detection (17 for COCO pose), 0 to skip keypoints. Defaults to 0.
+        with_masks (bool, optional): Collect mask references (instance segmentation). Defaults to False.
+    """
+    def __init__(self, capacity=64, num_keypoints=0, with_masks=False):
+        self.num_keypoints = num_keypoints
+        self.with_masks = with_masks
+        self.count = 0
+        self.labels = []
+        self.masks = [] if with_masks else None
+        self._allocate(capacity)
+        self._set_views(0)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._boxes = np.zeros((capacity, 4), dtype=np.float32)
+        self._scores = np.zeros(capacity, dtype=np.float32)
+        self._class_ids = np.zeros(capacity, dtype=np.int32)
+        self._track_ids = np.full(capacity, -1, dtype=np.int32)
+        self._keypoints = np.zeros((capacity, self.num_keypoints, 3), dtype=np.float32) if self.num_keypoints else None
+
+    def _set_views(self, count):
+        self.count = count
+        self.boxes = self._boxes[:count]
+        self.scores = self._scores[:count]
+        self.class_ids = self._class_ids[:count]
+        self.track_ids = self._track_ids[:count]
+        self.keypoints = self._keypoints[:count] if self._keypoints is not None else None
+
+    def __len__(self):
+        return self.count
+
+    def extract(self, source):
+        """
+        Fills the arrays with the detections of a buffer or ROI.
+
+        Args:
+            source: A GstBuffer or a HailoROI.
+
+        Returns:
+            DetectionArrays: self, for chaining.
+        """
+        roi = source if isinstance(source, hailo.HailoROI) else hailo.get_roi_from_buffer(source)
+        detections = roi.get_objects_typed(hailo.HAILO_DETECTION)
+        count = len(detections)
+        if count > self.capacity:
+            self._allocate(max(count, 2 * self.capacity))
+
+        # Bind lookups once, this loop runs for every detection of every frame
+        unique_id_type = hailo.HAILO_UNIQUE_ID
+        landmarks_type = hailo.HAILO_LANDMARKS
+        mask_type = hailo.HAILO_CONF_CLASS_MASK
+        num_keypoints = self.num_keypoints
+        boxes = []
+        scores = []
+        class_ids = []
+        track_ids = []
+        labels = []
+        keypoints = self._keypoints
+        masks = [] if self.with_masks else None
+
+        for index, detection in enumerate(detections):
+            bbox = detection.get_bbox()
+            xmin, ymin, width, height = bbox.xmin(), bbox.ymin(), bbox.width(), bbox.height()
+            boxes.append((xmin, ymin, xmin + width, ymin + height))
+            scores.append(detection.get_confidence())
+            class_ids.append(detection.get_class_id())
+            labels.append(detection.get_label())
+            track = detection.get_objects_typed(unique_id_type)
+            track_ids.append(track[0].get_id() if track else -1)
+            if num_keypoints:
+                landmarks = detection.get_objects_typed(landmarks_type)
+                keypoints[index] = 0
+                if landmarks:
+                    # Points are relative to the detection box, convert them to frame coordinates
+                    points = [(p.x() * width + xmin, p.y() * height + ymin, p.confidence()) for p in landmarks[0].get_points()]
+                    points = points[:num_keypoints]
+                    keypoints[index, :len(points)] = points
+            if masks is not None:
+                detection_masks = detection.get_objects_typed(mask_type)
+                masks.append(detection_masks[0] if detection_masks else None)
+
+        if count:
+            self._boxes[:count] = boxes
+            self._scores[:count] = scores
+            self._class_ids[:count] = class_ids
+            self._track_ids[:count] = track_ids
+        self._set_views(count)
+        self.labels = labels
+        self.masks = masks
+        return self
+
+    def copy(self):
+        """
+        Returns a dict with copies of the current arrays, safe to keep or pass to another thread.
+        """
+        return {
+            'boxes': self.boxes.copy(),
+            'scores': self.scores.copy(),
+            'class_ids': self.class_ids.copy(),
+            'track_ids': self.track_ids.copy(),
+            'keypoints': self.keypoints.copy() if self.keypoints is not None else None,
+            'labels': list(self.labels),
+            'masks': list(self.masks) if self.masks is not None else None,
+        }
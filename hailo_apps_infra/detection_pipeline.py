@@ -2,31 +2,26 @@ import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
 import os
-import argparse
-import multiprocessing
-import numpy as np
-import setproctitle
-import cv2
-import time
-import hailo
 from hailo_apps_infra.hailo_rpi_common import (
     get_default_parser,
     detect_hailo_arch,
 )
 from hailo_apps_infra.gstreamer_helper_pipelines import(
     QUEUE,
-    SOURCE_PIPELINE,
     INFERENCE_PIPELINE,
-    INFERENCE_PIPELINE_WRAPPER,
+    TILING_PIPELINE,
     TRACKER_PIPELINE,
     USER_CALLBACK_PIPELINE,
-    DISPLAY_PIPELINE,
+    METADATA_EXPORT_PIPELINE,
+    EVENT_RECORDING_PIPELINE,
 )
 from hailo_apps_infra.gstreamer_app import (
     GStreamerApp,
     app_callback_class,
     dummy_callback
 )
+from hailo_apps_infra.pipeline_builder import get_hef_input_shape
+from hailo_apps_infra.tiling import get_tile_count, print_tiling_report
 
 
 
@@ -43,7 +38,19 @@ class GStreamerDetectionApp(GStreamerApp):
             default=None,
             help="Path to costume labels JSON file",
         )
+        parser.add_argument(
+            "--tiles", type=int, nargs=2, default=None, metavar=('X', 'Y'),
+            help="Run the detection on X x Y overlapping tiles of each frame, for small objects in high resolution sources.",
+        )
+        parser.add_argument("--tile-overlap", type=float, default=0.1, help="Overlap between neighbouring tiles, as a fraction of the tile. Default is 0.1.")
+        parser.add_argument(
+            "--tile-scale-level", type=int, default=0, choices=[0, 1, 2, 3],
+            help="Also run the 1x1, up to 2x2 or up to 3x3 tile grids (multi scale tiling) to keep detecting large objects. Default is 0 (single scale).",
+        )
         args = parser.parse_args()
+        if args.tiles and (args.inference_interval != 1 or args.motion_gate):
+            # The tiling pipeline has its own cropper, the frame skipping and motion gate croppers are not used
+            parser.error("--tiles can't be combined with --inference-interval or --motion-gate, every tiled frame is inferred")
         # Call the parent class constructor
         super().__init__(args, user_data)
         # Additional initialization code can be added here
@@ -77,6 +84,9 @@ class GStreamerDetectionApp(GStreamerApp):
         self.post_function_name = "filter_letterbox"
         # User-defined label JSON file
         self.labels_json = args.labels_json
+        self.tiles = args.tiles
+        self.tile_overlap = args.tile_overlap
+        self.tile_scale_level = args.tile_scale_level
 
         self.app_callback = app_callback
 
@@ -87,33 +97,67 @@ class GStreamerDetectionApp(GStreamerApp):
         )
 
         # Set the process title
+        import setproctitle
         setproctitle.setproctitle("Hailo Detection App")
 
         self.create_pipeline()
 
     def get_pipeline_string(self):
-        source_pipeline = SOURCE_PIPELINE(self.video_source, self.video_width, self.video_height)
-        detection_pipeline = INFERENCE_PIPELINE(
+        builder = self.create_pipeline_builder()
+        builder.add_sources(self.video_sources, self.video_width, self.video_height, self.video_format,
+                            no_webcam_compression=self.no_webcam_compression)
+        if self.tiles:
+            builder.add(self.get_tiling_pipeline())
+        else:
+            builder.add_inference(
+                hef_path=self.hef_path,
+                post_process_so=self.post_process_so,
+                post_function_name=self.post_function_name,
+                batch_size=self.batch_size,
+                config_json=self.labels_json,
+                additional_params=self.thresholds_str,
+                scheduler_priority=self.scheduler_priority,
+                scheduler_timeout_ms=self.scheduler_timeout_ms,
+                multi_process_service=self.multi_process_service,
+                inference_interval=self.inference_interval,
+                motion_gate=self.motion_gate is not None)
+        builder.add(TRACKER_PIPELINE(class_id=1, profile=self.tuning_profile, inference_interval=self.inference_interval))
+        builder.add(USER_CALLBACK_PIPELINE(profile=self.tuning_profile))
+        if self.metadata_exporter is not None:
+            builder.add(METADATA_EXPORT_PIPELINE(profile=self.tuning_profile))
+        if self.event_recorder is not None:
+            builder.add(EVENT_RECORDING_PIPELINE(profile=self.tuning_profile))
+        builder.add_display(len(self.video_sources), video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps,
+                            headless=self.headless)
+        pipeline_string = builder.build()
+        print(pipeline_string)
+        return pipeline_string
+
+    def get_tuning_stages(self, network_shape):
+        # The tiles are scaled and converted by the INFERENCE_PIPELINE of the tiling pipeline
+        return super().get_tuning_stages(None if self.tiles else network_shape)
+
+    def get_tiling_pipeline(self):
+        tiles_x, tiles_y = self.tiles
+        network_width, network_height = get_hef_input_shape(self.hef_path) or (640, 640)
+        print_tiling_report(self.video_width, self.video_height, network_width, network_height, tiles_x, tiles_y,
+                            self.tile_overlap, self.tile_overlap, self.tile_scale_level)
+        inference = INFERENCE_PIPELINE(
             hef_path=self.hef_path,
             post_process_so=self.post_process_so,
-            post_function_name=self.post_function_name,
-            batch_size=self.batch_size,
+            # The tiles are not letterboxed
+            post_function_name='filter',
+            # The tiles of a frame are batched together
+            batch_size=min(8, get_tile_count(tiles_x, tiles_y, self.tile_scale_level)),
             config_json=self.labels_json,
-            additional_params=self.thresholds_str)
-        detection_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(detection_pipeline)
-        tracker_pipeline = TRACKER_PIPELINE(class_id=1)
-        user_callback_pipeline = USER_CALLBACK_PIPELINE()
-        display_pipeline = DISPLAY_PIPELINE(video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps)
-
-        pipeline_string = (
-            f'{source_pipeline} ! '
-            f'{detection_pipeline_wrapper} ! '
-            f'{tracker_pipeline} ! '
-            f'{user_callback_pipeline} ! '
-            f'{display_pipeline}'
+            additional_params=self.thresholds_str,
+            scheduler_priority=self.scheduler_priority,
+            scheduler_timeout_ms=self.scheduler_timeout_ms,
+            multi_process_service=self.multi_process_service,
+            profile=self.tuning_profile,
         )
-        print(pipeline_string)
-        return pipeline_string
+        return TILING_PIPELINE(inference, tiles_x, tiles_y, self.tile_overlap, self.tile_overlap,
+                               self.tile_scale_level, profile=self.tuning_profile)
 
 if __name__ == "__main__":
     # Create an instance of the user app callback class
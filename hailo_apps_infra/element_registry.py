@@ -0,0 +1,378 @@
+import argparse
+import collections
+import functools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from hailo_apps_infra.gstreamer_helper_pipelines import get_source_type
+
+# -----------------------------------------------------------------------------------------------
+# Decoder / converter registry
+# -----------------------------------------------------------------------------------------------
+# SOURCE_PIPELINE decodes with decodebin and then scales and converts with a software videoscale followed by a
+# videoconvert. Many systems have faster elements: V4L2 hardware codecs and converters (v4l2jpegdec,
+# v4l2h264dec, v4l2convert), or videoconvertscale (GStreamer >= 1.22) which scales and converts in one pass.
+# get_source_chain() looks the candidates below up in the GStreamer registry, runs each one found on a short
+# synthetic clip and keeps the one which works with the least CPU time per frame (a hardware decoder can be
+# slower than a software one on an idle machine, but leaves the cores to the rest of the pipeline), the frame
+# rate breaks ties. Each run is a gst-launch-1.0 child process, its CPU time is read with
+# getrusage(RUSAGE_CHILDREN). The rankings are cached with a key made of the GStreamer version and the plugins
+# of the candidates, so the benchmark only runs again after an upgrade.
+# A slot without a better working candidate keeps the SOURCE_PIPELINE default.
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'hailo_apps_infra', 'source_chain.json')
+
+SourceChain = collections.namedtuple('SourceChain', [
+    'jpeg_decoder',     # decoder of the MJPEG webcams, None keeps decodebin
+    'converter',        # element scaling and converting the source frames, None keeps videoscale + videoconvert
+    'video_decoders',   # decoders decodebin picks first for files, see apply_decoder_ranks()
+])
+DEFAULT_CHAIN = SourceChain(None, None, ())
+
+# codec: (caps, parser, encoders making the benchmark clip, decoders in order of preference)
+DECODERS = {
+    'jpeg': ('image/jpeg', 'jpegparse', ('jpegenc',), ('v4l2jpegdec', 'jpegdec', 'avdec_mjpeg')),
+    'h264': ('video/x-h264, stream-format=byte-stream', 'h264parse', ('x264enc', 'openh264enc', 'v4l2h264enc'),
+             ('v4l2slh264dec', 'v4l2h264dec', 'avdec_h264', 'openh264dec')),
+    'h265': ('video/x-h265, stream-format=byte-stream', 'h265parse', ('x265enc', 'v4l2h265enc'),
+             ('v4l2slh265dec', 'v4l2h265dec', 'avdec_h265')),
+}
+# The SOURCE_PIPELINE defaults, benchmarked with the candidates
+LEGACY_DECODER = 'decodebin'
+LEGACY_CONVERTER = 'videoscale+videoconvert'
+# converter: benchmark pipeline fragment
+CONVERTERS = {
+    'v4l2convert': 'v4l2convert',
+    'videoconvertscale': 'videoconvertscale n-threads=3',
+    LEGACY_CONVERTER: 'videoscale n-threads=2 ! videoconvert n-threads=3',
+}
+VIDEO_CODECS = ('h264', 'h265')
+
+BENCHMARK_FRAMES = 60
+# Decoded clip size, and converter input -> output size
+CLIP_SIZE = (1280, 720)
+CONVERT_INPUT = ('I420', 1920, 1080)
+BENCHMARK_TIMEOUT = 10  # seconds
+# Part of the cache key, changes when the rankings change meaning
+RANKINGS_VERSION = 2
+
+
+def _gst():
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+    Gst.init(None)
+    return Gst
+
+
+@functools.lru_cache(maxsize=None)
+def get_available_elements():
+    """Returns the candidate elements (decoders, encoders, parsers, converters) found in the GStreamer registry."""
+    Gst = _gst()
+    names = {LEGACY_DECODER}
+    for _, parser, encoders, decoders in DECODERS.values():
+        names.update((parser, *encoders, *decoders))
+    names.update(('v4l2convert', 'videoconvertscale', 'videoscale', 'videoconvert'))
+    return frozenset(name for name in names if Gst.ElementFactory.find(name) is not None)
+
+
+def is_available(element):
+    if element == LEGACY_CONVERTER:
+        return {'videoscale', 'videoconvert'} <= get_available_elements()
+    return element in get_available_elements()
+
+
+def get_registry_key():
+    """Returns the key the cached rankings are valid for: GStreamer version, machine and candidate plugins."""
+    Gst = _gst()
+    plugins = []
+    for name in sorted(get_available_elements()):
+        plugin = Gst.ElementFactory.find(name).get_plugin()
+        plugins.append(f'{name}:{plugin.get_version() if plugin else ""}:{plugin.get_filename() if plugin else ""}')
+    return '|'.join([f'v{RANKINGS_VERSION}', Gst.version_string(), platform.machine(), ','.join(plugins)])
+
+
+def get_required_slots(video_sources, video_format='RGB', no_webcam_compression=False):
+    """Returns the rankings the sources need: 'jpeg' for USB webcams, the video codecs for files, the converter."""
+    slots = [f'convert_{video_format}']
+    for video_source in video_sources:
+        source_type = get_source_type(video_source)
+        if source_type == 'usb' and not no_webcam_compression:
+            slots.append('jpeg')
+        elif source_type == 'file':
+            slots.extend(VIDEO_CODECS)
+    return list(dict.fromkeys(slots))
+
+
+def _cpu_time(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _run_pipeline(description, timeout=BENCHMARK_TIMEOUT):
+    """
+    Runs a pipeline to EOS in a gst-launch-1.0 child process.
+
+    Returns:
+        tuple: (elapsed seconds, CPU seconds of the child), None if it fails or times out.
+    """
+    gst_launch = shutil.which('gst-launch-1.0')
+    if gst_launch is None:
+        return _run_pipeline_in_process(description, timeout)
+    cpu_start = _cpu_time(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    try:
+        result = subprocess.run([gst_launch, '-q', description], stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return time.perf_counter() - start, _cpu_time(resource.RUSAGE_CHILDREN) - cpu_start
+
+
+def _run_pipeline_in_process(description, timeout=BENCHMARK_TIMEOUT):
+    """Without gst-launch-1.0: runs the pipeline in this process, the CPU time is the whole process (RUSAGE_SELF)."""
+    Gst = _gst()
+    try:
+        pipeline = Gst.parse_launch(description)
+    except Exception:
+        return None
+    cpu_start = _cpu_time(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    try:
+        if pipeline.set_state(Gst.State.PLAYING) == Gst.StateChangeReturn.FAILURE:
+            return None
+        message = pipeline.get_bus().timed_pop_filtered(int(timeout * Gst.SECOND), Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        if message is None or message.type != Gst.MessageType.EOS:
+            return None
+        return time.perf_counter() - start, _cpu_time(resource.RUSAGE_SELF) - cpu_start
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+
+def _ranking(element, frames, result):
+    elapsed, cpu_time = result
+    return [element, round(cpu_time * 1000 / frames, 3), frames / elapsed if elapsed > 0 else 0.0]
+
+
+def sort_rankings(rankings):
+    """Sorts [element, cpu_ms_per_frame, fps] rankings: least CPU time per frame first (0.1 ms steps), then the fastest."""
+    return sorted(rankings, key=lambda ranking: (round(ranking[1], 1), -ranking[2]))
+
+
+def _make_clip(codec, directory, frames):
+    caps, parser, encoders, _ = DECODERS[codec]
+    path = os.path.join(directory, f'{codec}.bin')
+    width, height = CLIP_SIZE
+    for encoder in encoders:
+        if not is_available(encoder):
+            continue
+        if _run_pipeline(f'videotestsrc num-buffers={frames} ! video/x-raw, width={width}, height={height}, framerate=30/1 ! '
+                         f'{encoder} ! {parser} ! {caps} ! filesink location={path}') is not None:
+            return path
+    return None
+
+
+def rank_decoders(codec, frames=BENCHMARK_FRAMES):
+    """
+    Decodes a clip of the codec with each available decoder and decodebin.
+
+    Returns:
+        list: [decoder, cpu_ms_per_frame, fps] of the decoders which worked, best first (see sort_rankings()).
+            Empty if no clip could be encoded.
+    """
+    _, parser, _, decoders = DECODERS[codec]
+    if not is_available(parser):
+        return []
+    directory = tempfile.mkdtemp(prefix='hailo_source_chain_')
+    try:
+        clip = _make_clip(codec, directory, frames)
+        if clip is None:
+            return []
+        rankings = []
+        for decoder in [decoder for decoder in decoders if is_available(decoder)] + [LEGACY_DECODER]:
+            result = _run_pipeline(f'filesrc location={clip} ! {parser} ! {decoder} ! fakesink sync=false')
+            if result:
+                rankings.append(_ranking(decoder, frames, result))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return sort_rankings(rankings)
+
+
+def rank_converters(video_format='RGB', frames=BENCHMARK_FRAMES):
+    """
+    Scales and converts CONVERT_INPUT frames to CLIP_SIZE video_format frames with each available converter.
+    The videotestsrc rendering is part of every measurement, it does not change the order.
+
+    Returns:
+        list: [converter, cpu_ms_per_frame, fps] of the converters which worked, best first (see sort_rankings()).
+    """
+    input_format, input_width, input_height = CONVERT_INPUT
+    width, height = CLIP_SIZE
+    rankings = []
+    for converter, fragment in CONVERTERS.items():
+        if not is_available(converter):
+            continue
+        result = _run_pipeline(
+            f'videotestsrc num-buffers={frames} ! video/x-raw, format={input_format}, width={input_width}, height={input_height} ! '
+            f'{fragment} ! video/x-raw, format={video_format}, width={width}, height={height} ! fakesink sync=false'
+        )
+        if result:
+            rankings.append(_ranking(converter, frames, result))
+    return sort_rankings(rankings)
+
+
+def rank_slot(slot):
+    if slot.startswith('convert_'):
+        return rank_converters(slot[len('convert_'):])
+    return rank_decoders(slot)
+
+
+def load_rankings_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_rankings(slots, use_cache=True, path=CACHE_PATH):
+    """
+    Returns {slot: [[element, cpu_ms_per_frame, fps], ...]} for the slots (see get_required_slots()), from the
+    cache when its key still matches. The slots missing from the cache are benchmarked and added to it.
+    """
+    key = get_registry_key()
+    cache = load_rankings_cache(path) if use_cache else {}
+    rankings = cache.get('rankings', {}) if cache.get('key') == key else {}
+    missing = [slot for slot in slots if slot not in rankings]
+    if not missing:
+        return rankings
+    print(f"Benchmarking the source decoders / converters ({', '.join(missing)}), this takes a few seconds once, "
+          f"the result is cached in {path if use_cache else 'memory only'}")
+    for slot in missing:
+        rankings[slot] = rank_slot(slot)
+    if use_cache:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': key, 'rankings': rankings}, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save the source chain cache: {e}")
+    return rankings
+
+
+def choose_source_chain(rankings, video_format='RGB'):
+    """Returns the SourceChain of the best elements of the rankings, the legacy elements map to None."""
+    def best(slot):
+        ranking = rankings.get(slot)
+        return ranking[0][0] if ranking else None
+    jpeg_decoder = best('jpeg')
+    converter = best(f'convert_{video_format}')
+    video_decoders = tuple(decoder for decoder in (best(codec) for codec in VIDEO_CODECS)
+                           if decoder not in (None, LEGACY_DECODER))
+    return SourceChain(
+        None if jpeg_decoder == LEGACY_DECODER else jpeg_decoder,
+        None if converter == LEGACY_CONVERTER else converter,
+        video_decoders,
+    )
+
+
+def parse_source_chain(spec):
+    """
+    Parses a forced chain: 'legacy' for the SOURCE_PIPELINE defaults, or comma separated slot=element pairs,
+    e.g. 'jpeg=jpegdec,convert=videoconvertscale,h264=avdec_h264'. Slots not given keep the defaults.
+    """
+    if spec == 'legacy':
+        return DEFAULT_CHAIN
+    jpeg_decoder = converter = None
+    video_decoders = []
+    for item in spec.split(','):
+        slot, separator, element = item.partition('=')
+        slot, element = slot.strip(), element.strip()
+        if not separator or not element:
+            raise ValueError(f"Invalid source chain item '{item}', expected slot=element")
+        if slot == 'jpeg':
+            jpeg_decoder = None if element == LEGACY_DECODER else element
+        elif slot == 'convert':
+            converter = None if element == LEGACY_CONVERTER else element
+        elif slot in VIDEO_CODECS:
+            if element != LEGACY_DECODER:
+                video_decoders.append(element)
+        else:
+            raise ValueError(f"Unknown source chain slot '{slot}', use jpeg, convert, {', '.join(VIDEO_CODECS)}")
+    return SourceChain(jpeg_decoder, converter, tuple(video_decoders))
+
+
+def get_source_chain(spec, video_sources, video_format='RGB', no_webcam_compression=False, use_cache=True, path=CACHE_PATH):
+    """
+    Returns the SourceChain for the sources.
+
+    Args:
+        spec (str): 'auto' for the working elements using the least CPU, 'legacy' or a forced chain (see parse_source_chain()).
+        video_sources (list): The sources of the app, only the rankings they need are benchmarked.
+        video_format (str, optional): The source output format. Defaults to 'RGB'.
+        no_webcam_compression (bool, optional): The USB webcams are read uncompressed, no JPEG decoder is ranked.
+            Defaults to False.
+        use_cache (bool, optional): Read and update the rankings cache. Defaults to True.
+        path (str, optional): The cache file.
+    """
+    if spec != 'auto':
+        chain = parse_source_chain(spec)
+        # Forced elements which are not installed fall back to the defaults
+        missing = [element for element in (chain.jpeg_decoder, chain.converter, *chain.video_decoders)
+                   if element is not None and _gst().ElementFactory.find(element) is None]
+        if missing:
+            print(f"Source chain elements not found, using the defaults instead: {', '.join(missing)}")
+            chain = SourceChain(
+                None if chain.jpeg_decoder in missing else chain.jpeg_decoder,
+                None if chain.converter in missing else chain.converter,
+                tuple(decoder for decoder in chain.video_decoders if decoder not in missing),
+            )
+        return chain
+    slots = get_required_slots(video_sources, video_format, no_webcam_compression)
+    return choose_source_chain(get_rankings(slots, use_cache, path), video_format)
+
+
+def apply_decoder_ranks(chain):
+    """Raises the rank of the chain video decoders above the others, so decodebin picks them for files."""
+    if not chain.video_decoders:
+        return
+    Gst = _gst()
+    for decoder in chain.video_decoders:
+        factory = Gst.ElementFactory.find(decoder)
+        if factory is not None:
+            factory.set_rank(Gst.Rank.PRIMARY + 1)
+
+
+def format_source_chain(chain):
+    return (f"jpeg={chain.jpeg_decoder or LEGACY_DECODER}, convert={chain.converter or LEGACY_CONVERTER}, "
+            f"video decoders={','.join(chain.video_decoders) or 'by rank'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the source decoders and converters")
+    parser.add_argument("--format", default="RGB", help="Converter output format. Default is RGB.")
+    parser.add_argument("--slots", nargs='+', default=None, help="Rankings to print (jpeg, h264, h265, convert_<format>). Default is all.")
+    parser.add_argument("--no-cache", action="store_true", help="Benchmark again and don't update the cache.")
+    args = parser.parse_args()
+    slots = args.slots or ['jpeg', *VIDEO_CODECS, f'convert_{args.format}']
+    rankings = get_rankings(slots, use_cache=not args.no_cache)
+    for slot in slots:
+        print(f"{slot}:")
+        for element, cpu_ms_per_frame, fps in rankings.get(slot, []):
+            print(f"  {element:<26} {cpu_ms_per_frame:>8.2f} ms CPU/frame {fps:>8.1f} fps")
+        if not rankings.get(slot):
+            print("  no working element")
+    print(f"Chain: {format_source_chain(choose_source_chain(rankings, args.format))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import collections
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# -----------------------------------------------------------------------------------------------
+# Event recording
+# -----------------------------------------------------------------------------------------------
+# EVENT_RECORDING_PIPELINE tees the frames into an H.264 encoder whose access units end in an appsink.
+# EventRecorder keeps the last pre_roll seconds of them in memory, as whole GOPs so a clip always starts at a
+# keyframe (h264parse repeats the SPS / PPS before every keyframe). trigger() flushes the pre-roll and the
+# following post_roll seconds into an MP4 clip: a writer thread muxes the encoded frames as they are, with an
+# appsrc ! h264parse ! mp4mux ! filesink pipeline, and finalizes the file with an EOS. Nothing is written to disk
+# between events and nothing is encoded twice. A trigger during a clip extends it.
+# The ring is capped at max_bytes, the oldest GOPs are dropped first.
+
+
+class ClipWriter:
+    """
+    Muxes encoded H.264 frames into an MP4 file in its own thread.
+
+    Args:
+        path (str): The clip file.
+        caps (Gst.Caps): The caps of the encoded frames.
+    """
+    def __init__(self, path, caps):
+        self.path = path
+        self.caps = caps
+        self.frames = 0
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='event_clip_writer')
+        self.thread.start()
+
+    def push(self, buffer):
+        self.queue.put(buffer)
+
+    def finish(self):
+        """Ends the clip, the file is finalized by the writer thread."""
+        self.queue.put(None)
+
+    def _run(self):
+        pipeline = Gst.parse_launch(f'appsrc name=clip_source format=time ! h264parse ! mp4mux ! filesink location="{self.path}"')
+        appsrc = pipeline.get_by_name('clip_source')
+        appsrc.set_property('caps', self.caps)
+        pipeline.set_state(Gst.State.PLAYING)
+        offset = None
+        while True:
+            buffer = self.queue.get()
+            if buffer is None:
+                break
+            if offset is None:
+                offset = buffer.pts
+            # The ring buffers are shared with the other clips, the copy shares their memory
+            buffer = buffer.copy()
+            buffer.pts = buffer.dts = buffer.pts - offset
+            if appsrc.emit('push-buffer', buffer) != Gst.FlowReturn.OK:
+                break
+            self.frames += 1
+        appsrc.emit('end-of-stream')
+        message = pipeline.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+        if message is None or message.type == Gst.MessageType.ERROR:
+            self.error = message.parse_error()[0].message if message is not None else 'timeout'
+            print(f"Event clip {self.path} not finalized: {self.error}", file=sys.stderr)
+        pipeline.set_state(Gst.State.NULL)
+
+
+class EventRecorder:
+    """
+    Keeps a pre-roll of encoded frames in memory and writes clips around the events.
+
+    Args:
+        directory (str, optional): Where the clips are written. Defaults to 'recordings'.
+        pre_roll (float, optional): Seconds kept before an event, rounded up to whole GOPs. Defaults to 5.0.
+        post_roll (float, optional): Seconds recorded after the last event of a clip. Defaults to 5.0.
+        max_bytes (int, optional): Memory cap of the pre-roll ring. Defaults to 64 MB.
+
+    Attributes:
+        ring_bytes (int): Encoded bytes in the ring.
+        peak_bytes (int): Highest ring_bytes.
+        events (int): Triggers, including those extending a clip.
+        clips (list): The paths of the clips started.
+        dropped_frames (int): Frames not kept because a single GOP exceeded max_bytes.
+    """
+    def __init__(self, directory='recordings', pre_roll=5.0, post_roll=5.0, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.pre_roll = int(pre_roll * Gst.SECOND)
+        self.post_roll = int(post_roll * Gst.SECOND)
+        self.max_bytes = max_bytes
+        # [start pts, bytes, buffers] per GOP
+        self.gops = collections.deque()
+        self.ring_bytes = 0
+        self.peak_bytes = 0
+        self.newest_pts = None
+        self.caps = None
+        self.events = 0
+        self.clips = []
+        self.dropped_frames = 0
+        self.writer = None
+        self.record_until = None
+        self.writers = []
+        self.lock = threading.Lock()
+
+    def attach(self, pipeline, name='event_recorder'):
+        appsink = pipeline.get_by_name(f'{name}_appsink')
+        if appsink is None:
+            print(f"Event recorder: {name}_appsink not found, add EVENT_RECORDING_PIPELINE to the pipeline")
+            return self
+        appsink.connect('new-sample', self._on_new_sample)
+        return self
+
+    def _on_new_sample(self, appsink):
+        sample = appsink.emit('pull-sample')
+        if sample is not None:
+            self.add_buffer(sample.get_buffer(), sample.get_caps())
+        return Gst.FlowReturn.OK
+
+    def add_buffer(self, buffer, caps):
+        """Adds an encoded frame to the ring and to the clip being recorded."""
+        with self.lock:
+            self.caps = caps
+            self.newest_pts = buffer.pts
+            if not buffer.has_flags(Gst.BufferFlags.DELTA_UNIT):
+                self.gops.append([buffer.pts, 0, []])
+            if self.gops:
+                gop = self.gops[-1]
+                gop[1] += buffer.get_size()
+                gop[2].append(buffer)
+                self.ring_bytes += buffer.get_size()
+                self._trim()
+            else:
+                # Waiting for a keyframe
+                self.dropped_frames += 1
+            if self.writer is not None:
+                self.writer.push(buffer)
+                if buffer.pts >= self.record_until:
+                    self._finish_clip()
+
+    def _trim(self):
+        # Drop the oldest GOP while the next one still starts pre_roll before the newest frame
+        while len(self.gops) > 1 and (self.newest_pts - self.gops[1][0] >= self.pre_roll or self.ring_bytes > self.max_bytes):
+            self.ring_bytes -= self.gops.popleft()[1]
+        if self.ring_bytes > self.max_bytes:
+            # A single GOP over the cap, start again at the next keyframe
+            self.dropped_frames += len(self.gops[0][2])
+            self.gops.clear()
+            self.ring_bytes = 0
+        self.peak_bytes = max(self.peak_bytes, self.ring_bytes)
+
+    def trigger(self, event='event'):
+        """
+        Starts a clip with the pre-roll, or extends the clip being recorded. Can be called from any thread.
+
+        Args:
+            event (str, optional): Used in the clip file name. Defaults to 'event'.
+
+        Returns:
+            bool: False if no frame was encoded yet.
+        """
+        with self.lock:
+            if self.newest_pts is None:
+                return False
+            self.events += 1
+            self.record_until = self.newest_pts + self.post_roll
+            if self.writer is None:
+                os.makedirs(self.directory, exist_ok=True)
+                label = re.sub(r'[^A-Za-z0-9_-]+', '_', event)
+                path = os.path.join(self.directory, f"{label}_{time.strftime('%Y%m%d_%H%M%S')}_{len(self.clips)}.mp4")
+                self.writer = ClipWriter(path, self.caps)
+                self.writers.append(self.writer)
+                self.clips.append(path)
+                for _, _, buffers in self.gops:
+                    for buffer in buffers:
+                        self.writer.push(buffer)
+            return True
+
+    def _finish_clip(self):
+        self.writer.finish()
+        print(f"Event clip saved to {self.writer.path}")
+        self.writer = None
+
+    def close(self, timeout=10):
+        """Finalizes the clip being recorded and waits for the writers."""
+        with self.lock:
+            if self.writer is not None:
+                self._finish_clip()
+        for writer in self.writers:
+            writer.thread.join(timeout)
+
+    def get_stats(self):
+        with self.lock:
+            ring_seconds = (self.newest_pts - self.gops[0][0]) / Gst.SECOND if self.gops else 0.0
+            return {
+                'ring_bytes': self.ring_bytes,
+                'ring_seconds': ring_seconds,
+                'peak_bytes': self.peak_bytes,
+                'max_bytes': self.max_bytes,
+                'events': self.events,
+                'clips': len(self.clips),
+                'dropped_frames': self.dropped_frames,
+            }
+
+    def print_stats(self, file=sys.stdout):
+        stats = self.get_stats()
+        megabyte = 1024 * 1024
+        print(f"Event recorder: pre-roll {stats['ring_seconds']:.1f} s in {stats['ring_bytes'] / megabyte:.1f} MB "
+              f"(peak {stats['peak_bytes'] / megabyte:.1f} MB, cap {stats['max_bytes'] / megabyte:.0f} MB), "
+              f"{stats['events']} events, {stats['clips']} clips, {stats['dropped_frames']} frames dropped", file=file)
+        return True
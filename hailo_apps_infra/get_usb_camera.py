@@ -1,39 +1,386 @@
+import argparse
+import collections
+import fcntl
 import os
-import subprocess
+import select
+import socket
+import struct
+import threading
+import time
 
-# if udevadm is not installed, install it using the following command:
-# sudo apt-get install udev
+# -----------------------------------------------------------------------------------------------
+# USB camera enumeration
+# -----------------------------------------------------------------------------------------------
+# The devices are enumerated in-process, without running `udevadm info` for every /dev/video* node:
+# - /sys/class/video4linux/videoN gives the name, the major:minor and the bus path (the device symlink).
+# - /run/udev/data/c<major>:<minor> holds the properties udev collected (ID_BUS, ID_V4L_CAPABILITIES, ID_PATH).
+# - The V4L2 ioctls (VIDIOC_QUERYCAP, VIDIOC_ENUM_FMT, VIDIOC_ENUM_FRAMESIZES) give the capture capability and
+#   the supported formats and resolutions, and replace the udev properties where udev is not running (containers).
+# The records are cached per device node, a replugged camera gets a new node and is queried again.
+
+SYSFS_ROOT = '/sys/class/video4linux'
+UDEV_DATA_ROOT = '/run/udev/data'
+DEV_ROOT = '/dev'
+
+# formats: {fourcc: [(width, height), ...]}, None if not queried. Stepwise sizes are listed as their min and max.
+VideoDevice = collections.namedtuple('VideoDevice', ['device', 'name', 'bus', 'bus_path', 'capture', 'formats'])
+
+# linux/videodev2.h
+VIDIOC_QUERYCAP = 0x80685600
+VIDIOC_ENUM_FMT = 0xc0405602
+VIDIOC_ENUM_FRAMESIZES = 0xc02c564a
+V4L2_CAPABILITY = struct.Struct('=16s32s32sIII3I')
+V4L2_FMTDESC = struct.Struct('=III32sII3I')
+V4L2_FRMSIZEENUM = struct.Struct('=III6I2I')
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+V4L2_FRMSIZE_TYPE_DISCRETE = 1
+
+# linux/netlink.h
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+
+_device_cache = {}
+
+
+def _read_file(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_udev_properties(major, minor, udev_root=UDEV_DATA_ROOT):
+    """
+    Returns the udev properties of a character device ("E:KEY=VALUE" lines of its udev database entry),
+    an empty dict if udev has no entry for it.
+    """
+    data = _read_file(os.path.join(udev_root, f'c{major}:{minor}'))
+    properties = {}
+    for line in (data or '').split('\n'):
+        if line.startswith('E:'):
+            key, _, value = line[2:].partition('=')
+            properties[key] = value
+    return properties
+
+
+def query_v4l2_device(device, query_formats=True):
+    """
+    Queries a V4L2 device with ioctls.
+
+    Args:
+        device (str): The device node, e.g. /dev/video0.
+        query_formats (bool, optional): Also enumerate the capture formats and frame sizes. Defaults to True.
+
+    Returns:
+        tuple: (capture, formats). capture is None if the device could not be queried, formats is None if
+            not queried.
+    """
+    try:
+        fd = os.open(device, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return None, None
+    try:
+        buffer = bytearray(V4L2_CAPABILITY.size)
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, buffer)
+        _, _, _, _, capabilities, device_caps, *_ = V4L2_CAPABILITY.unpack(buffer)
+        if capabilities & V4L2_CAP_DEVICE_CAPS:
+            capabilities = device_caps
+        capture = bool(capabilities & V4L2_CAP_VIDEO_CAPTURE)
+        if not capture or not query_formats:
+            return capture, None
+        formats = {}
+        index = 0
+        while True:
+            buffer = bytearray(V4L2_FMTDESC.pack(index, V4L2_BUF_TYPE_VIDEO_CAPTURE, 0, b'', 0, 0, 0, 0, 0))
+            try:
+                fcntl.ioctl(fd, VIDIOC_ENUM_FMT, buffer)
+            except OSError:
+                break
+            pixel_format = V4L2_FMTDESC.unpack(buffer)[4]
+            formats[struct.pack('<I', pixel_format).decode('ascii', 'replace')] = _query_frame_sizes(fd, pixel_format)
+            index += 1
+        return capture, formats
+    except OSError:
+        return None, None
+    finally:
+        os.close(fd)
+
+
+def _query_frame_sizes(fd, pixel_format):
+    sizes = []
+    index = 0
+    while True:
+        buffer = bytearray(V4L2_FRMSIZEENUM.pack(index, pixel_format, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_ENUM_FRAMESIZES, buffer)
+        except OSError:
+            break
+        _, _, size_type, *values = V4L2_FRMSIZEENUM.unpack(buffer)
+        if size_type == V4L2_FRMSIZE_TYPE_DISCRETE:
+            sizes.append((values[0], values[1]))
+        else:
+            # Continuous / stepwise: min_width, max_width, step_width, min_height, max_height, step_height
+            sizes += [(values[0], values[3]), (values[1], values[4])]
+            break
+        index += 1
+    return sizes
+
+
+def _get_cache_key(device):
+    try:
+        stat = os.stat(device)
+        return stat.st_rdev, stat.st_ctime_ns
+    except OSError:
+        return None
+
+
+def get_video_device(node, query_formats=True, dev_root=DEV_ROOT, sysfs_root=SYSFS_ROOT, udev_root=UDEV_DATA_ROOT):
+    """
+    Returns the VideoDevice record of a video4linux node.
+
+    Args:
+        node (str): The node name, e.g. video0.
+        query_formats (bool, optional): Enumerate the formats and frame sizes. Defaults to True.
+
+    Returns:
+        VideoDevice: The record, None if the node has no sysfs entry.
+    """
+    sysfs_path = os.path.join(sysfs_root, node)
+    major_minor = _read_file(os.path.join(sysfs_path, 'dev'))
+    if major_minor is None:
+        return None
+    major, _, minor = major_minor.partition(':')
+    properties = read_udev_properties(major, minor, udev_root)
+    device_path = os.path.realpath(os.path.join(sysfs_path, 'device'))
+
+    device = os.path.join(dev_root, node)
+    capture, formats = query_v4l2_device(device, query_formats)
+    if capture is None:
+        capture = ':capture:' in properties.get('ID_V4L_CAPABILITIES', '')
+    bus = properties.get('ID_BUS')
+    if bus is None:
+        bus = 'usb' if '/usb' in device_path else None
+    return VideoDevice(
+        device=device,
+        name=_read_file(os.path.join(sysfs_path, 'name')) or node,
+        bus=bus,
+        bus_path=properties.get('ID_PATH', device_path),
+        capture=capture,
+        formats=formats,
+    )
+
+
+def list_video_devices(usb_only=True, capture_only=True, query_formats=True, use_cache=True,
+                       dev_root=DEV_ROOT, sysfs_root=SYSFS_ROOT, udev_root=UDEV_DATA_ROOT):
+    """
+    Enumerates the video4linux devices.
+
+    Args:
+        usb_only (bool, optional): Only USB devices. Defaults to True.
+        capture_only (bool, optional): Only devices with video capture capability (UVC cameras also
+            create metadata nodes). Defaults to True.
+        query_formats (bool, optional): Enumerate the formats and frame sizes. Defaults to True.
+        use_cache (bool, optional): Reuse the records of unchanged device nodes. Defaults to True.
+
+    Returns:
+        list: VideoDevice records, sorted by device number.
+    """
+    try:
+        nodes = [node for node in os.listdir(sysfs_root) if node.startswith('video')]
+    except OSError:
+        nodes = []
+    devices = []
+    for node in sorted(nodes, key=lambda node: int(node[len('video'):] or 0)):
+        device = os.path.join(dev_root, node)
+        key = _get_cache_key(device)
+        cached = _device_cache.get(device)
+        # A record made without the formats does not answer a query for them
+        if use_cache and cached and cached[0] == key and (cached[2] or not query_formats):
+            record = cached[1]
+        else:
+            record = get_video_device(node, query_formats, dev_root, sysfs_root, udev_root)
+            if record is None:
+                continue
+            _device_cache[device] = (key, record, query_formats)
+        if usb_only and record.bus != 'usb':
+            continue
+        if capture_only and not record.capture:
+            continue
+        devices.append(record)
+    return devices
 
 
 def get_usb_video_devices():
     """
     Get a list of video devices that are connected via USB and have video capture capability.
     """
-    video_devices = [f'/dev/{device}' for device in os.listdir('/dev') if device.startswith('video')]
-    usb_video_devices = []
+    return [record.device for record in list_video_devices(query_formats=False)]
+
+
+# -----------------------------------------------------------------------------------------------
+# Hotplug monitor
+# -----------------------------------------------------------------------------------------------
+# Listens to the kernel uevents of the video4linux subsystem and enumerates the devices again when one
+# arrives, falling back to polling when netlink is not available. The kernel sends the event before udev
+# created the node and its database entry, so the scan waits settle_time first.
+
+def parse_uevent(data):
+    """
+    Parses a kernel uevent netlink message ("ACTION@DEVPATH\\0KEY=VALUE\\0...").
+
+    Returns:
+        dict: The KEY=VALUE fields, empty if the message is not a kernel uevent.
+    """
+    fields = data.split(b'\0')
+    if b'@' not in fields[0]:
+        return {}
+    event = {}
+    for field in fields[1:]:
+        key, separator, value = field.partition(b'=')
+        if separator:
+            event[key.decode('utf-8', 'replace')] = value.decode('utf-8', 'replace')
+    return event
+
+
+class UsbCameraMonitor:
+    """
+    Watches USB cameras being plugged and unplugged.
+
+    The callbacks run in the monitor thread, a GStreamer app should hand them to its main loop
+    (GLib.idle_add) before changing the pipeline.
+
+    Args:
+        on_added (callable, optional): Called with the VideoDevice of every new camera.
+        on_removed (callable, optional): Called with the VideoDevice of every removed camera.
+        poll_interval (float, optional): Seconds between scans when netlink is not available. Defaults to 2.0.
+        settle_time (float, optional): Seconds to wait after a uevent before scanning. Defaults to 0.5.
+        query_formats (bool, optional): Enumerate the formats of the new cameras. Defaults to True.
 
-    for device in video_devices:
+    Attributes:
+        devices (dict): The current cameras, device node -> VideoDevice.
+    """
+    def __init__(self, on_added=None, on_removed=None, poll_interval=2.0, settle_time=0.5, query_formats=True):
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.query_formats = query_formats
+        self.devices = {}
+        self._keys = {}
+        self._socket = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _open_socket(self):
         try:
-            # Use udevadm to get detailed information about the device
-            udevadm_cmd = ["udevadm", "info", "--query=all", "--name=" + device]
-            result = subprocess.run(udevadm_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output = result.stdout.decode('utf-8')
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, UEVENT_KERNEL_GROUP))
+            return sock
+        except (AttributeError, OSError):
+            return None
+
+    def scan(self):
+        """Enumerates the cameras and calls the callbacks for the changes. Returns (added, removed)."""
+        current = {}
+        keys = {}
+        for record in list_video_devices(query_formats=self.query_formats):
+            current[record.device] = record
+            keys[record.device] = _get_cache_key(record.device)
+        # A node recreated between two scans is a removal followed by an addition
+        removed = [record for device, record in self.devices.items() if keys.get(device) != self._keys.get(device)]
+        added = [record for device, record in current.items() if keys[device] != self._keys.get(device)]
+        self.devices = current
+        self._keys = keys
+        for record in removed:
+            if self.on_removed:
+                self.on_removed(record)
+        for record in added:
+            if self.on_added:
+                self.on_added(record)
+        return added, removed
 
-            # Check if the device is connected via USB and has video capture capabilities
-            if "ID_BUS=usb" in output and ":capture:" in output:
-                usb_video_devices.append(device)
-        except Exception as e:
-            print(f"Error checking device {device}: {e}")
+    def start(self):
+        """Takes the initial list of cameras (no callbacks) and starts the monitor thread."""
+        self._socket = self._open_socket()
+        self.devices = {record.device: record for record in list_video_devices(query_formats=self.query_formats)}
+        self._keys = {device: _get_cache_key(device) for device in self.devices}
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self._socket is None:
+                self._stop_event.wait(self.poll_interval)
+                if not self._stop_event.is_set():
+                    self.scan()
+                continue
+            readable, _, _ = select.select([self._socket], [], [], self.poll_interval)
+            if not readable:
+                continue
+            changed = False
+            # Drain the burst of events a camera generates (video and media nodes, interfaces)
+            while True:
+                try:
+                    data = self._socket.recv(16384, socket.MSG_DONTWAIT)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    return
+                if parse_uevent(data).get('SUBSYSTEM') == 'video4linux':
+                    changed = True
+            if changed and not self._stop_event.wait(self.settle_time):
+                self.scan()
+
+
+def format_video_device(record):
+    """Returns a one line per format description of a VideoDevice."""
+    lines = [f"{record.device}: {record.name} ({record.bus_path})"]
+    for fourcc, sizes in (record.formats or {}).items():
+        lines.append(f"    {fourcc}: {' '.join(f'{width}x{height}' for width, height in sizes)}")
+    return '\n'.join(lines)
 
-    return usb_video_devices
 
 def main():
-    usb_video_devices = get_usb_video_devices()
+    parser = argparse.ArgumentParser(description="List the USB cameras")
+    parser.add_argument("--details", action="store_true", help="Print the bus path, formats and resolutions of every camera")
+    parser.add_argument("--watch", action="store_true", help="Keep running and print the cameras being plugged and unplugged")
+    args = parser.parse_args()
+
+    usb_video_devices = list_video_devices(query_formats=args.details)
 
     if usb_video_devices:
-        print(f"USB cameras found on: {', '.join(usb_video_devices)}")
+        print(f"USB cameras found on: {', '.join(record.device for record in usb_video_devices)}")
+        if args.details:
+            for record in usb_video_devices:
+                print(format_video_device(record))
     else:
         print("No available USB cameras found.")
 
+    if args.watch:
+        monitor = UsbCameraMonitor(
+            on_added=lambda record: print(f"Added: {format_video_device(record) if args.details else record.device}"),
+            on_removed=lambda record: print(f"Removed: {record.device}"),
+            query_formats=args.details,
+        ).start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            monitor.stop()
+
 if __name__ == "__main__":
     main()
@@ -1,21 +1,20 @@
-import multiprocessing
-import setproctitle
 import signal
 import os
 import gi
 import threading
 import sys
-import cv2
-import numpy as np
-import time
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib, GObject
-from hailo_apps_infra.gstreamer_helper_pipelines import get_source_type
+from hailo_apps_infra.gstreamer_helper_pipelines import get_source_type, PREDICTED_FRAME_META, GATED_FRAME_META
+from hailo_apps_infra.latency_tracer import LatencyTracer
+from hailo_apps_infra.queue_monitor import QueueMonitor
+from hailo_apps_infra.pipeline_tuning import PipelineTuningProfile, DEFAULT_STAGES
+from hailo_apps_infra.pipeline_builder import PipelineBuilder, get_hef_input_shape, NETWORK_FORMAT
+from hailo_apps_infra.multi_stream import MultiStreamMonitor
+from hailo_apps_infra.startup_profiler import StartupProfiler
 
-try:
-    from picamera2 import Picamera2
-except ImportError:
-    pass # Available only on Pi OS
+# numpy, cv2, multiprocessing, picamera2 and the modules depending on them (shared frame ring, async callbacks,
+# batch tuner) are imported where they are used, so apps which don't use them start faster.
 
 # -----------------------------------------------------------------------------------------------
 # User-defined class to be used in the callback function
@@ -23,30 +22,83 @@ except ImportError:
 # A sample class to be used in the callback function
 # This example allows to:
 # 1. Count the number of frames
-# 2. Setup a multiprocessing queue to pass the frame to the main thread
+# 2. Setup a shared memory frame ring buffer to pass the frame to the display process
 # Additional variables and functions can be added to this class as needed
 class app_callback_class:
     def __init__(self):
         self.frame_count = 0
         self.use_frame = False
-        self.frame_queue = multiprocessing.Queue(maxsize=3)
+        self.frame_ring = None
+        self.event_recorder = None
         self.running = True
 
+    def __getstate__(self):
+        # The event recorder stays in the app process, process callback workers get a copy without it
+        state = self.__dict__.copy()
+        state['event_recorder'] = None
+        return state
+
     def increment(self):
         self.frame_count += 1
 
     def get_count(self):
         return self.frame_count
 
+    def create_frame_ring(self, max_frame_size, num_slots=3):
+        """
+        Creates the shared memory ring used by set_frame / get_frame.
+        Must be called before starting the process that reads the frames.
+
+        Args:
+            max_frame_size (int): The maximum frame size in bytes.
+            num_slots (int, optional): The number of frame slots. Defaults to 3.
+        """
+        if self.frame_ring is None:
+            from hailo_apps_infra.shared_frame_ring import SharedFrameRing
+            self.frame_ring = SharedFrameRing(max_frame_size, num_slots)
+        return self.frame_ring
+
+    def close_frame_ring(self):
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
+
     def set_frame(self, frame):
-        if not self.frame_queue.full():
-            self.frame_queue.put(frame)
+        # The latest frame wins, frames not yet displayed are overwritten.
+        # Raises ValueError if the frame does not fit in a slot of the ring.
+        if isinstance(frame, tuple):
+            # The (Y, UV) or (Y, U, V) planes of --video-format NV12 frames, the display shows RGB
+            from hailo_apps_infra.video_frame import frame_to_rgb
+            frame = frame_to_rgb(frame, 'NV12' if len(frame) == 2 else 'I420')
+        if self.frame_ring is None:
+            self.create_frame_ring(frame.nbytes)
+        self.frame_ring.write(frame)
 
     def get_frame(self):
-        if not self.frame_queue.empty():
-            return self.frame_queue.get()
-        else:
+        # Returns a view into shared memory, valid until the producer writes num_slots - 1 more frames
+        if self.frame_ring is None:
             return None
+        return self.frame_ring.read()
+
+    def trigger_event(self, event='event'):
+        """
+        Saves a clip with the seconds before and after this frame, with --record-events. Events during a clip
+        extend it. Returns False if there is no recorder (or no frame encoded yet).
+        """
+        if self.event_recorder is None:
+            return False
+        return self.event_recorder.trigger(event)
+
+    def is_inferred_frame(self, buffer):
+        """
+        Returns False for the frames which skipped the inference: with --inference-interval their detections
+        are the tracker predictions, with --motion-gate the detections of the last inferred frame.
+        True for the inferred frames.
+        """
+        import hailo
+        roi = hailo.get_roi_from_buffer(buffer)
+        skipped = (PREDICTED_FRAME_META, GATED_FRAME_META)
+        return not any(meta.get_user_string() in skipped for meta in roi.get_objects_typed(hailo.HAILO_USER_META))
 
 def dummy_callback(pad, info, user_data):
     """
@@ -68,11 +120,16 @@ def dummy_callback(pad, info, user_data):
 class GStreamerApp:
     def __init__(self, args, user_data: app_callback_class):
         # Set the process title
+        import setproctitle
         setproctitle.setproctitle("Hailo Python App")
 
         # Create options menu
         self.options_menu = args
 
+        # With --profile-startup, the time to the first frame is broken down per stage
+        self.startup_profiler = StartupProfiler() if self.options_menu.profile_startup else None
+        self.mark_startup("imports and arguments")
+
         # Set up signal handler for SIGINT (Ctrl-C)
         signal.signal(signal.SIGINT, self.shutdown)
 
@@ -83,13 +140,17 @@ class GStreamerApp:
             exit(1)
         self.current_path = os.path.dirname(os.path.abspath(__file__))
         self.postprocess_dir = tappas_post_process_dir
-        self.video_source = self.options_menu.input
+        # With --inputs the sources are funneled into a single inference pipeline (see MULTI_SOURCE_PIPELINE)
+        self.video_sources = self.options_menu.inputs if self.options_menu.inputs else [self.options_menu.input]
+        self.video_source = self.video_sources[0]
         self.source_type = get_source_type(self.video_source)
         self.user_data = user_data
         self.video_sink = "autovideosink"
         self.pipeline = None
         self.loop = None
         self.threads = []
+        # Stops the rpi camera thread at cleanup, it only captures while the appsrc asks for frames
+        self.picamera_stop_event = threading.Event()
         self.error_occurred = False
         self.pipeline_latency = 300  # milliseconds
 
@@ -97,15 +158,68 @@ class GStreamerApp:
         self.batch_size = 1
         self.video_width = 1280
         self.video_height = 720
-        self.video_format = "RGB"
+        # With --video-format NV12 the frames stay in YUV, only the network input is converted to RGB
+        self.video_format = self.options_menu.video_format
+        # Read the USB webcams uncompressed (passed to SOURCE_PIPELINE), no JPEG decoder is then selected
+        self.no_webcam_compression = False
         self.hef_path = None
+        # hailonet scheduler parameters, used when several apps share the device
+        self.multi_process_service = True if self.options_menu.multi_process_service else None
+        self.scheduler_priority = self.options_menu.scheduler_priority
+        self.scheduler_timeout_ms = self.options_menu.scheduler_timeout_ms
+
         self.app_callback = None
+        self.callback_pool = None
+        self.latency_tracer = None
+        self.queue_monitor = None
+        self.stream_monitor = None
+
+        # Thread and queue settings passed to the pipeline helpers, None keeps the helper defaults
+        self.tuning_profile = None
+        if self.options_menu.tune_pipeline or self.options_menu.tuning_profile:
+            self.tuning_profile = self.load_tuning_profile()
+        # Only every Nth frame goes through hailonet, the tracker predicts the detections of the others
+        self.inference_interval = self.options_menu.inference_interval
+        # Only the frames with motion go through hailonet, configured before the pipeline loads the gate library
+        self.motion_gate = None
+        if self.options_menu.motion_gate:
+            from hailo_apps_infra.motion_gate import MotionGate
+            self.motion_gate = MotionGate(self.options_menu.motion_threshold, self.options_menu.motion_keepalive)
+        # With --record-events the callback saves clips around events (user_data.trigger_event), from an in memory
+        # pre-roll of encoded frames
+        self.event_recorder = None
+        if self.options_menu.record_events:
+            if len(self.video_sources) > 1:
+                print("--record-events is not supported with --inputs, recording disabled")
+            else:
+                from hailo_apps_infra.event_recorder import EventRecorder
+                self.event_recorder = EventRecorder(self.options_menu.record_events, self.options_menu.pre_roll,
+                                                    self.options_menu.post_roll, self.options_menu.record_memory_mb * 1024 * 1024)
+                user_data.event_recorder = self.event_recorder
+        # With --export-metadata the detections of every frame are written to chunk files by a writer thread
+        self.metadata_exporter = None
+        if self.options_menu.export_metadata:
+            from hailo_apps_infra.metadata_export import MetadataExporter
+            self.metadata_exporter = MetadataExporter(
+                self.options_menu.export_metadata,
+                chunk_frames=self.options_menu.export_chunk_frames,
+                rotate_bytes=self.options_menu.export_rotate_mb * 1024 * 1024,
+                rotate_seconds=self.options_menu.export_rotate_seconds,
+                with_masks=self.options_menu.export_masks)
+        # With --optimize-pipeline the builder leaves out the scale / convert stages which do nothing
+        self.optimize_pipeline = self.options_menu.optimize_pipeline
+        self.pipeline_builder = None
+        # Decoder / converter of the sources, selected after Gst.init (see element_registry.py), None keeps
+        # decodebin and videoscale + videoconvert
+        self.source_chain = None
 
         # Set user data parameters
         user_data.use_frame = self.options_menu.use_frame
 
-        self.sync = "false" if (self.options_menu.disable_sync or self.source_type != "file") else "true"
+        live_source = any(get_source_type(video_source) != "file" for video_source in self.video_sources)
+        self.sync = "false" if (self.options_menu.disable_sync or live_source) else "true"
         self.show_fps = self.options_menu.show_fps
+        self.headless = self.options_menu.headless
 
         if self.options_menu.dump_dot:
             os.environ["GST_DEBUG_DUMP_DOT_DIR"] = os.getcwd()
@@ -114,9 +228,30 @@ class GStreamerApp:
         print(f"FPS: {fps:.2f}, Droprate: {droprate:.2f}, Avg FPS: {avgfps:.2f}")
         return True
 
+    def on_stream_fps_measurement(self, sink, fps, droprate, avgfps):
+        print(f"{sink.get_name()} FPS: {fps:.2f}, Droprate: {droprate:.2f}, Avg FPS: {avgfps:.2f}")
+        return True
+
+    def is_multi_stream(self):
+        return len(self.video_sources) > 1
+
+    def mark_startup(self, stage):
+        if self.startup_profiler is not None:
+            self.startup_profiler.mark(stage)
+
     def create_pipeline(self):
+        self.mark_startup("app init (device detection)")
         # Initialize GStreamer
         Gst.init(None)
+        self.mark_startup("Gst.init")
+
+        if self.options_menu.source_chain != 'legacy':
+            self.select_source_chain()
+            self.mark_startup("source chain selection")
+
+        if self.options_menu.auto_batch:
+            self.tune_batch_size()
+            self.mark_startup("batch calibration")
 
         pipeline_string = self.get_pipeline_string()
         try:
@@ -124,15 +259,107 @@ class GStreamerApp:
         except Exception as e:
             print(f"Error creating pipeline: {e}", file=sys.stderr)
             sys.exit(1)
+        self.mark_startup("parse_launch")
+        if self.optimize_pipeline and self.pipeline_builder is not None:
+            self.pipeline_builder.print_report(self.pipeline)
+            self.pipeline_builder.check_caps(self.pipeline)
 
         # Connect to hailo_display fps-measurements
         if self.show_fps:
             print("Showing FPS")
-            self.pipeline.get_by_name("hailo_display").connect("fps-measurements", self.on_fps_measurement)
+            if self.is_multi_stream():
+                # Multi stream pipelines have a display per stream named hailo_display_<index>
+                for index in range(len(self.video_sources)):
+                    self.pipeline.get_by_name(f"hailo_display_{index}").connect("fps-measurements", self.on_stream_fps_measurement)
+            else:
+                self.pipeline.get_by_name("hailo_display").connect("fps-measurements", self.on_fps_measurement)
 
         # Create a GLib Main Loop
         self.loop = GLib.MainLoop()
 
+    def create_pipeline_builder(self):
+        """
+        Returns a new PipelineBuilder for get_pipeline_string(), with the HEF input shape when optimizing.
+        """
+        network_shape = get_hef_input_shape(self.hef_path) if self.optimize_pipeline else None
+        if self.tuning_profile is not None:
+            stages = self.get_tuning_stages(network_shape)
+            if set(stages) != set(self.tuning_profile.stages):
+                self.tuning_profile.set_stages(stages)
+                print(f"Pipeline tuning: threads per stage {self.tuning_profile.threads}")
+        self.pipeline_builder = PipelineBuilder(self.optimize_pipeline, network_shape, self.tuning_profile, self.source_chain)
+        return self.pipeline_builder
+
+    def get_tuning_stages(self, network_shape):
+        """
+        Returns the conversion stages the pipeline will have, only they share the cores of the tuning profile.
+
+        Args:
+            network_shape (tuple): The HEF input (width, height) with --optimize-pipeline, None otherwise.
+        """
+        stages = set(DEFAULT_STAGES)
+        if self.headless:
+            stages.discard('display_convert')
+        if self.optimize_pipeline and network_shape is not None:
+            # The hailocropper already resizes the frames to the network input (see PipelineBuilder.add_inference)
+            stages.discard('inference_scale')
+            if self.video_format == NETWORK_FORMAT:
+                stages.discard('inference_convert')
+        return stages
+
+    def select_source_chain(self):
+        """
+        Selects the working decoder / converter of the sources using the least CPU (--source-chain auto), or the
+        forced chain.
+        """
+        from hailo_apps_infra.element_registry import get_source_chain, apply_decoder_ranks, format_source_chain
+        try:
+            self.source_chain = get_source_chain(self.options_menu.source_chain, self.video_sources, self.video_format,
+                                                 self.no_webcam_compression)
+        except ValueError as e:
+            print(f"Invalid --source-chain: {e}", file=sys.stderr)
+            sys.exit(1)
+        apply_decoder_ranks(self.source_chain)
+        print(f"Source chain: {format_source_chain(self.source_chain)}")
+
+    def load_tuning_profile(self):
+        num_streams = len(self.video_sources)
+        path = self.options_menu.tuning_profile
+        if path and os.path.exists(path):
+            profile = PipelineTuningProfile.load(path, num_streams=num_streams)
+        else:
+            profile = PipelineTuningProfile(num_streams=num_streams)
+        print(f"Pipeline tuning: {profile.cores} cores, threads per stage {profile.threads}")
+        return profile
+
+    def save_tuning_profile(self):
+        """
+        Sizes the queues of the tuning profile from the latency measured in this run and saves it.
+        """
+        sizes = self.tuning_profile.size_queues(self.latency_tracer)
+        if not sizes:
+            print("No latency measurements, the tuning profile was not updated.")
+            return
+        self.tuning_profile.save(self.options_menu.tuning_profile)
+        print(f"Saved the tuning profile to {self.options_menu.tuning_profile}")
+
+    def tune_batch_size(self):
+        """
+        Sets self.batch_size and self.scheduler_timeout_ms from the calibration cache or a calibration run.
+        """
+        if self.source_type in ('rpi', 'ximage'):
+            print(f"Batch size calibration is not supported with a {self.source_type} source, using batch size {self.batch_size}.")
+            return
+        from hailo_apps_infra.batch_tuner import BatchTuner
+        tuner = BatchTuner(
+            self,
+            batch_sizes=self.options_menu.auto_batch_sizes,
+            scheduler_timeouts=self.options_menu.auto_batch_timeouts or (self.scheduler_timeout_ms,),
+            objective=self.options_menu.auto_batch_objective,
+            latency_budget_ms=self.options_menu.latency_budget_ms,
+        )
+        tuner.tune(recalibrate=self.options_menu.recalibrate)
+
     def bus_call(self, bus, message, loop):
         t = message.type
         if t == Gst.MessageType.EOS:
@@ -180,6 +407,15 @@ class GStreamerApp:
         # This is a placeholder function that should be overridden by the child class
         return ""
 
+    def report_latency(self):
+        self.latency_tracer.print_summary()
+        if self.options_menu.trace_latency_export:
+            self.latency_tracer.export_json(self.options_menu.trace_latency_export)
+        return True
+
+    def report_queues(self, signum=None, frame=None):
+        self.queue_monitor.print_report()
+
     def dump_dot_file(self):
         print("Dumping dot file...")
         Gst.debug_bin_to_dot_file(self.pipeline, Gst.DebugGraphDetails.ALL, "pipeline")
@@ -199,22 +435,79 @@ class GStreamerApp:
                 print("Warning: identity_callback element not found, add <identity name=identity_callback> in your pipeline where you want the callback to be called.")
             else:
                 identity_pad = identity.get_static_pad("src")
-                identity_pad.add_probe(Gst.PadProbeType.BUFFER, self.app_callback, self.user_data)
-
-        hailo_display = self.pipeline.get_by_name("hailo_display")
+                if self.options_menu.async_callback:
+                    # The probe only snapshots the buffer, the user callback runs in the worker pool
+                    from hailo_apps_infra.async_callback import AsyncCallbackPool
+                    self.callback_pool = AsyncCallbackPool(
+                        self.app_callback,
+                        self.user_data,
+                        num_workers=self.options_menu.callback_workers,
+                        max_queue_size=self.options_menu.callback_queue_size,
+                        overflow_policy=self.options_menu.callback_overflow,
+                        executor=self.options_menu.callback_executor,
+                        with_frame=self.options_menu.use_frame,
+                    )
+                    self.callback_pool.start()
+                    identity_pad.add_probe(Gst.PadProbeType.BUFFER, self.callback_pool.probe, self.user_data)
+                else:
+                    identity_pad.add_probe(Gst.PadProbeType.BUFFER, self.app_callback, self.user_data)
+
+        hailo_display = self.pipeline.get_by_name("hailo_display_0" if self.is_multi_stream() else "hailo_display")
         if hailo_display is None:
             print("Warning: hailo_display element not found, add <fpsdisplaysink name=hailo_display> to your pipeline to support fps display.")
 
         # Disable QoS to prevent frame drops
         disable_qos(self.pipeline)
 
+        # Trace per stage latency using probes on the pipeline queues
+        if self.options_menu.trace_latency:
+            self.latency_tracer = LatencyTracer(self.pipeline).attach()
+            if self.options_menu.trace_latency_interval > 0:
+                GLib.timeout_add_seconds(self.options_menu.trace_latency_interval, self.report_latency)
+
+        # Count input, output and dropped frames of every stream
+        if self.is_multi_stream():
+            self.stream_monitor = MultiStreamMonitor(self.pipeline, len(self.video_sources)).attach()
+            if self.options_menu.stream_stats_interval > 0:
+                GLib.timeout_add_seconds(self.options_menu.stream_stats_interval, self.stream_monitor.print_stats)
+
+        # Fraction of frames gated and hailonet time saved per stream
+        if self.motion_gate is not None:
+            self.motion_gate.attach(self.pipeline)
+            if self.options_menu.stream_stats_interval > 0:
+                GLib.timeout_add_seconds(self.options_menu.stream_stats_interval, self.motion_gate.print_stats)
+
+        # Pre-roll memory, events and clips
+        if self.event_recorder is not None:
+            self.event_recorder.attach(self.pipeline)
+            if self.options_menu.stream_stats_interval > 0:
+                GLib.timeout_add_seconds(self.options_menu.stream_stats_interval, self.event_recorder.print_stats)
+
+        # Frames exported, writer throughput and frames dropped
+        if self.metadata_exporter is not None:
+            self.metadata_exporter.attach(self.pipeline)
+            if self.options_menu.stream_stats_interval > 0:
+                GLib.timeout_add_seconds(self.options_menu.stream_stats_interval, self.metadata_exporter.print_stats)
+
+        # Sample the queue levels to find the bottleneck, send SIGUSR1 to print the report while running
+        if self.options_menu.monitor_queues:
+            self.queue_monitor = QueueMonitor(self.pipeline, interval_ms=self.options_menu.monitor_queues_interval).start()
+            signal.signal(signal.SIGUSR1, self.report_queues)
+
         # Start a subprocess to run the display_user_data_frame function
         if self.options_menu.use_frame:
+            # The ring must exist before the display process starts, frames are passed through shared memory
+            self.user_data.create_frame_ring(self.video_width * self.video_height * 4)
+            import multiprocessing
             display_process = multiprocessing.Process(target=display_user_data_frame, args=(self.user_data,))
             display_process.start()
 
         if self.source_type == "rpi":
-            picam_thread = threading.Thread(target=picamera_thread, args=(self.pipeline, self.video_width, self.video_height, self.video_format))
+            picam_thread = threading.Thread(
+                target=picamera_thread,
+                args=(self.pipeline, self.video_width, self.video_height, self.video_format),
+                kwargs={'target_fps': self.options_menu.target_fps, 'stop_event': self.picamera_stop_event},
+            )
             self.threads.append(picam_thread)
             picam_thread.start()
 
@@ -225,6 +518,14 @@ class GStreamerApp:
         new_latency = self.pipeline_latency * Gst.MSECOND  # Convert milliseconds to nanoseconds
         self.pipeline.set_latency(new_latency)
 
+        # Time the state changes and the first buffer at the callback (or at the display without one)
+        if self.startup_profiler is not None:
+            identity = self.pipeline.get_by_name("identity_callback")
+            if identity is not None:
+                self.startup_profiler.attach(self.pipeline, identity.get_static_pad("src"))
+            elif hailo_display is not None:
+                self.startup_profiler.attach(self.pipeline, hailo_display.get_static_pad("sink"))
+
         # Set pipeline to PLAYING state
         self.pipeline.set_state(Gst.State.PLAYING)
 
@@ -238,10 +539,32 @@ class GStreamerApp:
         # Clean up
         try:
             self.user_data.running = False
+            self.picamera_stop_event.set()
             self.pipeline.set_state(Gst.State.NULL)
+            if self.callback_pool is not None:
+                self.callback_pool.stop()
+                self.callback_pool.print_stats()
+            if self.latency_tracer is not None:
+                self.report_latency()
+                if self.options_menu.tuning_profile:
+                    self.save_tuning_profile()
+            if self.stream_monitor is not None:
+                self.stream_monitor.print_stats()
+            if self.motion_gate is not None:
+                self.motion_gate.print_stats()
+            if self.event_recorder is not None:
+                self.event_recorder.close()
+                self.event_recorder.print_stats()
+            if self.metadata_exporter is not None:
+                self.metadata_exporter.close()
+                self.metadata_exporter.print_stats()
+            if self.queue_monitor is not None:
+                self.queue_monitor.stop()
+                self.report_queues()
             if self.options_menu.use_frame:
                 display_process.terminate()
                 display_process.join()
+                self.user_data.close_frame_ring()
             for t in self.threads:
                 t.join()
         except Exception as e:
@@ -254,60 +577,34 @@ class GStreamerApp:
                 print("Exiting...")
                 sys.exit(0)
 
-def picamera_thread(pipeline, video_width, video_height, video_format, picamera_config=None):
+def picamera_thread(pipeline, video_width, video_height, video_format, picamera_config=None, target_fps=None, stop_event=None):
+    from picamera2 import Picamera2  # Available only on Pi OS
+    from hailo_apps_infra.picamera_source import PicameraSource, get_picamera_format
     appsrc = pipeline.get_by_name("app_source")
-    appsrc.set_property("is-live", True)
-    appsrc.set_property("format", Gst.Format.TIME)
     print("appsrc properties: ", appsrc)
     # Initialize Picamera2
     with Picamera2() as picam2:
+        # With a target frame rate the sensor runs slower too, instead of delivering frames which are skipped
+        frame_rate = min(30, target_fps) if target_fps else 30
         if picamera_config is None:
-            # Default configuration
+            # Default configuration, the lores stream is delivered in the pipeline format (no color conversion)
             main = {'size': (1280, 720), 'format': 'RGB888'}
-            lores = {'size': (video_width, video_height), 'format': 'RGB888'}
-            controls = {'FrameRate': 30}
-            config = picam2.create_preview_configuration(main=main, lores=lores, controls=controls)
+            lores = {'size': (video_width, video_height), 'format': get_picamera_format(video_format)}
+            config = picam2.create_preview_configuration(main=main, lores=lores, controls={'FrameRate': frame_rate})
         else:
             config = picamera_config
         # Configure the camera with the created configuration
         picam2.configure(config)
-        # Update GStreamer caps based on 'lores' stream
-        lores_stream = config['lores']
-        format_str = 'RGB' if lores_stream['format'] == 'RGB888' else video_format
-        width, height = lores_stream['size']
-        print(f"Picamera2 configuration: width={width}, height={height}, format={format_str}")
-        appsrc.set_property(
-            "caps",
-            Gst.Caps.from_string(
-                f"video/x-raw, format={format_str}, width={width}, height={height}, "
-                f"framerate=30/1, pixel-aspect-ratio=1/1"
-            )
-        )
+        # Sets the appsrc caps based on the 'lores' stream, the framerate from the target frame rate
+        source = PicameraSource(appsrc, picam2, config, frame_rate=frame_rate, target_fps=target_fps, stop_event=stop_event)
+        print(f"Picamera2 configuration: width={source.width}, height={source.height}, format={source.format}")
         picam2.start()
-        frame_count = 0
-        start_time = time.time()
         print("picamera_process started")
-        while True:
-            frame_data = picam2.capture_array('lores')
-            # frame_data = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
-            if frame_data is None:
-                print("Failed to capture frame.")
-                break
-            # Convert framontigue data if necessary
-            frame = cv2.cvtColor(frame_data, cv2.COLOR_BGR2RGB)
-            frame = np.asarray(frame)
-            # Create Gst.Buffer by wrapping the frame data
-            buffer = Gst.Buffer.new_wrapped(frame.tobytes())
-            # Set buffer PTS and duration
-            buffer_duration = Gst.util_uint64_scale_int(1, Gst.SECOND, 30)
-            buffer.pts = frame_count * buffer_duration
-            buffer.duration = buffer_duration
-            # Push the buffer to appsrc
-            ret = appsrc.emit('push-buffer', buffer)
-            if ret != Gst.FlowReturn.OK:
-                print("Failed to push buffer:", ret)
-                break
-            frame_count += 1
+        try:
+            source.run()
+        finally:
+            source.close()
+            source.print_stats()
 
 def disable_qos(pipeline):
     """
@@ -337,6 +634,7 @@ def disable_qos(pipeline):
 
 # This function is used to display the user data frame
 def display_user_data_frame(user_data: app_callback_class):
+    import cv2
     while user_data.running:
         frame = user_data.get_frame()
         if frame is not None:
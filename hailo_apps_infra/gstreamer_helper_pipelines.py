@@ -1,8 +1,25 @@
 import os
 
+# Cropping algorithms of INFERENCE_PIPELINE_WRAPPER with inference_interval > 1 (cpp/frame_skip_crops.cpp)
+FRAME_SKIP_CROPS_SO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../resources/libframe_skip_crops.so')
+MAX_INFERENCE_INTERVAL = 10
+# HailoUserMeta string marking the frames which skipped the inference
+PREDICTED_FRAME_META = 'predicted_frame'
+# Cropping algorithm of INFERENCE_PIPELINE_WRAPPER with motion_gate=True (cpp/motion_gate.cpp)
+MOTION_GATE_SO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../resources/libmotion_gate.so')
+# HailoUserMeta string marking the frames gated for lack of motion
+GATED_FRAME_META = 'gated_frame'
+# Pipeline format -> format the rpi camera delivers for it, when it can't deliver the pipeline format itself.
+# Picamera2 has no NV12 stream on every Pi, I420 (YUV420) keeps the frames in YUV and the source converts them.
+RPI_CAMERA_FORMATS = {'NV12': 'I420'}
+
+def get_rpi_camera_format(video_format):
+    # The format of the appsrc frames of the rpi source for a pipeline format, see picamera_source.py
+    return RPI_CAMERA_FORMATS.get(video_format, video_format)
+
 def get_source_type(input_source):
     # This function will return the source type based on the input source
-    # return values can be "file", "mipi" or "usb"
+    # return values can be "file", "usb", "rpi", "libcamera", "ximage" or "videotestsrc"
     if input_source.startswith("/dev/video"):
         return 'usb'
     elif input_source.startswith("rpi"):
@@ -11,10 +28,12 @@ def get_source_type(input_source):
         return 'libcamera'
     elif input_source.startswith('0x'):
         return 'ximage'
+    elif input_source.startswith('videotestsrc'): # Synthetic test pattern, no camera or file needed
+        return 'videotestsrc'
     else:
         return 'file'
 
-def QUEUE(name, max_size_buffers=3, max_size_bytes=0, max_size_time=0, leaky='no'):
+def QUEUE(name, max_size_buffers=3, max_size_bytes=0, max_size_time=0, leaky='no', profile=None):
     """
     Creates a GStreamer queue element string with the specified parameters.
 
@@ -24,13 +43,20 @@ def QUEUE(name, max_size_buffers=3, max_size_bytes=0, max_size_time=0, leaky='no
         max_size_bytes (int, optional): The maximum size in bytes that the queue can hold. Defaults to 0 (unlimited).
         max_size_time (int, optional): The maximum size in time that the queue can hold. Defaults to 0 (unlimited).
         leaky (str, optional): The leaky type of the queue. Can be 'no', 'upstream', or 'downstream'. Defaults to 'no'.
+        profile (PipelineTuningProfile, optional): Overrides max_size_buffers with the measured queue size, if any. Defaults to None.
 
     Returns:
         str: A string representing the GStreamer queue element with the specified parameters.
     """
+    if profile is not None:
+        max_size_buffers = profile.get_queue_size(name, max_size_buffers)
     q_string = f'queue name={name} leaky={leaky} max-size-buffers={max_size_buffers} max-size-bytes={max_size_bytes} max-size-time={max_size_time} '
     return q_string
 
+def _n_threads(profile, stage, default):
+    # n-threads of a videoscale / videoconvert stage, see PipelineTuningProfile
+    return default if profile is None else profile.get_n_threads(stage, default)
+
 def get_camera_resulotion(video_width=640, video_height=640):
     # This function will return a standard camera resolution based on the video resolution required
     # Standard resolutions are 640x480, 1280x720, 1920x1080, 3840x2160
@@ -45,7 +71,7 @@ def get_camera_resulotion(video_width=640, video_height=640):
         return 3840, 2160
 
 
-def SOURCE_PIPELINE(video_source, video_width=640, video_height=640, video_format='RGB', name='source', no_webcam_compression=False):
+def SOURCE_PIPELINE(video_source, video_width=640, video_height=640, video_format='RGB', name='source', no_webcam_compression=False, profile=None, scale=True, convert=True, chain=None):
     """
     Creates a GStreamer pipeline string for the video source.
 
@@ -53,8 +79,14 @@ def SOURCE_PIPELINE(video_source, video_width=640, video_height=640, video_forma
         video_source (str): The path or device name of the video source.
         video_width (int, optional): The width of the video. Defaults to 640.
         video_height (int, optional): The height of the video. Defaults to 640.
-        video_format (str, optional): The video format. Defaults to 'RGB'.
+        video_format (str, optional): The video format, 'RGB' or 'NV12'. With NV12 the frames stay in YUV up to the
+            INFERENCE_PIPELINE videoconvert, which converts the network input only. Defaults to 'RGB'.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'source'.
+        profile (PipelineTuningProfile, optional): Thread and queue settings, None keeps the defaults. Defaults to None.
+        scale (bool, optional): Include the videoscale, set to False when the source already has the output size. Defaults to True.
+        convert (bool, optional): Include the videoconvert, set to False when the source already has the output format. Defaults to True.
+        chain (SourceChain, optional): The MJPEG decoder and the converter to use instead of decodebin and
+            videoscale + videoconvert, see element_registry.py. Defaults to None (decodebin, videoscale + videoconvert).
 
     Returns:
         str: A string representing the GStreamer pipeline for the video source.
@@ -67,22 +99,26 @@ def SOURCE_PIPELINE(video_source, video_width=640, video_height=640, video_forma
             source_element = (
                 f'v4l2src device={video_source} name={name} ! '
                 f'video/x-raw, format=RGB, width=640, height=480 ! '
-                'videoflip name=videoflip video-direction=horiz ! '
+                f'videoflip name={name}_videoflip video-direction=horiz ! '
             )
         else:
             # Use compressed format for webcam
             width, height = get_camera_resulotion(video_width, video_height)
+            if chain is not None and chain.jpeg_decoder:
+                decoder = f'jpegparse name={name}_jpegparse ! {chain.jpeg_decoder} name={name}_decoder'
+            else:
+                decoder = f'decodebin name={name}_decodebin'
             source_element = (
                 f'v4l2src device={video_source} name={name} ! image/jpeg, framerate=30/1, width={width}, height={height} ! '
-                f'{QUEUE(name=f"{name}_queue_decode")} ! '
-                f'decodebin name={name}_decodebin ! '
-                f'videoflip name=videoflip video-direction=horiz ! '
+                f'{QUEUE(name=f"{name}_queue_decode", profile=profile)} ! '
+                f'{decoder} ! '
+                f'videoflip name={name}_videoflip video-direction=horiz ! '
             )
     elif source_type == 'rpi':
         source_element = (
             f'appsrc name=app_source is-live=true leaky-type=downstream max-buffers=3 ! '
-            'videoflip name=videoflip video-direction=horiz ! '
-            f'video/x-raw, format={video_format}, width={video_width}, height={video_height} ! '
+            f'videoflip name={name}_videoflip video-direction=horiz ! '
+            f'video/x-raw, format={get_rpi_camera_format(video_format)}, width={video_width}, height={video_height} ! '
         )
     elif source_type == 'libcamera':
         source_element = (
@@ -92,26 +128,95 @@ def SOURCE_PIPELINE(video_source, video_width=640, video_height=640, video_forma
     elif source_type == 'ximage':
         source_element = (
             f'ximagesrc xid={video_source} ! '
-            f'{QUEUE(name=f"{name}queue_scale_")} ! '
+            f'{QUEUE(name=f"{name}queue_scale_", profile=profile)} ! '
             f'videoscale ! '
         )
+    elif source_type == 'videotestsrc':
+        source_element = (
+            f'videotestsrc name={name} pattern=ball is-live=true ! '
+            f'video/x-raw, format={video_format}, width={video_width}, height={video_height}, framerate=30/1 ! '
+        )
     else:
         source_element = (
             f'filesrc location="{video_source}" name={name} ! '
-            f'{QUEUE(name=f"{name}_queue_decode")} ! '
+            f'{QUEUE(name=f"{name}_queue_decode", profile=profile)} ! '
             f'decodebin name={name}_decodebin ! '
         )
-    source_pipeline = (
-        f'{source_element} '
-        f'{QUEUE(name=f"{name}_scale_q")} ! '
-        f'videoscale name={name}_videoscale n-threads=2 ! '
-        f'{QUEUE(name=f"{name}_convert_q")} ! '
-        f'videoconvert n-threads=3 name={name}_convert qos=false ! '
-        f'video/x-raw, pixel-aspect-ratio=1/1, format={video_format}, width={video_width}, height={video_height} '
-    )
+    source_pipeline = f'{source_element} '
+    if chain is not None and chain.converter and (scale or convert):
+        # A single element scales and converts
+        threads = f'n-threads={_n_threads(profile, "source_convert", 3)} ' if chain.converter == 'videoconvertscale' else ''
+        source_pipeline += (
+            f'{QUEUE(name=f"{name}_convert_q", profile=profile)} ! '
+            f'{chain.converter} {threads}name={name}_convert qos=false ! '
+        )
+        scale = convert = False
+    if scale:
+        source_pipeline += (
+            f'{QUEUE(name=f"{name}_scale_q", profile=profile)} ! '
+            f'videoscale name={name}_videoscale n-threads={_n_threads(profile, "source_scale", 2)} ! '
+        )
+    if convert:
+        source_pipeline += (
+            f'{QUEUE(name=f"{name}_convert_q", profile=profile)} ! '
+            f'videoconvert n-threads={_n_threads(profile, "source_convert", 3)} name={name}_convert qos=false ! '
+        )
+    source_pipeline += f'video/x-raw, pixel-aspect-ratio=1/1, format={video_format}, width={video_width}, height={video_height} '
 
     return source_pipeline
 
+def MULTI_SOURCE_PIPELINE(video_sources, video_width=640, video_height=640, video_format='RGB', name='source', roundrobin_mode=0, profile=None, chain=None):
+    """
+    Creates a GStreamer pipeline string for several video sources funneled into a single stream with hailoroundrobin.
+    The frames of all sources share the inference pipeline which follows, so a batch can hold frames of different sources.
+    The stream id of each frame is the roundrobin sink pad name ('sink_0', 'sink_1', ...), use STREAM_ROUTER_PIPELINE
+    to split the streams again.
+
+    Args:
+        video_sources (list): The sources, each one as accepted by SOURCE_PIPELINE.
+        video_width (int, optional): The width of the video. Defaults to 640.
+        video_height (int, optional): The height of the video. Defaults to 640.
+        video_format (str, optional): The video format. Defaults to 'RGB'.
+        name (str, optional): The prefix name for the pipeline elements, source i elements are prefixed with '{name}_{i}'. Defaults to 'source'.
+        roundrobin_mode (int, optional): hailoroundrobin mode, 0 waits for each source in turn, 1 does not block on
+            sources without frames. Defaults to 0.
+        profile (PipelineTuningProfile, optional): Thread and queue settings, None keeps the defaults. Defaults to None.
+        chain (SourceChain, optional): Passed to SOURCE_PIPELINE. Defaults to None.
+
+    Returns:
+        str: A string representing the GStreamer pipeline for the sources, ending with the roundrobin output queue.
+    """
+    multi_source_pipeline = f'hailoroundrobin mode={roundrobin_mode} name={name}_roundrobin '
+    for index, video_source in enumerate(video_sources):
+        # Live sources drop their oldest frame when inference can't keep up, instead of stalling the other streams
+        leaky = 'no' if get_source_type(video_source) == 'file' else 'downstream'
+        multi_source_pipeline += (
+            f'{SOURCE_PIPELINE(video_source, video_width, video_height, video_format, name=f"{name}_{index}", profile=profile, chain=chain)} ! '
+            f'{QUEUE(name=f"{name}_{index}_roundrobin_q", leaky=leaky, profile=profile)} ! '
+            f'{name}_roundrobin.sink_{index} '
+        )
+    multi_source_pipeline += f'{name}_roundrobin. ! {QUEUE(name=f"{name}_roundrobin_q", profile=profile)} '
+    return multi_source_pipeline
+
+def STREAM_ROUTER_PIPELINE(stream_pipelines, name='stream_router'):
+    """
+    Creates a GStreamer pipeline string splitting a multi source stream (see MULTI_SOURCE_PIPELINE) back per stream
+    with hailostreamrouter.
+
+    Args:
+        stream_pipelines (list): One pipeline string per stream, stream i is routed to stream_pipelines[i].
+            Each one should start with a queue (DISPLAY_PIPELINE does) so the streams run in their own threads.
+        name (str, optional): The name of the hailostreamrouter element. Defaults to 'stream_router'.
+
+    Returns:
+        str: A string representing the GStreamer pipeline for the stream router and the per stream pipelines.
+    """
+    input_streams = ' '.join(f'src_{index}::input-streams="<sink_{index}>"' for index in range(len(stream_pipelines)))
+    stream_router_pipeline = f'hailostreamrouter name={name} {input_streams} '
+    for index, stream_pipeline in enumerate(stream_pipelines):
+        stream_router_pipeline += f'{name}.src_{index} ! {stream_pipeline} '
+    return stream_router_pipeline
+
 def INFERENCE_PIPELINE(
     hef_path,
     post_process_so=None,
@@ -124,7 +229,10 @@ def INFERENCE_PIPELINE(
     scheduler_timeout_ms=None,
     scheduler_priority=None,
     vdevice_group_id=1,
-    multi_process_service=None
+    multi_process_service=None,
+    profile=None,
+    scale=True,
+    convert=True
 ):
     """
     Creates a GStreamer pipeline string for inference and post-processing using a user-provided shared object file.
@@ -146,6 +254,10 @@ def INFERENCE_PIPELINE(
         scheduler_timeout_ms (int or None): hailonet scheduler-timeout-ms. Default=None.
         scheduler_priority (int or None): hailonet scheduler-priority. Default=None.
         multi_process_service (bool or None): hailonet multi-process-service. Default=None.
+        profile (PipelineTuningProfile or None): Thread and queue settings, None keeps the defaults. Default=None.
+        scale (bool): Include the videoscale, set to False when the frames already have the network input size,
+            e.g. inside INFERENCE_PIPELINE_WRAPPER whose hailocropper resizes to it. Default=True.
+        convert (bool): Include the videoconvert, set to False when the frames already have the network input format. Default=True.
 
     Returns:
         str: A string representing the GStreamer pipeline for inference.
@@ -170,27 +282,34 @@ def INFERENCE_PIPELINE(
         f'force-writable=true '
     )
 
-    inference_pipeline = (
-        f'{QUEUE(name=f"{name}_scale_q")} ! '
-        f'videoscale name={name}_videoscale n-threads=2 qos=false ! '
-        f'{QUEUE(name=f"{name}_convert_q")} ! '
-        f'video/x-raw, pixel-aspect-ratio=1/1 ! '
-        f'videoconvert name={name}_videoconvert n-threads=2 ! '
-        f'{QUEUE(name=f"{name}_hailonet_q")} ! '
+    inference_pipeline = ''
+    if scale:
+        inference_pipeline += (
+            f'{QUEUE(name=f"{name}_scale_q", profile=profile)} ! '
+            f'videoscale name={name}_videoscale n-threads={_n_threads(profile, "inference_scale", 2)} qos=false ! '
+        )
+    if convert:
+        inference_pipeline += (
+            f'{QUEUE(name=f"{name}_convert_q", profile=profile)} ! '
+            f'video/x-raw, pixel-aspect-ratio=1/1 ! '
+            f'videoconvert name={name}_videoconvert n-threads={_n_threads(profile, "inference_convert", 2)} ! '
+        )
+    inference_pipeline += (
+        f'{QUEUE(name=f"{name}_hailonet_q", profile=profile)} ! '
         f'{hailonet_str} ! '
     )
 
     if post_process_so:
         inference_pipeline += (
-            f'{QUEUE(name=f"{name}_hailofilter_q")} ! '
+            f'{QUEUE(name=f"{name}_hailofilter_q", profile=profile)} ! '
             f'hailofilter name={name}_hailofilter so-path={post_process_so} {config_str} {function_name_str} qos=false ! '
         )
 
-    inference_pipeline += f'{QUEUE(name=f"{name}_output_q")} '
+    inference_pipeline += f'{QUEUE(name=f"{name}_output_q", profile=profile)} '
 
     return inference_pipeline
 
-def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name='inference_wrapper'):
+def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name='inference_wrapper', profile=None, inference_interval=1, motion_gate=False):
     """
     Creates a GStreamer pipeline string that wraps an inner pipeline with a hailocropper and hailoaggregator.
     This allows to keep the original video resolution and color-space (format) of the input frame.
@@ -200,46 +319,70 @@ def INFERENCE_PIPELINE_WRAPPER(inner_pipeline, bypass_max_size_buffers=20, name=
         inner_pipeline (str): The inner pipeline string to be wrapped.
         bypass_max_size_buffers (int, optional): The maximum number of buffers for the bypass queue. Defaults to 20.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'inference_wrapper'.
+        profile (PipelineTuningProfile, optional): Queue settings, None keeps the defaults. Defaults to None.
+        inference_interval (int, optional): Send only every Nth frame of each stream to the inner pipeline, the other
+            frames only take the bypass branch and are marked with PREDICTED_FRAME_META. Use a TRACKER_PIPELINE with
+            the same inference_interval after the wrapper to predict their detections. Defaults to 1 (every frame).
+        motion_gate (bool, optional): Send only the frames with motion (and a periodic keep-alive frame) to the inner
+            pipeline, the static frames take the bypass branch and are marked with GATED_FRAME_META. A hailofilter
+            after the aggregator gives them a copy of the detections of the last inferred frame. Configured with
+            MotionGate (motion_gate.py). Defaults to False.
 
     Returns:
         str: A string representing the GStreamer pipeline for the inference wrapper.
     """
-    # Get the directory for post-processing shared objects
-    tappas_post_process_dir = os.environ.get('TAPPAS_POST_PROC_DIR', '')
-    whole_buffer_crop_so = os.path.join(tappas_post_process_dir, 'cropping_algorithms/libwhole_buffer.so')
+    if motion_gate:
+        if inference_interval != 1:
+            raise ValueError("motion_gate and inference_interval can't be combined")
+        crop_so = MOTION_GATE_SO
+        crop_function = 'create_crops_motion'
+    elif inference_interval == 1:
+        # Get the directory for post-processing shared objects
+        tappas_post_process_dir = os.environ.get('TAPPAS_POST_PROC_DIR', '')
+        crop_so = os.path.join(tappas_post_process_dir, 'cropping_algorithms/libwhole_buffer.so')
+        crop_function = 'create_crops'
+    elif 1 < inference_interval <= MAX_INFERENCE_INTERVAL:
+        crop_so = FRAME_SKIP_CROPS_SO
+        crop_function = f'create_crops_interval_{inference_interval}'
+    else:
+        raise ValueError(f"inference_interval must be between 1 and {MAX_INFERENCE_INTERVAL}, got {inference_interval}")
+
+    # The detections of the inferred frames are complete after the aggregator, the gated frames get them there
+    carry_over = f'hailofilter name={name}_carry_over so-path={MOTION_GATE_SO} function-name=carry_over_detections qos=false ! ' if motion_gate else ''
 
     # Construct the inference wrapper pipeline string
     inference_wrapper_pipeline = (
-        f'{QUEUE(name=f"{name}_input_q")} ! '
-        f'hailocropper name={name}_crop so-path={whole_buffer_crop_so} function-name=create_crops use-letterbox=true resize-method=inter-area internal-offset=true '
+        f'{QUEUE(name=f"{name}_input_q", profile=profile)} ! '
+        f'hailocropper name={name}_crop so-path={crop_so} function-name={crop_function} use-letterbox=true resize-method=inter-area internal-offset=true '
         f'hailoaggregator name={name}_agg '
-        f'{name}_crop. ! {QUEUE(max_size_buffers=bypass_max_size_buffers, name=f"{name}_bypass_q")} ! {name}_agg.sink_0 '
+        f'{name}_crop. ! {QUEUE(max_size_buffers=bypass_max_size_buffers, name=f"{name}_bypass_q", profile=profile)} ! {name}_agg.sink_0 '
         f'{name}_crop. ! {inner_pipeline} ! {name}_agg.sink_1 '
-        f'{name}_agg. ! {QUEUE(name=f"{name}_output_q")} '
+        f'{name}_agg. ! {carry_over}{QUEUE(name=f"{name}_output_q", profile=profile)} '
     )
 
     return inference_wrapper_pipeline
 
-def OVERLAY_PIPELINE(name='hailo_overlay'):
+def OVERLAY_PIPELINE(name='hailo_overlay', profile=None):
     """
     Creates a GStreamer pipeline string for the hailooverlay element.
     This pipeline is used to draw bounding boxes and labels on the video.
 
     Args:
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'hailo_overlay'.
+        profile (PipelineTuningProfile, optional): Queue settings, None keeps the defaults. Defaults to None.
 
     Returns:
         str: A string representing the GStreamer pipeline for the hailooverlay element.
     """
     # Construct the overlay pipeline string
     overlay_pipeline = (
-        f'{QUEUE(name=f"{name}_q")} ! '
+        f'{QUEUE(name=f"{name}_q", profile=profile)} ! '
         f'hailooverlay name={name} '
     )
 
     return overlay_pipeline
 
-def DISPLAY_PIPELINE(video_sink='autovideosink', sync='true', show_fps='false', name='hailo_display'):
+def DISPLAY_PIPELINE(video_sink='autovideosink', sync='true', show_fps='false', name='hailo_display', headless=False, profile=None):
     """
     Creates a GStreamer pipeline string for displaying the video.
     It includes the hailooverlay plugin to draw bounding boxes and labels on the video.
@@ -249,22 +392,32 @@ def DISPLAY_PIPELINE(video_sink='autovideosink', sync='true', show_fps='false',
         sync (str, optional): The sync property for the video sink. Defaults to 'true'.
         show_fps (str, optional): Whether to show the FPS on the video sink. Should be 'true' or 'false'. Defaults to 'false'.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'hailo_display'.
+        headless (bool, optional): Drop the frames in a fakesink without drawing or converting them.
+            The fpsdisplaysink is kept so FPS measurements still work. Defaults to False.
+        profile (PipelineTuningProfile, optional): Thread and queue settings, None keeps the defaults. Defaults to None.
 
     Returns:
         str: A string representing the GStreamer pipeline for displaying the video.
     """
+    if headless:
+        # No overlay, no videoconvert: fakesink accepts any format and the FPS text overlay is disabled
+        return (
+            f'{QUEUE(name=f"{name}_q", profile=profile)} ! '
+            f'fpsdisplaysink name={name} video-sink=fakesink sync={sync} text-overlay=false signal-fps-measurements=true '
+        )
+
     # Construct the display pipeline string
     display_pipeline = (
-        f'{OVERLAY_PIPELINE(name=f"{name}_overlay")} ! '
-        f'{QUEUE(name=f"{name}_videoconvert_q")} ! '
-        f'videoconvert name={name}_videoconvert n-threads=2 qos=false ! '
-        f'{QUEUE(name=f"{name}_q")} ! '
+        f'{OVERLAY_PIPELINE(name=f"{name}_overlay", profile=profile)} ! '
+        f'{QUEUE(name=f"{name}_videoconvert_q", profile=profile)} ! '
+        f'videoconvert name={name}_videoconvert n-threads={_n_threads(profile, "display_convert", 2)} qos=false ! '
+        f'{QUEUE(name=f"{name}_q", profile=profile)} ! '
         f'fpsdisplaysink name={name} video-sink={video_sink} sync={sync} text-overlay={show_fps} signal-fps-measurements=true '
     )
 
     return display_pipeline
 
-def FILE_SINK_PIPELINE(output_file='output.mkv', name='file_sink', bitrate=5000):
+def FILE_SINK_PIPELINE(output_file='output.mkv', name='file_sink', bitrate=5000, profile=None):
     """
     Creates a GStreamer pipeline string for saving the video to a file in .mkv format.
     It it recommended run ffmpeg to fix the file header after recording.
@@ -274,15 +427,16 @@ def FILE_SINK_PIPELINE(output_file='output.mkv', name='file_sink', bitrate=5000)
         output_file (str): The path to the output file.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'file_sink'.
         bitrate (int, optional): The bitrate for the encoder. Defaults to 5000.
+        profile (PipelineTuningProfile, optional): Thread and queue settings, None keeps the defaults. Defaults to None.
 
     Returns:
         str: A string representing the GStreamer pipeline for saving the video to a file.
     """
     # Construct the file sink pipeline string
     file_sink_pipeline = (
-        f'{QUEUE(name=f"{name}_videoconvert_q")} ! '
-        f'videoconvert name={name}_videoconvert n-threads=2 qos=false ! '
-        f'{QUEUE(name=f"{name}_encoder_q")} ! '
+        f'{QUEUE(name=f"{name}_videoconvert_q", profile=profile)} ! '
+        f'videoconvert name={name}_videoconvert n-threads={_n_threads(profile, "file_sink_convert", 2)} qos=false ! '
+        f'{QUEUE(name=f"{name}_encoder_q", profile=profile)} ! '
         f'x264enc tune=zerolatency bitrate={bitrate} ! '
         f'matroskamux ! '
         f'filesink location={output_file} '
@@ -290,25 +444,73 @@ def FILE_SINK_PIPELINE(output_file='output.mkv', name='file_sink', bitrate=5000)
 
     return file_sink_pipeline
 
-def USER_CALLBACK_PIPELINE(name='identity_callback'):
+def EVENT_RECORDING_PIPELINE(name='event_recorder', bitrate=2000, key_int_max=30, profile=None):
+    """
+    Creates a GStreamer pipeline string teeing the frames into an H.264 encoder for EventRecorder (event_recorder.py),
+    which keeps the last seconds of encoded frames in memory and writes a clip when an event is triggered.
+    The frames continue unchanged after the tee, the recording branch drops frames instead of slowing them down.
+
+    Args:
+        name (str, optional): The prefix name for the pipeline elements, the appsink is '{name}_appsink'. Defaults to 'event_recorder'.
+        bitrate (int, optional): The encoder bitrate in kbit/s. Defaults to 2000.
+        key_int_max (int, optional): Frames between keyframes, the pre-roll is kept in whole GOPs. Defaults to 30.
+        profile (PipelineTuningProfile, optional): Thread and queue settings, None keeps the defaults. Defaults to None.
+
+    Returns:
+        str: A string representing the GStreamer pipeline for the recording branch, ending with the output queue of the tee.
+    """
+    event_recording_pipeline = (
+        f'tee name={name}_tee '
+        f'{name}_tee. ! {QUEUE(name=f"{name}_q", leaky="downstream", profile=profile)} ! '
+        f'videoconvert name={name}_videoconvert n-threads={_n_threads(profile, "file_sink_convert", 2)} qos=false ! '
+        f'x264enc name={name}_encoder tune=zerolatency speed-preset=ultrafast bitrate={bitrate} key-int-max={key_int_max} ! '
+        f'h264parse config-interval=-1 ! video/x-h264, stream-format=byte-stream, alignment=au ! '
+        f'appsink name={name}_appsink emit-signals=true sync=false async=false '
+        f'{name}_tee. ! {QUEUE(name=f"{name}_output_q", profile=profile)} '
+    )
+
+    return event_recording_pipeline
+
+def USER_CALLBACK_PIPELINE(name='identity_callback', profile=None):
     """
     Creates a GStreamer pipeline string for the user callback element.
 
     Args:
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'identity_callback'.
+        profile (PipelineTuningProfile, optional): Queue settings, None keeps the defaults. Defaults to None.
 
     Returns:
         str: A string representing the GStreamer pipeline for the user callback element.
     """
     # Construct the user callback pipeline string
     user_callback_pipeline = (
-        f'{QUEUE(name=f"{name}_q")} ! '
+        f'{QUEUE(name=f"{name}_q", profile=profile)} ! '
         f'identity name={name} '
     )
 
     return user_callback_pipeline
 
-def TRACKER_PIPELINE(class_id, kalman_dist_thr=0.8, iou_thr=0.9, init_iou_thr=0.7, keep_new_frames=2, keep_tracked_frames=15, keep_lost_frames=2, keep_past_metadata=False, qos=False, name='hailo_tracker'):
+def METADATA_EXPORT_PIPELINE(name='metadata_export', profile=None):
+    """
+    Creates a GStreamer pipeline string for the metadata export element, placed after USER_CALLBACK_PIPELINE.
+    MetadataExporter (metadata_export.py) probes the identity and writes the detections of every frame to
+    columnar chunk files from its own thread.
+
+    Args:
+        name (str, optional): The prefix name for the pipeline elements, the identity is '{name}'. Defaults to 'metadata_export'.
+        profile (PipelineTuningProfile, optional): Queue settings, None keeps the defaults. Defaults to None.
+
+    Returns:
+        str: A string representing the GStreamer pipeline for the metadata export element.
+    """
+    metadata_export_pipeline = (
+        f'{QUEUE(name=f"{name}_q", profile=profile)} ! '
+        f'identity name={name} '
+    )
+
+    return metadata_export_pipeline
+
+def TRACKER_PIPELINE(class_id, kalman_dist_thr=0.8, iou_thr=0.9, init_iou_thr=0.7, keep_new_frames=2, keep_tracked_frames=15, keep_lost_frames=2, keep_past_metadata=False, qos=False, name='hailo_tracker', profile=None, inference_interval=1):
     """
     Creates a GStreamer pipeline string for the HailoTracker element.
     Args:
@@ -322,19 +524,86 @@ def TRACKER_PIPELINE(class_id, kalman_dist_thr=0.8, iou_thr=0.9, init_iou_thr=0.
         keep_past_metadata (bool, optional): Whether to keep past metadata on tracked objects. Defaults to False.
         qos (bool, optional): Whether to enable QoS. Defaults to False.
         name (str, optional): The prefix name for the pipeline elements. Defaults to 'hailo_tracker'.
+        profile (PipelineTuningProfile, optional): Queue settings, None keeps the defaults. Defaults to None.
+        inference_interval (int, optional): The inference_interval of the INFERENCE_PIPELINE_WRAPPER before the tracker.
+            The skipped frames have no detections, so keep_new_frames and keep_tracked_frames are raised to at least the
+            interval: the instances are kept, and their Kalman predictions are used, until the next inferred frame. Defaults to 1.
     Note:
         For a full list of options and their descriptions, run `gst-inspect-1.0 hailotracker`.
     Returns:
         str: A string representing the GStreamer pipeline for the HailoTracker element.
     """
+    keep_new_frames = max(keep_new_frames, inference_interval)
+    keep_tracked_frames = max(keep_tracked_frames, inference_interval)
     # Construct the tracker pipeline string
     tracker_pipeline = (
         f'hailotracker name={name} class-id={class_id} kalman-dist-thr={kalman_dist_thr} iou-thr={iou_thr} init-iou-thr={init_iou_thr} '
         f'keep-new-frames={keep_new_frames} keep-tracked-frames={keep_tracked_frames} keep-lost-frames={keep_lost_frames} keep-past-metadata={keep_past_metadata} qos={qos} ! '
-        f'{QUEUE(name=f"{name}_q")} '
+        f'{QUEUE(name=f"{name}_q", profile=profile)} '
     )
     return tracker_pipeline
 
+def TILING_PIPELINE(
+    inner_pipeline,
+    tiles_x=2,
+    tiles_y=2,
+    overlap_x=0.1,
+    overlap_y=0.1,
+    scale_level=0,
+    iou_threshold=0.3,
+    border_threshold=0.1,
+    bypass_max_size_buffers=20,
+    name='tiling_wrapper',
+    profile=None
+):
+    """
+    Wraps an inner inference pipeline with hailotilecropper and hailotileaggregator, the tiling versions of
+    hailocropper and hailoaggregator (see CROPPER_PIPELINE).
+    Each frame is split into overlapping tiles which go through the inner pipeline one after the other, so the
+    hailonet batch can hold the tiles of a frame. The aggregator maps the detections back to the frame and merges
+    the boxes found in several tiles with a cross-tile NMS.
+    Use it for high resolution sources where the objects are too small once the whole frame is scaled to the
+    network input. See tiling.py for the throughput / resolution trade off of a tile grid.
+
+    Args:
+        inner_pipeline (str): The inference pipeline string, e.g. INFERENCE_PIPELINE(batch_size=get_tile_count(...)).
+        tiles_x (int, optional): Tiles along the x axis. Defaults to 2.
+        tiles_y (int, optional): Tiles along the y axis. Defaults to 2.
+        overlap_x (float, optional): Overlap between neighbouring tiles along x, as a fraction of the tile. Defaults to 0.1.
+        overlap_y (float, optional): Overlap between neighbouring tiles along y, as a fraction of the tile. Defaults to 0.1.
+        scale_level (int, optional): 0 for single scale tiling (the tiles_x x tiles_y grid only). 1 to 3 adds the
+            1x1, up to 2x2 or up to 3x3 grids to detect large objects too (multi scale). Defaults to 0.
+        iou_threshold (float, optional): IOU above which boxes of different tiles are merged. Defaults to 0.3.
+        border_threshold (float, optional): Boxes closer to a tile border than this (fraction of the tile) are
+            dropped in multi scale mode, the object is found by a larger tile. Defaults to 0.1.
+        bypass_max_size_buffers (int, optional): For the bypass queue. Defaults to 20.
+        name (str, optional): A prefix name for pipeline elements. Defaults to 'tiling_wrapper'.
+        profile (PipelineTuningProfile, optional): Queue settings, None keeps the defaults. Defaults to None.
+
+    Returns:
+        str: A pipeline string representing hailotilecropper + hailotileaggregator around the inner_pipeline.
+    """
+    if scale_level not in (0, 1, 2, 3):
+        raise ValueError(f"scale_level must be 0 (single scale) or 1 to 3, got {scale_level}")
+    tiling_mode = 1 if scale_level else 0
+    scale_level_str = f'scale-level={scale_level} ' if scale_level else ''
+    return (
+        f'{QUEUE(name=f"{name}_input_q", profile=profile)} ! '
+        f'hailotilecropper name={name}_cropper internal-offset=true '
+        f'tiles-along-x-axis={tiles_x} tiles-along-y-axis={tiles_y} '
+        f'overlap-x-axis={overlap_x} overlap-y-axis={overlap_y} '
+        f'tiling-mode={tiling_mode} {scale_level_str}'
+        f'hailotileaggregator name={name}_agg flatten-detections=true '
+        f'iou-threshold={iou_threshold} border-threshold={border_threshold} '
+        # bypass
+        f'{name}_cropper. ! '
+        f'{QUEUE(name=f"{name}_bypass_q", max_size_buffers=bypass_max_size_buffers, profile=profile)} ! {name}_agg.sink_0 '
+        # pipeline for the actual inference
+        f'{name}_cropper. ! {inner_pipeline} ! {name}_agg.sink_1 '
+        # aggregator output
+        f'{name}_agg. ! {QUEUE(name=f"{name}_output_q", profile=profile)} '
+    )
+
 def CROPPER_PIPELINE(
     inner_pipeline,
     so_path,
@@ -344,7 +613,8 @@ def CROPPER_PIPELINE(
     internal_offset=True,
     resize_method='bilinear',
     bypass_max_size_buffers=20,
-    name='cropper_wrapper'
+    name='cropper_wrapper',
+    profile=None
 ):
     """
     Wraps an inner pipeline with hailocropper and hailoaggregator.
@@ -363,12 +633,13 @@ def CROPPER_PIPELINE(
         resize_method (str): The resize method. Defaults to 'inter-area'.
         bypass_max_size_buffers (int): For the bypass queue. Defaults to 20.
         name (str): A prefix name for pipeline elements. Defaults 'cropper_wrapper'.
+        profile (PipelineTuningProfile): Queue settings, None keeps the defaults. Defaults None.
 
     Returns:
         str: A pipeline string representing hailocropper + aggregator around the inner_pipeline.
     """
     return (
-        f'{QUEUE(name=f"{name}_input_q")} ! '
+        f'{QUEUE(name=f"{name}_input_q", profile=profile)} ! '
         f'hailocropper name={name}_cropper '
         f'so-path={so_path} '
         f'function-name={function_name} '
@@ -379,9 +650,9 @@ def CROPPER_PIPELINE(
         f'hailoaggregator name={name}_agg '
         # bypass
         f'{name}_cropper. ! '
-        f'{QUEUE(name=f"{name}_bypass_q", max_size_buffers=bypass_max_size_buffers)} ! {name}_agg.sink_0 '
+        f'{QUEUE(name=f"{name}_bypass_q", max_size_buffers=bypass_max_size_buffers, profile=profile)} ! {name}_agg.sink_0 '
         # pipeline for the actual inference
         f'{name}_cropper. ! {inner_pipeline} ! {name}_agg.sink_1 '
         # aggregator output
-        f'{name}_agg. ! {QUEUE(name=f"{name}_output_q")} '
+        f'{name}_agg. ! {QUEUE(name=f"{name}_output_q", profile=profile)} '
     )
@@ -0,0 +1,124 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+
+# -----------------------------------------------------------------------------------------------
+# Device identity cache
+# -----------------------------------------------------------------------------------------------
+# `hailortcli fw-control identify` opens the device and takes a noticeable part of the app startup.
+# Its result is cached together with a key made of the boot id, the /dev/hailo* device nodes and the
+# hailortcli binary: a reboot, a driver reload (the nodes are recreated), another device or a HailoRT
+# upgrade invalidate the cache.
+
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'hailo_apps_infra', 'device.json')
+# Checked in order, "HAILO8" is a prefix of "HAILO8L"
+ARCHITECTURES = (('HAILO8L', 'hailo8l'), ('HAILO8', 'hailo8'))
+
+
+def parse_identify_output(output):
+    """
+    Parses the output of `hailortcli fw-control identify`.
+
+    Returns:
+        dict: The "Key: Value" fields of the output, plus 'arch' ('hailo8', 'hailo8l' or None).
+    """
+    identity = {}
+    for line in output.split('\n'):
+        key, separator, value = line.partition(':')
+        if separator and key.strip():
+            identity[key.strip()] = value.strip()
+    identity['arch'] = None
+    device_architecture = identity.get('Device Architecture', '')
+    for name, arch in ARCHITECTURES:
+        if name in device_architecture:
+            identity['arch'] = arch
+            break
+    return identity
+
+
+def get_device_cache_key():
+    """Returns the key the cached identity is valid for, see the module comment."""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            boot_id = f.read().strip()
+    except OSError:
+        boot_id = ''
+    nodes = []
+    for path in sorted(glob.glob('/dev/hailo*')):
+        try:
+            stat = os.stat(path)
+            nodes.append(f'{path}:{stat.st_rdev}:{stat.st_ctime_ns}')
+        except OSError:
+            pass
+    hailortcli = shutil.which('hailortcli')
+    try:
+        tool = f'{os.path.realpath(hailortcli)}:{os.stat(hailortcli).st_mtime_ns}' if hailortcli else ''
+    except OSError:
+        tool = ''
+    return '|'.join([boot_id, ','.join(nodes), tool])
+
+
+def identify_device():
+    """
+    Runs `hailortcli fw-control identify`.
+
+    Returns:
+        dict: See parse_identify_output(), None if the command failed.
+    """
+    try:
+        result = subprocess.run(['hailortcli', 'fw-control', 'identify'], capture_output=True, text=True)
+    except Exception as e:
+        print(f"An error occurred while detecting Hailo architecture: {e}")
+        return None
+    if result.returncode != 0:
+        print(f"Error running hailortcli: {result.stderr}")
+        return None
+    return parse_identify_output(result.stdout)
+
+
+def load_device_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def invalidate_device_cache(path=CACHE_PATH):
+    """Removes the cached device identity, the next get_device_identity() runs hailortcli again."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get_device_identity(use_cache=True, path=CACHE_PATH):
+    """
+    Returns the device identity, from the cache when its key still matches.
+
+    Args:
+        use_cache (bool, optional): Read and update the cache. Defaults to True.
+        path (str, optional): The cache file.
+
+    Returns:
+        dict: See parse_identify_output(), None if the device could not be identified.
+    """
+    key = get_device_cache_key() if use_cache else None
+    if use_cache:
+        cache = load_device_cache(path)
+        if cache.get('key') == key and cache.get('identity'):
+            return cache['identity']
+    identity = identify_device()
+    # Failures are not cached, the device may just not be ready yet
+    if use_cache and identity is not None and identity['arch'] is not None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': key, 'identity': identity}, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save the device cache: {e}")
+    return identity
@@ -1,53 +1,37 @@
-import sys
 import gi
 gi.require_version('Gst', '1.0')
-from gi.repository import Gst, GLib, GObject
+from gi.repository import Gst
 import os
 import argparse
-import multiprocessing
-import numpy as np
-import setproctitle
-import cv2
-import time
-import signal
-import threading
-import subprocess
-from hailo_apps_infra.gstreamer_app import (
-    app_callback_class
-)
-
-# Try to import hailo python module
-try:
-    import hailo
-except ImportError:
-    sys.exit("Failed to import hailo python module. Make sure you are in hailo virtual environment.")
+from contextlib import contextmanager
+from hailo_apps_infra.hailo_device import get_device_identity
+
+# Heavy modules (numpy, cv2, multiprocessing, hailo) are imported where they are used, so importing this
+# module stays fast. app_callback_class moved to gstreamer_app, it is still importable from here (see __getattr__).
+
+
+def __getattr__(name):
+    # Imported lazily: gstreamer_app imports the pipeline modules, importing it here was circular
+    if name == 'app_callback_class':
+        from hailo_apps_infra.gstreamer_app import app_callback_class
+        return app_callback_class
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # -----------------------------------------------------------------------------------------------
 # Common functions
 # -----------------------------------------------------------------------------------------------
-def detect_hailo_arch():
-    try:
-        # Run the hailortcli command to get device information
-        result = subprocess.run(['hailortcli', 'fw-control', 'identify'], capture_output=True, text=True)
-
-        # Check if the command was successful
-        if result.returncode != 0:
-            print(f"Error running hailortcli: {result.stderr}")
-            return None
-
-        # Search for the "Device Architecture" line in the output
-        for line in result.stdout.split('\n'):
-            if "Device Architecture" in line:
-                if "HAILO8L" in line:
-                    return "hailo8l"
-                elif "HAILO8" in line:
-                    return "hailo8"
-
-        print("Could not determine Hailo architecture from device information.")
-        return None
-    except Exception as e:
-        print(f"An error occurred while detecting Hailo architecture: {e}")
+def detect_hailo_arch(use_cache=True):
+    """
+    Returns the architecture of the Hailo device ('hailo8' or 'hailo8l'), None if it could not be detected.
+    The result of `hailortcli fw-control identify` is cached until the next reboot, driver reload or
+    HailoRT upgrade (see hailo_device.py). Use use_cache=False to run the detection again.
+    """
+    identity = get_device_identity(use_cache)
+    if identity is None:
         return None
+    if identity['arch'] is None:
+        print("Could not determine Hailo architecture from device information.")
+    return identity['arch']
 
 def get_caps_from_pad(pad: Gst.Pad):
     caps = pad.get_current_caps()
@@ -70,12 +54,22 @@ def get_default_parser():
     default_video_source = os.path.join(current_path, '../resources/example.mp4')
     parser.add_argument(
         "--input", "-i", type=str, default=default_video_source,
-        help="Input source. Can be a file, USB (webcam), RPi camera (CSI camera module) or ximage. \
-        For RPi camera use '-i rpi' \
+        help="Input source. Can be a file, USB (webcam), RPi camera (CSI camera module), ximage or videotestsrc. \
+        For RPi camera use '-i rpi', for a synthetic test pattern use '-i videotestsrc' \
         Defaults to example video resources/example.mp4"
     )
+    parser.add_argument(
+        "--inputs", nargs='+', default=None,
+        help="Several input sources (files, USB cameras or videotestsrc) sharing one inference pipeline. \
+        Each stream gets its own display, the stream id of the frames is sink_<index>. Overrides --input."
+    )
+    parser.add_argument("--stream-stats-interval", type=int, default=10, help="Seconds between per stream FPS and drop counters with --inputs. Default is 10, 0 prints only at exit.")
     parser.add_argument("--use-frame", "-u", action="store_true", help="Use frame from the callback function")
     parser.add_argument("--show-fps", "-f", action="store_true", help="Print FPS on sink")
+    parser.add_argument(
+        "--headless", action="store_true",
+        help="Run without a display: no overlay drawing and no conversion, frames are dropped in a fakesink. FPS printing (--show-fps) still works."
+    )
     parser.add_argument(
             "--arch",
             default=None,
@@ -87,6 +81,21 @@ def get_default_parser():
             default=None,
             help="Path to HEF file",
         )
+    parser.add_argument(
+        "--multi-process-service", action="store_true",
+        help="Share the Hailo device with other processes through the HailoRT multi-process service (hailort_service must be running)."
+    )
+    parser.add_argument("--scheduler-priority", type=int, default=None, help="hailonet scheduler priority (0-31, higher runs first) when sharing the device. Default is the hailonet default.")
+    parser.add_argument("--scheduler-timeout-ms", type=int, default=None, help="hailonet scheduler timeout: how long to wait for a full batch before switching. Default is the hailonet default.")
+    parser.add_argument(
+        "--auto-batch", action="store_true",
+        help="Calibrate the hailonet batch size (and scheduler timeout) at startup. The result is cached per HEF, architecture and resolution."
+    )
+    parser.add_argument("--auto-batch-objective", default="max-fps", choices=['max-fps', 'latency'], help="Calibration objective: max-fps, or latency for the highest FPS within --latency-budget-ms. Default is max-fps.")
+    parser.add_argument("--latency-budget-ms", type=float, default=None, help="p95 end to end latency budget for --auto-batch-objective latency.")
+    parser.add_argument("--auto-batch-sizes", type=int, nargs='+', default=[1, 2, 4, 8], help="Candidate batch sizes. Default is 1 2 4 8.")
+    parser.add_argument("--auto-batch-timeouts", type=int, nargs='+', default=None, help="Candidate scheduler timeouts in ms. Default keeps the hailonet default.")
+    parser.add_argument("--recalibrate", action="store_true", help="Ignore the cached --auto-batch result and calibrate again.")
     parser.add_argument(
         "--disable-sync", action="store_true",
         help="Disables display sink sync, will run as fast as possible. Relevant when using file source."
@@ -96,6 +105,88 @@ def get_default_parser():
         help="Disables the user's custom callback function in the pipeline. Use this option to run the pipeline without invoking the callback logic."
     )
     parser.add_argument("--dump-dot", action="store_true", help="Dump the pipeline graph to a dot file pipeline.dot")
+    parser.add_argument(
+        "--async-callback", action="store_true",
+        help="Run the user callback in a worker pool instead of the GStreamer streaming thread. \
+        The callback is called as callback(item, user_data) with a CallbackWorkItem snapshot of the buffer."
+    )
+    parser.add_argument("--callback-workers", type=int, default=1, help="Number of asynchronous callback workers. Default is 1.")
+    parser.add_argument("--callback-queue-size", type=int, default=8, help="Maximum pending work items per asynchronous callback worker. Default is 8.")
+    parser.add_argument(
+        "--callback-overflow", default="drop-oldest", choices=['drop-oldest', 'drop-newest', 'block'],
+        help="What to do when the asynchronous callback queue is full. Default is drop-oldest."
+    )
+    parser.add_argument(
+        "--callback-executor", default="thread", choices=['thread', 'process'],
+        help="Run asynchronous callbacks in threads or in processes (processes get a copy of user_data). Default is thread."
+    )
+    parser.add_argument(
+        "--trace-latency", action="store_true",
+        help="Measure per stage latency (queue wait, processing and end to end p50/p95/p99) using probes on the pipeline queues."
+    )
+    parser.add_argument("--trace-latency-interval", type=int, default=10, help="Seconds between latency summaries. Default is 10, 0 prints only at shutdown.")
+    parser.add_argument("--trace-latency-export", default=None, help="Write the latency summary as JSON to this path (updated with every summary).")
+    parser.add_argument(
+        "--monitor-queues", action="store_true",
+        help="Sample the occupancy of every queue and report the stage limiting the throughput at exit (or on SIGUSR1)."
+    )
+    parser.add_argument("--monitor-queues-interval", type=int, default=50, help="Queue sampling interval in milliseconds. Default is 50.")
+    parser.add_argument(
+        "--inference-interval", type=int, default=1,
+        help="Run the inference on every Nth frame only (1-10), the tracker predicts the detections of the other frames. Callbacks can tell them apart with user_data.is_inferred_frame(buffer). Default is 1 (every frame)."
+    )
+    parser.add_argument(
+        "--motion-gate", action="store_true",
+        help="Run the inference only on frames with motion plus a keep-alive frame, static frames keep the detections of the last inferred frame. Prints the fraction of frames gated per stream."
+    )
+    parser.add_argument("--motion-threshold", type=float, default=2.0, help="Mean gray level difference (0-255) to the last inferred frame above which a frame is inferred with --motion-gate. Default is 2.0.")
+    parser.add_argument("--motion-keepalive", type=int, default=30, help="Infer at least one frame out of this many with --motion-gate. Default is 30.")
+    parser.add_argument(
+        "--record-events", default=None, metavar="DIR",
+        help="Keep the last --pre-roll seconds of encoded frames in memory, and save a clip to DIR with them and the following --post-roll seconds when the callback calls user_data.trigger_event(). Single input only."
+    )
+    parser.add_argument("--pre-roll", type=float, default=5.0, help="Seconds kept before an event with --record-events. Default is 5.")
+    parser.add_argument("--post-roll", type=float, default=5.0, help="Seconds recorded after the last event of a clip with --record-events. Default is 5.")
+    parser.add_argument("--record-memory-mb", type=int, default=64, help="Memory cap of the --record-events pre-roll in MB. Default is 64.")
+    parser.add_argument(
+        "--export-metadata", default=None, metavar="DIR",
+        help="Write the detections of every frame (boxes, scores, classes, track ids, keypoints, PTS, stream id) to DIR as columnar .hmeta chunk files, read them with hailo_apps_infra.metadata_export.MetadataReader."
+    )
+    parser.add_argument("--export-chunk-frames", type=int, default=256, help="Frames per chunk with --export-metadata. Default is 256.")
+    parser.add_argument("--export-rotate-mb", type=int, default=256, help="Start a new --export-metadata file at this size in MB. Default is 256.")
+    parser.add_argument("--export-rotate-seconds", type=int, default=600, help="Start a new --export-metadata file after this many seconds, 0 rotates by size only. Default is 600.")
+    parser.add_argument("--export-masks", action="store_true", help="Also export the instance masks, run length encoded, with --export-metadata.")
+    parser.add_argument(
+        "--target-fps", type=float, default=None,
+        help="rpi camera only: capture at most this many frames per second. Frames are always captured only when the pipeline can take them."
+    )
+    parser.add_argument(
+        "--profile-startup", action="store_true",
+        help="Print the time to the first frame per stage: imports, device detection, Gst.init, parse_launch, PAUSED, PLAYING and the first buffer at the callback."
+    )
+    parser.add_argument(
+        "--optimize-pipeline", action="store_true",
+        help="Leave out the videoscale / videoconvert stages which would not change the frames (the source already has the size or format, the HEF input shape is known) and print the removed elements."
+    )
+    parser.add_argument(
+        "--video-format", default="RGB", choices=['RGB', 'NV12'],
+        help="Format of the frames between the source and the display. NV12 keeps them in YUV and converts only the network input to RGB, \
+        callbacks get (Y, UV) planes from map_frame / get_numpy_from_buffer (use frame_to_rgb from video_frame.py for RGB). Default is RGB."
+    )
+    parser.add_argument(
+        "--source-chain", default="legacy",
+        help="Source decoder / converter: 'legacy' keeps decodebin and videoscale + videoconvert, 'auto' benchmarks the available elements \
+        once (a few seconds at the first start, cached) and uses the working ones with the least CPU time per frame, \
+        or force elements with e.g. 'jpeg=jpegdec,convert=videoconvertscale,h264=avdec_h264'. Default is legacy."
+    )
+    parser.add_argument(
+        "--tune-pipeline", action="store_true",
+        help="Share the videoscale / videoconvert threads across the available cores (affinity and cgroup CPU quota) instead of the fixed defaults."
+    )
+    parser.add_argument(
+        "--tuning-profile", default=None,
+        help="Tuning profile JSON, implies --tune-pipeline. Its queue sizes are used if it exists; with --trace-latency the queue sizes measured in this run are saved to it at exit."
+    )
     return parser
 
 
@@ -103,19 +194,20 @@ def get_default_parser():
 # Functions used to get numpy arrays from GStreamer buffers
 # ---------------------------------------------------------
 
-def handle_rgb(map_info, width, height):
-    # The copy() method is used to create a copy of the numpy array. This is necessary because the original numpy array is created from buffer data, and it does not own the data it represents. Instead, it's just a view of the buffer's data.
-    return np.ndarray(shape=(height, width, 3), dtype=np.uint8, buffer=map_info.data).copy()
+# The handlers only get the mapped data, they use the plane offsets and row strides GStreamer uses by default
+# for the format (see video_frame.py). map_frame also honors the caps and the GstVideoMeta of the buffer.
+def handle_rgb(map_info, width, height, copy=True):
+    from hailo_apps_infra.video_frame import get_frame_layout_for_format, plane_views
+    return plane_views(get_frame_layout_for_format('RGB', width, height), map_info.data, copy)
 
-def handle_nv12(map_info, width, height):
-    y_plane_size = width * height
-    uv_plane_size = width * height // 2
-    y_plane = np.ndarray(shape=(height, width), dtype=np.uint8, buffer=map_info.data[:y_plane_size]).copy()
-    uv_plane = np.ndarray(shape=(height//2, width//2, 2), dtype=np.uint8, buffer=map_info.data[y_plane_size:]).copy()
+def handle_nv12(map_info, width, height, copy=True):
+    from hailo_apps_infra.video_frame import get_frame_layout_for_format, plane_views
+    y_plane, uv_plane = plane_views(get_frame_layout_for_format('NV12', width, height), map_info.data, copy)
     return y_plane, uv_plane
 
-def handle_yuyv(map_info, width, height):
-    return np.ndarray(shape=(height, width, 2), dtype=np.uint8, buffer=map_info.data).copy()
+def handle_yuyv(map_info, width, height, copy=True):
+    from hailo_apps_infra.video_frame import get_frame_layout_for_format, plane_views
+    return plane_views(get_frame_layout_for_format('YUYV', width, height), map_info.data, copy)
 
 FORMAT_HANDLERS = {
     'RGB': handle_rgb,
@@ -123,29 +215,52 @@ FORMAT_HANDLERS = {
     'YUYV': handle_yuyv,
 }
 
-def get_numpy_from_buffer(buffer, format, width, height):
+@contextmanager
+def map_frame(buffer, format, width, height, copy=False, caps=None):
+    """
+    Maps a GstBuffer and yields numpy arrays of the frame without copying the pixel data.
+
+    The yielded arrays are read-only views into the mapped buffer and are valid only inside the
+    `with` block; the buffer is unmapped when the block exits. Use `copy=True` (or call `.copy()` on
+    the part you need, e.g. a small ROI) to keep data beyond the block.
+    Row strides and plane offsets are taken from the buffer's GstVideoMeta when present, otherwise
+    from the negotiated caps when given, otherwise from the default GStreamer layout of the format.
+
+    Example:
+        with map_frame(buffer, format, width, height, caps=pad.get_current_caps()) as frame:
+            roi = frame[y0:y1, x0:x1].copy()
+
+    Args:
+        buffer (GstBuffer): The GStreamer Buffer to map.
+        format (str): The video format ('RGB', 'NV12', 'YUYV', etc.).
+        width (int): The width of the video frame.
+        height (int): The height of the video frame.
+        copy (bool, optional): Yield copies that own their data instead of views. Defaults to False.
+        caps (Gst.Caps, optional): The negotiated caps of the buffer. Defaults to None (format, width and height).
+
+    Yields:
+        np.ndarray: A numpy array representing the buffer's data, or a tuple of arrays for certain formats.
+    """
+    from hailo_apps_infra.video_frame import get_frame_layout, get_frame_layout_for_format, map_video_frame
+    layout = get_frame_layout(caps) if caps is not None else get_frame_layout_for_format(format, width, height)
+    with map_video_frame(buffer, layout, copy=copy) as frame:
+        yield frame
+
+def get_numpy_from_buffer(buffer, format, width, height, caps=None):
     """
     Converts a GstBuffer to a numpy array based on provided format, width, and height.
+    The returned arrays own a copy of the frame data. Callbacks that only read a few pixels or
+    crop small regions should use `map_frame` instead to avoid the full-frame copy.
 
     Args:
         buffer (GstBuffer): The GStreamer Buffer to convert.
         format (str): The video format ('RGB', 'NV12', 'YUYV', etc.).
         width (int): The width of the video frame.
         height (int): The height of the video frame.
+        caps (Gst.Caps, optional): The negotiated caps of the buffer, see map_frame. Defaults to None.
 
     Returns:
         np.ndarray: A numpy array representing the buffer's data, or a tuple of arrays for certain formats.
     """
-    # Map the buffer to access data
-    success, map_info = buffer.map(Gst.MapFlags.READ)
-    if not success:
-        raise ValueError("Buffer mapping failed")
-
-    try:
-        # Handle different formats based on the provided format parameter
-        handler = FORMAT_HANDLERS.get(format)
-        if handler is None:
-            raise ValueError(f"Unsupported format: {format}")
-        return handler(map_info, width, height)
-    finally:
-        buffer.unmap(map_info)
+    with map_frame(buffer, format, width, height, copy=True, caps=caps) as frame:
+        return frame
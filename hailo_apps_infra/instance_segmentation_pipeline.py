@@ -2,25 +2,16 @@ import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
 import os
-import argparse
-import multiprocessing
-import numpy as np
-import setproctitle
-import cv2
-import time
-import hailo
 from hailo_apps_infra.hailo_rpi_common import (
     get_default_parser,
     detect_hailo_arch,
 )
 from hailo_apps_infra.gstreamer_helper_pipelines import(
     QUEUE,
-    SOURCE_PIPELINE,
-    INFERENCE_PIPELINE,
-    INFERENCE_PIPELINE_WRAPPER,
     USER_CALLBACK_PIPELINE,
+    METADATA_EXPORT_PIPELINE,
+    EVENT_RECORDING_PIPELINE,
     TRACKER_PIPELINE,
-    DISPLAY_PIPELINE,
 )
 from hailo_apps_infra.gstreamer_app import (
     GStreamerApp,
@@ -77,30 +68,36 @@ class GStreamerInstanceSegmentationApp(GStreamerApp):
         self.app_callback = app_callback
 
         # Set the process title
+        import setproctitle
         setproctitle.setproctitle("Hailo Instance Segmentation App")
 
         self.create_pipeline()
 
     def get_pipeline_string(self):
-        source_pipeline = SOURCE_PIPELINE(video_source=self.video_source, video_width=self.video_width, video_height=self.video_height)
-        infer_pipeline = INFERENCE_PIPELINE(
+        builder = self.create_pipeline_builder()
+        builder.add_sources(self.video_sources, self.video_width, self.video_height, self.video_format,
+                            no_webcam_compression=self.no_webcam_compression)
+        builder.add_inference(
             hef_path=self.hef_path,
             post_process_so=self.default_post_process_so,
             post_function_name=self.post_function_name,
             batch_size=self.batch_size,
             config_json=self.config_file,
+            scheduler_priority=self.scheduler_priority,
+            scheduler_timeout_ms=self.scheduler_timeout_ms,
+            multi_process_service=self.multi_process_service,
+            inference_interval=self.inference_interval,
+            motion_gate=self.motion_gate is not None,
         )
-        infer_pipeline_wrapper = INFERENCE_PIPELINE_WRAPPER(infer_pipeline)
-        tracker_pipeline = TRACKER_PIPELINE(class_id=1)
-        user_callback_pipeline = USER_CALLBACK_PIPELINE()
-        display_pipeline = DISPLAY_PIPELINE(video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps)
-        pipeline_string = (
-            f'{source_pipeline} ! '
-            f'{infer_pipeline_wrapper} ! '
-            f'{tracker_pipeline} ! '
-            f'{user_callback_pipeline} ! '
-            f'{display_pipeline}'
-        )
+        builder.add(TRACKER_PIPELINE(class_id=1, profile=self.tuning_profile, inference_interval=self.inference_interval))
+        builder.add(USER_CALLBACK_PIPELINE(profile=self.tuning_profile))
+        if self.metadata_exporter is not None:
+            builder.add(METADATA_EXPORT_PIPELINE(profile=self.tuning_profile))
+        if self.event_recorder is not None:
+            builder.add(EVENT_RECORDING_PIPELINE(profile=self.tuning_profile))
+        builder.add_display(len(self.video_sources), video_sink=self.video_sink, sync=self.sync, show_fps=self.show_fps,
+                            headless=self.headless)
+        pipeline_string = builder.build()
         print(pipeline_string)
         return pipeline_string
 
@@ -0,0 +1,446 @@
+import json
+import math
+import resource
+import sys
+import threading
+import time
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# -----------------------------------------------------------------------------------------------
+# Pipeline topology helpers
+# -----------------------------------------------------------------------------------------------
+# The pipeline helper functions name all their queues (e.g. inference_hailonet_q), the queues split the
+# pipeline into stages: the elements between a queue and the next queue(s) downstream run in the
+# queue's streaming thread.
+
+
+def get_queue_elements(pipeline):
+    """
+    Returns the queue elements which are direct children of the pipeline.
+    """
+    queues = []
+    it = pipeline.iterate_elements()
+    while True:
+        result, element = it.next()
+        if result != Gst.IteratorResult.OK:
+            break
+        factory = element.get_factory()
+        if factory is not None and factory.get_name() == 'queue':
+            queues.append(element)
+    # iterate_elements returns the elements sink to source
+    queues.reverse()
+    return queues
+
+
+def iterate_pads(iterator):
+    """Returns the pads of a pad iterator (e.g. element.iterate_src_pads()) as a list."""
+    pads = []
+    while True:
+        result, pad = iterator.next()
+        if result != Gst.IteratorResult.OK:
+            break
+        pads.append(pad)
+    return pads
+
+
+def get_downstream_queues(queue):
+    """
+    Follows the links from a queue's src pad to the next queues downstream.
+
+    Returns:
+        list: (downstream queue, list of element names between the queues) tuples.
+    """
+    downstream = []
+    pending = [(queue.get_static_pad('src'), [])]
+    visited = set()
+    while pending:
+        src_pad, path = pending.pop()
+        peer = src_pad.get_peer() if src_pad is not None else None
+        if peer is None:
+            continue
+        element = peer.get_parent_element()
+        if element is None or element.get_name() in visited:
+            continue
+        factory = element.get_factory()
+        if factory is not None and factory.get_name() == 'queue':
+            downstream.append((element, path))
+            continue
+        visited.add(element.get_name())
+        for pad in iterate_pads(element.iterate_src_pads()):
+            pending.append((pad, path + [element.get_name()]))
+    return downstream
+
+
+def get_queue_topology(pipeline):
+    """
+    Returns the queues of the pipeline in upstream to downstream order, and their links.
+
+    Returns:
+        tuple: (list of queue names, dict mapping a queue name to a list of (downstream queue name, element names) tuples)
+    """
+    queues = get_queue_elements(pipeline)
+    links = {queue.get_name(): [(downstream.get_name(), path) for downstream, path in get_downstream_queues(queue)] for queue in queues}
+    # Order the queues so that every queue comes after its upstream queues
+    upstream_count = {name: 0 for name in links}
+    for targets in links.values():
+        for target, _ in targets:
+            if target in upstream_count:
+                upstream_count[target] += 1
+    order = []
+    ready = [queue.get_name() for queue in queues if upstream_count[queue.get_name()] == 0]
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        for target, _ in links[name]:
+            if target in upstream_count:
+                upstream_count[target] -= 1
+                if upstream_count[target] == 0:
+                    ready.append(target)
+    # Keep queues inside loops (not expected in our pipelines) at the end
+    order += [name for name in links if name not in order]
+    return order, links
+
+
+def get_source_stream_ids(pipeline, queue_names):
+    """
+    Returns the stream id of the queues in the per source branches of MULTI_SOURCE_PIPELINE. Their frames are
+    tagged with the stream id (the hailoroundrobin sink pad name) only when they reach the roundrobin.
+
+    Returns:
+        dict: queue name -> stream id ('sink_0', 'sink_1', ...), empty without a hailoroundrobin.
+    """
+    stream_ids = {}
+    it = pipeline.iterate_elements()
+    while True:
+        result, element = it.next()
+        if result != Gst.IteratorResult.OK:
+            break
+        factory = element.get_factory()
+        if factory is None or factory.get_name() != 'hailoroundrobin' or not element.get_name().endswith('_roundrobin'):
+            continue
+        # The branch of source i is named {name}_{i}_... and linked to {name}_roundrobin.sink_{i}
+        prefix = element.get_name()[:-len('roundrobin')]
+        for queue_name in queue_names:
+            index = queue_name[len(prefix):].split('_', 1)[0]
+            if queue_name.startswith(prefix) and index.isdigit() and element.get_static_pad(f'sink_{index}') is not None:
+                stream_ids[queue_name] = f'sink_{index}'
+    return stream_ids
+
+# -----------------------------------------------------------------------------------------------
+# Latency histogram
+# -----------------------------------------------------------------------------------------------
+# Log scale buckets with 8 buckets per octave (about 9% resolution), starting at 1 microsecond.
+BUCKETS_PER_OCTAVE = 8
+NUM_BUCKETS = 32 * BUCKETS_PER_OCTAVE
+
+
+class LatencyHistogram:
+    """
+    A fixed size log scale histogram of latencies. Adding a sample is O(1) and memory does not grow with the run time.
+    """
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, latency_ns):
+        latency_us = latency_ns / 1000
+        index = int(math.log2(latency_us) * BUCKETS_PER_OCTAVE) if latency_us > 1 else 0
+        self.buckets[min(index, NUM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += latency_ns
+        if latency_ns > self.max:
+            self.max = latency_ns
+
+    def percentile(self, percent):
+        """
+        Returns the latency in milliseconds below which `percent` of the samples fall (bucket upper edge).
+        """
+        if self.count == 0:
+            return 0.0
+        target = self.count * percent / 100
+        cumulative = 0
+        for index, bucket in enumerate(self.buckets):
+            cumulative += bucket
+            if cumulative >= target:
+                return min(2 ** ((index + 1) / BUCKETS_PER_OCTAVE) / 1000, self.max / 1e6)
+        return self.max / 1e6
+
+    def mean(self):
+        return self.total / self.count / 1e6 if self.count else 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean(), 3),
+            'p50_ms': round(self.percentile(50), 3),
+            'p95_ms': round(self.percentile(95), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'max_ms': round(self.max / 1e6, 3),
+        }
+
+# -----------------------------------------------------------------------------------------------
+# Latency tracer
+# -----------------------------------------------------------------------------------------------
+# The fpsdisplaysink of DISPLAY_PIPELINE is named hailo_display (hailo_display_<i> per stream)
+DISPLAY_SINK_NAME = 'hailo_display'
+
+
+class LatencyTracer:
+    """
+    Measures per stage latency using buffer probes on the named queues of a pipeline.
+
+    For every queue two latencies are measured, keyed by the stream id and the buffer PTS (the streams of a multi
+    source pipeline share the queues after hailoroundrobin, and file sources all start at PTS 0):
+    - queue wait: from entering the queue (sink pad) to leaving it (src pad).
+    - stage: from leaving the queue to entering the next queue downstream, i.e. the processing time of the
+      elements between the queues (e.g. videoscale, hailonet, hailofilter).
+    The end to end latency is measured from the first time a frame is seen to the moment it leaves the last queue
+    (the queue before the display, see _get_last_queues()).
+    Negative latencies, from frames which can't be told apart, are counted in negative_samples and not recorded.
+
+    Args:
+        pipeline (Gst.Pipeline): The pipeline to trace.
+        max_pending (int, optional): Maximum number of in-flight frames kept per queue and stream. Defaults to 64.
+    """
+    def __init__(self, pipeline, max_pending=64):
+        self.pipeline = pipeline
+        self.max_pending = max_pending
+        self._max_entries = max_pending
+        self.order = []
+        self.links = {}
+        self.upstream = {}
+        self.histograms = {}
+        self._enter = {}
+        self._leave = {}
+        self._first_seen = {}
+        self._last_queues = set()
+        self._stream_ids = {}
+        self._roi_stream_ids = False
+        self._probes = []
+        self._lock = threading.Lock()
+        self.negative_samples = 0
+
+    def attach(self):
+        """Adds the probes to the pipeline queues."""
+        self.order, self.links = get_queue_topology(self.pipeline)
+        self.upstream = {name: [] for name in self.order}
+        for name, targets in self.links.items():
+            for target, path in targets:
+                if target in self.upstream:
+                    self.upstream[target].append((name, self._stage_name(name, path)))
+        self._last_queues = self._get_last_queues()
+        self._stream_ids = get_source_stream_ids(self.pipeline, self.order)
+        # After hailoroundrobin the stream id is read from the frame's ROI
+        self._roi_stream_ids = bool(self._stream_ids)
+        self._max_entries = self.max_pending * max(1, len(set(self._stream_ids.values())))
+        for name in self.order:
+            self._enter[name] = {}
+            self._leave[name] = {}
+            queue = self.pipeline.get_by_name(name)
+            sink_pad = queue.get_static_pad('sink')
+            src_pad = queue.get_static_pad('src')
+            self._probes.append((sink_pad, sink_pad.add_probe(Gst.PadProbeType.BUFFER, self._on_enter, name)))
+            self._probes.append((src_pad, src_pad.add_probe(Gst.PadProbeType.BUFFER, self._on_leave, name)))
+        return self
+
+    def detach(self):
+        for pad, probe_id in self._probes:
+            pad.remove_probe(probe_id)
+        self._probes = []
+
+    def reset(self):
+        """Drops the samples collected so far, e.g. after a warm up period."""
+        with self._lock:
+            self.histograms = {}
+            self.negative_samples = 0
+
+    def _get_last_queues(self):
+        """
+        Returns the queues where the end to end latency is measured: the queues feeding a hailo_display sink. Other
+        queues without a queue downstream are side branches (e.g. the leaky queue of EVENT_RECORDING_PIPELINE), a
+        frame passing them is not done. Without a display, the last queues which don't drop frames.
+        """
+        last_queues = [name for name, targets in self.links.items() if not targets]
+        display_queues = set()
+        for name in last_queues:
+            peer = self.pipeline.get_by_name(name).get_static_pad('src').get_peer()
+            element = peer.get_parent_element() if peer is not None else None
+            if element is not None and element.get_name().startswith(DISPLAY_SINK_NAME):
+                display_queues.add(name)
+        if display_queues:
+            return display_queues
+        return {name for name in last_queues if int(self.pipeline.get_by_name(name).get_property('leaky')) == 0}
+
+    @staticmethod
+    def _stage_name(queue_name, path):
+        return '+'.join(path) if path else f'{queue_name}->'
+
+    def get_downstream_stages(self, queue_name):
+        """
+        Returns the names of the stages between a queue and the next queues, as used in get_summary().
+
+        Args:
+            queue_name (str): A queue of the pipeline (see links).
+
+        Returns:
+            list: Stage names, empty for the last queues.
+        """
+        return [self._stage_name(queue_name, path) for _, path in self.links.get(queue_name, [])]
+
+    def _record(self, name, latency_ns):
+        if latency_ns < 0:
+            self.negative_samples += 1
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.add(latency_ns)
+
+    def _frame_key(self, buffer, name):
+        stream_id = self._stream_ids.get(name)
+        if stream_id is None and self._roi_stream_ids:
+            import hailo
+            try:
+                stream_id = hailo.get_roi_from_buffer(buffer).get_stream_id()
+            except AttributeError:
+                # Older hailo modules do not expose the stream id
+                stream_id = ''
+        return stream_id, buffer.pts
+
+    def _remember(self, table, key, now):
+        table[key] = now
+        if len(table) > self._max_entries:
+            try:
+                del table[next(iter(table))]
+            except (StopIteration, KeyError, RuntimeError):
+                pass
+
+    def _on_enter(self, pad, info, name):
+        buffer = info.get_buffer()
+        if buffer is None or buffer.pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        now = time.monotonic_ns()
+        key = self._frame_key(buffer, name)
+        if key not in self._first_seen:
+            self._remember(self._first_seen, key, now)
+        for upstream_name, stage_name in self.upstream[name]:
+            leave = self._leave[upstream_name].get(key)
+            if leave is not None:
+                self._record(stage_name, now - leave)
+        self._remember(self._enter[name], key, now)
+        return Gst.PadProbeReturn.OK
+
+    def _on_leave(self, pad, info, name):
+        buffer = info.get_buffer()
+        if buffer is None or buffer.pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        now = time.monotonic_ns()
+        key = self._frame_key(buffer, name)
+        enter = self._enter[name].get(key)
+        if enter is not None:
+            self._record(f'queue:{name}', now - enter)
+        self._remember(self._leave[name], key, now)
+        if name in self._last_queues:
+            first_seen = self._first_seen.get(key)
+            if first_seen is not None:
+                self._record('end-to-end', now - first_seen)
+        return Gst.PadProbeReturn.OK
+
+    def get_summary(self):
+        """
+        Returns the latency summary in pipeline order.
+
+        Returns:
+            dict: stage name -> {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}
+        """
+        names = []
+        for name in self.order:
+            names.append(f'queue:{name}')
+            names += self.get_downstream_stages(name)
+        names.append('end-to-end')
+        return {name: self.histograms[name].summary() for name in dict.fromkeys(names) if name in self.histograms}
+
+    def print_summary(self, file=sys.stdout):
+        summary = self.get_summary()
+        print(f"{'stage':<60} {'count':>7} {'p50 [ms]':>9} {'p95 [ms]':>9} {'p99 [ms]':>9}", file=file)
+        for name, stats in summary.items():
+            print(f"{name[:60]:<60} {stats['count']:>7} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}", file=file)
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.get_summary(), f, indent=2)
+
+# -----------------------------------------------------------------------------------------------
+# Pipeline measurement
+# -----------------------------------------------------------------------------------------------
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _check_bus(bus):
+    message = bus.pop_filtered(Gst.MessageType.ERROR)
+    if message is not None:
+        err, debug = message.parse_error()
+        raise RuntimeError(f"{err}, {debug}")
+
+
+def measure_pipeline(pipeline, duration=10.0, warmup=2.0, sink_names=('hailo_display',)):
+    """
+    Plays a pipeline for warmup + duration seconds and measures it during the last duration seconds.
+    The pipeline is set to NULL when done.
+
+    Args:
+        pipeline (Gst.Pipeline): The pipeline, in NULL state.
+        duration (float, optional): Measured seconds. Defaults to 10.
+        warmup (float, optional): Seconds before measuring. Defaults to 2.
+        sink_names (tuple, optional): Elements whose sink pad buffers are counted as output frames. Defaults to ('hailo_display',).
+
+    Returns:
+        dict: {'fps', 'frames', 'latency' (end to end summary), 'stages' (per stage summary),
+            'cpu_percent' (process CPU time / wall time, 100 is one core)}
+
+    Raises:
+        RuntimeError: If the pipeline posted an error.
+    """
+    bus = pipeline.get_bus()
+    tracer = LatencyTracer(pipeline).attach()
+    frames = [0]
+
+    def count_frame(pad, info):
+        frames[0] += 1
+        return Gst.PadProbeReturn.OK
+
+    for name in sink_names:
+        pipeline.get_by_name(name).get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, count_frame)
+
+    pipeline.set_state(Gst.State.PLAYING)
+    try:
+        time.sleep(warmup)
+        _check_bus(bus)
+        tracer.reset()
+        start_frames, start_cpu, start_time = frames[0], _cpu_time(), time.monotonic()
+        time.sleep(duration)
+        end_frames, end_cpu, end_time = frames[0], _cpu_time(), time.monotonic()
+        _check_bus(bus)
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+
+    elapsed = end_time - start_time
+    stages = tracer.get_summary()
+    return {
+        'fps': round((end_frames - start_frames) / elapsed, 2),
+        'frames': end_frames - start_frames,
+        'latency': stages.pop('end-to-end', None),
+        'stages': stages,
+        'cpu_percent': round((end_cpu - start_cpu) / elapsed * 100, 1),
+    }
@@ -0,0 +1,511 @@
+import glob
+import json
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import numpy as np
+
+# -----------------------------------------------------------------------------------------------
+# Metadata export
+# -----------------------------------------------------------------------------------------------
+# METADATA_EXPORT_PIPELINE adds an identity after the user callback. MetadataExporter probes it, extracts the
+# detections with DetectionArrays and appends them to the current batch: the streaming thread only copies a few
+# small arrays per frame. Every chunk_frames frames (or chunk_seconds) the batch is handed to a writer thread,
+# which concatenates it into columns and appends it as one chunk to the current .hmeta file. When the writer
+# falls behind, whole chunks are dropped and counted instead of blocking the pipeline. The files rotate by size
+# and by age. MetadataReader memory-maps them, the columns are numpy views of the file.
+#
+# A chunk is a fixed header (CHUNK_HEADER: magic, JSON length, data length), a JSON directory and the column
+# data, each column aligned to COLUMN_ALIGNMENT bytes of the file:
+#   per frame:     frame (int64), pts (int64), stream (uint16, index into 'streams'),
+#                  detection_offsets (uint32, frames + 1, the detections of frame i are [offsets[i], offsets[i + 1]))
+#   per detection: boxes (float32 x 4, xmin ymin xmax ymax), scores (float32), class_ids (int32),
+#                  track_ids (int32, -1 untracked), labels (uint16, index into 'labels'),
+#                  keypoints (float32 x K x 3, when exported)
+#   masks:         mask_shapes (uint16 x 2 per detection, 0 x 0 without mask), mask_offsets (uint32, detections + 1)
+#                  and mask_runs (uint16, or uint32 for large masks): alternating background / foreground run lengths of the mask (relative
+#                  to the box), in row order, starting with background
+# 'streams' and 'labels' hold all the values seen so far by the exporter, every chunk can be read on its own.
+
+CHUNK_MAGIC = b'HMETA001'
+CHUNK_HEADER = struct.Struct('<8sIQ')
+COLUMN_ALIGNMENT = 64
+FILE_EXTENSION = '.hmeta'
+
+
+def encode_rle(masks):
+    """
+    Run length encodes binary masks, all of them in one vectorized pass.
+
+    Args:
+        masks (list): The masks (np.ndarray, non zero is foreground), None for a detection without mask.
+
+    Returns:
+        tuple: (runs, offsets): uint32 run lengths, alternating background / foreground and starting with
+            background for every mask, and the uint32 offsets (len(masks) + 1) of the runs of each mask.
+    """
+    flats = [np.asarray(mask, dtype=bool).ravel() for mask in masks if mask is not None]
+    sizes = np.array([mask.size if mask is not None else 0 for mask in masks], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    flat = np.concatenate(flats) if flats else np.zeros(0, dtype=bool)
+    # A run starts at every value change and at the first pixel of every mask
+    is_start = np.zeros(flat.size, dtype=bool)
+    is_start[starts[:-1][sizes > 0]] = True
+    run_starts = np.flatnonzero(is_start | np.concatenate(([True], flat[1:] != flat[:-1]))[:flat.size])
+    runs = np.diff(np.append(run_starts, flat.size))
+    run_masks = np.searchsorted(starts, run_starts, side='right') - 1
+    # Masks starting with foreground get an empty background run first
+    leading = np.flatnonzero(is_start[run_starts] & flat[run_starts])
+    runs = np.insert(runs, leading, 0)
+    run_masks = np.insert(run_masks, leading, run_masks[leading])
+    offsets = np.zeros(len(masks) + 1, dtype=np.uint32)
+    np.cumsum(np.bincount(run_masks, minlength=len(masks)), dtype=np.uint32, out=offsets[1:])
+    return runs.astype(np.uint32), offsets
+
+
+def decode_rle(runs, height, width):
+    """Returns the (height, width) bool mask of the runs of one mask."""
+    values = np.arange(len(runs)) % 2 == 1
+    return np.repeat(values, runs).reshape(height, width)
+
+
+def _align(offset):
+    return -offset % COLUMN_ALIGNMENT
+
+
+def serialize_chunk(batch, streams, labels, num_keypoints=0, with_masks=False, file_offset=0):
+    """
+    Serializes a batch of frames into a chunk.
+
+    Args:
+        batch (dict): Lists filled by MetadataExporter.add_frame: frame, pts, stream, counts, boxes, scores,
+            class_ids, track_ids, labels, keypoints, masks.
+        streams (list): The stream ids, 'stream' holds indexes into it.
+        labels (list): The labels, 'labels' holds indexes into it.
+        num_keypoints (int, optional): Keypoints per detection, 0 for none. Defaults to 0.
+        with_masks (bool, optional): Add the mask columns. Defaults to False.
+        file_offset (int, optional): Offset of the chunk in its file, the columns are aligned in the file. Defaults to 0.
+
+    Returns:
+        list: The bytes-like parts of the chunk, to be written in order.
+    """
+    def concatenate(arrays, dtype, shape):
+        return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.zeros((0,) + shape, dtype=dtype)
+
+    offsets = np.zeros(len(batch['counts']) + 1, dtype=np.uint32)
+    np.cumsum(batch['counts'], dtype=np.uint32, out=offsets[1:])
+    columns = {
+        'frame': np.asarray(batch['frame'], dtype=np.int64),
+        'pts': np.asarray(batch['pts'], dtype=np.int64),
+        'stream': np.asarray(batch['stream'], dtype=np.uint16),
+        'detection_offsets': offsets,
+        'boxes': concatenate(batch['boxes'], np.float32, (4,)),
+        'scores': concatenate(batch['scores'], np.float32, ()),
+        'class_ids': concatenate(batch['class_ids'], np.int32, ()),
+        'track_ids': concatenate(batch['track_ids'], np.int32, ()),
+        'labels': concatenate(batch['labels'], np.uint16, ()),
+    }
+    if num_keypoints:
+        columns['keypoints'] = concatenate(batch['keypoints'], np.float32, (num_keypoints, 3))
+    if with_masks:
+        masks = [mask for frame_masks in batch['masks'] for mask in frame_masks]
+        columns['mask_shapes'] = np.array([mask.shape if mask is not None else (0, 0) for mask in masks],
+                                          dtype=np.uint16).reshape(-1, 2)
+        runs, columns['mask_offsets'] = encode_rle(masks)
+        # Runs fit in 16 bits for masks up to 65535 pixels, the reader takes the dtype from the directory
+        columns['mask_runs'] = runs.astype(np.uint16) if runs.max(initial=0) < 2 ** 16 else runs
+
+    directory = {
+        'frames': len(batch['frame']),
+        'detections': int(offsets[-1]),
+        'streams': list(streams),
+        'labels': list(labels),
+        'columns': {},
+    }
+    # Every column is padded to the alignment, the chunk ends aligned and the next one starts aligned
+    data = []
+    data_size = 0
+    for name, column in columns.items():
+        column = np.ascontiguousarray(column)
+        directory['columns'][name] = [column.dtype.str, list(column.shape), data_size]
+        data.append(column)
+        data_size += column.nbytes + _align(column.nbytes)
+    directory_json = json.dumps(directory).encode()
+    directory_json += b' ' * _align(file_offset + CHUNK_HEADER.size + len(directory_json))
+    parts = [CHUNK_HEADER.pack(CHUNK_MAGIC, len(directory_json), data_size), directory_json]
+    for column in data:
+        parts.append(column.data)
+        if _align(column.nbytes):
+            parts.append(bytes(_align(column.nbytes)))
+    return parts
+
+
+class MetadataExporter:
+    """
+    Batches the detections of every frame and writes them as columnar chunks from a writer thread.
+
+    Args:
+        directory (str, optional): Where the .hmeta files are written. Defaults to 'metadata'.
+        chunk_frames (int, optional): Frames per chunk. Defaults to 256.
+        chunk_seconds (float, optional): A partial chunk is written after this many seconds. Defaults to 1.0.
+        rotate_bytes (int, optional): A new file is started when the current one reaches this size. Defaults to 256 MB.
+        rotate_seconds (float, optional): A new file is started after this many seconds, 0 rotates by size only.
+            Defaults to 600.
+        num_keypoints (int, optional): Keypoints exported per detection, 0 for none. Defaults to 0.
+        with_masks (bool, optional): Export the masks, run length encoded. Defaults to False.
+        mask_threshold (float, optional): Mask confidence above which a pixel is foreground. Defaults to 0.5.
+        max_pending_chunks (int, optional): Chunks waiting for the writer, the next ones are dropped. Defaults to 8.
+
+    Attributes:
+        frames (int): Frames added.
+        written_frames (int): Frames written to the files.
+        dropped_frames (int): Frames of the chunks dropped because the writer fell behind (or failed).
+        chunks (int): Chunks written.
+        bytes (int): Bytes written.
+        write_seconds (float): Time the writer spent serializing and writing.
+        files (list): The paths of the files started.
+    """
+    def __init__(self, directory='metadata', chunk_frames=256, chunk_seconds=1.0, rotate_bytes=256 * 1024 * 1024,
+                 rotate_seconds=600, num_keypoints=0, with_masks=False, mask_threshold=0.5, max_pending_chunks=8):
+        self.directory = directory
+        self.chunk_frames = chunk_frames
+        self.chunk_seconds = chunk_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.num_keypoints = num_keypoints
+        self.with_masks = with_masks
+        self.mask_threshold = mask_threshold
+        self.streams = []
+        self.labels = []
+        self._stream_index = {}
+        self._label_index = {}
+        self.frames = 0
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.write_seconds = 0.0
+        self.files = []
+        self.lock = threading.Lock()
+        self._batch = self._new_batch()
+        self._batch_start = None
+        self._queue = queue.Queue(maxsize=max_pending_chunks)
+        self._thread = threading.Thread(target=self._run, name='metadata_writer', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _new_batch():
+        keys = ('frame', 'pts', 'stream', 'counts', 'boxes', 'scores', 'class_ids', 'track_ids', 'labels', 'keypoints', 'masks')
+        return {key: [] for key in keys}
+
+    @staticmethod
+    def _index(indexes, values, value):
+        index = indexes.get(value)
+        if index is None:
+            index = indexes[value] = len(values)
+            values.append(value)
+        return index
+
+    def attach(self, pipeline, name='metadata_export'):
+        """Exports the detections of the buffers leaving the {name} identity (METADATA_EXPORT_PIPELINE)."""
+        import hailo
+        from gi.repository import Gst
+        from hailo_apps_infra.async_callback import get_stream_id
+        from hailo_apps_infra.detection_arrays import DetectionArrays
+        identity = pipeline.get_by_name(name)
+        if identity is None:
+            print(f"Metadata export: {name} not found, add METADATA_EXPORT_PIPELINE to the pipeline")
+            return self
+        arrays = DetectionArrays(num_keypoints=self.num_keypoints, with_masks=self.with_masks)
+
+        def probe(pad, info):
+            buffer = info.get_buffer()
+            if buffer is not None:
+                roi = hailo.get_roi_from_buffer(buffer)
+                arrays.extract(roi)
+                masks = None
+                if self.with_masks:
+                    masks = [np.asarray(mask.get_data()).reshape(mask.get_height(), mask.get_width()) > self.mask_threshold
+                             if mask is not None else None for mask in arrays.masks]
+                self.add_frame(arrays, buffer.pts, get_stream_id(roi), masks)
+            return Gst.PadProbeReturn.OK
+
+        identity.get_static_pad('src').add_probe(Gst.PadProbeType.BUFFER, probe)
+        return self
+
+    def add_frame(self, detections, pts, stream_id='', masks=None):
+        """
+        Adds the detections of a frame to the current batch. Never blocks on the writer.
+
+        Args:
+            detections (DetectionArrays): The detections, or any object with the same array attributes and labels.
+            pts (int): The buffer PTS in nanoseconds, -1 (or Gst.CLOCK_TIME_NONE) if unknown.
+            stream_id (str, optional): The stream of the frame. Defaults to ''.
+            masks (list, optional): One 2D bool array (or None) per detection, with with_masks. Defaults to None.
+        """
+        count = len(detections.scores)
+        with self.lock:
+            batch = self._batch
+            if not batch['frame']:
+                self._batch_start = time.monotonic()
+            batch['frame'].append(self.frames)
+            self.frames += 1
+            batch['pts'].append(pts if 0 <= pts < 2 ** 63 else -1)
+            batch['stream'].append(self._index(self._stream_index, self.streams, stream_id))
+            batch['counts'].append(count)
+            if count:
+                batch['boxes'].append(detections.boxes.copy())
+                batch['scores'].append(detections.scores.copy())
+                batch['class_ids'].append(detections.class_ids.copy())
+                batch['track_ids'].append(detections.track_ids.copy())
+                batch['labels'].append(np.array([self._index(self._label_index, self.labels, label) for label in detections.labels], dtype=np.uint16))
+                if self.num_keypoints:
+                    keypoints = detections.keypoints
+                    batch['keypoints'].append(keypoints.copy() if keypoints is not None else np.zeros((count, self.num_keypoints, 3), dtype=np.float32))
+                if self.with_masks:
+                    batch['masks'].append(list(masks) if masks is not None else [None] * count)
+            if len(batch['frame']) >= self.chunk_frames or time.monotonic() - self._batch_start >= self.chunk_seconds:
+                self._flush()
+
+    def _flush(self):
+        batch = self._batch
+        if not batch['frame']:
+            return
+        self._batch = self._new_batch()
+        try:
+            self._queue.put_nowait((batch, list(self.streams), list(self.labels)))
+        except queue.Full:
+            self.dropped_frames += len(batch['frame'])
+
+    def flush(self):
+        """Hands the current batch to the writer."""
+        with self.lock:
+            self._flush()
+
+    def _run(self):
+        file = None
+        file_opened = 0.0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch, streams, labels = item
+            start = time.perf_counter()
+            offset = None
+            try:
+                if file is None or file.tell() >= self.rotate_bytes or \
+                        (self.rotate_seconds and time.monotonic() - file_opened >= self.rotate_seconds):
+                    if file is not None:
+                        file.close()
+                    os.makedirs(self.directory, exist_ok=True)
+                    path = os.path.join(self.directory, f"metadata_{time.strftime('%Y%m%d_%H%M%S')}_{len(self.files):04d}{FILE_EXTENSION}")
+                    file = open(path, 'wb')
+                    file_opened = time.monotonic()
+                    self.files.append(path)
+                offset = file.tell()
+                for part in serialize_chunk(batch, streams, labels, self.num_keypoints, self.with_masks, offset):
+                    file.write(part)
+                file.flush()
+            except OSError as e:
+                print(f"Metadata export: chunk not written: {e}", file=sys.stderr)
+                with self.lock:
+                    self.dropped_frames += len(batch['frame'])
+                if offset is not None:
+                    file = self._remove_partial_chunk(file, offset)
+                continue
+            self.write_seconds += time.perf_counter() - start
+            self.written_frames += len(batch['frame'])
+            self.bytes += file.tell() - offset
+            self.chunks += 1
+        if file is not None:
+            file.close()
+
+    def _remove_partial_chunk(self, file, offset):
+        """
+        Cuts the file back to offset after a failed write, so the next chunk does not follow a partial one.
+        Returns the file, or None (the next chunk starts a new file) if it could not be cut back in place.
+        """
+        try:
+            # Seeking flushes what is still buffered first
+            file.seek(offset)
+            file.truncate()
+            return file
+        except OSError:
+            pass
+        try:
+            file.close()
+        except OSError:
+            # The file is closed even when the final flush fails
+            pass
+        try:
+            os.truncate(self.files[-1], offset)
+        except OSError as e:
+            print(f"Metadata export: {self.files[-1]} ends with a partial chunk: {e}", file=sys.stderr)
+        return None
+
+    def close(self, timeout=10):
+        """Writes the current batch and waits for the writer."""
+        self.flush()
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'written_frames': self.written_frames,
+            'dropped_frames': self.dropped_frames,
+            'chunks': self.chunks,
+            'files': len(self.files),
+            'bytes': self.bytes,
+            'frames_per_second': self.written_frames / self.write_seconds if self.write_seconds else 0.0,
+        }
+
+    def print_stats(self, file=sys.stdout):
+        stats = self.get_stats()
+        print(f"Metadata export: {stats['written_frames']}/{stats['frames']} frames in {stats['chunks']} chunks, "
+              f"{stats['files']} files, {stats['bytes'] / (1024 * 1024):.1f} MB, "
+              f"writer at {stats['frames_per_second']:.0f} frames/s, {stats['dropped_frames']} frames dropped", file=file)
+        return True
+
+
+class MetadataChunk:
+    """
+    A chunk of a .hmeta file. The columns are read only numpy views of the mapped file.
+
+    Attributes:
+        frames (int): Frames in the chunk.
+        detections (int): Detections in the chunk.
+        streams (list): The stream ids the 'stream' column indexes.
+        labels (list): The labels the 'labels' column indexes.
+        columns (dict): The columns by name, see the top of metadata_export.py.
+        size (int): The chunk size in bytes.
+    """
+    def __init__(self, buffer, offset):
+        magic, directory_length, data_length = CHUNK_HEADER.unpack_from(buffer, offset)
+        if magic != CHUNK_MAGIC:
+            raise ValueError(f"No metadata chunk at offset {offset}")
+        data_offset = offset + CHUNK_HEADER.size + directory_length
+        self.size = CHUNK_HEADER.size + directory_length + data_length
+        if offset + self.size > len(buffer):
+            raise EOFError(f"Truncated metadata chunk at offset {offset}")
+        directory = json.loads(bytes(buffer[offset + CHUNK_HEADER.size:data_offset]))
+        self.frames = directory['frames']
+        self.detections = directory['detections']
+        self.streams = directory['streams']
+        self.labels = directory['labels']
+        self.columns = {}
+        for name, (dtype, shape, column_offset) in directory['columns'].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            self.columns[name] = np.frombuffer(buffer, dtype, count, data_offset + column_offset).reshape(shape)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def frame_detections(self, index):
+        """Returns the slice of the detection columns holding the detections of frame index (in the chunk)."""
+        offsets = self.columns['detection_offsets']
+        return slice(int(offsets[index]), int(offsets[index + 1]))
+
+    def get_mask(self, detection):
+        """Returns the bool mask of a detection (in the chunk), relative to its box, None without mask."""
+        height, width = self.columns['mask_shapes'][detection]
+        if not height or not width:
+            return None
+        offsets = self.columns['mask_offsets']
+        return decode_rle(self.columns['mask_runs'][offsets[detection]:offsets[detection + 1]], int(height), int(width))
+
+
+class MetadataReader:
+    """
+    Memory-maps .hmeta files for offline analysis. A chunk cut by a crash at the end of a file is skipped.
+
+    Args:
+        path (str or list): A .hmeta file, a directory of them (read in name order) or a list of files.
+
+    Attributes:
+        chunks (list): The MetadataChunk of all the files, in order.
+    """
+    def __init__(self, path):
+        if isinstance(path, (list, tuple)):
+            paths = list(path)
+        elif os.path.isdir(path):
+            paths = sorted(glob.glob(os.path.join(path, f'*{FILE_EXTENSION}')))
+        else:
+            paths = [path]
+        self.paths = paths
+        self.chunks = []
+        self._maps = []
+        for file_path in paths:
+            with open(file_path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    continue
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(buffer)
+            offset = 0
+            while offset + CHUNK_HEADER.size <= len(buffer):
+                try:
+                    chunk = MetadataChunk(buffer, offset)
+                except EOFError:
+                    break
+                self.chunks.append(chunk)
+                offset += chunk.size
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def num_frames(self):
+        return sum(chunk.frames for chunk in self.chunks)
+
+    @property
+    def num_detections(self):
+        return sum(chunk.detections for chunk in self.chunks)
+
+    def column(self, name, per_detection=False, decode=False):
+        """
+        Returns a column of all the chunks. A single chunk returns its view, several chunks a concatenated copy.
+
+        Args:
+            name (str): The column name. detection_offsets, mask_offsets and mask_runs only make sense per chunk.
+            per_detection (bool, optional): Repeat a per frame column (frame, pts, stream) for each detection of
+                the frame, to line it up with the detection columns. Defaults to False.
+            decode (bool, optional): Return the strings of the 'labels' and 'stream' columns. Defaults to False.
+
+        Returns:
+            np.ndarray: The column.
+        """
+        parts = []
+        for chunk in self.chunks:
+            column = chunk.columns[name]
+            if per_detection:
+                column = np.repeat(column, np.diff(chunk.columns['detection_offsets']))
+            if decode:
+                values = chunk.labels if name == 'labels' else chunk.streams
+                column = np.asarray(values, dtype=object)[column]
+            parts.append(column)
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            raise ValueError("No metadata chunks")
+        return np.concatenate(parts)
+
+    def close(self):
+        self.chunks = []
+        for buffer in self._maps:
+            try:
+                buffer.close()
+            except BufferError:
+                # Column views are still referenced, the map is released with them
+                pass
+        self._maps = []
@@ -0,0 +1,111 @@
+import ctypes
+import sys
+import time
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from hailo_apps_infra.gstreamer_helper_pipelines import MOTION_GATE_SO
+
+# -----------------------------------------------------------------------------------------------
+# Motion gate
+# -----------------------------------------------------------------------------------------------
+# With INFERENCE_PIPELINE_WRAPPER(motion_gate=True) the hailocropper of the wrapper runs create_crops_motion of
+# libmotion_gate.so (cpp/motion_gate.cpp): only frames differing from the last inferred frame of their stream,
+# plus a keep-alive frame, go to hailonet. MotionGate sets its threshold and reads its per stream counters
+# through ctypes, the library is the one hailocropper loaded (dlopen returns the loaded instance).
+# The time saved is estimated from the mean time frames spend inside the hailonet element (queueing, transfer
+# and inference), the accelerator busy time is not measured.
+
+
+class MotionGate:
+    """
+    Settings and counters of the motion gate.
+
+    Args:
+        threshold (float, optional): Mean absolute gray level difference (0-255) to the last inferred frame above
+            which a frame is inferred. Defaults to 2.0.
+        keepalive_frames (int, optional): Infer at least one frame out of keepalive_frames. Defaults to 30.
+        gate_width (int, optional): Width the frames are scaled to before the comparison. Defaults to 64.
+        so_path (str, optional): The motion gate library. Defaults to MOTION_GATE_SO.
+    """
+    def __init__(self, threshold=2.0, keepalive_frames=30, gate_width=64, so_path=MOTION_GATE_SO):
+        self.threshold = threshold
+        self.keepalive_frames = keepalive_frames
+        self.gate_width = gate_width
+        self.hailonet_time = 0.0
+        self.hailonet_frames = 0
+        self._entered = {}
+        try:
+            self.library = ctypes.CDLL(so_path)
+        except OSError as e:
+            print(f"Motion gate library not loaded, run compile_postprocess.sh: {e}")
+            self.library = None
+            return
+        self.library.motion_gate_configure.argtypes = [ctypes.c_float, ctypes.c_uint, ctypes.c_uint]
+        self.library.motion_gate_stream_count.restype = ctypes.c_uint
+        self.library.motion_gate_stream_stats.argtypes = [
+            ctypes.c_uint, ctypes.c_char_p, ctypes.c_uint,
+            ctypes.POINTER(ctypes.c_ulonglong), ctypes.POINTER(ctypes.c_ulonglong),
+        ]
+        self.library.motion_gate_configure(threshold, keepalive_frames, gate_width)
+
+    def attach(self, pipeline, hailonet_name='inference_hailonet'):
+        """Measures the time frames spend in the hailonet element, used for the time saved estimate."""
+        hailonet = pipeline.get_by_name(hailonet_name)
+        if hailonet is None:
+            print(f"Motion gate: {hailonet_name} not found, the time saved is not estimated")
+            return self
+        hailonet.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self._on_hailonet_input)
+        hailonet.get_static_pad('src').add_probe(Gst.PadProbeType.BUFFER, self._on_hailonet_output)
+        return self
+
+    @staticmethod
+    def _frame_key(buffer):
+        # The streams of a multi source pipeline can have the same PTS
+        import hailo
+        return hailo.get_roi_from_buffer(buffer).get_stream_id(), buffer.pts
+
+    def _on_hailonet_input(self, pad, info):
+        # Buffers not matched on the output (e.g. dropped) must not accumulate
+        if len(self._entered) > 1000:
+            self._entered.clear()
+        self._entered[self._frame_key(info.get_buffer())] = time.monotonic()
+        return Gst.PadProbeReturn.OK
+
+    def _on_hailonet_output(self, pad, info):
+        entered = self._entered.pop(self._frame_key(info.get_buffer()), None)
+        if entered is not None:
+            self.hailonet_time += time.monotonic() - entered
+            self.hailonet_frames += 1
+        return Gst.PadProbeReturn.OK
+
+    def get_stats(self):
+        """
+        Returns:
+            list: One dict per stream: {stream_id, frames, gated, gated_fraction, saved_ms}. saved_ms is the time the
+                gated frames would have spent inside hailonet, None until a frame went through hailonet.
+        """
+        if self.library is None:
+            return []
+        mean_hailonet_ms = self.hailonet_time * 1000 / self.hailonet_frames if self.hailonet_frames else None
+        stats = []
+        stream_id = ctypes.create_string_buffer(256)
+        frames, gated = ctypes.c_ulonglong(), ctypes.c_ulonglong()
+        for index in range(self.library.motion_gate_stream_count()):
+            if self.library.motion_gate_stream_stats(index, stream_id, len(stream_id), ctypes.byref(frames), ctypes.byref(gated)) != 0:
+                continue
+            stats.append({
+                'stream_id': stream_id.value.decode(errors='replace') or f'stream {index}',
+                'frames': frames.value,
+                'gated': gated.value,
+                'gated_fraction': gated.value / frames.value if frames.value else 0.0,
+                'saved_ms': gated.value * mean_hailonet_ms if mean_hailonet_ms is not None else None,
+            })
+        return stats
+
+    def print_stats(self, file=sys.stdout):
+        for stream in self.get_stats():
+            saved = f"{stream['saved_ms'] / 1000:.1f} s" if stream['saved_ms'] is not None else "unknown"
+            print(f"Motion gate {stream['stream_id']}: {stream['gated']}/{stream['frames']} frames gated "
+                  f"({stream['gated_fraction']:.0%}), time inside hailonet saved {saved} (not accelerator time)", file=file)
+        return True
@@ -0,0 +1,280 @@
+"""
+Launches several apps sharing one Hailo device, from a JSON config.
+
+Every app runs in its own process with the HailoRT multi-process service, its own scheduler priority / timeout
+and its own CPU cores. The launcher restarts apps which exit with an error and prints a rollup of their
+FPS and latency.
+
+Example config:
+{
+    "report_interval": 10,
+    "max_restarts": 3,
+    "apps": [
+        {"name": "door", "module": "hailo_apps_infra.detection_pipeline",
+         "args": ["--input", "/dev/video0", "--headless"], "scheduler_priority": 20, "cores": [0, 1]},
+        {"name": "floor", "module": "hailo_apps_infra.pose_estimation_pipeline",
+         "args": ["--input", "/dev/video2", "--headless"], "scheduler_priority": 10, "scheduler_timeout_ms": 200}
+    ]
+}
+Apps without "cores" share the cores not pinned by other apps. "script" (a path) can be used instead of "module".
+
+Usage:
+    hailo-multi-app config.json --report report.json
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+FPS_PATTERN = re.compile(r'^(?:(\S+) )?FPS: ([\d.]+), Droprate')
+
+
+def parse_fps_line(line):
+    """
+    Parses an FPS line printed by GStreamerApp with --show-fps.
+
+    Returns:
+        tuple: (display name or None for single stream apps, fps), or None if the line is not an FPS line.
+    """
+    match = FPS_PATTERN.match(line.strip())
+    if match is None:
+        return None
+    return match.group(1), float(match.group(2))
+
+
+def assign_cores(app_configs, available_cores=None):
+    """
+    Returns the list of cores of each app: the configured "cores", or an even share of the cores not pinned
+    by other apps.
+    """
+    available = sorted(available_cores if available_cores is not None else os.sched_getaffinity(0))
+    pinned = {core for config in app_configs for core in config.get('cores', [])}
+    free = [core for core in available if core not in pinned] or available
+    unpinned = [index for index, config in enumerate(app_configs) if 'cores' not in config]
+    assignment = []
+    for index, config in enumerate(app_configs):
+        if 'cores' in config:
+            assignment.append(list(config['cores']))
+        else:
+            share = unpinned.index(index)
+            cores = free[share::len(unpinned)] if len(free) >= len(unpinned) else [free[share % len(free)]]
+            assignment.append(cores)
+    return assignment
+
+
+class ManagedApp:
+    """
+    An app process started and supervised by the launcher.
+
+    Args:
+        config (dict): The app config, see the module documentation.
+        cores (list): The CPU cores to pin the process to.
+        report_interval (int): Seconds between the app latency summaries.
+        verbose (bool): Forward the app output, prefixed with the app name.
+    """
+    def __init__(self, config, cores, report_interval=10, verbose=False):
+        self.name = config['name']
+        self.config = config
+        self.cores = cores
+        self.report_interval = report_interval
+        self.verbose = verbose
+        self.process = None
+        self.restarts = 0
+        self.exit_code = None
+        self.stream_fps = {}
+        fd, self.latency_path = tempfile.mkstemp(prefix=f'hailo_{self.name}_', suffix='_latency.json')
+        os.close(fd)
+
+    def get_command(self):
+        config = self.config
+        target = ['-m', config['module']] if 'module' in config else [config['script']]
+        command = [sys.executable, '-u', *target, *config.get('args', [])]
+        command += ['--multi-process-service', '--show-fps']
+        if 'scheduler_priority' in config:
+            command += ['--scheduler-priority', str(config['scheduler_priority'])]
+        if 'scheduler_timeout_ms' in config:
+            command += ['--scheduler-timeout-ms', str(config['scheduler_timeout_ms'])]
+        command += [
+            '--trace-latency',
+            '--trace-latency-interval', str(self.report_interval),
+            '--trace-latency-export', self.latency_path,
+        ]
+        return command
+
+    def _pin_cores(self):
+        # Runs in the child before exec, every thread the app starts inherits the mask
+        os.sched_setaffinity(0, self.cores)
+
+    def _popen(self, preexec_fn=None):
+        return subprocess.Popen(
+            self.get_command(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            preexec_fn=preexec_fn,
+        )
+
+    def start(self):
+        self.stream_fps = {}
+        self.exit_code = None
+        try:
+            self.process = self._popen(self._pin_cores)
+        except subprocess.SubprocessError as e:
+            # The affinity failed in the child (e.g. cores outside the cgroup), run the app unpinned
+            print(f"[{self.name}] Could not pin to cores {self.cores}: {e}")
+            self.process = self._popen()
+        threading.Thread(target=self._read_output, args=(self.process,), daemon=True).start()
+
+    def _read_output(self, process):
+        for line in process.stdout:
+            result = parse_fps_line(line)
+            if result is not None:
+                display, fps = result
+                self.stream_fps[display or 'hailo_display'] = fps
+            if self.verbose:
+                print(f"[{self.name}] {line}", end='')
+
+    def poll(self):
+        """Returns the exit code of the process, None while it is running."""
+        if self.process is not None and self.exit_code is None:
+            self.exit_code = self.process.poll()
+        return self.exit_code
+
+    def stop(self, timeout=5.0):
+        if self.process is None or self.process.poll() is not None:
+            return
+        # The apps shut down their pipeline on SIGINT
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def get_latency(self):
+        try:
+            with open(self.latency_path) as f:
+                return json.load(f).get('end-to-end')
+        except (OSError, ValueError):
+            return None
+
+    def get_report(self):
+        return {
+            'pid': self.process.pid if self.process is not None else None,
+            'running': self.poll() is None,
+            'restarts': self.restarts,
+            'cores': self.cores,
+            'fps': round(sum(self.stream_fps.values()), 2),
+            'latency': self.get_latency(),
+        }
+
+    def cleanup(self):
+        try:
+            os.remove(self.latency_path)
+        except OSError:
+            pass
+
+
+class MultiAppLauncher:
+    """
+    Starts the apps of a config, restarts the ones exiting with an error (up to max_restarts times) and
+    reports their FPS and latency.
+
+    Args:
+        config (dict): The launcher config, see the module documentation.
+        verbose (bool, optional): Forward the app output. Defaults to False.
+    """
+    def __init__(self, config, verbose=False):
+        self.report_interval = config.get('report_interval', 10)
+        self.max_restarts = config.get('max_restarts', 3)
+        self.restart_delay = config.get('restart_delay', 2.0)
+        app_configs = config['apps']
+        cores = assign_cores(app_configs)
+        self.apps = [ManagedApp(app_config, app_cores, self.report_interval, verbose) for app_config, app_cores in zip(app_configs, cores)]
+        self.running = False
+
+    def get_report(self):
+        apps = {app.name: app.get_report() for app in self.apps}
+        return {
+            'apps': apps,
+            'total_fps': round(sum(app['fps'] for app in apps.values()), 2),
+        }
+
+    def print_report(self):
+        report = self.get_report()
+        print(f"{'app':<20} {'pid':>8} {'status':<10} {'restarts':>8} {'fps':>8} {'p50 [ms]':>9} {'p95 [ms]':>9}  cores")
+        for name, app in report['apps'].items():
+            latency = app['latency'] or {'p50_ms': 0.0, 'p95_ms': 0.0}
+            status = 'running' if app['running'] else 'exited'
+            print(f"{name[:20]:<20} {app['pid'] or '-':>8} {status:<10} {app['restarts']:>8} {app['fps']:>8.1f} {latency['p50_ms']:>9.1f} {latency['p95_ms']:>9.1f}  {app['cores']}")
+        print(f"Total FPS: {report['total_fps']:.1f}")
+
+    def stop(self, signum=None, frame=None):
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        for app in self.apps:
+            print(f"Starting {app.name} on cores {app.cores}: {' '.join(app.get_command())}")
+            app.start()
+        self.running = True
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while self.running:
+                time.sleep(0.5)
+                for app in self.apps:
+                    exit_code = app.poll()
+                    if exit_code is None or exit_code == 0:
+                        continue
+                    if app.restarts < self.max_restarts:
+                        print(f"{app.name} exited with code {exit_code}, restarting ({app.restarts + 1}/{self.max_restarts})")
+                        time.sleep(self.restart_delay)
+                        app.restarts += 1
+                        app.start()
+                finished = [app.poll() == 0 or (app.poll() is not None and app.restarts >= self.max_restarts) for app in self.apps]
+                if all(finished):
+                    print("All apps exited.")
+                    break
+                if time.monotonic() >= next_report:
+                    self.print_report()
+                    next_report += self.report_interval
+        finally:
+            for app in self.apps:
+                app.stop()
+            self.print_report()
+        return self.get_report()
+
+    def cleanup(self):
+        for app in self.apps:
+            app.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several Hailo apps sharing one device")
+    parser.add_argument("config", help="Path to the launcher JSON config")
+    parser.add_argument("--report", default=None, help="Write the final report as JSON to this path")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Forward the output of the apps")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    launcher = MultiAppLauncher(config, verbose=args.verbose)
+    try:
+        report = launcher.run()
+    finally:
+        launcher.cleanup()
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
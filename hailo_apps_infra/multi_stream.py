@@ -0,0 +1,97 @@
+import sys
+import time
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# -----------------------------------------------------------------------------------------------
+# Multi stream counters
+# -----------------------------------------------------------------------------------------------
+# Per stream frame counters for pipelines built with MULTI_SOURCE_PIPELINE and STREAM_ROUTER_PIPELINE:
+# - input: frames entering the roundrobin queue of the stream.
+# - dropped: frames dropped by the (leaky) roundrobin queue of the stream, counted from its overrun signal.
+# - output: frames reaching the display (sink) of the stream.
+
+
+class StreamCounters:
+    __slots__ = ('input', 'output', 'dropped', 'last_output', 'last_time')
+
+    def __init__(self):
+        self.input = 0
+        self.output = 0
+        self.dropped = 0
+        self.last_output = 0
+        self.last_time = time.monotonic()
+
+
+class MultiStreamMonitor:
+    """
+    Counts the frames of each stream of a multi source pipeline.
+
+    Args:
+        pipeline (Gst.Pipeline): The pipeline.
+        num_streams (int): The number of streams.
+        source_name (str, optional): The name passed to MULTI_SOURCE_PIPELINE. Defaults to 'source'.
+        display_name (str, optional): The display name prefix, stream i ends in the fpsdisplaysink '{display_name}_{i}'.
+            Defaults to 'hailo_display'.
+    """
+    def __init__(self, pipeline, num_streams, source_name='source', display_name='hailo_display'):
+        self.pipeline = pipeline
+        self.num_streams = num_streams
+        self.source_name = source_name
+        self.display_name = display_name
+        self.counters = [StreamCounters() for _ in range(num_streams)]
+
+    def attach(self):
+        for index in range(self.num_streams):
+            queue = self.pipeline.get_by_name(f'{self.source_name}_{index}_roundrobin_q')
+            if queue is not None:
+                queue.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self._on_input, index)
+                # A leaky queue drops a buffer on every overrun, a non leaky one blocks upstream instead
+                if int(queue.get_property('leaky')) != 0:
+                    queue.connect('overrun', self._on_overrun, index)
+            sink = self.pipeline.get_by_name(f'{self.display_name}_{index}')
+            if sink is not None:
+                sink.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self._on_output, index)
+        return self
+
+    def _on_input(self, pad, info, index):
+        self.counters[index].input += 1
+        return Gst.PadProbeReturn.OK
+
+    def _on_output(self, pad, info, index):
+        self.counters[index].output += 1
+        return Gst.PadProbeReturn.OK
+
+    def _on_overrun(self, queue, index):
+        self.counters[index].dropped += 1
+
+    def get_stats(self):
+        """
+        Returns the counters of each stream, the FPS is measured since the previous call.
+
+        Returns:
+            list: One dict per stream: {stream_id, input, output, dropped, fps}
+        """
+        now = time.monotonic()
+        stats = []
+        for index, counters in enumerate(self.counters):
+            output = counters.output
+            elapsed = now - counters.last_time
+            fps = (output - counters.last_output) / elapsed if elapsed > 0 else 0.0
+            counters.last_output, counters.last_time = output, now
+            stats.append({
+                'stream_id': f'sink_{index}',
+                'input': counters.input,
+                'output': output,
+                'dropped': counters.dropped,
+                'fps': round(fps, 2),
+            })
+        return stats
+
+    def print_stats(self, file=sys.stdout):
+        stats = self.get_stats()
+        for stream in stats:
+            print(f"Stream {stream['stream_id']}: FPS: {stream['fps']:.2f}, input={stream['input']}, output={stream['output']}, dropped={stream['dropped']}", file=file)
+        print(f"Total FPS: {sum(stream['fps'] for stream in stats):.2f}", file=file)
+        return True
@@ -0,0 +1,246 @@
+import threading
+import time
+import numpy as np
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+from hailo_apps_infra.gstreamer_helper_pipelines import get_rpi_camera_format
+
+# -----------------------------------------------------------------------------------------------
+# Picamera2 appsrc source
+# -----------------------------------------------------------------------------------------------
+# Feeds the frames of a Picamera2 stream to the app_source appsrc of SOURCE_PIPELINE:
+# - The stream is configured in the pixel order the pipeline wants, so no cvtColor is needed. libcamera names
+#   the formats by their little endian word order: 'BGR888' is R, G, B in memory, which GStreamer calls RGB.
+# - The frames are read through a MappedArray view of the camera buffer and copied once, straight into a
+#   buffer from a Gst.BufferPool. The pool buffers are recycled when downstream releases them, so there are no
+#   per-frame allocations. (Wrapping the camera buffer itself would need its libcamera request released from
+#   the GstBuffer destroy notify, which can't be expressed from Python.)
+# - The PTS come from the sensor timestamps, mapped to the pipeline running time at the first frame, so a
+#   camera which does not run at exactly the nominal frame rate keeps correct timestamps.
+# - Frames are only captured while the appsrc asks for data (need-data / enough-data), optionally paced by a
+#   target frame rate. The frames the camera delivers meanwhile are recycled by libcamera without being copied,
+#   so the capture work follows the pipeline throughput instead of being dropped by the leaky appsrc.
+# - For an NV12 pipeline the stream is YUV420 (I420): its planes are copied without their stride padding and the
+#   source videoconvert only interleaves the chroma planes.
+
+# Picamera2 format -> GStreamer format
+PICAMERA_FORMATS = {
+    'BGR888': 'RGB',
+    'RGB888': 'BGR',
+    'XBGR8888': 'RGBx',
+    'XRGB8888': 'BGRx',
+    'YUV420': 'I420',
+}
+# Bytes per pixel of the packed GStreamer formats above
+FORMAT_CHANNELS = {'RGB': 3, 'BGR': 3, 'RGBx': 4, 'BGRx': 4}
+
+
+def get_picamera_format(video_format):
+    """Returns the Picamera2 format delivering video_format (see get_rpi_camera_format), 'BGR888' (RGB) if there is none."""
+    camera_format = get_rpi_camera_format(video_format)
+    for picamera_format, gst_format in PICAMERA_FORMATS.items():
+        if gst_format == camera_format:
+            return picamera_format
+    return 'BGR888'
+
+
+def _mapped_array(request, stream):
+    from picamera2 import MappedArray  # Available only on Pi OS
+    return MappedArray(request, stream)
+
+
+class PicameraSource:
+    """
+    Pushes the frames of a configured Picamera2 stream to an appsrc.
+
+    Args:
+        appsrc (Gst.Element): The appsrc to push to, its caps are set from the stream configuration.
+        camera (Picamera2): A configured camera, started by the caller.
+        config (dict): The camera configuration.
+        stream (str, optional): The stream to push. Defaults to 'lores'.
+        frame_rate (float, optional): The nominal frame rate, used for the caps and when the sensor timestamps
+            are missing. Defaults to 30.
+        target_fps (float, optional): Push at most this many frames per second, the caps framerate is limited
+            to it as well. Defaults to None (no limit).
+        mapped_array (callable, optional): (request, stream) -> context manager with an .array view of the
+            stream buffer. Defaults to picamera2.MappedArray.
+        stop_event (threading.Event, optional): Stops run() when set, e.g. by the app at shutdown. Defaults to
+            a new event, set by stop().
+
+    Attributes:
+        frames (int): Frames pushed.
+        captured (int): Frames captured from the camera.
+        dropped (int): Camera frames which were not pushed: skipped while the pipeline was full or by the
+            target_fps governor (counted from the sensor timestamp gaps), and frames leaked by a full appsrc.
+    """
+    def __init__(self, appsrc, camera, config, stream='lores', frame_rate=30, target_fps=None, mapped_array=None,
+                 stop_event=None):
+        self.appsrc = appsrc
+        self.camera = camera
+        self.stream = stream
+        self.frame_rate = frame_rate
+        self.target_fps = target_fps
+        self.mapped_array = mapped_array or _mapped_array
+        stream_config = config[stream]
+        if stream_config['format'] not in PICAMERA_FORMATS:
+            raise ValueError(f"Unsupported Picamera2 format {stream_config['format']}, use one of {list(PICAMERA_FORMATS)}")
+        self.format = PICAMERA_FORMATS[stream_config['format']]
+        self.width, self.height = stream_config['size']
+        if self.format == 'I420':
+            # Y plane followed by the quarter size U and V planes
+            self.shape = (self.height * 3 // 2, self.width)
+        else:
+            self.shape = (self.height, self.width, FORMAT_CHANNELS[self.format])
+        self.frame_size = int(np.prod(self.shape))
+        rate_num, rate_denom = Gst.util_double_to_fraction(min(frame_rate, target_fps) if target_fps else frame_rate)
+        self.caps = Gst.Caps.from_string(
+            f"video/x-raw, format={self.format}, width={self.width}, height={self.height}, "
+            f"framerate={rate_num}/{rate_denom}, pixel-aspect-ratio=1/1"
+        )
+        appsrc.set_property("is-live", True)
+        appsrc.set_property("format", Gst.Format.TIME)
+        appsrc.set_property("caps", self.caps)
+        appsrc.set_property("emit-signals", True)
+        self.max_buffers = appsrc.get_property("max-buffers")
+        self.pool = self._create_pool()
+        self.timestamp_offset = None
+        self.last_sensor_timestamp = None
+        self.next_push_time = None
+        self.frames = 0
+        self.captured = 0
+        self.dropped = 0
+        # Set while the appsrc wants data
+        self.need_data = threading.Event()
+        self.need_data.set()
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        appsrc.connect("need-data", lambda appsrc, length: self.need_data.set())
+        appsrc.connect("enough-data", lambda appsrc: self.need_data.clear())
+
+    def _create_pool(self):
+        pool = Gst.BufferPool.new()
+        config = pool.get_config()
+        # No maximum: the pool grows to the number of buffers in flight instead of blocking the camera
+        Gst.BufferPool.config_set_params(config, self.caps, self.frame_size, 4, 0)
+        pool.set_config(config)
+        pool.set_active(True)
+        return pool
+
+    def get_timestamps(self, metadata):
+        """Returns the (pts, duration) of a frame from its request metadata."""
+        frame_duration = metadata.get('FrameDuration')
+        duration = frame_duration * 1000 if frame_duration else Gst.util_uint64_scale_int(1, Gst.SECOND, self.frame_rate)
+        sensor_timestamp = metadata.get('SensorTimestamp')
+        if sensor_timestamp is None:
+            return self.frames * duration, duration
+        if self.last_sensor_timestamp is not None:
+            # Frames the camera delivered since the previous capture
+            self.dropped += max(0, round((sensor_timestamp - self.last_sensor_timestamp) / duration) - 1)
+        self.last_sensor_timestamp = sensor_timestamp
+        if self.timestamp_offset is None:
+            clock = self.appsrc.get_clock()
+            running_time = clock.get_time() - self.appsrc.get_base_time() if clock is not None else 0
+            self.timestamp_offset = sensor_timestamp - running_time
+        return max(0, sensor_timestamp - self.timestamp_offset), duration
+
+    def get_planes(self, array):
+        """
+        Returns the planes of a stream array without the stride padding. A YUV420 array is (height * 3 / 2, stride):
+        the Y rows, then the U and V planes whose rows are stride / 2 bytes long.
+        """
+        if self.format != 'I420':
+            return [array[:self.height, :self.width]]
+        stride = array.shape[1]
+        chroma = array[self.height:self.height * 3 // 2].reshape(-1)
+        chroma_size = self.height // 2 * stride // 2
+        return [array[:self.height, :self.width]] + [
+            chroma[index * chroma_size:(index + 1) * chroma_size].reshape(self.height // 2, stride // 2)[:, :self.width // 2]
+            for index in range(2)
+        ]
+
+    def make_buffer(self, array):
+        """Copies a frame into a buffer from the pool."""
+        planes = self.get_planes(array)
+        _, buffer = self.pool.acquire_buffer(None)
+        success, info = buffer.map(Gst.MapFlags.WRITE)
+        if success:
+            try:
+                data = np.ndarray(self.frame_size, dtype=np.uint8, buffer=info.data)
+                offset = 0
+                for plane in planes:
+                    np.copyto(data[offset:offset + plane.size].reshape(plane.shape), plane)
+                    offset += plane.size
+                return buffer
+            except (TypeError, ValueError):
+                # gst-python without writable mappings
+                pass
+            finally:
+                buffer.unmap(info)
+        return Gst.Buffer.new_wrapped(b''.join(np.ascontiguousarray(plane).tobytes() for plane in planes))
+
+    def push_frame(self):
+        """Captures a frame and pushes it. Returns the Gst.FlowReturn of the push."""
+        request = self.camera.capture_request()
+        self.captured += 1
+        try:
+            metadata = request.get_metadata()
+            with self.mapped_array(request, self.stream) as mapped:
+                buffer = self.make_buffer(mapped.array)
+        finally:
+            # The camera buffer goes back to libcamera as soon as it is copied
+            request.release()
+        buffer.pts, buffer.duration = self.get_timestamps(metadata)
+        # A full leaky appsrc drops its oldest buffer to take this one
+        if self.appsrc.get_property("current-level-buffers") >= self.max_buffers > 0:
+            self.dropped += 1
+        ret = self.appsrc.emit('push-buffer', buffer)
+        if ret == Gst.FlowReturn.OK:
+            self.frames += 1
+        return ret
+
+    def wait_for_slot(self, timeout=0.1):
+        """
+        Waits until the appsrc wants data and the target_fps governor allows the next frame.
+
+        Returns:
+            bool: True if a frame should be captured, False on timeout or stop.
+        """
+        if not self.need_data.wait(timeout) or self.stop_event.is_set():
+            return False
+        if self.target_fps:
+            now = time.monotonic()
+            if self.next_push_time is not None and now < self.next_push_time:
+                if self.stop_event.wait(min(timeout, self.next_push_time - now)) or time.monotonic() < self.next_push_time:
+                    return False
+            # Keep the schedule, unless it fell behind by more than a frame
+            interval = 1 / self.target_fps
+            now = time.monotonic()
+            if self.next_push_time is None or now - self.next_push_time > interval:
+                self.next_push_time = now
+            self.next_push_time += interval
+        return True
+
+    def run(self):
+        """Pushes frames until stop() is called or a push fails (pipeline stopped or flushing)."""
+        while not self.stop_event.is_set():
+            if not self.wait_for_slot():
+                continue
+            ret = self.push_frame()
+            if ret != Gst.FlowReturn.OK:
+                print("Failed to push buffer:", ret)
+                break
+
+    def stop(self):
+        """Stops run(), can be called from another thread."""
+        self.stop_event.set()
+
+    def close(self):
+        self.stop()
+        self.pool.set_active(False)
+
+    def get_stats(self):
+        return {'captured': self.captured, 'pushed': self.frames, 'dropped': self.dropped}
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print("Picamera2 source: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
@@ -0,0 +1,465 @@
+"""
+Hardware free pipeline benchmark.
+
+Builds the detection topology from the real pipeline helpers (SOURCE_PIPELINE, INFERENCE_PIPELINE_WRAPPER,
+INFERENCE_PIPELINE, TRACKER_PIPELINE, USER_CALLBACK_PIPELINE, DISPLAY_PIPELINE) with a videotestsrc source and a
+fakesink display, then replaces the Hailo elements with stand-ins:
+- hailonet, hailofilter: hailostandin, a Python element sleeping a configurable time per batch.
+- hailocropper: tee.
+- hailoaggregator: hailoaggregatorstandin, forwarding the bypass frame once the inference branch delivered it.
+- hailotracker, hailooverlay: identity.
+
+For every configuration (resolution, batch size, queue depth, n-threads) FPS, end to end latency and CPU usage
+are measured and optionally compared to a stored baseline. With --pipeline-modes legacy optimized, the pipeline
+is also built with the caps aware PipelineBuilder and the element count and CPU time per frame are compared.
+With --video-formats RGB NV12 the CPU time per frame of the RGB and NV12 pipelines is compared; add
+--decoded-format NV12 so the source frames need a conversion, as the frames of a video decoder do.
+
+Usage:
+    hailo-pipeline-benchmark --resolutions 1280x720 1920x1080 --batch-sizes 1 2 4 --output results.json
+    hailo-pipeline-benchmark --baseline results.json --tolerance 0.1
+    hailo-pipeline-benchmark --pipeline-modes legacy optimized
+    hailo-pipeline-benchmark --resolutions 1280x720 1920x1080 --video-formats RGB NV12 --decoded-format NV12 --live
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+import time
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstBase', '1.0')
+from gi.repository import Gst, GstBase, GObject
+from hailo_apps_infra.gstreamer_helper_pipelines import (
+    SOURCE_PIPELINE,
+    TRACKER_PIPELINE,
+    USER_CALLBACK_PIPELINE,
+)
+from hailo_apps_infra.latency_tracer import iterate_pads, measure_pipeline
+from hailo_apps_infra.pipeline_builder import Caps, PipelineBuilder, count_elements
+
+# -----------------------------------------------------------------------------------------------
+# Stand-in elements
+# -----------------------------------------------------------------------------------------------
+# The pad templates below are created at import time
+Gst.init(None)
+
+
+class HailoStandIn(Gst.Element):
+    """
+    Stand-in for hailonet / hailofilter: collects batch-size buffers, sleeps latency-ms and pushes them.
+    """
+    __gstmetadata__ = ('Hailo stand-in', 'Filter', 'Configurable latency stand-in for hailonet and hailofilter', 'hailo-apps-infra')
+    __gsttemplates__ = (
+        Gst.PadTemplate.new('sink', Gst.PadDirection.SINK, Gst.PadPresence.ALWAYS, Gst.Caps.new_any()),
+        Gst.PadTemplate.new('src', Gst.PadDirection.SRC, Gst.PadPresence.ALWAYS, Gst.Caps.new_any()),
+    )
+    __gproperties__ = {
+        'latency-ms': (float, 'Latency', 'Processing time of a batch in milliseconds', 0.0, 10000.0, 0.0, GObject.ParamFlags.READWRITE),
+        'batch-size': (int, 'Batch size', 'Number of buffers processed together', 1, 64, 1, GObject.ParamFlags.READWRITE),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.latency_ms = 0.0
+        self.batch_size = 1
+        self.pending = []
+        self.sinkpad = Gst.Pad.new_from_template(self.get_pad_template('sink'), 'sink')
+        self.sinkpad.set_chain_function_full(self.chain, None)
+        self.sinkpad.set_event_function_full(self.event, None)
+        self.add_pad(self.sinkpad)
+        self.srcpad = Gst.Pad.new_from_template(self.get_pad_template('src'), 'src')
+        self.add_pad(self.srcpad)
+
+    def do_get_property(self, prop):
+        if prop.name == 'latency-ms':
+            return self.latency_ms
+        if prop.name == 'batch-size':
+            return self.batch_size
+        raise AttributeError(f"Unknown property {prop.name}")
+
+    def do_set_property(self, prop, value):
+        if prop.name == 'latency-ms':
+            self.latency_ms = value
+        elif prop.name == 'batch-size':
+            self.batch_size = value
+        else:
+            raise AttributeError(f"Unknown property {prop.name}")
+
+    def _push_pending(self):
+        ret = Gst.FlowReturn.OK
+        pending, self.pending = self.pending, []
+        if pending and self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+        for buffer in pending:
+            ret = self.srcpad.push(buffer)
+            if ret != Gst.FlowReturn.OK:
+                break
+        return ret
+
+    def chain(self, pad, parent, buffer):
+        self.pending.append(buffer)
+        if len(self.pending) < self.batch_size:
+            return Gst.FlowReturn.OK
+        return self._push_pending()
+
+    def event(self, pad, parent, event):
+        if event.type == Gst.EventType.EOS:
+            self._push_pending()
+        elif event.type == Gst.EventType.FLUSH_STOP:
+            self.pending = []
+        return self.srcpad.push_event(event)
+
+
+class HailoAggregatorStandIn(GstBase.Aggregator):
+    """
+    Stand-in for hailoaggregator: waits for a buffer on every sink pad and forwards the one of sink_0 (the bypass frame).
+    """
+    __gstmetadata__ = ('Hailo aggregator stand-in', 'Aggregator', 'Forwards the bypass frame once all branches delivered', 'hailo-apps-infra')
+    __gsttemplates__ = (
+        Gst.PadTemplate.new_with_gtype('sink_%u', Gst.PadDirection.SINK, Gst.PadPresence.REQUEST, Gst.Caps.new_any(), GstBase.AggregatorPad.__gtype__),
+        Gst.PadTemplate.new_with_gtype('src', Gst.PadDirection.SRC, Gst.PadPresence.ALWAYS, Gst.Caps.new_any(), GstBase.AggregatorPad.__gtype__),
+    )
+
+    def _main_pad(self):
+        return self.get_static_pad('sink_0')
+
+    def do_update_src_caps(self, caps):
+        main_caps = self._main_pad().get_current_caps()
+        return Gst.FlowReturn.OK, main_caps if main_caps is not None else caps
+
+    def do_aggregate(self, timeout):
+        pads = iterate_pads(self.iterate_sink_pads())
+        if all(pad.is_eos() and not pad.has_buffer() for pad in pads):
+            return Gst.FlowReturn.EOS
+        if not all(pad.has_buffer() for pad in pads):
+            return Gst.FlowReturn.OK
+        buffers = {pad.get_name(): pad.pop_buffer() for pad in pads}
+        return self.finish_buffer(buffers['sink_0'])
+
+
+_registered = None
+
+
+def register_stand_in_elements():
+    """
+    Registers the Python stand-in elements. Python elements need the GStreamer Python bindings (gst-python);
+    returns False if they could not be registered, the benchmark then falls back to identity / input-selector.
+    """
+    global _registered
+    if _registered is None:
+        try:
+            Gst.Element.register(None, 'hailostandin', Gst.Rank.NONE, HailoStandIn)
+            Gst.Element.register(None, 'hailoaggregatorstandin', Gst.Rank.NONE, HailoAggregatorStandIn)
+            _registered = all(Gst.ElementFactory.make(name, None) is not None for name in ('hailostandin', 'hailoaggregatorstandin'))
+        except Exception as e:
+            print(f"Error registering the stand-in elements: {e}", file=sys.stderr)
+            _registered = False
+        if not _registered:
+            print("Python stand-in elements not available, using identity and input-selector.", file=sys.stderr)
+    return _registered
+
+# -----------------------------------------------------------------------------------------------
+# Pipeline construction
+# -----------------------------------------------------------------------------------------------
+
+
+class BenchmarkConfig:
+    """
+    A single benchmark configuration.
+
+    Args:
+        width, height (int): The source resolution.
+        batch_size (int, optional): hailonet batch size. Defaults to 1.
+        queue_depth (int, optional): max-size-buffers of the pipeline queues (bypass queues keep their size). Defaults to 3.
+        n_threads (int, optional): n-threads of videoscale / videoconvert, None keeps the helper defaults. Defaults to None.
+        inference_latency_ms (float, optional): Time the hailonet stand-in takes per batch. Defaults to 10.
+        postprocess_latency_ms (float, optional): Time the hailofilter stand-in takes per frame. Defaults to 1.
+        network_width, network_height (int, optional): The network input size. Defaults to 640x640.
+        live (bool, optional): Use a live 30 fps source instead of running as fast as possible. Defaults to False.
+        headless (bool, optional): Use the headless display path (no overlay, no conversion). Defaults to False.
+        optimize (bool, optional): Build the pipeline with PipelineBuilder(optimize=True). Defaults to False.
+        video_format (str, optional): The format of the frames between the source and the display. Defaults to 'RGB'.
+        decoded_format (str, optional): The format the videotestsrc delivers, converted to video_format by the source
+            videoconvert like decoded frames. Defaults to None (videotestsrc delivers video_format).
+    """
+    def __init__(self, width, height, batch_size=1, queue_depth=3, n_threads=None, inference_latency_ms=10.0,
+                 postprocess_latency_ms=1.0, network_width=640, network_height=640, live=False, headless=False,
+                 optimize=False, video_format='RGB', decoded_format=None):
+        self.width = width
+        self.height = height
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.n_threads = n_threads
+        self.inference_latency_ms = inference_latency_ms
+        self.postprocess_latency_ms = postprocess_latency_ms
+        self.network_width = network_width
+        self.network_height = network_height
+        self.live = live
+        self.headless = headless
+        self.optimize = optimize
+        self.video_format = video_format
+        self.decoded_format = decoded_format
+
+    @property
+    def name(self):
+        threads = self.n_threads if self.n_threads is not None else 'default'
+        name = f"{self.width}x{self.height}_batch{self.batch_size}_queue{self.queue_depth}_threads{threads}"
+        if self.headless:
+            name += "_headless"
+        if self.video_format != 'RGB':
+            name += f"_{self.video_format.lower()}"
+        if self.decoded_format:
+            name += f"_from_{self.decoded_format.lower()}"
+        return f"{name}_optimized" if self.optimize else name
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def get_benchmark_pipeline_string(config):
+    """
+    Returns the detection pipeline built from the pipeline helpers, as used by detection_pipeline.py,
+    before the Hailo elements are replaced.
+    """
+    builder = PipelineBuilder(config.optimize, network_shape=(config.network_width, config.network_height))
+    if config.decoded_format:
+        # The videotestsrc caps come first in the source string, the output caps follow the videoconvert
+        source = SOURCE_PIPELINE('videotestsrc', config.width, config.height, config.video_format, scale=False)
+        source = source.replace(f'format={config.video_format}, width', f'format={config.decoded_format}, width', 1)
+        builder.add(source, Caps(config.video_format, config.width, config.height))
+    else:
+        builder.add_source('videotestsrc', config.width, config.height, config.video_format)
+    builder.add_inference(
+        hef_path='benchmark.hef',
+        post_process_so='benchmark_postprocess.so',
+        batch_size=config.batch_size,
+    )
+    builder.add(TRACKER_PIPELINE(class_id=1))
+    builder.add(USER_CALLBACK_PIPELINE())
+    builder.add_display(video_sink="fakesink", sync="false", show_fps="false", headless=config.headless)
+    return builder.build()
+
+
+def replace_hailo_elements(pipeline_string, config, stand_in_elements=True):
+    """
+    Replaces the Hailo elements of a pipeline string with the benchmark stand-ins and applies the
+    queue depth, n-threads and live settings of the configuration.
+
+    Args:
+        pipeline_string (str): A pipeline built from the pipeline helpers.
+        config (BenchmarkConfig): The benchmark configuration.
+        stand_in_elements (bool, optional): Use the Python stand-in elements, otherwise identity (with sleep-time)
+            and input-selector. Defaults to True.
+
+    Returns:
+        str: The pipeline string runnable without a Hailo device.
+    """
+    network_caps = f'video/x-raw, format=RGB, width={config.network_width}, height={config.network_height}'
+
+    def hailonet(match):
+        batch_size = re.search(r'batch-size=(\d+)', match.group(0))
+        batch_size = int(batch_size.group(1)) if batch_size else 1
+        if stand_in_elements:
+            element = f'hailostandin name={match.group(1)} latency-ms={config.inference_latency_ms} batch-size={batch_size} '
+        else:
+            element = f'identity name={match.group(1)} sleep-time={int(config.inference_latency_ms * 1000 / batch_size)} '
+        # hailonet fixes its input caps to the network input shape
+        return f'{network_caps} ! {element}'
+
+    def hailofilter(match):
+        if stand_in_elements:
+            return f'hailostandin name={match.group(1)} latency-ms={config.postprocess_latency_ms} '
+        return f'identity name={match.group(1)} sleep-time={int(config.postprocess_latency_ms * 1000)} '
+
+    aggregator = 'hailoaggregatorstandin' if stand_in_elements else 'input-selector'
+    pipeline_string = re.sub(r'hailonet name=(\S+)[^!]*', hailonet, pipeline_string)
+    pipeline_string = re.sub(r'hailofilter name=(\S+)[^!]*', hailofilter, pipeline_string)
+    croppers = re.findall(r'hailocropper name=(\S+)', pipeline_string)
+    pipeline_string = re.sub(r'hailocropper name=(\S+).*?(?=hailoaggregator)', r'tee name=\1 ', pipeline_string)
+    for cropper in croppers:
+        # hailocropper resizes the frames of the inference branch, the first branch is the bypass queue
+        pipeline_string = re.sub(rf'({cropper}\. ! (?!queue name=\S+_bypass_q))', rf'\1videoscale name={cropper}_resize ! ', pipeline_string)
+    pipeline_string = re.sub(r'hailoaggregator name=(\S+) ', rf'{aggregator} name=\1 ', pipeline_string)
+    pipeline_string = re.sub(r'(hailotracker|hailooverlay) name=(\S+)[^!]*', r'identity name=\2 ', pipeline_string)
+
+    # Bypass queues keep their size, they must hold the frames in flight in the inference branch
+    pipeline_string = re.sub(r'max-size-buffers=3 ', f'max-size-buffers={config.queue_depth} ', pipeline_string)
+    if config.n_threads is not None:
+        pipeline_string = re.sub(r'n-threads=\d+', f'n-threads={config.n_threads}', pipeline_string)
+    if not config.live:
+        pipeline_string = pipeline_string.replace('is-live=true', 'is-live=false')
+    return pipeline_string
+
+# -----------------------------------------------------------------------------------------------
+# Measurement
+# -----------------------------------------------------------------------------------------------
+
+
+def run_benchmark(config, duration=10.0, warmup=2.0):
+    """
+    Runs a single configuration.
+
+    Returns:
+        dict: {'config', 'fps', 'frames', 'latency' (end to end summary), 'stages' (per stage summary),
+            'cpu_percent' (process CPU time / wall time, 100 is one core)}
+    """
+    stand_in_elements = register_stand_in_elements()
+    pipeline_string = replace_hailo_elements(get_benchmark_pipeline_string(config), config, stand_in_elements)
+    pipeline = Gst.parse_launch(pipeline_string)
+    elements = count_elements(pipeline)
+    result = measure_pipeline(pipeline, duration, warmup)
+    result['config'] = config.to_dict()
+    result['elements'] = elements
+    # cpu_percent is CPU time / wall time, so CPU time per frame is cpu_percent / 100 / fps
+    result['cpu_ms_per_frame'] = result['cpu_percent'] * 10 / result['fps'] if result['fps'] else 0.0
+    result['stand_in_elements'] = stand_in_elements
+    return result
+
+
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    """
+    Compares benchmark results to a baseline.
+
+    Args:
+        results (dict): Configuration name -> result, as written by the benchmark.
+        baseline (dict): The same structure from a previous run.
+        tolerance (float, optional): Allowed relative degradation. Defaults to 0.1 (10%).
+
+    Returns:
+        list: Human readable regression messages, empty if there are no regressions.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result['fps'] < reference['fps'] * (1 - tolerance):
+            regressions.append(f"{name}: fps {result['fps']:.1f} < baseline {reference['fps']:.1f}")
+        if result.get('latency') and reference.get('latency'):
+            if result['latency']['p95_ms'] > reference['latency']['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: p95 latency {result['latency']['p95_ms']:.1f}ms > baseline {reference['latency']['p95_ms']:.1f}ms")
+        if result['cpu_percent'] > reference['cpu_percent'] * (1 + tolerance):
+            regressions.append(f"{name}: cpu {result['cpu_percent']:.0f}% > baseline {reference['cpu_percent']:.0f}%")
+    return regressions
+
+
+def compare_optimization(results):
+    """
+    Pairs the legacy and optimized results of the same configuration.
+
+    Returns:
+        list: (legacy name, legacy result, optimized result) for every configuration run in both modes.
+    """
+    return [
+        (name, result, results[f'{name}_optimized'])
+        for name, result in results.items()
+        if not name.endswith('_optimized') and f'{name}_optimized' in results
+    ]
+
+
+def print_optimization_comparison(results, file=sys.stdout):
+    print(f"{'configuration':<54} {'elements':>13} {'cpu/frame [ms]':>17} {'fps':>15}", file=file)
+    for name, legacy, optimized in compare_optimization(results):
+        print(f"{name:<54} {legacy['elements']:>5} -> {optimized['elements']:<5} "
+              f"{legacy['cpu_ms_per_frame']:>7.2f} -> {optimized['cpu_ms_per_frame']:<7.2f} "
+              f"{legacy['fps']:>6.1f} -> {optimized['fps']:<6.1f}", file=file)
+
+
+def compare_video_formats(results):
+    """
+    Pairs the RGB and NV12 results of otherwise identical configurations.
+
+    Returns:
+        list: (RGB name, RGB result, NV12 result) for every configuration run in both formats.
+    """
+    def key(result):
+        return tuple(sorted((name, value) for name, value in result['config'].items() if name != 'video_format'))
+    nv12_results = {key(result): result for result in results.values() if result['config']['video_format'] == 'NV12'}
+    return [
+        (name, result, nv12_results[key(result)])
+        for name, result in results.items()
+        if result['config']['video_format'] == 'RGB' and key(result) in nv12_results
+    ]
+
+
+def print_video_format_comparison(results, frame_rate=30, file=sys.stdout):
+    """Prints the CPU time per frame of the RGB and NV12 pipelines and the CPU saved per stream at frame_rate."""
+    print(f"{'configuration':<54} {'cpu/frame RGB -> NV12 [ms]':>27} {f'saved per {frame_rate} fps stream':>26}", file=file)
+    for name, rgb, nv12 in compare_video_formats(results):
+        saved_ms = rgb['cpu_ms_per_frame'] - nv12['cpu_ms_per_frame']
+        # ms per frame * frames per second / 1000 ms, in percent of a core
+        print(f"{name:<54} {rgb['cpu_ms_per_frame']:>12.2f} -> {nv12['cpu_ms_per_frame']:<11.2f} "
+              f"{saved_ms:>8.2f} ms/frame {saved_ms * frame_rate / 10:>6.1f}% core", file=file)
+
+
+def _resolution(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Hardware free benchmark of the detection pipeline topology")
+    parser.add_argument("--resolutions", type=_resolution, nargs='+', default=[(1280, 720)], help="Source resolutions, e.g. 1280x720. Default is 1280x720.")
+    parser.add_argument("--batch-sizes", type=int, nargs='+', default=[1], help="hailonet batch sizes. Default is 1.")
+    parser.add_argument("--queue-depths", type=int, nargs='+', default=[3], help="Queue max-size-buffers. Default is 3.")
+    parser.add_argument("--n-threads", type=int, nargs='+', default=[None], help="videoscale / videoconvert n-threads. Default keeps the pipeline values.")
+    parser.add_argument("--inference-latency-ms", type=float, default=10.0, help="Time the hailonet stand-in takes per batch. Default is 10.")
+    parser.add_argument("--postprocess-latency-ms", type=float, default=1.0, help="Time the hailofilter stand-in takes per frame. Default is 1.")
+    parser.add_argument("--live", action="store_true", help="Use a live 30 fps source instead of running as fast as possible.")
+    parser.add_argument("--display-modes", nargs='+', default=['display'], choices=['display', 'headless'], help="Display paths to benchmark. Default is display.")
+    parser.add_argument("--pipeline-modes", nargs='+', default=['legacy'], choices=['legacy', 'optimized'], help="Build the pipeline as the helpers do (legacy) and/or with the caps aware PipelineBuilder (optimized). Default is legacy.")
+    parser.add_argument("--video-formats", nargs='+', default=['RGB'], choices=['RGB', 'NV12'], help="Formats of the frames between the source and the display. Default is RGB.")
+    parser.add_argument("--decoded-format", default=None, help="Format the source delivers, converted in the source like decoded frames (e.g. NV12). Default is the video format.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per configuration. Default is 10.")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds before measuring. Default is 2.")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path.")
+    parser.add_argument("--baseline", default=None, help="Compare the results to this JSON file and exit with an error on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative degradation against the baseline. Default is 0.1.")
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    results = {}
+    print(f"{'configuration':<54} {'fps':>8} {'p50 [ms]':>9} {'p95 [ms]':>9} {'cpu [%]':>8}")
+    for (width, height), batch_size, queue_depth, n_threads, display_mode, pipeline_mode, video_format in itertools.product(
+            args.resolutions, args.batch_sizes, args.queue_depths, args.n_threads, args.display_modes, args.pipeline_modes,
+            args.video_formats):
+        config = BenchmarkConfig(
+            width, height, batch_size, queue_depth, n_threads,
+            inference_latency_ms=args.inference_latency_ms,
+            postprocess_latency_ms=args.postprocess_latency_ms,
+            live=args.live,
+            headless=display_mode == 'headless',
+            optimize=pipeline_mode == 'optimized',
+            video_format=video_format,
+            decoded_format=args.decoded_format,
+        )
+        result = run_benchmark(config, args.duration, args.warmup)
+        results[config.name] = result
+        latency = result['latency'] or {'p50_ms': 0.0, 'p95_ms': 0.0}
+        print(f"{config.name:<54} {result['fps']:>8.1f} {latency['p50_ms']:>9.1f} {latency['p95_ms']:>9.1f} {result['cpu_percent']:>8.1f}")
+
+    if len(args.pipeline_modes) > 1:
+        print_optimization_comparison(results)
+    if len(args.video_formats) > 1:
+        print_video_format_comparison(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import collections
+import struct
+import sys
+from hailo_apps_infra.gstreamer_helper_pipelines import (
+    get_source_type,
+    get_camera_resulotion,
+    get_rpi_camera_format,
+    SOURCE_PIPELINE,
+    MULTI_SOURCE_PIPELINE,
+    INFERENCE_PIPELINE,
+    INFERENCE_PIPELINE_WRAPPER,
+    STREAM_ROUTER_PIPELINE,
+    DISPLAY_PIPELINE,
+)
+
+# -----------------------------------------------------------------------------------------------
+# Caps aware pipeline builder
+# -----------------------------------------------------------------------------------------------
+# The helpers scale and convert defensively: the source scales and converts to video_width x video_height,
+# the hailocropper of INFERENCE_PIPELINE_WRAPPER letterboxes to the network input size, and INFERENCE_PIPELINE
+# scales and converts again before hailonet. The builder tracks the caps between the fragments and, with
+# optimize=True, leaves out the stages which would not change them:
+# - The source videoscale / videoconvert when the source already delivers the requested size / format.
+# - The inference videoscale / videoconvert inside the wrapper when the HEF input shape is known, the
+#   hailocropper then scales once, straight to the network input. hailocropper keeps the format of its
+#   input, check_caps() verifies the format negotiated before hailonet once the pipeline is created.
+# With optimize=False the builder returns the same string as the helpers joined with ' ! '.
+
+# Caps between two fragments, None for unknown fields
+Caps = collections.namedtuple('Caps', ['format', 'width', 'height'])
+UNKNOWN_CAPS = Caps(None, None, None)
+# hailonet takes RGB frames for the models used by the apps
+NETWORK_FORMAT = 'RGB'
+
+
+def get_hef_input_shape(hef_path):
+    """
+    Returns the (width, height) of the HEF input, None if it can't be read (hailo_platform is optional).
+    """
+    try:
+        from hailo_platform import HEF
+        height, width, _ = HEF(hef_path).get_input_vstream_infos()[0].shape
+        return width, height
+    except Exception:
+        return None
+
+
+# MP4 / MOV boxes from a track to the sample description
+TRACK_PATH = (b'mdia', b'minf', b'stbl', b'stsd')
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+
+
+def _iter_boxes(data, offset=0, end=None):
+    """Yields (type, payload start, payload end) of the ISO BMFF boxes in data[offset:end]."""
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size, = struct.unpack_from('>Q', data, offset + 8)
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            return
+        yield box_type, offset + header, offset + size
+        offset += size
+
+
+def _read_moov(f):
+    """Returns the payload of the moov box of an MP4 / MOV file, None if there is none."""
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size, = struct.unpack('>Q', f.read(8))
+            header_size = 16
+        if size == 0 or size < header_size:
+            return None
+        if box_type == b'moov':
+            return f.read(size - header_size) if size <= MAX_MOOV_SIZE else None
+        f.seek(size - header_size, 1)
+
+
+def _find_box(data, start, end, box_type):
+    """Returns (payload start, payload end) of the first box_type box in data[start:end], None if there is none."""
+    for found_type, payload, box_end in _iter_boxes(data, start, end):
+        if found_type == box_type:
+            return payload, box_end
+    return None
+
+
+def _find_video_sample_entry(moov):
+    """Returns (payload start, payload end) of the first sample entry of the first video track, None if there is none."""
+    for box_type, start, end in _iter_boxes(moov):
+        if box_type != b'trak':
+            continue
+        mdia = _find_box(moov, start, end, b'mdia')
+        hdlr = _find_box(moov, *mdia, b'hdlr') if mdia else None
+        # hdlr: version / flags, predefined, handler type
+        if hdlr is None or moov[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+            continue
+        box = (start, end)
+        for box_type in TRACK_PATH:
+            box = _find_box(moov, *box, box_type)
+            if box is None:
+                return None
+        # stsd: version / flags and entry count, then the sample entries
+        entry = next(_iter_boxes(moov, box[0] + 8, box[1]), None)
+        return entry[1:] if entry else None
+    return None
+
+
+def get_file_caps(path):
+    """
+    Returns the Caps of the video track of an MP4 / MOV file, read from its sample description without
+    GStreamer (the pipeline string is built before Gst is running). The format is left unknown, it depends
+    on the decoder decodebin picks. Other containers and files with non square pixels return UNKNOWN_CAPS,
+    they keep the videoscale.
+    """
+    try:
+        with open(path, 'rb') as f:
+            moov = _read_moov(f)
+        entry = _find_video_sample_entry(moov) if moov is not None else None
+        if entry is None:
+            return UNKNOWN_CAPS
+        start, end = entry
+        # VisualSampleEntry: 6 reserved, data reference index, 16 predefined / reserved, width, height
+        width, height = struct.unpack_from('>HH', moov, start + 24)
+        # The codec configuration boxes follow the 78 bytes of fixed fields, pasp holds the pixel aspect ratio
+        pasp = _find_box(moov, start + 78, end, b'pasp')
+        if pasp is not None and len(set(struct.unpack_from('>II', moov, pasp[0]))) != 1:
+            return UNKNOWN_CAPS
+    except (OSError, struct.error):
+        return UNKNOWN_CAPS
+    if not width or not height:
+        return UNKNOWN_CAPS
+    return Caps(None, width, height)
+
+
+def get_source_caps(video_source, video_width, video_height, video_format='RGB', no_webcam_compression=False):
+    """
+    Returns the Caps the source element of SOURCE_PIPELINE delivers, before its videoscale / videoconvert.
+    """
+    source_type = get_source_type(video_source)
+    if source_type == 'usb':
+        if no_webcam_compression:
+            return Caps('RGB', 640, 480)
+        # The decoded JPEG format depends on the decoder
+        return Caps(None, *get_camera_resulotion(video_width, video_height))
+    if source_type == 'rpi':
+        # The appsrc caps are set to the requested size, and format when the camera delivers it
+        return Caps(get_rpi_camera_format(video_format), video_width, video_height)
+    if source_type == 'videotestsrc':
+        # The videotestsrc caps are set to the requested format and size
+        return Caps(video_format, video_width, video_height)
+    if source_type == 'libcamera':
+        return Caps(video_format, 1536, 864)
+    if source_type == 'file':
+        return get_file_caps(video_source)
+    return UNKNOWN_CAPS
+
+
+class PipelineBuilder:
+    """
+    Builds a pipeline string from the helper fragments, tracking the caps between them.
+
+    Args:
+        optimize (bool, optional): Leave out the videoscale / videoconvert stages which would not change the caps.
+            Defaults to False.
+        network_shape (tuple, optional): The (width, height) of the HEF input, None if unknown. Defaults to None.
+        profile (PipelineTuningProfile, optional): Passed to the helpers. Defaults to None.
+        source_chain (SourceChain, optional): The source decoder / converter, passed to the source helpers.
+            Defaults to None (decodebin, videoscale + videoconvert).
+
+    Attributes:
+        caps (Caps): The caps at the end of the pipeline built so far.
+        removed (list): (element name, reason) of the named elements left out.
+        expected_caps (list): (queue name, format, removed converter) of the queues whose input format is
+            checked by check_caps().
+    """
+    def __init__(self, optimize=False, network_shape=None, profile=None, source_chain=None):
+        self.optimize = optimize
+        self.network_shape = network_shape
+        self.profile = profile
+        self.source_chain = source_chain
+        self.fragments = []
+        self.caps = UNKNOWN_CAPS
+        self.removed = []
+        self.expected_caps = []
+
+    def _remove(self, elements, reason):
+        self.removed += [(element, reason) for element in elements]
+
+    def add(self, fragment, caps=None):
+        """
+        Appends a pipeline fragment. caps are the caps at its output, None if it does not change them
+        (tracker, user callback, display...).
+        """
+        self.fragments.append(fragment)
+        if caps is not None:
+            self.caps = caps
+        return self
+
+    def add_source(self, video_source, video_width, video_height, video_format='RGB', name='source', **kwargs):
+        """Appends SOURCE_PIPELINE, kwargs are passed to it."""
+        scale = convert = True
+        if self.optimize:
+            source_caps = get_source_caps(video_source, video_width, video_height, video_format,
+                                          kwargs.get('no_webcam_compression', False))
+            if (source_caps.width, source_caps.height) == (video_width, video_height):
+                scale = False
+                self._remove([f'{name}_scale_q', f'{name}_videoscale'], f'source is already {video_width}x{video_height}')
+            if source_caps.format == video_format:
+                convert = False
+                self._remove([f'{name}_convert_q', f'{name}_convert'], f'source is already {video_format}')
+            if self.source_chain is not None and self.source_chain.converter:
+                # A single element scales and converts, it is left out only when neither stage is needed
+                not_removed = [f'{name}_scale_q', f'{name}_videoscale']
+                if scale or convert:
+                    not_removed += [f'{name}_convert_q', f'{name}_convert']
+                self.removed = [removed for removed in self.removed if removed[0] not in not_removed]
+        fragment = SOURCE_PIPELINE(video_source, video_width, video_height, video_format, name=name, profile=self.profile,
+                                   scale=scale, convert=convert, chain=self.source_chain, **kwargs)
+        return self.add(fragment, Caps(video_format, video_width, video_height))
+
+    def add_multi_source(self, video_sources, video_width, video_height, video_format='RGB', **kwargs):
+        """Appends MULTI_SOURCE_PIPELINE, kwargs are passed to it. The sources keep their conversions."""
+        fragment = MULTI_SOURCE_PIPELINE(video_sources, video_width, video_height, video_format, profile=self.profile,
+                                         chain=self.source_chain, **kwargs)
+        return self.add(fragment, Caps(video_format, video_width, video_height))
+
+    def add_sources(self, video_sources, video_width, video_height, video_format='RGB', no_webcam_compression=False):
+        """
+        Appends the source of the app: SOURCE_PIPELINE for a single source, MULTI_SOURCE_PIPELINE for several.
+        no_webcam_compression applies to a single source only.
+        """
+        if len(video_sources) > 1:
+            return self.add_multi_source(video_sources, video_width, video_height, video_format)
+        return self.add_source(video_sources[0], video_width, video_height, video_format,
+                               no_webcam_compression=no_webcam_compression)
+
+    def add_display(self, num_streams=1, **kwargs):
+        """
+        Appends DISPLAY_PIPELINE, kwargs are passed to it. With several streams, STREAM_ROUTER_PIPELINE splits them
+        again and each stream gets its own display, named hailo_display_<index>.
+        """
+        if num_streams > 1:
+            return self.add(STREAM_ROUTER_PIPELINE([
+                DISPLAY_PIPELINE(profile=self.profile, name=f'hailo_display_{index}', **kwargs) for index in range(num_streams)
+            ]))
+        return self.add(DISPLAY_PIPELINE(profile=self.profile, **kwargs))
+
+    def add_inference(self, wrapper=True, inference_interval=1, motion_gate=False, **kwargs):
+        """
+        Appends INFERENCE_PIPELINE, wrapped with INFERENCE_PIPELINE_WRAPPER if wrapper is True.
+        kwargs are passed to INFERENCE_PIPELINE, inference_interval and motion_gate to the wrapper.
+        The frames after the wrapper keep their caps.
+        """
+        if (inference_interval != 1 or motion_gate) and not wrapper:
+            raise ValueError("inference_interval and motion_gate require the inference wrapper")
+        name = kwargs.get('name', 'inference')
+        if self.network_shape is not None:
+            network_caps = Caps(NETWORK_FORMAT, *self.network_shape)
+            # The hailocropper resizes the (letterboxed) frame to the size negotiated with hailonet
+            inner_caps = Caps(self.caps.format, *self.network_shape) if wrapper else self.caps
+        else:
+            network_caps = inner_caps = UNKNOWN_CAPS
+        scale = convert = True
+        if self.optimize and network_caps != UNKNOWN_CAPS:
+            if (inner_caps.width, inner_caps.height) == (network_caps.width, network_caps.height):
+                scale = False
+                self._remove([f'{name}_scale_q', f'{name}_videoscale'], f'frames are already {network_caps.width}x{network_caps.height}')
+            if inner_caps.format == network_caps.format:
+                convert = False
+                self._remove([f'{name}_convert_q', f'{name}_videoconvert'], f'frames are already {network_caps.format}')
+                self.expected_caps.append((f'{name}_hailonet_q', network_caps.format, f'{name}_videoconvert'))
+        fragment = INFERENCE_PIPELINE(profile=self.profile, scale=scale, convert=convert, **kwargs)
+        if wrapper:
+            return self.add(INFERENCE_PIPELINE_WRAPPER(fragment, profile=self.profile, inference_interval=inference_interval,
+                                                       motion_gate=motion_gate))
+        return self.add(fragment, network_caps)
+
+    def build(self):
+        return ' ! '.join(self.fragments)
+
+    def check_caps(self, pipeline):
+        """
+        Verifies the format negotiated before the queues whose converter was left out. A different format
+        posts an error on the bus instead of feeding hailonet frames it can't read.
+        """
+        for queue_name, video_format, converter in self.expected_caps:
+            queue = pipeline.get_by_name(queue_name)
+            if queue is not None:
+                queue.get_static_pad('sink').add_probe(_get_gst().PadProbeType.EVENT_DOWNSTREAM, self._on_caps_event,
+                                                       (video_format, converter))
+
+    @staticmethod
+    def _on_caps_event(pad, info, expected):
+        Gst = _get_gst()
+        event = info.get_event()
+        if event.type != Gst.EventType.CAPS:
+            return Gst.PadProbeReturn.OK
+        video_format, converter = expected
+        negotiated = event.parse_caps().get_structure(0).get_value('format')
+        if negotiated == video_format:
+            return Gst.PadProbeReturn.OK
+        from gi.repository import GLib
+        message = (f"{converter} was removed by --optimize-pipeline but the frames are {negotiated}, not {video_format}. "
+                   f"Run without --optimize-pipeline.")
+        element = pad.get_parent_element()
+        error = GLib.Error.new_literal(Gst.CoreError.quark(), message, Gst.CoreError.NEGOTIATION)
+        element.post_message(Gst.Message.new_error(element, error, message))
+        return Gst.PadProbeReturn.DROP
+
+    def print_report(self, pipeline=None, file=sys.stdout):
+        """
+        Prints the removed elements and, if the created pipeline is given, its element count.
+        """
+        if pipeline is not None:
+            print(f"Pipeline optimization: {len(self.removed)} elements removed, {count_elements(pipeline)} elements", file=file)
+        for element, reason in self.removed:
+            print(f"  removed {element}: {reason}", file=file)
+
+
+def _get_gst():
+    # gi is only needed once there is a pipeline, building the string does not need it
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+    return Gst
+
+
+def count_elements(pipeline):
+    """Returns the number of elements of a pipeline, including the elements inside its bins."""
+    Gst = _get_gst()
+    iterator = pipeline.iterate_recurse()
+    count = 0
+    while iterator.next()[0] == Gst.IteratorResult.OK:
+        count += 1
+    return count
@@ -0,0 +1,209 @@
+import json
+import math
+import os
+
+# -----------------------------------------------------------------------------------------------
+# Pipeline tuning profiles
+# -----------------------------------------------------------------------------------------------
+# The pipeline helpers hard-code n-threads for videoscale / videoconvert and max-size-buffers=3 for the
+# queues. A PipelineTuningProfile passed to the helpers (profile=...) replaces them:
+# - The conversion threads of the stages present in the pipeline share the available cores (affinity and
+#   cgroup CPU quota) minus the reserved ones, in proportion to the default thread count of each stage,
+#   instead of adding up to more threads than cores. Every stage keeps at least one thread, so the total
+#   only exceeds the budget when there are more stages than cores.
+# - The queue sizes come from the measured service time of the stage after each queue (see LatencyTracer).
+# With profile=None the helpers return exactly the legacy strings.
+
+# Default n-threads of the conversion stages, used as their weights
+STAGE_THREADS = {
+    'source_scale': 2,
+    'source_convert': 3,
+    'inference_scale': 2,
+    'inference_convert': 2,
+    'display_convert': 2,
+    'file_sink_convert': 2,
+}
+# Stages of the application pipelines: source, inference and display
+DEFAULT_STAGES = ('source_scale', 'source_convert', 'inference_scale', 'inference_convert', 'display_convert')
+# Stages repeated for every stream of a multi source pipeline (each stream has its own display)
+PER_STREAM_STAGES = ('source_scale', 'source_convert', 'display_convert')
+# The bypass queue of INFERENCE_PIPELINE_WRAPPER holds the frames during the whole inference branch,
+# not during a single stage, so its measured size never goes below the helper default
+MIN_BYPASS_QUEUE_SIZE = 20
+
+
+def _read_first_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def get_cgroup_cpu_limit(cgroup_root='/sys/fs/cgroup', proc_cgroup='/proc/self/cgroup'):
+    """
+    Returns the CPU quota of the process cgroup in cores (e.g. 1.5), None if there is no quota.
+    Supports cgroup v2 (cpu.max) and v1 (cpu.cfs_quota_us / cpu.cfs_period_us).
+    """
+    # cgroup v2: "0::/path" in /proc/self/cgroup, the limit is in <root>/<path>/cpu.max ("max 100000" when unlimited)
+    cgroup_path = ''
+    try:
+        with open(proc_cgroup) as f:
+            for line in f:
+                hierarchy, _, path = line.strip().split(':', 2)
+                if hierarchy == '0':
+                    cgroup_path = path.lstrip('/')
+    except (OSError, ValueError):
+        pass
+    for directory in (os.path.join(cgroup_root, cgroup_path), cgroup_root):
+        cpu_max = _read_first_line(os.path.join(directory, 'cpu.max'))
+        if cpu_max:
+            quota, _, period = cpu_max.partition(' ')
+            if quota == 'max':
+                return None
+            return int(quota) / int(period or 100000)
+    # cgroup v1
+    quota = _read_first_line(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_quota_us'))
+    period = _read_first_line(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_period_us'))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def get_available_cores():
+    """
+    Returns the number of cores the process can use: the CPU affinity, limited by the cgroup CPU quota.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    limit = get_cgroup_cpu_limit()
+    if limit is not None:
+        cores = min(cores, max(1, math.ceil(limit)))
+    return cores
+
+
+class PipelineTuningProfile:
+    """
+    Thread and queue settings shared by all pipeline helpers.
+
+    Args:
+        cores (int, optional): Cores available to the pipeline. Defaults to get_available_cores().
+        reserved_cores (int, optional): Cores left for everything but the conversion stages (hailonet,
+            post-process, user callback, decoding). Defaults to 1.
+        num_streams (int, optional): Number of streams, the source and display stages are repeated per stream. Defaults to 1.
+        stages (iterable, optional): The conversion stages present in the pipeline (see STAGE_THREADS), only they
+            share the cores. Defaults to DEFAULT_STAGES.
+        max_threads (int, optional): Maximum n-threads of a single stage. Defaults to 8.
+        queue_sizes (dict, optional): max-size-buffers per queue name, e.g. from a previous measurement.
+        min_queue_size (int, optional): Smallest queue size set from measurements. Defaults to 2.
+        max_queue_size (int, optional): Largest queue size set from measurements. Defaults to 32.
+    """
+    def __init__(self, cores=None, reserved_cores=1, num_streams=1, stages=DEFAULT_STAGES, max_threads=8,
+                 queue_sizes=None, min_queue_size=2, max_queue_size=32):
+        self.cores = cores if cores is not None else get_available_cores()
+        self.reserved_cores = reserved_cores
+        self.num_streams = num_streams
+        self.stages = [stage for stage in STAGE_THREADS if stage in stages]
+        self.max_threads = max_threads
+        self.queue_sizes = dict(queue_sizes or {})
+        self.min_queue_size = min_queue_size
+        self.max_queue_size = max_queue_size
+        self.threads = self._share_threads()
+
+    def _share_threads(self):
+        budget = max(1, self.cores - self.reserved_cores)
+        instances = {stage: self.num_streams if stage in PER_STREAM_STAGES else 1 for stage in self.stages}
+        total_weight = sum(STAGE_THREADS[stage] * count for stage, count in instances.items())
+        shares = {stage: budget * STAGE_THREADS[stage] / total_weight for stage in self.stages}
+        threads = {stage: max(1, min(self.max_threads, int(share))) for stage, share in shares.items()}
+
+        def total():
+            return sum(threads[stage] * count for stage, count in instances.items())
+
+        # The one thread minimum can push the total over the budget, take the extra threads back from the largest stages
+        while total() > budget and max(threads.values(), default=1) > 1:
+            threads[max(threads, key=threads.get)] -= 1
+        # Hand the cores lost to rounding down to the stages furthest below their share
+        while True:
+            candidates = [stage for stage in self.stages
+                          if threads[stage] < self.max_threads and total() + instances[stage] <= budget]
+            if not candidates:
+                break
+            threads[max(candidates, key=lambda stage: shares[stage] - threads[stage])] += 1
+        return threads
+
+    def set_stages(self, stages):
+        """Shares the cores again among the given stages only, e.g. once the app knows which stages its pipeline has."""
+        self.stages = [stage for stage in STAGE_THREADS if stage in stages]
+        self.threads = self._share_threads()
+
+    def get_n_threads(self, stage, default):
+        """
+        Returns the n-threads of a conversion stage (see STAGE_THREADS). A stage which is not part of the
+        profile gets a single thread, the cores are already shared by the others.
+        """
+        if stage in STAGE_THREADS:
+            return self.threads.get(stage, 1)
+        return default
+
+    def get_queue_size(self, name, default):
+        """Returns the max-size-buffers of a queue: the measured size if any, otherwise the helper default."""
+        return self.queue_sizes.get(name, default)
+
+    def size_queues(self, tracer, fps=None):
+        """
+        Sets the queue sizes from the stage latencies measured by a LatencyTracer.
+
+        A queue must hold the frames arriving while the stage after it processes its slowest frames,
+        so its size is the p99 service time of that stage in frame intervals, plus one.
+
+        Args:
+            tracer (LatencyTracer): A tracer which ran on the pipeline.
+            fps (float, optional): The pipeline frame rate. Defaults to the rate of the slowest stage.
+
+        Returns:
+            dict: The new queue sizes.
+        """
+        summary = tracer.get_summary()
+        if fps:
+            frame_interval = 1000 / fps
+        else:
+            stage_means = [stats['mean_ms'] for name, stats in summary.items() if not name.startswith('queue:') and name != 'end-to-end']
+            frame_interval = max(stage_means, default=0)
+        if frame_interval <= 0:
+            return {}
+        sizes = {}
+        for queue in tracer.links:
+            service_times = [summary[stage]['p99_ms'] for stage in tracer.get_downstream_stages(queue) if stage in summary]
+            if not service_times:
+                continue
+            size = math.ceil(max(service_times) / frame_interval) + 1
+            min_size = MIN_BYPASS_QUEUE_SIZE if queue.endswith('_bypass_q') else self.min_queue_size
+            sizes[queue] = min(max(self.max_queue_size, min_size), max(min_size, size))
+        self.queue_sizes.update(sizes)
+        return sizes
+
+    def to_dict(self):
+        return {
+            'cores': self.cores,
+            'reserved_cores': self.reserved_cores,
+            'num_streams': self.num_streams,
+            'stages': self.stages,
+            'max_threads': self.max_threads,
+            'queue_sizes': self.queue_sizes,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path, **overrides):
+        """
+        Loads a profile saved with save(). The cores are detected again unless given in overrides,
+        so a profile can be moved between machines.
+        """
+        with open(path) as f:
+            settings = json.load(f)
+        settings.pop('cores', None)
+        settings.update(overrides)
+        return cls(**settings)
@@ -0,0 +1,192 @@
+import collections
+import sys
+import threading
+import time
+from hailo_apps_infra.latency_tracer import get_queue_topology
+
+# -----------------------------------------------------------------------------------------------
+# Queue occupancy monitor
+# -----------------------------------------------------------------------------------------------
+# With back-pressure, the queues upstream of the slowest stage stay full and the queues after it stay
+# almost empty. The bottleneck is therefore the stage right after the most downstream queue which is
+# full most of the time.
+
+# Hints printed with the report, by the factory name of the element after the saturated queue
+BOTTLENECK_HINTS = {
+    'videoconvert': "increase n-threads on the videoconvert or convert earlier, at a lower resolution",
+    'videoscale': "increase n-threads on the videoscale or scale at the source",
+    'hailonet': "the device is the limit, try a larger batch-size or a lighter model",
+    'hailofilter': "the post-process is CPU bound, check its function and thresholds",
+    'hailooverlay': "drawing is CPU bound, reduce the drawn objects or disable the overlay",
+    'hailotracker': "the tracker is CPU bound, reduce keep-past-metadata or the number of classes",
+    'identity': "the user callback is slow, try --async-callback",
+    'fpsdisplaysink': "the display is slow, try --disable-sync or a lighter video sink",
+}
+
+
+class QueueStats:
+    """
+    Occupancy samples of a single queue.
+
+    Attributes:
+        name (str): The queue name.
+        next_element (str): Name of the element linked to the queue src pad.
+        next_factory (str): Factory name of that element.
+        series (collections.deque): The latest (time, level buffers, level time in ns) samples.
+        samples (int): Total number of samples.
+        full_samples (int): Number of samples in which the queue was full.
+    """
+    __slots__ = ('name', 'next_element', 'next_factory', 'series', 'samples', 'full_samples', 'level_sum')
+
+    def __init__(self, name, next_element, next_factory, history):
+        self.name = name
+        self.next_element = next_element
+        self.next_factory = next_factory
+        self.series = collections.deque(maxlen=history)
+        self.samples = 0
+        self.full_samples = 0
+        self.level_sum = 0
+
+    @property
+    def saturation(self):
+        return self.full_samples / self.samples if self.samples else 0.0
+
+    @property
+    def mean_level(self):
+        return self.level_sum / self.samples if self.samples else 0.0
+
+
+def _is_full(queue, level_buffers, level_time):
+    max_buffers = queue.get_property('max-size-buffers')
+    if max_buffers > 0:
+        return level_buffers >= max_buffers
+    max_time = queue.get_property('max-size-time')
+    if max_time > 0:
+        return level_time >= max_time
+    return False
+
+
+class QueueMonitor:
+    """
+    Samples current-level-buffers / current-level-time of every queue of a pipeline in a background thread
+    and reports the stage limiting the throughput.
+
+    Args:
+        pipeline (Gst.Pipeline): The pipeline to monitor.
+        interval_ms (int, optional): Sampling interval. Defaults to 50.
+        history (int, optional): Number of samples kept per queue in the time series. Defaults to 1200.
+        saturation_threshold (float, optional): Fraction of time a queue must be full to be considered
+            saturated. Defaults to 0.5.
+    """
+    def __init__(self, pipeline, interval_ms=50, history=1200, saturation_threshold=0.5):
+        self.pipeline = pipeline
+        self.interval = interval_ms / 1000
+        self.history = history
+        self.saturation_threshold = saturation_threshold
+        self.order = []
+        self.links = {}
+        self.stats = {}
+        self._queues = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.order, self.links = get_queue_topology(self.pipeline)
+        for name in self.order:
+            queue = self.pipeline.get_by_name(name)
+            peer = queue.get_static_pad('src').get_peer()
+            element = peer.get_parent_element() if peer is not None else None
+            factory = element.get_factory() if element is not None else None
+            # Caps filters (e.g. before the inference videoconvert) do no work, report the element after them
+            while factory is not None and factory.get_name() == 'capsfilter':
+                peer = element.get_static_pad('src').get_peer()
+                element = peer.get_parent_element() if peer is not None else None
+                factory = element.get_factory() if element is not None else None
+            self._queues[name] = queue
+            self.stats[name] = QueueStats(
+                name,
+                element.get_name() if element is not None else '',
+                factory.get_name() if factory is not None else '',
+                self.history,
+            )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Takes one occupancy sample of every queue."""
+        now = time.monotonic()
+        for name, queue in self._queues.items():
+            level_buffers = queue.get_property('current-level-buffers')
+            level_time = queue.get_property('current-level-time')
+            stats = self.stats[name]
+            stats.series.append((now, level_buffers, level_time))
+            stats.samples += 1
+            stats.level_sum += level_buffers
+            if _is_full(queue, level_buffers, level_time):
+                stats.full_samples += 1
+
+    def find_bottleneck(self):
+        """
+        Returns the QueueStats of the most downstream saturated queue, the stage after it limits the throughput.
+        None if no queue is saturated.
+        """
+        saturated = [name for name in self.order if self.stats[name].saturation >= self.saturation_threshold]
+        if not saturated:
+            return None
+        # Prefer a saturated queue whose downstream queues are not saturated
+        for name in reversed(saturated):
+            if not any(target in saturated for target, _ in self.links[name]):
+                return self.stats[name]
+        return self.stats[saturated[-1]]
+
+    def get_report(self):
+        """
+        Returns the monitor report.
+
+        Returns:
+            dict: {'queues': {name: {saturation, mean_level, next_element}}, 'bottleneck': {...} or None,
+                'recommendation': str}
+        """
+        report = {
+            'queues': {
+                name: {
+                    'saturation': round(stats.saturation, 3),
+                    'mean_level': round(stats.mean_level, 2),
+                    'next_element': stats.next_element,
+                }
+                for name, stats in self.stats.items()
+            },
+            'bottleneck': None,
+            'recommendation': "No queue is saturated, the source (or sync to the clock) limits the throughput.",
+        }
+        bottleneck = self.find_bottleneck()
+        if bottleneck is not None:
+            report['bottleneck'] = {
+                'queue': bottleneck.name,
+                'element': bottleneck.next_element,
+                'factory': bottleneck.next_factory,
+                'saturation': round(bottleneck.saturation, 3),
+            }
+            recommendation = f"{bottleneck.next_factory} ({bottleneck.next_element}) after {bottleneck.name} saturated {bottleneck.saturation:.0%} of the time"
+            hint = BOTTLENECK_HINTS.get(bottleneck.next_factory)
+            if hint:
+                recommendation += f": {hint}"
+            report['recommendation'] = recommendation
+        return report
+
+    def print_report(self, file=sys.stdout):
+        report = self.get_report()
+        print(f"{'queue':<40} {'full [%]':>8} {'mean level':>10}  next element", file=file)
+        for name, stats in report['queues'].items():
+            print(f"{name[:40]:<40} {stats['saturation'] * 100:>8.1f} {stats['mean_level']:>10.2f}  {stats['next_element']}", file=file)
+        print(f"Bottleneck: {report['recommendation']}", file=file)
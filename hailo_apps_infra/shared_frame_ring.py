@@ -0,0 +1,185 @@
+import multiprocessing
+import sys
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+
+# -----------------------------------------------------------------------------------------------
+# Shared memory frame ring buffer
+# -----------------------------------------------------------------------------------------------
+# A fixed number of frame slots in a single shared memory block, used to pass frames between
+# processes without pickling them. The producer writes straight into the next slot and publishes it,
+# the consumer always reads the most recently published frame (latest frame wins, older frames are
+# overwritten). Each slot is guarded by a sequence counter (seqlock): the counter is odd while the
+# slot is being written, so a reader can detect and retry torn reads.
+# numpy stores are plain stores: on weakly ordered CPUs (ARM, e.g. the Raspberry Pi) another core may see them
+# out of order, the new sequence number before the frame data. Writer and reader therefore fence between the
+# sequence and data accesses, by acquiring and releasing a shared semaphore (POSIX semaphore operations are full
+# memory barriers). The semaphore is never held while frames are copied, the writer is never blocked by a reader.
+
+MAX_DIMS = 4
+# Per slot header: sequence, nbytes, dtype char, ndim, shape[MAX_DIMS]
+SLOT_HEADER_FIELDS = 4 + MAX_DIMS
+# Global header: write count (number of published frames)
+GLOBAL_HEADER_FIELDS = 8
+DATA_ALIGNMENT = 64
+
+
+class SharedFrameRing:
+    """
+    A ring buffer of frames in shared memory with latest-frame-wins semantics.
+
+    Args:
+        slot_size (int): The maximum size of a frame in bytes.
+        num_slots (int, optional): The number of frame slots. Defaults to 3.
+        name (str, optional): Attach to an existing ring with this name instead of creating one.
+        fence (multiprocessing.Lock, optional): The semaphore used as memory barrier, shared with the ring
+            attached to. Defaults to None (a new one).
+    """
+    def __init__(self, slot_size, num_slots=3, name=None, fence=None):
+        self.slot_size = slot_size
+        self.num_slots = num_slots
+        # A spawn context semaphore can be passed to both forked and spawned processes
+        self._fence = fence if fence is not None else multiprocessing.get_context('spawn').Lock()
+        header_size = (GLOBAL_HEADER_FIELDS + num_slots * SLOT_HEADER_FIELDS) * 8
+        self._data_offset = -(-header_size // DATA_ALIGNMENT) * DATA_ALIGNMENT
+        self._slot_stride = -(-slot_size // DATA_ALIGNMENT) * DATA_ALIGNMENT
+        total_size = self._data_offset + num_slots * self._slot_stride
+        self._owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self._owner, size=total_size if self._owner else 0)
+        self._attach()
+        if self._owner:
+            self._header[:] = 0
+        self._last_read = 0
+
+    def _attach(self):
+        fields = GLOBAL_HEADER_FIELDS + self.num_slots * SLOT_HEADER_FIELDS
+        self._header = np.ndarray((fields,), dtype=np.int64, buffer=self.shm.buf)
+        self._slots = self._header[GLOBAL_HEADER_FIELDS:].reshape(self.num_slots, SLOT_HEADER_FIELDS)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_count(self):
+        """The number of frames published so far."""
+        return int(self._header[0])
+
+    def fence(self):
+        """Memory barrier: the accesses before it are visible to the other processes before the ones after it."""
+        with self._fence:
+            pass
+
+    def _slot_buffer(self, slot):
+        start = self._data_offset + slot * self._slot_stride
+        return self.shm.buf[start:start + self.slot_size]
+
+    @contextmanager
+    def writer(self, shape, dtype=np.uint8):
+        """
+        Yields a writable array in the next free slot. The frame is published when the block exits,
+        so producers can write (or copy a mapped buffer) straight into shared memory.
+
+        Args:
+            shape (tuple): The frame shape.
+            dtype (np.dtype, optional): The frame dtype. Defaults to np.uint8.
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if nbytes > self.slot_size:
+            raise ValueError(f"Frame of {nbytes} bytes does not fit in a {self.slot_size} bytes slot")
+        if len(shape) > MAX_DIMS:
+            raise ValueError(f"Frames with more than {MAX_DIMS} dimensions are not supported")
+        count = self.write_count + 1
+        slot = count % self.num_slots
+        header = self._slots[slot]
+        # Odd sequence: slot is being written
+        header[0] += 1
+        self.fence()
+        try:
+            yield np.ndarray(shape, dtype=dtype, buffer=self._slot_buffer(slot))
+        except BaseException:
+            # Leave the slot unpublished
+            self.fence()
+            header[0] += 1
+            raise
+        header[1] = nbytes
+        header[2] = ord(dtype.char)
+        header[3] = len(shape)
+        header[4:4 + len(shape)] = shape
+        # The frame and its header are visible before the even sequence, and the sequence before the count
+        self.fence()
+        header[0] += 1
+        self.fence()
+        self._header[0] = count
+
+    def write(self, frame):
+        """
+        Copies a frame into the next slot and publishes it.
+
+        Args:
+            frame (np.ndarray): The frame to write.
+        """
+        with self.writer(frame.shape, frame.dtype) as slot:
+            np.copyto(slot, frame)
+
+    def read(self, copy=False, retries=3):
+        """
+        Returns the most recently published frame, or None if no new frame was published since the last read.
+
+        Args:
+            copy (bool, optional): Return a copy instead of a view into shared memory. A view stays valid
+                until the producer wraps around the ring (num_slots - 1 more frames). Defaults to False.
+            retries (int, optional): Number of retries when the slot is overwritten while reading. Defaults to 3.
+
+        Returns:
+            np.ndarray or None: The frame.
+        """
+        for _ in range(retries + 1):
+            count = self.write_count
+            if count == 0 or count == self._last_read:
+                return None
+            self.fence()
+            header = self._slots[count % self.num_slots]
+            sequence = int(header[0])
+            if sequence % 2:
+                continue
+            self.fence()
+            ndim = int(header[3])
+            shape = tuple(int(dim) for dim in header[4:4 + ndim])
+            dtype = np.dtype(chr(int(header[2])))
+            frame = np.ndarray(shape, dtype=dtype, buffer=self._slot_buffer(count % self.num_slots))
+            if copy:
+                frame = frame.copy()
+            self.fence()
+            if int(header[0]) == sequence:
+                self._last_read = count
+                return frame
+        return None
+
+    def close(self):
+        """Detaches from the shared memory. The owner also removes it."""
+        self._header = None
+        self._slots = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frames returned as views are still referenced; the mapping is released with them
+            pass
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __getstate__(self):
+        return {'slot_size': self.slot_size, 'num_slots': self.num_slots, 'name': self.name, 'fence': self._fence}
+
+    def __setstate__(self, state):
+        # Attach in the child process (spawn start method); only the creating process owns the memory
+        self.__init__(state['slot_size'], state['num_slots'], name=state['name'], fence=state['fence'])
+        if sys.version_info < (3, 13):
+            # Attaching registers the block with the resource tracker, which would remove it when the child exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
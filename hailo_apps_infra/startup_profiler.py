@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+# -----------------------------------------------------------------------------------------------
+# Startup profiler
+# -----------------------------------------------------------------------------------------------
+# Breaks down the time to the first frame. The process start time is read from /proc, so the first stage
+# covers the interpreter start, the imports and the argument parsing done before GStreamerApp starts.
+# The pipeline state changes are taken from sync bus messages and the first buffer from a probe, so they
+# are timed when they happen, not when the main loop dispatches them.
+
+
+def get_process_age():
+    """Returns the seconds since the process started (10 ms resolution), None if /proc is not available."""
+    try:
+        with open('/proc/self/stat') as f:
+            # The command name may contain spaces, the fields after it start with field 3 (state)
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfiler:
+    """
+    Records named marks from the process start to the first buffer.
+
+    Each mark ends a stage: mark('imports') ends the stage which started at the previous mark.
+    """
+    def __init__(self):
+        now = time.monotonic()
+        age = get_process_age()
+        self.marks = [('process start', now - age if age is not None else now)]
+        self.reported = False
+
+    def mark(self, name):
+        self.marks.append((name, time.monotonic()))
+
+    def has_mark(self, name):
+        return any(mark == name for mark, _ in self.marks)
+
+    def attach(self, pipeline, pad):
+        """
+        Marks the PAUSED and PLAYING state changes of the pipeline and the first buffer on pad,
+        then prints the report.
+        """
+        bus = pipeline.get_bus()
+        bus.enable_sync_message_emission()
+        bus.connect('sync-message::state-changed', self._on_state_changed, pipeline)
+        pad.add_probe(Gst.PadProbeType.BUFFER, self._on_first_buffer)
+        return self
+
+    def _on_state_changed(self, bus, message, pipeline):
+        if message.src != pipeline:
+            return
+        _, new_state, _ = message.parse_state_changed()
+        for state, name in ((Gst.State.PAUSED, 'PAUSED'), (Gst.State.PLAYING, 'PLAYING')):
+            if new_state == state and not self.has_mark(name):
+                self.mark(name)
+
+    def _on_first_buffer(self, pad, info):
+        self.mark('first buffer')
+        self.print_report()
+        return Gst.PadProbeReturn.REMOVE
+
+    def get_report(self):
+        """
+        Returns:
+            list: (stage, duration ms, time since the process start ms) for every mark.
+        """
+        start = self.marks[0][1]
+        report = []
+        for (_, previous), (name, timestamp) in zip(self.marks, self.marks[1:]):
+            report.append((name, (timestamp - previous) * 1000, (timestamp - start) * 1000))
+        return report
+
+    def print_report(self, file=sys.stdout):
+        if self.reported:
+            return
+        self.reported = True
+        print(f"{'startup stage':<32} {'duration [ms]':>14} {'total [ms]':>11}", file=file)
+        for name, duration, total in self.get_report():
+            print(f"{name:<32} {duration:>14.1f} {total:>11.1f}", file=file)
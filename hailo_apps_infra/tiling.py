@@ -0,0 +1,81 @@
+import collections
+import sys
+
+# -----------------------------------------------------------------------------------------------
+# Tiling trade off
+# -----------------------------------------------------------------------------------------------
+# Without tiling the whole frame is letterboxed to the network input: a 3840x2160 frame is scaled by 1/6 for a
+# 640x640 network, and a 30 pixel object ends up 5 pixels wide. TILING_PIPELINE runs the network on tiles instead,
+# each tile is scaled less, but hailonet runs once per tile: the frame rate the device sustains is divided by the
+# number of tiles. The functions below compute both sides for a tile grid, the numbers are estimates from the
+# geometry only (the actual accuracy depends on the model and the scene).
+
+# Grids added by the multi scale levels of hailotilecropper
+SCALE_LEVEL_GRIDS = {
+    0: [],
+    1: [(1, 1)],
+    2: [(1, 1), (2, 2)],
+    3: [(1, 1), (2, 2), (3, 3)],
+}
+# Grids compared by print_tiling_report
+REPORT_GRIDS = [(1, 1), (2, 1), (2, 2), (3, 2), (3, 3), (4, 3)]
+# Smallest object, in network input pixels, the detection models find reliably
+MIN_NETWORK_OBJECT_PIXELS = 16
+
+TilingStats = collections.namedtuple('TilingStats', [
+    'grid',            # "tiles_x x tiles_y" plus the scale level
+    'tiles',           # hailonet runs per frame
+    'relative_fps',    # frame rate relative to no tiling, 1 / tiles
+    'tile_size',       # (width, height) of the tiles of the custom grid, in source pixels
+    'scale',           # network pixels per source pixel
+    'min_object',      # smallest detectable object, in source pixels
+])
+
+
+def get_tile_count(tiles_x, tiles_y, scale_level=0):
+    """Returns the number of tiles per frame, i.e. the hailonet runs per frame."""
+    return tiles_x * tiles_y + sum(x * y for x, y in SCALE_LEVEL_GRIDS[scale_level])
+
+
+def get_tile_size(frame_width, frame_height, tiles_x, tiles_y, overlap_x=0.0, overlap_y=0.0):
+    """
+    Returns the (width, height) of a tile in source pixels. n tiles overlapping by a fraction o of the tile
+    cover the frame when n * tile - (n - 1) * o * tile = frame.
+    """
+    return (
+        frame_width / (tiles_x - overlap_x * (tiles_x - 1)),
+        frame_height / (tiles_y - overlap_y * (tiles_y - 1)),
+    )
+
+
+def get_tiling_stats(frame_width, frame_height, network_width, network_height, tiles_x, tiles_y,
+                     overlap_x=0.1, overlap_y=0.1, scale_level=0):
+    """
+    Returns the TilingStats of a tile grid. The scale is taken on the axis with the fewest network pixels per
+    source pixel, as when the tile is letterboxed to the network input.
+    """
+    tile_width, tile_height = get_tile_size(frame_width, frame_height, tiles_x, tiles_y, overlap_x, overlap_y)
+    scale = min(network_width / tile_width, network_height / tile_height)
+    tiles = get_tile_count(tiles_x, tiles_y, scale_level)
+    grid = f'{tiles_x}x{tiles_y}' + (f' +L{scale_level}' if scale_level else '')
+    return TilingStats(grid, tiles, 1 / tiles, (round(tile_width), round(tile_height)), scale, MIN_NETWORK_OBJECT_PIXELS / scale)
+
+
+def print_tiling_report(frame_width, frame_height, network_width, network_height, tiles_x, tiles_y,
+                        overlap_x=0.1, overlap_y=0.1, scale_level=0, file=sys.stdout):
+    """
+    Prints the TilingStats of the requested grid (marked with *) next to no tiling and the REPORT_GRIDS.
+    """
+    requested = (tiles_x, tiles_y, scale_level)
+    grids = [(x, y, 0) for x, y in REPORT_GRIDS]
+    if requested not in grids:
+        grids.append(requested)
+    print(f"Tiling {frame_width}x{frame_height} for a {network_width}x{network_height} network "
+          f"(overlap {overlap_x:g} x {overlap_y:g}):", file=file)
+    print(f"  {'grid':<10} {'tiles':>5} {'rel. fps':>8} {'tile size':>11} {'scale':>6} {'min object [px]':>16}", file=file)
+    for x, y, level in grids:
+        stats = get_tiling_stats(frame_width, frame_height, network_width, network_height, x, y, overlap_x, overlap_y, level)
+        marker = '*' if (x, y, level) == requested else ' '
+        tile_size = f'{stats.tile_size[0]}x{stats.tile_size[1]}'
+        print(f"{marker} {stats.grid:<10} {stats.tiles:>5} {stats.relative_fps:>8.2f} {tile_size:>11} "
+              f"{stats.scale:>6.2f} {stats.min_object:>16.0f}", file=file)
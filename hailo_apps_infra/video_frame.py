@@ -0,0 +1,392 @@
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import lru_cache
+import numpy as np
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstVideo', '1.0')
+from gi.repository import Gst, GstVideo
+
+# -----------------------------------------------------------------------------------------------
+# Frame layout
+# -----------------------------------------------------------------------------------------------
+# The layout of a raw video frame (plane offsets, row strides) is described by GstVideoInfo for the
+# negotiated caps, and can be overridden per buffer by a GstVideoMeta when an upstream element pads
+# rows or places planes at custom offsets. The layout is derived once per caps and reused for every frame.
+
+# Aliases used in this repo for GStreamer format names
+FORMAT_ALIASES = {
+    'YUYV': 'YUY2',
+}
+
+# Per format: the (rows divisor, columns divisor, channels) of each plane
+PLANE_SHAPES = {
+    'RGB': [(1, 1, 3)],
+    'BGR': [(1, 1, 3)],
+    'RGBA': [(1, 1, 4)],
+    'BGRA': [(1, 1, 4)],
+    'RGBx': [(1, 1, 4)],
+    'BGRx': [(1, 1, 4)],
+    'GRAY8': [(1, 1, 1)],
+    'YUY2': [(1, 1, 2)],
+    'NV12': [(1, 1, 1), (2, 2, 2)],
+    'NV21': [(1, 1, 1), (2, 2, 2)],
+    'I420': [(1, 1, 1), (2, 2, 1), (2, 2, 1)],
+}
+
+
+class PlaneLayout:
+    """
+    The memory layout of a single video plane.
+
+    Attributes:
+        offset (int): Offset of the first pixel of the plane from the start of the buffer, in bytes.
+        stride (int): Distance between the start of two consecutive rows, in bytes.
+        rows (int): Number of rows in the plane.
+        cols (int): Number of pixels (samples) per row.
+        channels (int): Number of interleaved bytes per sample.
+    """
+    __slots__ = ('offset', 'stride', 'rows', 'cols', 'channels')
+
+    def __init__(self, offset, stride, rows, cols, channels):
+        self.offset = offset
+        self.stride = stride
+        self.rows = rows
+        self.cols = cols
+        self.channels = channels
+
+    def view(self, data):
+        shape = (self.rows, self.cols, self.channels) if self.channels > 1 else (self.rows, self.cols)
+        strides = (self.stride, self.channels, 1) if self.channels > 1 else (self.stride, 1)
+        return np.ndarray(shape=shape, dtype=np.uint8, buffer=data, offset=self.offset, strides=strides)
+
+    def __repr__(self):
+        return f"PlaneLayout(offset={self.offset}, stride={self.stride}, rows={self.rows}, cols={self.cols}, channels={self.channels})"
+
+
+class FrameLayout:
+    """
+    The memory layout of a raw video frame, derived from GstVideoInfo.
+
+    Attributes:
+        format (str): The video format as used in the caps ('RGB', 'NV12', 'YUY2', ...).
+        width (int): The width of the video frame.
+        height (int): The height of the video frame.
+        planes (list): A PlaneLayout per plane.
+        size (int): The expected size of a frame in bytes.
+    """
+    def __init__(self, format, width, height, planes, size):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.planes = planes
+        self.size = size
+
+    @classmethod
+    def from_video_info(cls, info, format=None):
+        format = format or info.finfo.name
+        plane_shapes = PLANE_SHAPES.get(FORMAT_ALIASES.get(format, format))
+        if plane_shapes is None:
+            raise ValueError(f"Unsupported format: {format}")
+        planes = [
+            PlaneLayout(info.offset[i], info.stride[i], -(-info.height // rows_div), -(-info.width // cols_div), channels)
+            for i, (rows_div, cols_div, channels) in enumerate(plane_shapes)
+        ]
+        return cls(format, info.width, info.height, planes, info.size)
+
+    def with_video_meta(self, meta):
+        """
+        Returns a layout using the plane offsets and strides of a GstVideoMeta.
+        Returns self when the meta does not change the layout.
+        """
+        if all(meta.offset[i] == plane.offset and meta.stride[i] == plane.stride for i, plane in enumerate(self.planes)):
+            return self
+        planes = [
+            PlaneLayout(meta.offset[i], meta.stride[i], plane.rows, plane.cols, plane.channels)
+            for i, plane in enumerate(self.planes)
+        ]
+        return FrameLayout(self.format, self.width, self.height, planes, self.size)
+
+    def views(self, data):
+        """
+        Builds strided numpy views of every plane over the given buffer data.
+
+        Returns:
+            np.ndarray for single plane formats, a tuple of np.ndarray (one per plane) otherwise.
+        """
+        views = tuple(plane.view(data) for plane in self.planes)
+        return views[0] if len(views) == 1 else views
+
+    def __repr__(self):
+        return f"FrameLayout(format={self.format}, width={self.width}, height={self.height}, planes={self.planes})"
+
+
+@lru_cache(maxsize=32)
+def _layout_from_caps_string(caps_string):
+    info = GstVideo.VideoInfo.new_from_caps(Gst.Caps.from_string(caps_string))
+    if info is None:
+        raise ValueError(f"Caps are not raw video caps: {caps_string}")
+    return FrameLayout.from_video_info(info)
+
+
+@lru_cache(maxsize=32)
+def get_frame_layout_for_format(format, width, height):
+    """
+    Returns the default (cached) frame layout GStreamer uses for the given format and resolution.
+    Note that the default layout is not necessarily tightly packed, e.g. RGB rows are padded to 4 bytes.
+
+    Args:
+        format (str): The video format ('RGB', 'NV12', 'YUYV', etc.).
+        width (int): The width of the video frame.
+        height (int): The height of the video frame.
+
+    Returns:
+        FrameLayout: The frame layout.
+    """
+    video_format = GstVideo.VideoFormat.from_string(FORMAT_ALIASES.get(format, format))
+    if video_format == GstVideo.VideoFormat.UNKNOWN:
+        raise ValueError(f"Unsupported format: {format}")
+    info = GstVideo.VideoInfo.new()
+    info.set_format(video_format, width, height)
+    return FrameLayout.from_video_info(info, format=format)
+
+
+def get_frame_layout(caps):
+    """
+    Returns the (cached) frame layout for the given raw video caps.
+
+    Args:
+        caps (Gst.Caps): Negotiated raw video caps.
+
+    Returns:
+        FrameLayout: The frame layout.
+    """
+    return _layout_from_caps_string(caps.to_string())
+
+
+# Weakly keyed, a pad removed from the pipeline is not kept alive by its cached layout
+_pad_layouts = weakref.WeakKeyDictionary()
+_pad_layouts_lock = threading.Lock()
+
+def get_frame_layout_from_pad(pad):
+    """
+    Returns the frame layout for the current caps of a pad.
+    The layout is cached per pad and only re-derived when the pad caps change, so this is cheap to
+    call on every frame (unlike get_caps_from_pad which parses the caps structure each time).
+
+    Args:
+        pad (Gst.Pad): The pad the buffer is flowing through.
+
+    Returns:
+        FrameLayout: The frame layout, or None if the pad has no caps yet.
+    """
+    caps = pad.get_current_caps()
+    if caps is None:
+        return None
+    cached = _pad_layouts.get(pad)
+    if cached is not None and cached[0].is_equal(caps):
+        return cached[1]
+    layout = get_frame_layout(caps)
+    with _pad_layouts_lock:
+        _pad_layouts[pad] = (caps, layout)
+    return layout
+
+
+def plane_views(layout, data, copy=False):
+    """
+    Returns the planes of a frame over mapped buffer data. Views share memory with the mapped GstBuffer and
+    are marked read-only so callbacks cannot write into pipeline memory, copy=True returns copies instead.
+
+    Args:
+        layout (FrameLayout): The frame layout.
+        data: The mapped buffer data.
+        copy (bool, optional): Return copies that own their data instead of views. Defaults to False.
+
+    Returns:
+        np.ndarray for single plane formats, a tuple of np.ndarray (one per plane) otherwise.
+    """
+    views = layout.views(data)
+    planes = views if isinstance(views, tuple) else (views,)
+    if copy:
+        planes = tuple(plane.copy() for plane in planes)
+    else:
+        for plane in planes:
+            plane.flags.writeable = False
+    return planes if len(planes) > 1 else planes[0]
+
+
+@contextmanager
+def map_video_frame(buffer, layout, copy=False):
+    """
+    Maps a GstBuffer and yields numpy arrays for every plane of the frame, honoring the row strides and
+    plane offsets of the layout and of the buffer's GstVideoMeta (if present).
+
+    The arrays are read-only views valid only inside the `with` block unless `copy=True`.
+
+    Args:
+        buffer (GstBuffer): The GStreamer Buffer to map.
+        layout (FrameLayout): The frame layout, see get_frame_layout / get_frame_layout_from_pad.
+        copy (bool, optional): Yield copies that own their data instead of views. Defaults to False.
+
+    Yields:
+        np.ndarray for single plane formats, a tuple of np.ndarray (one per plane) otherwise.
+    """
+    meta = GstVideo.buffer_get_video_meta(buffer)
+    if meta is not None:
+        layout = layout.with_video_meta(meta)
+
+    success, map_info = buffer.map(Gst.MapFlags.READ)
+    if not success:
+        raise ValueError("Buffer mapping failed")
+    try:
+        yield plane_views(layout, map_info.data, copy)
+    finally:
+        buffer.unmap(map_info)
+
+# -----------------------------------------------------------------------------------------------
+# Vectorized colour conversion
+# -----------------------------------------------------------------------------------------------
+# Limited range YUV to RGB fixed point coefficients (scaled by 256): (Y, V->R, U->G, V->G, U->B)
+YUV_MATRICES = {
+    'bt601': (298, 409, 100, 208, 516),
+    'bt709': (298, 459, 55, 136, 541),
+}
+
+
+def yuv_to_rgb(y, u, v, matrix='bt601'):
+    """
+    Converts full resolution Y, U and V planes (limited range) to an RGB image.
+
+    Args:
+        y, u, v (np.ndarray): uint8 arrays of the same (height, width) shape.
+        matrix (str, optional): 'bt601' or 'bt709'. Defaults to 'bt601'.
+
+    Returns:
+        np.ndarray: A (height, width, 3) uint8 RGB image.
+    """
+    cy, crv, cgu, cgv, cbu = YUV_MATRICES[matrix]
+    c = (y.astype(np.int32) - 16) * cy + 128
+    d = u.astype(np.int32) - 128
+    e = v.astype(np.int32) - 128
+    rgb = np.empty(y.shape + (3,), dtype=np.int32)
+    rgb[..., 0] = c + crv * e
+    rgb[..., 1] = c - cgu * d - cgv * e
+    rgb[..., 2] = c + cbu * d
+    rgb >>= 8
+    return np.clip(rgb, 0, 255, out=rgb).astype(np.uint8)
+
+
+def _sample_indices(size, step):
+    return np.arange(0, size, step)
+
+
+def nv12_to_rgb(y_plane, uv_plane, step=1, matrix='bt601'):
+    """
+    Converts NV12 planes to RGB. With step > 1 only every step-th pixel is read, producing a
+    downscaled RGB image without converting the full frame.
+
+    Args:
+        y_plane (np.ndarray): The (height, width) Y plane.
+        uv_plane (np.ndarray): The (height/2, width/2, 2) interleaved UV plane.
+        step (int, optional): Sampling step in both axes. Defaults to 1.
+        matrix (str, optional): 'bt601' or 'bt709'. Defaults to 'bt601'.
+
+    Returns:
+        np.ndarray: A (ceil(height/step), ceil(width/step), 3) uint8 RGB image.
+    """
+    height, width = y_plane.shape
+    y = y_plane[::step, ::step]
+    if step % 2 == 0:
+        uv = uv_plane[::step // 2, ::step // 2]
+    else:
+        rows = _sample_indices(height, step) // 2
+        cols = _sample_indices(width, step) // 2
+        uv = uv_plane[rows[:, None], cols[None, :]]
+    return yuv_to_rgb(y, uv[..., 0], uv[..., 1], matrix)
+
+
+def i420_to_rgb(y_plane, u_plane, v_plane, step=1, matrix='bt601'):
+    """
+    Converts I420 planes to RGB, see nv12_to_rgb for the step argument.
+    """
+    height, width = y_plane.shape
+    y = y_plane[::step, ::step]
+    rows = _sample_indices(height, step) // 2
+    cols = _sample_indices(width, step) // 2
+    return yuv_to_rgb(y, u_plane[rows[:, None], cols[None, :]], v_plane[rows[:, None], cols[None, :]], matrix)
+
+
+def yuyv_to_rgb(yuyv_plane, step=1, matrix='bt601'):
+    """
+    Converts a packed YUYV (YUY2) plane to RGB, see nv12_to_rgb for the step argument.
+
+    Args:
+        yuyv_plane (np.ndarray): The (height, width, 2) packed plane.
+        step (int, optional): Sampling step in both axes. Defaults to 1.
+        matrix (str, optional): 'bt601' or 'bt709'. Defaults to 'bt601'.
+
+    Returns:
+        np.ndarray: A (ceil(height/step), ceil(width/step), 3) uint8 RGB image.
+    """
+    width = yuyv_plane.shape[1]
+    rows = yuyv_plane[::step]
+    cols = _sample_indices(width, step)
+    u_cols = cols - (cols % 2)
+    return yuv_to_rgb(rows[:, cols, 0], rows[:, u_cols, 1], rows[:, u_cols + 1, 1], matrix)
+
+
+def frame_to_rgb(frame, format, step=1, matrix='bt601'):
+    """
+    Converts the planes yielded by map_video_frame / map_frame to an RGB image.
+    Use step > 1 to get a small RGB thumbnail for the cost of reading only the sampled pixels.
+
+    Args:
+        frame: The plane(s) of the frame.
+        format (str): The video format ('RGB', 'NV12', 'YUYV', etc.).
+        step (int, optional): Sampling step in both axes. Defaults to 1.
+        matrix (str, optional): 'bt601' or 'bt709', used for YUV formats. Defaults to 'bt601'.
+
+    Returns:
+        np.ndarray: A uint8 RGB image. For RGB input with step 1 this is the input itself (no copy).
+    """
+    format = FORMAT_ALIASES.get(format, format)
+    if format == 'RGB':
+        return frame[::step, ::step]
+    if format in ('RGBA', 'RGBx'):
+        return frame[::step, ::step, :3]
+    if format in ('BGR', 'BGRA', 'BGRx'):
+        return frame[::step, ::step, 2::-1]
+    if format == 'GRAY8':
+        gray = frame[::step, ::step]
+        return np.repeat(gray[..., None], 3, axis=2)
+    if format == 'NV12':
+        return nv12_to_rgb(frame[0], frame[1], step, matrix)
+    if format == 'NV21':
+        return nv12_to_rgb(frame[0], frame[1][..., ::-1], step, matrix)
+    if format == 'I420':
+        return i420_to_rgb(frame[0], frame[1], frame[2], step, matrix)
+    if format == 'YUY2':
+        return yuyv_to_rgb(frame, step, matrix)
+    raise ValueError(f"Unsupported format: {format}")
+
+
+def get_rgb_thumbnail(buffer, layout, max_size=160, matrix='bt601'):
+    """
+    Reads a small RGB thumbnail of a frame directly from the mapped buffer.
+    Only the sampled pixels are read and converted; the full frame is never copied.
+
+    Args:
+        buffer (GstBuffer): The GStreamer Buffer.
+        layout (FrameLayout): The frame layout, see get_frame_layout_from_pad.
+        max_size (int, optional): The maximum size of the longest thumbnail side. Defaults to 160.
+        matrix (str, optional): 'bt601' or 'bt709', used for YUV formats. Defaults to 'bt601'.
+
+    Returns:
+        np.ndarray: A uint8 RGB thumbnail that owns its data.
+    """
+    step = max(1, -(-max(layout.width, layout.height) // max_size))
+    with map_video_frame(buffer, layout) as frame:
+        thumbnail = frame_to_rgb(frame, layout.format, step, matrix)
+        # RGB thumbnails are views into the mapped buffer, copy them before unmapping
+        return thumbnail if thumbnail.flags.owndata else thumbnail.copy()
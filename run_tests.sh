@@ -19,6 +19,26 @@ pip install -r tests/test_resources/requirements.txt
 # Run pytest for all test files
 echo "Running tests..."
 pytest --log-cli-level=INFO \
-       "$TESTS_DIR/test_sanity_check.py" 
+       "$TESTS_DIR/test_sanity_check.py" \
+       "$TESTS_DIR/test_video_frame.py" \
+       "$TESTS_DIR/test_shared_frame_ring.py" \
+       "$TESTS_DIR/test_pipeline_benchmark.py" \
+       "$TESTS_DIR/test_multi_app_launcher.py" \
+       "$TESTS_DIR/test_batch_tuner.py" \
+       "$TESTS_DIR/test_pipeline_tuning.py" \
+       "$TESTS_DIR/test_pipeline_builder.py" \
+       "$TESTS_DIR/test_hailo_device.py" \
+       "$TESTS_DIR/test_get_usb_camera.py" \
+       "$TESTS_DIR/test_picamera_source.py" \
+       "$TESTS_DIR/test_tiling.py" \
+       "$TESTS_DIR/test_element_registry.py" \
+       "$TESTS_DIR/test_event_recorder.py" \
+       "$TESTS_DIR/test_metadata_export.py" \
+       "$TESTS_DIR/test_async_callback.py" \
+       "$TESTS_DIR/test_latency_tracer.py" \
+       "$TESTS_DIR/test_multi_stream.py" \
+       "$TESTS_DIR/test_detection_arrays.py" \
+       "$TESTS_DIR/test_queue_monitor.py" \
+       "$TESTS_DIR/test_motion_gate.py" 
 
 echo "All tests completed."
@@ -78,7 +78,10 @@ def main():
         include_package_data=True,
         entry_points={
             'console_scripts': [
-                'get-usb-camera=hailo_apps_infra.get_usb_camera:main'
+                'get-usb-camera=hailo_apps_infra.get_usb_camera:main',
+                'hailo-pipeline-benchmark=hailo_apps_infra.pipeline_benchmark:main',
+                'hailo-multi-app=hailo_apps_infra.multi_app_launcher:main',
+                'hailo-source-chain=hailo_apps_infra.element_registry:main',
             ],
         },
     )
@@ -0,0 +1,85 @@
+# tests/test_async_callback.py
+import threading
+import pytest
+
+pytest.importorskip("gi")
+from hailo_apps_infra.async_callback import AsyncCallbackPool, CallbackWorkItem
+
+
+def make_item(stream_id, index):
+    return CallbackWorkItem(stream_id, index, index * 1000, [])
+
+
+def test_items_of_a_stream_stay_in_order():
+    """Test that each stream goes to one worker and its items are processed in submission order."""
+    processed = []
+    lock = threading.Lock()
+
+    def callback(item, user_data):
+        with lock:
+            processed.append((item.stream_id, item.index))
+
+    pool = AsyncCallbackPool(callback, None, num_workers=3, max_queue_size=100, overflow_policy='block')
+    pool.start()
+    for index in range(50):
+        for stream_id in ('a', 'b', 'c', 'd'):
+            pool.submit(make_item(stream_id, index))
+    pool.stop()
+    assert len(processed) == 200
+    for stream_id in ('a', 'b', 'c', 'd'):
+        assert [index for stream, index in processed if stream == stream_id] == list(range(50))
+    assert pool.get_stats()['processed'] == 200
+
+
+@pytest.mark.parametrize("policy, kept", [('drop-oldest', [0, 3, 4]), ('drop-newest', [0, 1, 2])])
+def test_overflow_policies(policy, kept):
+    """Test that a full queue drops the oldest pending item or the new one, without blocking."""
+    release = threading.Event()
+    processed = []
+
+    def callback(item, user_data):
+        release.wait(5)
+        processed.append(item.index)
+
+    pool = AsyncCallbackPool(callback, None, max_queue_size=2, overflow_policy=policy)
+    pool.start()
+    pool.submit(make_item('', 0))
+    # Wait for the worker to take item 0, the queue then holds up to 2 items
+    for _ in range(500):
+        if not pool._queues[0]:
+            break
+        threading.Event().wait(0.01)
+    results = [pool.submit(make_item('', index)) for index in range(1, 5)]
+    release.set()
+    pool.stop()
+    assert processed == kept
+    assert pool.get_stats()['dropped'] == 2
+    assert results == ([True] * 4 if policy == 'drop-oldest' else [True, True, False, False])
+
+
+def test_stop_processes_pending_items_and_joins():
+    """Test that stop() lets the workers finish the pending items and then exit."""
+    processed = []
+    pool = AsyncCallbackPool(lambda item, user_data: processed.append(item.index), None, num_workers=2, max_queue_size=20)
+    pool.start()
+    for index in range(10):
+        pool.submit(make_item('', index))
+    pool.stop()
+    assert processed == list(range(10))
+    assert not any(worker.is_alive() for worker in pool._workers)
+    assert not pool.running
+
+
+def test_callback_errors_are_counted():
+    """Test that an exception in the callback is counted and does not stop the worker."""
+    def callback(item, user_data):
+        if item.index % 2:
+            raise RuntimeError("odd")
+
+    pool = AsyncCallbackPool(callback, None, max_queue_size=10, overflow_policy='block')
+    pool.start()
+    for index in range(6):
+        pool.submit(make_item('', index))
+    pool.stop()
+    stats = pool.get_stats()
+    assert stats['processed'] == 6 and stats['errors'] == 3
@@ -0,0 +1,42 @@
+# tests/test_batch_tuner.py
+import pytest
+
+pytest.importorskip("gi")
+from hailo_apps_infra.batch_tuner import select_best, get_cache_key, load_cache, save_cache
+
+RESULTS = [
+    {'batch_size': 1, 'scheduler_timeout_ms': None, 'fps': 50.0, 'p95_ms': 20.0},
+    {'batch_size': 2, 'scheduler_timeout_ms': None, 'fps': 80.0, 'p95_ms': 35.0},
+    {'batch_size': 4, 'scheduler_timeout_ms': None, 'fps': 81.0, 'p95_ms': 60.0},
+    {'batch_size': 8, 'scheduler_timeout_ms': None, 'fps': 70.0, 'p95_ms': 120.0},
+]
+
+
+def test_max_fps_prefers_lower_latency_on_ties():
+    """Test that results within the FPS tolerance are decided by latency."""
+    assert select_best(RESULTS)['batch_size'] == 2
+    assert select_best(RESULTS, fps_tolerance=0.0)['batch_size'] == 4
+
+
+def test_latency_budget():
+    """Test the highest FPS within the latency budget, or the lowest latency if none fits."""
+    assert select_best(RESULTS, 'latency', 30.0)['batch_size'] == 1
+    assert select_best(RESULTS, 'latency', 100.0)['batch_size'] == 2
+    assert select_best(RESULTS, 'latency', 10.0)['batch_size'] == 1
+    assert select_best([]) is None
+
+
+def test_cache_key_and_roundtrip(tmp_path):
+    """Test that the cache key depends on the HEF file and the arch, and the cache roundtrip."""
+    hef = tmp_path / 'model.hef'
+    hef.write_bytes(b'0' * 10)
+    key = get_cache_key(str(hef), 'hailo8', 1280, 720)
+    assert key == get_cache_key(str(hef), 'hailo8', 1280, 720)
+    assert key != get_cache_key(str(hef), 'hailo8l', 1280, 720)
+    assert key != get_cache_key(str(hef), 'hailo8', 640, 640)
+    hef.write_bytes(b'0' * 20)
+    assert key != get_cache_key(str(hef), 'hailo8', 1280, 720)
+    cache_path = str(tmp_path / 'cache' / 'batch_tuning.json')
+    assert load_cache(cache_path) == {}
+    save_cache({key: RESULTS[1]}, cache_path)
+    assert load_cache(cache_path) == {key: RESULTS[1]}
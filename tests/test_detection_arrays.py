@@ -0,0 +1,161 @@
+# tests/test_detection_arrays.py
+import importlib
+import sys
+import types
+import numpy as np
+import pytest
+
+# A stand-in for the hailo bindings: only the calls DetectionArrays makes
+
+
+class FakeObject:
+    def __init__(self, object_type, objects=()):
+        self.type = object_type
+        self.objects = list(objects)
+
+    def get_objects_typed(self, object_type):
+        return [obj for obj in self.objects if obj.type == object_type]
+
+
+class FakeROI(FakeObject):
+    def __init__(self, detections):
+        super().__init__('roi', detections)
+
+
+class FakeBBox:
+    def __init__(self, xmin, ymin, width, height):
+        self._values = (xmin, ymin, width, height)
+
+    def xmin(self):
+        return self._values[0]
+
+    def ymin(self):
+        return self._values[1]
+
+    def width(self):
+        return self._values[2]
+
+    def height(self):
+        return self._values[3]
+
+
+class FakeDetection(FakeObject):
+    def __init__(self, bbox, label, confidence, class_id, objects=()):
+        super().__init__('detection', objects)
+        self.bbox, self.label, self.confidence, self.class_id = bbox, label, confidence, class_id
+
+    def get_bbox(self):
+        return self.bbox
+
+    def get_label(self):
+        return self.label
+
+    def get_confidence(self):
+        return self.confidence
+
+    def get_class_id(self):
+        return self.class_id
+
+
+class FakeUniqueID(FakeObject):
+    def __init__(self, unique_id):
+        super().__init__('unique_id')
+        self.unique_id = unique_id
+
+    def get_id(self):
+        return self.unique_id
+
+
+class FakePoint:
+    def __init__(self, x, y, confidence):
+        self.values = (x, y, confidence)
+
+    def x(self):
+        return self.values[0]
+
+    def y(self):
+        return self.values[1]
+
+    def confidence(self):
+        return self.values[2]
+
+
+class FakeLandmarks(FakeObject):
+    def __init__(self, points):
+        super().__init__('landmarks')
+        self.points = points
+
+    def get_points(self):
+        return self.points
+
+
+@pytest.fixture
+def detection_arrays():
+    """Imports detection_arrays against the fake bindings, and restores the real module afterwards."""
+    fake = types.ModuleType('hailo')
+    fake.HailoROI = FakeROI
+    fake.HAILO_DETECTION, fake.HAILO_UNIQUE_ID, fake.HAILO_LANDMARKS, fake.HAILO_CONF_CLASS_MASK = (
+        'detection', 'unique_id', 'landmarks', 'mask')
+    fake.get_roi_from_buffer = lambda buffer: buffer.roi
+    saved = {name: sys.modules.pop(name, None) for name in ('hailo', 'hailo_apps_infra.detection_arrays')}
+    sys.modules['hailo'] = fake
+    try:
+        yield importlib.import_module('hailo_apps_infra.detection_arrays')
+    finally:
+        for name, module in saved.items():
+            sys.modules.pop(name, None)
+            if module is not None:
+                sys.modules[name] = module
+
+
+def make_roi(count, tracked=True, keypoints=0):
+    detections = []
+    for index in range(count):
+        objects = [FakeUniqueID(100 + index)] if tracked and index % 2 == 0 else []
+        if keypoints:
+            objects.append(FakeLandmarks([FakePoint(0.5, 0.5, 0.9)] * keypoints))
+        detections.append(FakeDetection(FakeBBox(0.1 * index, 0.2, 0.1, 0.4), 'person', 0.5 + index / 100, index % 3, objects))
+    return FakeROI(detections)
+
+
+def test_extract_columns(detection_arrays):
+    """Test that the boxes are converted to corners and the untracked detections get track id -1."""
+    arrays = detection_arrays.DetectionArrays().extract(make_roi(3))
+    assert len(arrays) == 3
+    assert np.allclose(arrays.boxes[1], [0.1, 0.2, 0.2, 0.6])
+    assert np.allclose(arrays.scores, [0.5, 0.51, 0.52])
+    assert list(arrays.class_ids) == [0, 1, 2]
+    assert list(arrays.track_ids) == [100, -1, 102]
+    assert arrays.labels == ['person'] * 3
+    assert arrays.keypoints is None and arrays.masks is None
+
+
+def test_keypoints_in_frame_coordinates(detection_arrays):
+    """Test that the landmarks, relative to the box, are returned in frame coordinates."""
+    arrays = detection_arrays.DetectionArrays(num_keypoints=4).extract(make_roi(2, keypoints=3))
+    assert arrays.keypoints.shape == (2, 4, 3)
+    assert np.allclose(arrays.keypoints[1, 0], [0.15, 0.4, 0.9])
+    # Missing keypoints stay zero
+    assert not arrays.keypoints[:, 3].any()
+
+
+def test_growth_and_reuse(detection_arrays):
+    """Test that the arrays grow past the capacity, shrink their views for smaller frames and copy() detaches."""
+    arrays = detection_arrays.DetectionArrays(capacity=2)
+    arrays.extract(make_roi(5))
+    assert arrays.capacity >= 5 and len(arrays.boxes) == 5
+    kept = arrays.copy()
+    arrays.extract(make_roi(1, tracked=False))
+    assert len(arrays.boxes) == 1 and list(arrays.track_ids) == [-1]
+    assert list(kept['track_ids']) == [100, -1, 102, -1, 104]
+    arrays.extract(FakeROI([]))
+    assert len(arrays) == 0 and arrays.boxes.shape == (0, 4)
+
+
+def test_buffer_and_masks(detection_arrays):
+    """Test extraction from a buffer and that the mask references are kept per detection."""
+    mask = FakeObject('mask')
+    roi = make_roi(2)
+    roi.objects[1].objects.append(mask)
+    arrays = detection_arrays.DetectionArrays(with_masks=True).extract(types.SimpleNamespace(roi=roi))
+    assert arrays.masks == [None, mask]
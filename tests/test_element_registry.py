@@ -0,0 +1,69 @@
+# tests/test_element_registry.py
+import pytest
+from hailo_apps_infra.gstreamer_helper_pipelines import SOURCE_PIPELINE, MULTI_SOURCE_PIPELINE
+from hailo_apps_infra.pipeline_builder import PipelineBuilder
+from hailo_apps_infra.element_registry import (
+    DEFAULT_CHAIN,
+    SourceChain,
+    choose_source_chain,
+    get_required_slots,
+    parse_source_chain,
+    sort_rankings,
+)
+
+
+def test_choose_and_parse_source_chain():
+    """Test the chain selected from the rankings and the forced chains."""
+    rankings = {
+        'jpeg': [['jpegdec', 2.0, 300.0], ['decodebin', 2.2, 290.0]],
+        'h264': [['decodebin', 5.0, 120.0], ['avdec_h264', 5.1, 110.0]],
+        'h265': [['v4l2slh265dec', 0.5, 200.0]],
+        'convert_RGB': [['videoconvertscale', 8.0, 90.0], ['videoscale+videoconvert', 20.0, 40.0]],
+    }
+    assert choose_source_chain(rankings) == SourceChain('jpegdec', 'videoconvertscale', ('v4l2slh265dec',))
+    # Legacy elements winning, or no working element, keep the defaults
+    assert choose_source_chain({'convert_RGB': [['videoscale+videoconvert', 20.0, 40.0]], 'jpeg': []}) == DEFAULT_CHAIN
+    assert choose_source_chain(rankings, 'NV12') == SourceChain('jpegdec', None, ('v4l2slh265dec',))
+
+    assert parse_source_chain('legacy') == DEFAULT_CHAIN
+    assert parse_source_chain('jpeg=avdec_mjpeg, convert=v4l2convert,h264=avdec_h264') == \
+        SourceChain('avdec_mjpeg', 'v4l2convert', ('avdec_h264',))
+    assert parse_source_chain('convert=videoscale+videoconvert,h265=decodebin') == DEFAULT_CHAIN
+    for spec in ('jpeg', 'vp9=avdec_vp9'):
+        with pytest.raises(ValueError):
+            parse_source_chain(spec)
+
+    assert get_required_slots(['videotestsrc']) == ['convert_RGB']
+    assert get_required_slots(['/dev/video0', 'a.mp4', 'b.mp4'], 'NV12') == ['convert_NV12', 'jpeg', 'h264', 'h265']
+    assert get_required_slots(['/dev/video0'], no_webcam_compression=True) == ['convert_RGB']
+
+
+def test_rankings_prefer_cpu_time():
+    """Test that the element using the least CPU per frame ranks first, and the frame rate breaks ties."""
+    rankings = [['avdec_h264', 6.0, 240.0], ['v4l2h264dec', 1.2, 150.0], ['decodebin', 1.23, 160.0]]
+    assert [element for element, _, _ in sort_rankings(rankings)] == ['decodebin', 'v4l2h264dec', 'avdec_h264']
+
+
+def test_source_pipeline_chain():
+    """Test the decoder and converter of SOURCE_PIPELINE with a source chain."""
+    assert SOURCE_PIPELINE('/dev/video0', chain=DEFAULT_CHAIN) == SOURCE_PIPELINE('/dev/video0')
+    chain = SourceChain('v4l2jpegdec', 'videoconvertscale', ())
+    pipeline = SOURCE_PIPELINE('/dev/video0', chain=chain)
+    assert 'jpegparse name=source_jpegparse ! v4l2jpegdec name=source_decoder ! ' in pipeline
+    assert 'videoconvertscale n-threads=3 name=source_convert qos=false ! ' in pipeline
+    assert 'videoscale' not in pipeline.replace('videoconvertscale', '') and 'decodebin' not in pipeline
+    pipeline = SOURCE_PIPELINE('video.mp4', chain=SourceChain(None, 'v4l2convert', ('avdec_h264',)))
+    assert 'decodebin name=source_decodebin ' in pipeline
+    assert 'v4l2convert name=source_convert qos=false ! ' in pipeline
+    assert SOURCE_PIPELINE('video.mp4', chain=chain, scale=False, convert=False) == \
+        SOURCE_PIPELINE('video.mp4', scale=False, convert=False)
+    assert MULTI_SOURCE_PIPELINE(['/dev/video0', 'video.mp4'], chain=chain).count('videoconvertscale') == 2
+
+    # The single converter stays while one of its stages is needed
+    builder = PipelineBuilder(optimize=True, source_chain=chain)
+    pipeline = builder.add_source('/dev/video0', 1280, 720).build()
+    assert 'videoconvertscale n-threads=3 name=source_convert' in pipeline
+    assert builder.removed == []
+    builder = PipelineBuilder(optimize=True, source_chain=chain)
+    assert 'source_convert' not in builder.add_source('videotestsrc', 640, 640).build()
+    assert [element for element, _ in builder.removed] == ['source_convert_q', 'source_convert']
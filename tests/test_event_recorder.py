@@ -0,0 +1,98 @@
+# tests/test_event_recorder.py
+import pytest
+from hailo_apps_infra.gstreamer_helper_pipelines import EVENT_RECORDING_PIPELINE
+
+
+def test_event_recording_pipeline():
+    """Test that the recording branch hangs off a tee and the frames continue through the output queue."""
+    pipeline = EVENT_RECORDING_PIPELINE(bitrate=1000, key_int_max=15)
+    assert pipeline.startswith('tee name=event_recorder_tee event_recorder_tee. ! queue name=event_recorder_q leaky=downstream ')
+    assert 'bitrate=1000 key-int-max=15 ! h264parse config-interval=-1 ! ' in pipeline
+    assert 'appsink name=event_recorder_appsink ' in pipeline
+    assert pipeline.endswith('event_recorder_tee. ! queue name=event_recorder_output_q leaky=no max-size-buffers=3 max-size-bytes=0 max-size-time=0  ')
+
+
+def test_pre_roll_ring(tmp_path):
+    """Test that the pre-roll is kept in whole GOPs and within the memory cap."""
+    pytest.importorskip("gi")
+    from gi.repository import Gst
+    from hailo_apps_infra.event_recorder import EventRecorder
+    Gst.init(None)
+    caps = Gst.Caps.from_string('video/x-h264, stream-format=byte-stream, alignment=au')
+
+    def frame(index, size=1000):
+        buffer = Gst.Buffer.new_wrapped(bytes(size))
+        buffer.pts = index * Gst.SECOND // 10
+        if index % 10:
+            buffer.set_flags(Gst.BufferFlags.DELTA_UNIT)
+        return buffer
+
+    recorder = EventRecorder(str(tmp_path), pre_roll=1.5, post_roll=0.5, max_bytes=100000)
+    assert not recorder.trigger()
+    for index in range(55):
+        recorder.add_buffer(frame(index), caps)
+    # 1.5 s back from frame 54 is frame 39, the ring starts at the keyframe before it
+    assert recorder.gops[0][0] == 30 * Gst.SECOND // 10
+    assert recorder.ring_bytes == 25 * 1000
+    stats = recorder.get_stats()
+    assert stats['ring_seconds'] == pytest.approx(2.4)
+
+    small = EventRecorder(str(tmp_path), pre_roll=10, max_bytes=15000)
+    for index in range(30):
+        small.add_buffer(frame(index), caps)
+    assert small.ring_bytes <= 15000 and small.peak_bytes <= 15000
+    assert small.gops[0][0] == 20 * Gst.SECOND // 10
+
+    # A GOP over the cap is dropped, the ring starts again at the next keyframe
+    tiny = EventRecorder(str(tmp_path), max_bytes=5000)
+    for index in range(12):
+        tiny.add_buffer(frame(index), caps)
+    assert tiny.dropped_frames == 6 + 4 and tiny.ring_bytes == 2000
+    assert tiny.gops[0][0] == Gst.SECOND
+
+
+def test_clip_of_encoded_frames(tmp_path):
+    """Test that a triggered clip of x264enc frames is a valid MP4 starting on a keyframe, with the pre and post roll."""
+    pytest.importorskip("gi")
+    from gi.repository import Gst
+    from hailo_apps_infra.event_recorder import EventRecorder
+    Gst.init(None)
+    if any(Gst.ElementFactory.find(name) is None for name in ('x264enc', 'h264parse', 'mp4mux', 'qtdemux')):
+        pytest.skip("needs x264enc, h264parse, mp4mux and qtdemux")
+
+    # Encode with the recording branch and keep the access units, then replay them into the recorder
+    pipeline = Gst.parse_launch(
+        f'videotestsrc num-buffers=60 pattern=ball ! video/x-raw, width=320, height=240, framerate=30/1 ! '
+        f'{EVENT_RECORDING_PIPELINE(key_int_max=15)} ! fakesink sync=false')
+    samples = []
+    appsink = pipeline.get_by_name('event_recorder_appsink')
+    appsink.connect('new-sample', lambda sink: samples.append(sink.emit('pull-sample')) or Gst.FlowReturn.OK)
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    assert message is not None and message.type == Gst.MessageType.EOS and len(samples) == 60
+
+    recorder = EventRecorder(str(tmp_path), pre_roll=1.0, post_roll=0.5)
+    for sample in samples[:40]:
+        recorder.add_buffer(sample.get_buffer(), sample.get_caps())
+    assert recorder.trigger('person')
+    pts = [sample.get_buffer().pts for sample in samples]
+    first = pts.index(recorder.gops[0][0])
+    last = next(index for index in range(40, 60) if pts[index] >= pts[39] + recorder.post_roll)
+    for sample in samples[40:]:
+        recorder.add_buffer(sample.get_buffer(), sample.get_caps())
+    recorder.close()
+    assert len(recorder.clips) == 1 and recorder.writers[0].error is None
+
+    # Demux the clip
+    demux = Gst.parse_launch(f'filesrc location="{recorder.clips[0]}" ! qtdemux ! h264parse ! fakesink name=sink sync=false')
+    keyframes = []
+    demux.get_by_name('sink').get_static_pad('sink').add_probe(
+        Gst.PadProbeType.BUFFER,
+        lambda pad, info: keyframes.append(not info.get_buffer().has_flags(Gst.BufferFlags.DELTA_UNIT)) or Gst.PadProbeReturn.OK)
+    demux.set_state(Gst.State.PLAYING)
+    message = demux.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    demux.set_state(Gst.State.NULL)
+    assert message is not None and message.type == Gst.MessageType.EOS
+    assert len(keyframes) == last - first + 1
+    assert keyframes[0]
@@ -0,0 +1,70 @@
+# tests/test_get_usb_camera.py
+from hailo_apps_infra import get_usb_camera
+from hailo_apps_infra.get_usb_camera import list_video_devices, parse_uevent, UsbCameraMonitor, VideoDevice
+
+
+def make_node(root, node, minor, device_path, udev=None):
+    """Creates the /dev, sysfs and udev database entries of a video4linux node under root."""
+    (root / 'dev').mkdir(exist_ok=True)
+    (root / 'dev' / node).write_text('')
+    device_dir = root / 'devices' / device_path
+    device_dir.mkdir(parents=True, exist_ok=True)
+    sysfs = root / 'sys' / node
+    sysfs.mkdir(parents=True)
+    (sysfs / 'dev').write_text(f'81:{minor}\n')
+    (sysfs / 'name').write_text(f'Camera {node}\n')
+    (sysfs / 'device').symlink_to(device_dir)
+    (root / 'udev').mkdir(exist_ok=True)
+    if udev is not None:
+        (root / 'udev' / f'c81:{minor}').write_text(''.join(f'E:{line}\n' for line in udev))
+
+
+def test_list_video_devices(tmp_path, monkeypatch):
+    """Test the records read from sysfs and the udev database, the filters and the cache."""
+    monkeypatch.setattr(get_usb_camera, '_device_cache', {})
+    usb_path = 'platform/xhci/usb1/1-1/1-1:1.0'
+    make_node(tmp_path, 'video0', 0, usb_path, ['ID_BUS=usb', 'ID_V4L_CAPABILITIES=:capture:', 'ID_PATH=platform-xhci-usb-0:1:1.0'])
+    # The metadata node of the same UVC camera
+    make_node(tmp_path, 'video1', 1, usb_path, ['ID_BUS=usb', 'ID_V4L_CAPABILITIES=:'])
+    # A platform device without a udev entry
+    make_node(tmp_path, 'video10', 10, 'platform/codec')
+    roots = dict(dev_root=str(tmp_path / 'dev'), sysfs_root=str(tmp_path / 'sys'), udev_root=str(tmp_path / 'udev'))
+
+    devices = list_video_devices(**roots)
+    assert [record.device for record in devices] == [str(tmp_path / 'dev' / 'video0')]
+    assert devices[0].name == 'Camera video0'
+    assert devices[0].bus_path == 'platform-xhci-usb-0:1:1.0'
+    # Regular files can't be queried with ioctls
+    assert devices[0].formats is None
+    everything = list_video_devices(usb_only=False, capture_only=False, **roots)
+    assert [record.name for record in everything] == ['Camera video0', 'Camera video1', 'Camera video10']
+    assert everything[2].bus is None and everything[2].bus_path.endswith('platform/codec')
+
+    # Without udev the bus comes from the sysfs path
+    (tmp_path / 'udev' / 'c81:1').write_text('E:ID_V4L_CAPABILITIES=:capture:\n')
+    assert len(list_video_devices(**roots)) == 1
+    assert len(list_video_devices(use_cache=False, **roots)) == 2
+
+
+def test_parse_uevent():
+    """Test the parsing of kernel uevents, udev messages are ignored."""
+    event = parse_uevent(b'add@/devices/usb1/1-1/video4linux/video0\0ACTION=add\0SUBSYSTEM=video4linux\0DEVNAME=video0\0')
+    assert event == {'ACTION': 'add', 'SUBSYSTEM': 'video4linux', 'DEVNAME': 'video0'}
+    assert parse_uevent(b'libudev\0\xfe\xed\xca\xfe') == {}
+
+
+def test_monitor_scan(monkeypatch):
+    """Test the added / removed callbacks of the hotplug monitor."""
+    cameras = [VideoDevice('/dev/video0', 'cam0', 'usb', 'usb-0:1', True, None)]
+    monkeypatch.setattr(get_usb_camera, 'list_video_devices', lambda **kwargs: list(cameras))
+    monkeypatch.setattr(get_usb_camera, '_get_cache_key', lambda device: (device, 1))
+    added, removed = [], []
+    monitor = UsbCameraMonitor(on_added=added.append, on_removed=removed.append)
+    monitor.scan()
+    assert [record.device for record in added] == ['/dev/video0'] and removed == []
+
+    cameras[:] = [VideoDevice('/dev/video2', 'cam2', 'usb', 'usb-0:2', True, None)]
+    monitor.scan()
+    assert [record.device for record in added] == ['/dev/video0', '/dev/video2']
+    assert [record.device for record in removed] == ['/dev/video0']
+    assert list(monitor.devices) == ['/dev/video2']
@@ -0,0 +1,48 @@
+# tests/test_hailo_device.py
+from hailo_apps_infra import hailo_device
+from hailo_apps_infra.hailo_device import parse_identify_output, get_device_identity, invalidate_device_cache
+
+IDENTIFY_OUTPUT = """Executing on device: 0000:01:00.0
+Identifying board
+Control Protocol Version: 2
+Firmware Version: 4.20.0 (release,app,extended context switch buffer)
+Logger Version: 0
+Board Name: Hailo-8
+Device Architecture: HAILO8L
+Serial Number: HLDDLBB234500128
+"""
+
+
+def test_parse_identify_output():
+    """Test the architecture and the identity fields parsed from hailortcli."""
+    identity = parse_identify_output(IDENTIFY_OUTPUT)
+    assert identity['arch'] == 'hailo8l'
+    assert identity['Serial Number'] == 'HLDDLBB234500128'
+    assert parse_identify_output(IDENTIFY_OUTPUT.replace('HAILO8L', 'HAILO8'))['arch'] == 'hailo8'
+    assert parse_identify_output('Device Architecture: HAILO15')['arch'] is None
+
+
+def test_identity_cache(tmp_path, monkeypatch):
+    """Test that the identity is cached, invalidated by a new key, and that failures are not cached."""
+    path = str(tmp_path / 'device.json')
+    calls = []
+    key = ['boot-1']
+    identity = [parse_identify_output(IDENTIFY_OUTPUT)]
+    monkeypatch.setattr(hailo_device, 'identify_device', lambda: calls.append(1) or identity[0])
+    monkeypatch.setattr(hailo_device, 'get_device_cache_key', lambda: key[0])
+
+    assert get_device_identity(path=path)['arch'] == 'hailo8l'
+    assert get_device_identity(path=path)['arch'] == 'hailo8l'
+    assert len(calls) == 1
+    # A reboot (new key) runs the detection again
+    key[0] = 'boot-2'
+    get_device_identity(path=path)
+    assert len(calls) == 2
+    get_device_identity(use_cache=False, path=path)
+    assert len(calls) == 3
+    # Failures are not cached
+    invalidate_device_cache(path)
+    identity[0] = None
+    assert get_device_identity(path=path) is None
+    assert get_device_identity(path=path) is None
+    assert len(calls) == 5
@@ -0,0 +1,123 @@
+# tests/test_latency_tracer.py
+import sys
+import types
+import pytest
+
+pytest.importorskip("gi")
+from gi.repository import Gst
+from hailo_apps_infra.latency_tracer import LatencyHistogram, LatencyTracer, get_queue_topology
+
+
+def run_to_eos(pipeline):
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    assert message is not None and message.type == Gst.MessageType.EOS
+
+
+def test_histogram_percentiles():
+    """Test that the log scale buckets keep the percentiles within their resolution."""
+    histogram = LatencyHistogram()
+    for latency_ms in range(1, 101):
+        histogram.add(latency_ms * 1_000_000)
+    summary = histogram.summary()
+    assert summary['count'] == 100
+    assert summary['mean_ms'] == pytest.approx(50.5)
+    assert summary['p50_ms'] == pytest.approx(50, rel=0.1)
+    assert summary['p99_ms'] <= summary['max_ms'] == 100
+    assert LatencyHistogram().percentile(50) == 0.0
+
+
+def test_queue_topology():
+    """Test that the queues are ordered upstream first, with the elements between them."""
+    Gst.init(None)
+    pipeline = Gst.parse_launch(
+        'videotestsrc num-buffers=1 ! queue name=a ! videoconvert name=convert ! tee name=split '
+        'split. ! queue name=b ! fakesink split. ! queue name=c ! fakesink')
+    order, links = get_queue_topology(pipeline)
+    assert order[0] == 'a' and set(order[1:]) == {'b', 'c'}
+    assert sorted(links['a']) == [('b', ['convert', 'split']), ('c', ['convert', 'split'])]
+    assert links['b'] == [] and links['c'] == []
+
+
+def test_tracer_measures_stages():
+    """Test that the time spent between two queues is recorded as the stage of the elements between them."""
+    Gst.init(None)
+    pipeline = Gst.parse_launch(
+        'videotestsrc num-buffers=30 ! queue name=a ! identity name=slow sleep-time=2000 ! queue name=b ! fakesink sync=false')
+    tracer = LatencyTracer(pipeline).attach()
+    run_to_eos(pipeline)
+    summary = tracer.get_summary()
+    assert list(summary) == ['queue:a', 'slow', 'queue:b', 'end-to-end']
+    assert summary['slow']['count'] == 30
+    assert summary['slow']['p50_ms'] >= 1.5
+    assert summary['end-to-end']['p50_ms'] >= summary['slow']['p50_ms']
+
+
+def test_streams_with_the_same_pts(monkeypatch):
+    """Test that frames of two streams with the same PTS are timed apart in a queue the streams share."""
+    fake_hailo = types.ModuleType('hailo')
+    fake_hailo.get_roi_from_buffer = lambda buffer: types.SimpleNamespace(get_stream_id=lambda: buffer.stream_id)
+    monkeypatch.setitem(sys.modules, 'hailo', fake_hailo)
+    tracer = LatencyTracer(None)
+    tracer.upstream = {'shared': [], 'display': [('shared', 'stage')]}
+    tracer._enter = {'shared': {}, 'display': {}}
+    tracer._leave = {'shared': {}, 'display': {}}
+    tracer._last_queues = {'display'}
+    tracer._roi_stream_ids = True
+    events = [(0, 'enter', 'shared', 'sink_0'), (10, 'leave', 'shared', 'sink_0'),
+              (20, 'enter', 'shared', 'sink_1'), (30, 'leave', 'shared', 'sink_1'),
+              (35, 'enter', 'display', 'sink_1'), (40, 'leave', 'display', 'sink_1'),
+              (50, 'enter', 'display', 'sink_0'), (60, 'leave', 'display', 'sink_0')]
+    for now, event, name, stream_id in events:
+        monkeypatch.setattr('time.monotonic_ns', lambda: now)
+        buffer = types.SimpleNamespace(pts=0, stream_id=stream_id)
+        probe = tracer._on_enter if event == 'enter' else tracer._on_leave
+        probe(None, types.SimpleNamespace(get_buffer=lambda: buffer), name)
+    assert tracer.histograms['stage'].total == 5 + 40
+    assert tracer.histograms['end-to-end'].total == 20 + 60
+    assert tracer.negative_samples == 0
+
+
+def write_clip(path, frames):
+    """Encodes a short H.264 MP4 clip, skips the test without x264enc / mp4mux."""
+    if any(Gst.ElementFactory.find(name) is None for name in ('x264enc', 'h264parse', 'mp4mux')):
+        pytest.skip("needs x264enc, h264parse and mp4mux")
+    run_to_eos(Gst.parse_launch(
+        f'videotestsrc num-buffers={frames} ! video/x-raw, width=320, height=240, framerate=30/1 ! '
+        f'x264enc ! h264parse ! mp4mux ! filesink location={path}'))
+
+
+def test_multi_source_streams_are_kept_apart(tmp_path):
+    """Test that two files starting at PTS 0 are timed per stream through the shared queues, never negative."""
+    Gst.init(None)
+    if Gst.ElementFactory.find('hailoroundrobin') is None:
+        pytest.skip("needs the TAPPAS hailoroundrobin and hailostreamrouter")
+    from hailo_apps_infra.gstreamer_helper_pipelines import MULTI_SOURCE_PIPELINE, STREAM_ROUTER_PIPELINE, QUEUE
+    clips = [str(tmp_path / f'{index}.mp4') for index in range(2)]
+    for clip in clips:
+        write_clip(clip, 30)
+    outputs = [QUEUE(name=f'out_{index}_q') + ' ! fakesink sync=false' for index in range(2)]
+    pipeline = Gst.parse_launch(
+        f'{MULTI_SOURCE_PIPELINE(clips, 320, 240)} ! identity name=slow sleep-time=2000 ! {STREAM_ROUTER_PIPELINE(outputs)}')
+    tracer = LatencyTracer(pipeline).attach()
+    assert tracer._stream_ids['source_0_roundrobin_q'] == 'sink_0'
+    assert tracer._stream_ids['source_1_roundrobin_q'] == 'sink_1'
+    run_to_eos(pipeline)
+    summary = tracer.get_summary()
+    assert tracer.negative_samples == 0
+    assert summary['end-to-end']['count'] == 60
+    assert summary['slow+stream_router']['count'] == 60 and summary['slow+stream_router']['p50_ms'] >= 1.5
+
+
+def test_end_to_end_at_the_display_only():
+    """Test that a leaky side branch, like the event recording queue, does not record end to end samples."""
+    Gst.init(None)
+    pipeline = Gst.parse_launch(
+        'videotestsrc num-buffers=20 ! queue name=a ! tee name=split '
+        'split. ! queue name=recorder_q leaky=downstream ! fakesink sync=false '
+        'split. ! queue name=hailo_display_q ! fakesink name=hailo_display sync=false')
+    tracer = LatencyTracer(pipeline).attach()
+    assert tracer._last_queues == {'hailo_display_q'}
+    run_to_eos(pipeline)
+    assert tracer.get_summary()['end-to-end']['count'] == 20
@@ -0,0 +1,108 @@
+# tests/test_metadata_export.py
+import os
+import types
+import numpy as np
+from hailo_apps_infra.gstreamer_helper_pipelines import METADATA_EXPORT_PIPELINE
+from hailo_apps_infra.metadata_export import (
+    MetadataExporter,
+    MetadataReader,
+    COLUMN_ALIGNMENT,
+    encode_rle,
+    decode_rle,
+)
+
+
+def make_detections(count, num_keypoints=0):
+    return types.SimpleNamespace(
+        boxes=np.full((count, 4), 0.25, dtype=np.float32),
+        scores=np.linspace(0.5, 1.0, count, dtype=np.float32),
+        class_ids=np.arange(count, dtype=np.int32),
+        track_ids=np.arange(count, dtype=np.int32) + 100,
+        keypoints=np.ones((count, num_keypoints, 3), dtype=np.float32) if num_keypoints else None,
+        labels=['person', 'car', 'person'][:count],
+    )
+
+
+def test_metadata_export_pipeline():
+    """Test that the export stage is a queue and the identity the exporter probes."""
+    pipeline = METADATA_EXPORT_PIPELINE()
+    assert pipeline.startswith('queue name=metadata_export_q ')
+    assert pipeline.endswith('! identity name=metadata_export ')
+
+
+def test_rle_round_trip():
+    """Test that masks starting with foreground, empty masks and missing masks survive the encoding."""
+    rng = np.random.default_rng(0)
+    masks = [rng.random((7, 5)) > 0.5, np.ones((3, 4), dtype=bool), None, np.zeros((2, 2), dtype=bool)]
+    runs, offsets = encode_rle(masks)
+    assert list(runs[offsets[1]:offsets[2]]) == [0, 12]
+    assert offsets[2] == offsets[3]
+    for index, mask in enumerate(masks):
+        if mask is not None:
+            assert (decode_rle(runs[offsets[index]:offsets[index + 1]], *mask.shape) == mask).all()
+
+
+def test_export_round_trip(tmp_path):
+    """Test that the columns, keypoints, masks and stream ids are read back from the mapped chunks."""
+    exporter = MetadataExporter(str(tmp_path), chunk_frames=4, num_keypoints=17, with_masks=True)
+    mask = np.eye(6, dtype=bool)
+    for index in range(10):
+        count = index % 3
+        exporter.add_frame(make_detections(count, 17), index * 1000, f'src_{index % 2}', [mask] * count)
+    exporter.close()
+    stats = exporter.get_stats()
+    assert stats['written_frames'] == 10 and stats['chunks'] == 3 and stats['dropped_frames'] == 0
+
+    with MetadataReader(str(tmp_path)) as reader:
+        assert reader.num_frames == 10 and reader.num_detections == 9
+        assert list(reader.column('pts')) == [index * 1000 for index in range(10)]
+        assert list(reader.column('stream', decode=True)[:3]) == ['src_0', 'src_1', 'src_0']
+        assert list(reader.column('labels', decode=True)[:3]) == ['person', 'person', 'car']
+        assert list(reader.column('frame', per_detection=True)[:3]) == [1, 2, 2]
+        assert reader.column('keypoints').shape == (9, 17, 3)
+        chunk = reader.chunks[0]
+        assert chunk.frame_detections(2) == slice(1, 3)
+        assert list(chunk['track_ids'][chunk.frame_detections(2)]) == [100, 101]
+        assert (chunk.get_mask(0) == mask).all()
+        assert chunk['boxes'].ctypes.data % COLUMN_ALIGNMENT == 0
+
+
+def test_rotation_and_truncated_chunk(tmp_path):
+    """Test that the files rotate by size and that a chunk cut at the end of a file is skipped."""
+    exporter = MetadataExporter(str(tmp_path), chunk_frames=2, rotate_bytes=1, rotate_seconds=0)
+    for index in range(6):
+        exporter.add_frame(make_detections(1), index, '')
+    exporter.close()
+    assert len(exporter.files) == 3
+
+    with open(exporter.files[-1], 'ab') as file:
+        with open(exporter.files[0], 'rb') as first:
+            file.write(first.read()[:100])
+    with MetadataReader(str(tmp_path)) as reader:
+        assert [os.path.basename(path) for path in reader.paths] == [os.path.basename(path) for path in exporter.files]
+        assert reader.num_frames == 6
+
+
+def test_failed_write_is_cut_back(tmp_path, monkeypatch):
+    """Test that a chunk failing partway through is removed from the file and the next chunks stay readable."""
+    from hailo_apps_infra import metadata_export
+    serialize_chunk = metadata_export.serialize_chunk
+    calls = []
+
+    def failing_serialize_chunk(*args, **kwargs):
+        calls.append(1)
+        for index, part in enumerate(serialize_chunk(*args, **kwargs)):
+            if len(calls) == 2 and index == 2:
+                raise OSError("No space left on device")
+            yield part
+
+    monkeypatch.setattr(metadata_export, 'serialize_chunk', failing_serialize_chunk)
+    exporter = MetadataExporter(str(tmp_path), chunk_frames=2)
+    for index in range(6):
+        exporter.add_frame(make_detections(1), index, '')
+    exporter.close()
+    stats = exporter.get_stats()
+    assert stats['written_frames'] == 4 and stats['dropped_frames'] == 2 and stats['files'] == 1
+
+    with MetadataReader(str(tmp_path)) as reader:
+        assert list(reader.column('pts')) == [0, 1, 4, 5]
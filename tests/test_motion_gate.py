@@ -0,0 +1,108 @@
+# tests/test_motion_gate.py
+import io
+import os
+import sys
+import types
+import pytest
+
+pytest.importorskip("gi")
+from gi.repository import Gst
+from hailo_apps_infra.gstreamer_helper_pipelines import INFERENCE_PIPELINE_WRAPPER, MOTION_GATE_SO, GATED_FRAME_META
+from hailo_apps_infra.motion_gate import MotionGate
+
+
+def make_info(stream_id, pts):
+    buffer = types.SimpleNamespace(stream_id=stream_id, pts=pts)
+    return types.SimpleNamespace(get_buffer=lambda: buffer)
+
+
+class FakeLibrary:
+    """The ctypes functions of libmotion_gate.so MotionGate reads the counters with."""
+    def __init__(self, streams):
+        self.streams = streams
+
+    def motion_gate_stream_count(self):
+        return len(self.streams)
+
+    def motion_gate_stream_stats(self, index, stream_id, size, frames, gated):
+        stream_id.value = self.streams[index][0].encode()
+        frames._obj.value, gated._obj.value = self.streams[index][1:]
+        return 0
+
+
+def test_hailonet_time_per_stream(monkeypatch):
+    """Test that frames of different streams with the same PTS are timed separately, and the saved time wording."""
+    fake_hailo = types.ModuleType('hailo')
+    fake_hailo.get_roi_from_buffer = lambda buffer: types.SimpleNamespace(get_stream_id=lambda: buffer.stream_id)
+    monkeypatch.setitem(sys.modules, 'hailo', fake_hailo)
+    gate = MotionGate(so_path=os.devnull + '.so')
+    assert gate.library is None and gate.get_stats() == []
+    for stream_id in ('sink_0', 'sink_1'):
+        gate._on_hailonet_input(None, make_info(stream_id, 1000))
+    for stream_id in ('sink_1', 'sink_0'):
+        gate._on_hailonet_output(None, make_info(stream_id, 1000))
+    assert gate.hailonet_frames == 2 and not gate._entered
+
+    gate.hailonet_time = 0.02
+    gate.library = FakeLibrary([('sink_0', 100, 75)])
+    assert gate.get_stats() == [{'stream_id': 'sink_0', 'frames': 100, 'gated': 75, 'gated_fraction': 0.75,
+                                 'saved_ms': pytest.approx(750.0)}]
+    output = io.StringIO()
+    gate.print_stats(file=output)
+    assert 'time inside hailonet saved 0.8 s (not accelerator time)' in output.getvalue()
+
+
+def run_gated_pipeline(pattern, width, height, frames):
+    """
+    Runs videotestsrc frames through the motion gate wrapper. The inner branch adds one detection per inferred
+    frame, with the frame index in the confidence. Returns (gated, confidences of the detections) per frame.
+    """
+    hailo = pytest.importorskip("hailo")
+    Gst.init(None)
+    if not os.path.exists(MOTION_GATE_SO) or Gst.ElementFactory.find('hailocropper') is None:
+        pytest.skip("needs libmotion_gate.so (compile_postprocess.sh) and the TAPPAS elements")
+    pipeline = Gst.parse_launch(
+        f'videotestsrc num-buffers={frames} pattern={pattern} ! '
+        f'video/x-raw, format=RGB, width={width}, height={height}, framerate=30/1 ! '
+        f'{INFERENCE_PIPELINE_WRAPPER("queue ! identity name=inner", motion_gate=True)} ! fakesink name=sink'
+    )
+    index = {'inferred': 0}
+
+    def add_detection(pad, info):
+        roi = hailo.get_roi_from_buffer(info.get_buffer())
+        roi.add_object(hailo.HailoDetection(hailo.HailoBBox(0.1, 0.1, 0.2, 0.2), 'person', index['inferred'] / 100))
+        index['inferred'] += 1
+        return Gst.PadProbeReturn.OK
+
+    results = []
+
+    def record(pad, info):
+        roi = hailo.get_roi_from_buffer(info.get_buffer())
+        gated = any(meta.get_user_string() == GATED_FRAME_META for meta in roi.get_objects_typed(hailo.HAILO_USER_META))
+        results.append((gated, [round(detection.get_confidence(), 2) for detection in roi.get_objects_typed(hailo.HAILO_DETECTION)]))
+        return Gst.PadProbeReturn.OK
+
+    pipeline.get_by_name('inner').get_static_pad('src').add_probe(Gst.PadProbeType.BUFFER, add_detection)
+    pipeline.get_by_name('sink').get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, record)
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    pipeline.set_state(Gst.State.NULL)
+    assert message is not None and message.type == Gst.MessageType.EOS
+    return results
+
+
+def test_static_frames_are_gated_and_carry_detections():
+    """Test that static frames are gated except the keep-alive frame, with copies of the last inferred detections."""
+    MotionGate(threshold=2.0, keepalive_frames=4)
+    results = run_gated_pipeline('solid-color', 128, 96, 12)
+    assert [gated for gated, _ in results] == [False, True, True, True] * 3
+    # Inferred frames 0, 4 and 8 are the 1st, 2nd and 3rd frames through the inner branch
+    assert [confidences for _, confidences in results] == [[0.0]] * 4 + [[0.01]] * 4 + [[0.02]] * 4
+
+
+def test_moving_frames_are_inferred():
+    """Test that every frame differing from the last inferred one goes to the inference."""
+    MotionGate(threshold=0.0, keepalive_frames=100)
+    results = run_gated_pipeline('ball', 160, 90, 6)
+    assert [gated for gated, _ in results] == [False] * 6
+    assert [confidences for _, confidences in results] == [[index / 100] for index in range(6)]
@@ -0,0 +1,77 @@
+# tests/test_multi_app_launcher.py
+import os
+import sys
+import time
+import pytest
+from hailo_apps_infra.multi_app_launcher import parse_fps_line, assign_cores, ManagedApp, MultiAppLauncher
+
+
+def test_parse_fps_line():
+    """Test parsing the FPS lines of single and multi stream apps."""
+    assert parse_fps_line("FPS: 29.97, Droprate: 0.00, Avg FPS: 30.01\n") == (None, 29.97)
+    assert parse_fps_line("hailo_display_1 FPS: 15.00, Droprate: 0.00, Avg FPS: 15.00") == ('hailo_display_1', 15.0)
+    assert parse_fps_line("Total FPS: 45.00") is None
+    assert parse_fps_line("Starting pipeline") is None
+
+
+def test_assign_cores():
+    """Test that pinned apps keep their cores and the others share the remaining ones."""
+    configs = [{'name': 'a', 'cores': [0]}, {'name': 'b'}, {'name': 'c'}]
+    assert assign_cores(configs, available_cores=[0, 1, 2, 3, 4]) == [[0], [1, 3], [2, 4]]
+    assert assign_cores([{'name': 'a'}, {'name': 'b'}], available_cores=[0]) == [[0], [0]]
+
+
+def test_command_line():
+    """Test that the scheduler and reporting options are passed to the app."""
+    app = ManagedApp({'name': 'a', 'module': 'hailo_apps_infra.detection_pipeline', 'args': ['--headless'],
+                      'scheduler_priority': 20, 'scheduler_timeout_ms': 100}, [0])
+    command = app.get_command()
+    app.cleanup()
+    assert command[:4] == [sys.executable, '-u', '-m', 'hailo_apps_infra.detection_pipeline']
+    for option in ('--headless', '--multi-process-service', '--show-fps', '--trace-latency'):
+        assert option in command
+    assert command[command.index('--scheduler-priority') + 1] == '20'
+    assert command[command.index('--scheduler-timeout-ms') + 1] == '100'
+
+
+def test_supervision_and_report(tmp_path):
+    """Test that a failing app is restarted and FPS lines are rolled up."""
+    script = tmp_path / 'fake_app.py'
+    script.write_text(
+        "import sys\n"
+        "print('FPS: 10.00, Droprate: 0.00, Avg FPS: 10.00', flush=True)\n"
+        "sys.exit(1)\n"
+    )
+    config = {'report_interval': 60, 'max_restarts': 1, 'restart_delay': 0, 'apps': [{'name': 'fake', 'script': str(script)}]}
+    launcher = MultiAppLauncher(config)
+    report = launcher.run()
+    launcher.cleanup()
+    assert report['apps']['fake']['restarts'] == 1
+    assert report['total_fps'] == 10.0
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'), reason="needs sched_setaffinity")
+def test_threads_inherit_the_cores(tmp_path, capsys):
+    """Test that the app is pinned before it starts, so the threads it starts have the same cores."""
+    core = sorted(os.sched_getaffinity(0))[-1]
+    script = tmp_path / 'threads_app.py'
+    script.write_text(
+        "import os, threading\n"
+        "cores = []\n"
+        "thread = threading.Thread(target=lambda: cores.append(sorted(os.sched_getaffinity(0))))\n"
+        "thread.start()\n"
+        "thread.join()\n"
+        "print('CORES', sorted(os.sched_getaffinity(0)), cores[0], flush=True)\n"
+    )
+    app = ManagedApp({'name': 'threads', 'script': str(script)}, [core], verbose=True)
+    app.get_command = lambda: [sys.executable, str(script)]
+    app.start()
+    app.process.wait()
+    output = ''
+    for _ in range(100):
+        output += capsys.readouterr().out
+        if 'CORES' in output:
+            break
+        time.sleep(0.05)
+    app.cleanup()
+    assert f'[threads] CORES [{core}] [{core}]' in output
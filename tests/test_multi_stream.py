@@ -0,0 +1,34 @@
+# tests/test_multi_stream.py
+import pytest
+
+pytest.importorskip("gi")
+from gi.repository import Gst
+from hailo_apps_infra.multi_stream import MultiStreamMonitor
+
+
+def test_stream_counters():
+    """Test that the frames entering the roundrobin queue and reaching the display are counted per stream."""
+    Gst.init(None)
+    pipeline = Gst.parse_launch(
+        'fakesrc num-buffers=5 ! queue name=source_0_roundrobin_q ! fakesink name=hailo_display_0 '
+        'fakesrc num-buffers=3 ! queue name=source_1_roundrobin_q leaky=downstream ! fakesink name=hailo_display_1')
+    monitor = MultiStreamMonitor(pipeline, 2).attach()
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(10 * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    assert message is not None and message.type == Gst.MessageType.EOS
+    stats = monitor.get_stats()
+    assert [stream['stream_id'] for stream in stats] == ['sink_0', 'sink_1']
+    assert [(stream['input'], stream['output'], stream['dropped']) for stream in stats] == [(5, 5, 0), (3, 3, 0)]
+
+
+def test_overruns_are_drops():
+    """Test that overruns of a leaky queue are counted as drops and the FPS restarts at every call."""
+    Gst.init(None)
+    monitor = MultiStreamMonitor(Gst.Pipeline.new('streams'), 1).attach()
+    for _ in range(4):
+        monitor._on_overrun(None, 0)
+        monitor._on_output(None, None, 0)
+    stats = monitor.get_stats()
+    assert stats[0]['dropped'] == 4 and stats[0]['output'] == 4 and stats[0]['fps'] > 0
+    assert monitor.get_stats()[0]['fps'] == 0.0
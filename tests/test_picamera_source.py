@@ -0,0 +1,119 @@
+# tests/test_picamera_source.py
+import contextlib
+import threading
+import types
+import numpy as np
+import pytest
+pytest.importorskip("gi")
+from hailo_apps_infra.picamera_source import PicameraSource, get_picamera_format
+from gi.repository import Gst
+
+
+class FakeCamera:
+    def __init__(self, frame):
+        self.frame = frame
+        self.released = 0
+        self.timestamp = 5 * Gst.SECOND
+
+    def capture_request(self):
+        camera = self
+        self.timestamp += 40 * Gst.MSECOND
+
+        class Request:
+            metadata = {'SensorTimestamp': camera.timestamp}
+
+            def get_metadata(self):
+                return self.metadata
+
+            def release(self):
+                camera.released += 1
+        return Request()
+
+
+def test_picamera_format():
+    """Test that the requested Picamera2 format delivers the pipeline pixel order."""
+    assert get_picamera_format('RGB') == 'BGR888'
+    assert get_picamera_format('BGRx') == 'XRGB8888'
+    # NV12 pipelines get YUV420 (I420) frames
+    assert get_picamera_format('NV12') == 'YUV420'
+    assert get_picamera_format('GRAY8') == 'BGR888'
+
+
+def test_push_frames():
+    """Test the pooled buffers (padded stride removed) and the PTS taken from the sensor timestamps."""
+    Gst.init(None)
+    width, height = 64, 48
+    padded = np.random.randint(0, 255, (height, width + 8, 3), dtype=np.uint8)
+    camera = FakeCamera(padded)
+
+    @contextlib.contextmanager
+    def mapped_array(request, stream):
+        yield types.SimpleNamespace(array=padded)
+
+    pipeline = Gst.parse_launch('appsrc name=app_source ! appsink name=sink sync=false')
+    appsrc = pipeline.get_by_name('app_source')
+    source = PicameraSource(appsrc, camera, {'lores': {'size': (width, height), 'format': 'BGR888'}}, mapped_array=mapped_array)
+    pipeline.set_state(Gst.State.PLAYING)
+    for _ in range(3):
+        assert source.push_frame() == Gst.FlowReturn.OK
+    sink = pipeline.get_by_name('sink')
+    samples = [sink.emit('pull-sample') for _ in range(3)]
+    pipeline.set_state(Gst.State.NULL)
+    source.close()
+
+    assert camera.released == 3
+    buffer = samples[0].get_buffer()
+    data = np.frombuffer(buffer.extract_dup(0, buffer.get_size()), dtype=np.uint8).reshape(height, width, 3)
+    assert np.array_equal(data, padded[:, :width])
+    pts = [sample.get_buffer().pts for sample in samples]
+    assert pts[1] - pts[0] == 40 * Gst.MSECOND and pts[2] - pts[1] == 40 * Gst.MSECOND
+
+
+def test_yuv420_planes():
+    """Test that the YUV420 planes are copied without their stride padding."""
+    Gst.init(None)
+    width, height, stride = 64, 48, 80
+    array = np.random.randint(0, 255, (height * 3 // 2, stride), dtype=np.uint8)
+    appsrc = Gst.ElementFactory.make('appsrc', 'app_source')
+    source = PicameraSource(appsrc, None, {'lores': {'size': (width, height), 'format': 'YUV420'}})
+    assert source.caps.get_structure(0).get_value('format') == 'I420'
+    buffer = source.make_buffer(array)
+    data = np.frombuffer(buffer.extract_dup(0, buffer.get_size()), dtype=np.uint8)
+    assert data.size == width * height * 3 // 2
+    chroma = array[height:].reshape(-1)
+    u_plane = chroma[:height // 2 * stride // 2].reshape(height // 2, stride // 2)[:, :width // 2]
+    assert np.array_equal(data[:width * height].reshape(height, width), array[:height, :width])
+    assert np.array_equal(data[width * height:width * height * 5 // 4].reshape(height // 2, width // 2), u_plane)
+    source.close()
+
+
+def test_flow_control():
+    """Test that frames are only captured while the appsrc wants data, at most at the target frame rate."""
+    Gst.init(None)
+    pipeline = Gst.parse_launch('appsrc name=app_source ! fakesink')
+    appsrc = pipeline.get_by_name('app_source')
+    source = PicameraSource(appsrc, None, {'lores': {'size': (64, 48), 'format': 'BGR888'}}, target_fps=20)
+    assert source.wait_for_slot(timeout=0.01)
+    # The governor holds the next frame for 50 ms
+    assert not source.wait_for_slot(timeout=0.001)
+    appsrc.emit('enough-data')
+    assert not source.wait_for_slot(timeout=0.06)
+    appsrc.emit('need-data', 0)
+    assert source.wait_for_slot(timeout=0.06)
+    source.stop()
+    assert not source.wait_for_slot(timeout=0.01)
+    source.close()
+
+
+def test_stop_event_and_framerate():
+    """Test that the caps framerate follows the target frame rate and that an app stop event stops run()."""
+    Gst.init(None)
+    appsrc = Gst.ElementFactory.make('appsrc', 'app_source')
+    stop_event = threading.Event()
+    source = PicameraSource(appsrc, None, {'lores': {'size': (64, 48), 'format': 'BGR888'}}, target_fps=12.5,
+                            stop_event=stop_event)
+    assert source.caps.get_structure(0).get_fraction('framerate')[1:] == (25, 2)
+    stop_event.set()
+    # run() returns without capturing, the camera is None
+    source.run()
+    source.close()
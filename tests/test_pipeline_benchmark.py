@@ -0,0 +1,87 @@
+# tests/test_pipeline_benchmark.py
+import os
+import pytest
+
+pytest.importorskip("gi")
+os.environ.setdefault("TAPPAS_POST_PROC_DIR", "")
+from hailo_apps_infra.pipeline_benchmark import (
+    BenchmarkConfig,
+    get_benchmark_pipeline_string,
+    replace_hailo_elements,
+    compare_to_baseline,
+    compare_video_formats,
+    run_benchmark,
+)
+
+
+def test_hailo_elements_replaced():
+    """Test that no Hailo element is left in the benchmark pipeline."""
+    config = BenchmarkConfig(640, 480, batch_size=2)
+    pipeline_string = replace_hailo_elements(get_benchmark_pipeline_string(config), config)
+    for element in ('hailonet', 'hailofilter', 'hailocropper', 'hailoaggregator ', 'hailotracker', 'hailooverlay'):
+        assert f'{element} name=' not in pipeline_string
+    assert 'hailostandin name=inference_hailonet latency-ms=10.0 batch-size=2' in pipeline_string
+    assert 'is-live=false' in pipeline_string
+
+
+def test_queue_depth_keeps_bypass_queue():
+    """Test that the queue depth applies to the pipeline queues but not to the bypass queue."""
+    config = BenchmarkConfig(640, 480, queue_depth=6, n_threads=1)
+    pipeline_string = replace_hailo_elements(get_benchmark_pipeline_string(config), config)
+    assert 'max-size-buffers=3 ' not in pipeline_string
+    assert 'name=inference_wrapper_bypass_q leaky=no max-size-buffers=20' in pipeline_string
+    assert 'n-threads=2' not in pipeline_string
+
+
+def test_compare_to_baseline():
+    """Test that regressions beyond the tolerance are reported."""
+    baseline = {'a': {'fps': 100.0, 'latency': {'p95_ms': 20.0}, 'cpu_percent': 100.0}}
+    assert compare_to_baseline({'a': {'fps': 95.0, 'latency': {'p95_ms': 21.0}, 'cpu_percent': 105.0}}, baseline) == []
+    regressions = compare_to_baseline({'a': {'fps': 80.0, 'latency': {'p95_ms': 30.0}, 'cpu_percent': 150.0}}, baseline)
+    assert len(regressions) == 3
+    assert compare_to_baseline({'b': {'fps': 1.0, 'latency': None, 'cpu_percent': 1.0}}, baseline) == []
+
+
+def test_benchmark_runs():
+    """Test a short benchmark run of the full topology with the stand-in elements."""
+    config = BenchmarkConfig(320, 240, inference_latency_ms=1.0, postprocess_latency_ms=0.0)
+    result = run_benchmark(config, duration=1.0, warmup=0.5)
+    assert result['fps'] > 0
+    assert result['latency']['count'] > 0
+    assert result['cpu_percent'] >= 0
+
+
+def test_headless_display_path():
+    """Test that the headless display path has no overlay or conversion but keeps hailo_display."""
+    config = BenchmarkConfig(640, 480, headless=True)
+    pipeline_string = get_benchmark_pipeline_string(config)
+    display_string = pipeline_string[pipeline_string.index('identity name=identity_callback'):]
+    assert 'hailooverlay' not in display_string
+    assert 'videoconvert' not in display_string
+    assert 'fpsdisplaysink name=hailo_display video-sink=fakesink' in display_string
+
+
+def test_optimized_pipeline():
+    """Test that the optimized pipeline resizes once, in the cropper stand-in, and still runs."""
+    config = BenchmarkConfig(320, 240, inference_latency_ms=1.0, postprocess_latency_ms=0.0, optimize=True)
+    pipeline_string = replace_hailo_elements(get_benchmark_pipeline_string(config), config)
+    assert 'inference_wrapper_crop. ! videoscale name=inference_wrapper_crop_resize ! ' in pipeline_string
+    assert 'name=inference_videoscale ' not in pipeline_string
+    optimized = run_benchmark(config, duration=1.0, warmup=0.5)
+    legacy = run_benchmark(BenchmarkConfig(320, 240, inference_latency_ms=1.0, postprocess_latency_ms=0.0), duration=1.0, warmup=0.5)
+    assert optimized['fps'] > 0
+    assert optimized['elements'] < legacy['elements']
+
+
+def test_nv12_pipeline():
+    """Test the NV12 benchmark pipeline with decoded frames and the pairing with the RGB results."""
+    config = BenchmarkConfig(320, 240, inference_latency_ms=1.0, postprocess_latency_ms=0.0, video_format='NV12', decoded_format='I420')
+    assert config.name.endswith('_nv12_from_i420')
+    pipeline_string = get_benchmark_pipeline_string(config)
+    assert 'video/x-raw, format=I420, width=320, height=240, framerate=30/1 ! ' in pipeline_string
+    assert 'videoconvert n-threads=3 name=source_convert qos=false ! video/x-raw, pixel-aspect-ratio=1/1, format=NV12' in pipeline_string
+    nv12 = run_benchmark(config, duration=1.0, warmup=0.5)
+    assert nv12['fps'] > 0
+    rgb_config = BenchmarkConfig(320, 240, inference_latency_ms=1.0, postprocess_latency_ms=0.0, decoded_format='I420')
+    results = {config.name: nv12, rgb_config.name: {'config': rgb_config.to_dict()}}
+    assert [name for name, _, _ in compare_video_formats(results)] == [rgb_config.name]
@@ -0,0 +1,165 @@
+# tests/test_pipeline_builder.py
+from hailo_apps_infra.gstreamer_helper_pipelines import (
+    SOURCE_PIPELINE,
+    INFERENCE_PIPELINE,
+    INFERENCE_PIPELINE_WRAPPER,
+    TRACKER_PIPELINE,
+    USER_CALLBACK_PIPELINE,
+    MULTI_SOURCE_PIPELINE,
+    STREAM_ROUTER_PIPELINE,
+    DISPLAY_PIPELINE,
+)
+import struct
+import pytest
+from hailo_apps_infra.pipeline_builder import PipelineBuilder, Caps, UNKNOWN_CAPS, get_source_caps, get_file_caps
+
+
+def build(builder, video_source='videotestsrc', width=1280, height=720):
+    builder.add_source(video_source, width, height)
+    builder.add_inference(hef_path='model.hef', post_process_so='post.so')
+    builder.add(USER_CALLBACK_PIPELINE())
+    return builder.build()
+
+
+def test_default_matches_helpers():
+    """Test that without optimize the builder returns the helper strings joined with ' ! '."""
+    expected = (
+        f"{SOURCE_PIPELINE('videotestsrc', 1280, 720)} ! "
+        f"{INFERENCE_PIPELINE_WRAPPER(INFERENCE_PIPELINE(hef_path='model.hef', post_process_so='post.so'))} ! "
+        f"{USER_CALLBACK_PIPELINE()}"
+    )
+    builder = PipelineBuilder(network_shape=(640, 640))
+    assert build(builder) == expected
+    assert builder.removed == []
+
+
+def test_optimize_removes_noop_stages():
+    """Test that the source and inference conversions are left out when the caps already match."""
+    builder = PipelineBuilder(optimize=True, network_shape=(640, 640))
+    pipeline_string = build(builder)
+    for element in ('source_videoscale', 'source_convert', 'inference_videoscale', 'inference_videoconvert'):
+        assert f'name={element} ' not in pipeline_string
+    assert len(builder.removed) == 8
+    assert builder.expected_caps == [('inference_hailonet_q', 'RGB', 'inference_videoconvert')]
+    assert builder.caps == Caps('RGB', 1280, 720)
+    # hailonet and the source caps stay
+    assert 'hailonet name=inference_hailonet' in pipeline_string
+    assert 'video/x-raw, pixel-aspect-ratio=1/1, format=RGB, width=1280, height=720' in pipeline_string
+
+
+def test_optimize_keeps_unknown_stages():
+    """Test that stages whose input caps are unknown are kept."""
+    # Unknown HEF shape: the inference stages stay
+    builder = PipelineBuilder(optimize=True)
+    pipeline_string = build(builder)
+    assert 'name=inference_videoscale ' in pipeline_string
+    assert 'name=inference_videoconvert ' in pipeline_string
+    # USB camera: the decoded size is known but not the format
+    assert get_source_caps('/dev/video0', 1280, 720) == Caps(None, 1280, 720)
+    builder = PipelineBuilder(optimize=True, network_shape=(640, 640))
+    pipeline_string = build(builder, '/dev/video0')
+    assert 'name=source_videoscale ' not in pipeline_string
+    assert 'name=source_convert ' in pipeline_string
+
+
+def test_sources_and_display():
+    """Test that one source gets SOURCE_PIPELINE and a display, several get the roundrobin and a display per stream."""
+    builder = PipelineBuilder().add_sources(['/dev/video0'], 640, 480, no_webcam_compression=True).add_display(headless=True)
+    assert builder.build() == f"{SOURCE_PIPELINE('/dev/video0', 640, 480, no_webcam_compression=True)} ! {DISPLAY_PIPELINE(headless=True)}"
+    sources = ['a.mp4', 'b.mp4']
+    builder = PipelineBuilder().add_sources(sources, 640, 480).add_display(len(sources), sync='false')
+    displays = [DISPLAY_PIPELINE(sync='false', name=f'hailo_display_{index}') for index in range(2)]
+    assert builder.build() == f"{MULTI_SOURCE_PIPELINE(sources, 640, 480)} ! {STREAM_ROUTER_PIPELINE(displays)}"
+
+
+def test_inference_interval():
+    """Test the frame skipping cropper of the inference wrapper and the tracker settings for the skipped frames."""
+    builder = PipelineBuilder()
+    builder.add_inference(inference_interval=3, hef_path='model.hef', post_process_so='post.so')
+    pipeline = builder.build()
+    assert 'libframe_skip_crops.so function-name=create_crops_interval_3 ' in pipeline
+    assert 'function-name=create_crops ' in INFERENCE_PIPELINE_WRAPPER('identity')
+    with pytest.raises(ValueError):
+        INFERENCE_PIPELINE_WRAPPER('identity', inference_interval=11)
+    with pytest.raises(ValueError):
+        PipelineBuilder().add_inference(wrapper=False, inference_interval=2, hef_path='model.hef', post_process_so='post.so')
+    assert TRACKER_PIPELINE(class_id=1, inference_interval=1) == TRACKER_PIPELINE(class_id=1)
+    tracker = TRACKER_PIPELINE(class_id=1, keep_tracked_frames=5, inference_interval=8)
+    assert 'keep-new-frames=8 keep-tracked-frames=8 keep-lost-frames=2 ' in tracker
+
+
+def test_motion_gate():
+    """Test the motion gate cropper of the inference wrapper."""
+    pipeline = INFERENCE_PIPELINE_WRAPPER('identity', motion_gate=True)
+    assert 'libmotion_gate.so function-name=create_crops_motion ' in pipeline
+    # The detections are carried over after the aggregator, not by the cropper
+    assert 'inference_wrapper_agg. ! hailofilter name=inference_wrapper_carry_over ' in pipeline
+    assert 'libmotion_gate.so function-name=carry_over_detections ' in pipeline
+    assert 'carry_over' not in INFERENCE_PIPELINE_WRAPPER('identity')
+    with pytest.raises(ValueError):
+        INFERENCE_PIPELINE_WRAPPER('identity', motion_gate=True, inference_interval=2)
+
+
+def test_nv12_source():
+    """Test that an NV12 pipeline keeps the rpi camera frames in YUV and converts them in the source only."""
+    assert 'format=I420, width=1280, height=720 ! ' in SOURCE_PIPELINE('rpi', 1280, 720, 'NV12')
+    assert SOURCE_PIPELINE('rpi', 1280, 720) == SOURCE_PIPELINE('rpi', 1280, 720, 'RGB')
+    builder = PipelineBuilder(optimize=True, network_shape=(640, 640))
+    builder.add_source('rpi', 1280, 720, 'NV12')
+    assert builder.caps == Caps('NV12', 1280, 720)
+    builder.add_inference(hef_path='model.hef', post_process_so='post.so')
+    pipeline = builder.build()
+    assert 'name=source_convert ' in pipeline and 'name=source_videoscale ' not in pipeline
+    # The network input is the only RGB conversion
+    assert 'name=inference_videoconvert ' in pipeline
+
+
+def box(box_type, payload):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def write_mp4(path, width, height, pixel_aspect=(1, 1)):
+    """Writes the boxes get_file_caps reads: a sound track, then a video track with an avc1 sample entry."""
+    entry = bytes(24) + struct.pack('>HH', width, height) + bytes(50) + box(b'avcC', bytes(4)) + box(b'pasp', struct.pack('>II', *pixel_aspect))
+    def track(handler, sample_entry):
+        stsd = box(b'stsd', struct.pack('>II', 0, 1) + box(sample_entry, entry))
+        hdlr = box(b'hdlr', bytes(8) + handler + bytes(12))
+        return box(b'trak', box(b'tkhd', bytes(84)) + box(b'mdia', hdlr + box(b'minf', box(b'stbl', stsd))))
+    with open(path, 'wb') as f:
+        f.write(box(b'ftyp', b'isom' + bytes(4)) + box(b'mdat', bytes(100)))
+        f.write(box(b'moov', box(b'mvhd', bytes(100)) + track(b'soun', b'mp4a') + track(b'vide', b'avc1')))
+
+
+def test_file_caps(tmp_path):
+    """Test that the size of an MP4 video track is read from its sample description, without GStreamer."""
+    path = tmp_path / 'video.mp4'
+    write_mp4(path, 1280, 720)
+    assert get_file_caps(str(path)) == Caps(None, 1280, 720)
+    builder = PipelineBuilder(optimize=True, network_shape=(640, 640))
+    assert 'name=source_videoscale ' not in build(builder, str(path))
+    write_mp4(path, 1280, 720, pixel_aspect=(4, 3))
+    assert get_file_caps(str(path)) == UNKNOWN_CAPS
+    (tmp_path / 'video.mkv').write_bytes(bytes(64))
+    assert get_file_caps(str(tmp_path / 'video.mkv')) == UNKNOWN_CAPS
+    assert get_file_caps(str(tmp_path / 'missing.mp4')) == UNKNOWN_CAPS
+
+
+def test_check_caps():
+    """Test that a format other than the one expected after a removed converter stops the pipeline."""
+    pytest.importorskip("gi")
+    from gi.repository import Gst
+    from hailo_apps_infra.pipeline_builder import count_elements
+    Gst.init(None)
+    builder = PipelineBuilder(optimize=True, network_shape=(64, 64))
+    builder.add_source('videotestsrc', 64, 64, 'NV12')
+    builder.add_inference(wrapper=False, hef_path='model.hef', post_process_so='post.so')
+    assert builder.expected_caps == []
+    builder.expected_caps = [('inference_hailonet_q', 'RGB', 'inference_videoconvert')]
+    pipeline = Gst.parse_launch('videotestsrc num-buffers=5 ! video/x-raw, format=NV12 ! queue name=inference_hailonet_q ! fakesink')
+    assert count_elements(pipeline) == 4
+    builder.check_caps(pipeline)
+    pipeline.set_state(Gst.State.PLAYING)
+    message = pipeline.get_bus().timed_pop_filtered(5 * Gst.SECOND, Gst.MessageType.ERROR | Gst.MessageType.EOS)
+    pipeline.set_state(Gst.State.NULL)
+    assert message.type == Gst.MessageType.ERROR
+    assert 'inference_videoconvert was removed' in message.parse_error()[0].message
@@ -0,0 +1,101 @@
+# tests/test_pipeline_tuning.py
+import pytest
+from hailo_apps_infra.gstreamer_helper_pipelines import SOURCE_PIPELINE, INFERENCE_PIPELINE, DISPLAY_PIPELINE
+from hailo_apps_infra.pipeline_tuning import PipelineTuningProfile, DEFAULT_STAGES, get_cgroup_cpu_limit
+
+
+class FakeTracer:
+    """Minimal LatencyTracer: inference_hailonet_q feeds hailonet, the bypass queue feeds the aggregator."""
+    links = {
+        'inference_hailonet_q': [('inference_output_q', ['inference_hailonet'])],
+        'inference_wrapper_bypass_q': [('inference_wrapper_output_q', ['inference_wrapper_agg'])],
+        'display_q': [],
+    }
+
+    def get_downstream_stages(self, queue_name):
+        return ['+'.join(path) for _, path in self.links[queue_name]]
+
+    def get_summary(self):
+        return {
+            'inference_hailonet': {'mean_ms': 20.0, 'p99_ms': 70.0},
+            'inference_wrapper_agg': {'mean_ms': 1.0, 'p99_ms': 2.0},
+            'end-to-end': {'mean_ms': 100.0, 'p99_ms': 150.0},
+        }
+
+
+def test_no_profile_keeps_defaults():
+    """Test that the helpers keep the fixed thread counts and queue sizes without a profile."""
+    pipeline = SOURCE_PIPELINE('video.mp4') + INFERENCE_PIPELINE('model.hef') + DISPLAY_PIPELINE()
+    assert 'videoconvert n-threads=3 name=source_convert' in pipeline
+    assert 'inference_videoscale n-threads=2' in pipeline
+    assert 'max-size-buffers=3' in pipeline
+
+
+def test_threads_do_not_oversubscribe():
+    """Test that the conversion threads of the present stages fit in the cores left after the reserved one."""
+    for cores in (8, 16):
+        profile = PipelineTuningProfile(cores=cores)
+        assert sorted(profile.threads) == sorted(DEFAULT_STAGES)
+        assert sum(profile.threads.values()) <= cores - 1
+    # Two streams: the source and display stages count twice
+    profile = PipelineTuningProfile(cores=16, num_streams=2)
+    per_stream = profile.threads['source_scale'] + profile.threads['source_convert'] + profile.threads['display_convert']
+    assert sum(profile.threads.values()) + per_stream == 15
+    profile = PipelineTuningProfile(cores=4, stages=('source_convert', 'inference_scale'))
+    assert sum(profile.threads.values()) <= 3
+    assert profile.get_n_threads('file_sink_convert', 2) == 1
+    # More stages than free cores: one thread each
+    profile = PipelineTuningProfile(cores=4)
+    assert set(profile.threads.values()) == {1}
+    assert f'n-threads={profile.threads["source_convert"]} name=source_convert' in SOURCE_PIPELINE('video.mp4', profile=profile)
+
+
+def test_set_stages():
+    """Test that the stages left out of the pipeline give their share of the cores to the others."""
+    profile = PipelineTuningProfile(cores=8)
+    profile.set_stages(('source_scale', 'source_convert', 'inference_convert'))
+    assert sorted(profile.threads) == ['inference_convert', 'source_convert', 'source_scale']
+    assert sum(profile.threads.values()) == 7
+    assert profile.get_n_threads('display_convert', 2) == 1
+
+
+def test_app_stages():
+    """Test that the app leaves out the display stage when headless and the inference stages removed by the builder."""
+    pytest.importorskip("gi")
+    from hailo_apps_infra.gstreamer_app import GStreamerApp
+    app = object.__new__(GStreamerApp)
+    app.headless, app.optimize_pipeline, app.video_format = True, True, 'RGB'
+    assert app.get_tuning_stages((640, 640)) == {'source_scale', 'source_convert'}
+    assert app.get_tuning_stages(None) == set(DEFAULT_STAGES) - {'display_convert'}
+    app.headless, app.video_format = False, 'NV12'
+    assert app.get_tuning_stages((640, 640)) == set(DEFAULT_STAGES) - {'inference_scale'}
+
+
+def test_size_queues(tmp_path):
+    """Test queue sizes from the p99 service time of the next stage, and the profile roundtrip."""
+    profile = PipelineTuningProfile(cores=4)
+    sizes = profile.size_queues(FakeTracer())
+    # 70 ms p99 at a 20 ms frame interval: 4 frames arrive meanwhile, plus one
+    assert sizes == {'inference_hailonet_q': 5, 'inference_wrapper_bypass_q': 20}
+    assert 'max-size-buffers=5' in INFERENCE_PIPELINE('model.hef', profile=profile)
+    path = tmp_path / 'profile.json'
+    profile.save(path)
+    loaded = PipelineTuningProfile.load(path, cores=8)
+    assert loaded.queue_sizes == profile.queue_sizes
+    assert loaded.cores == 8 and loaded.stages == profile.stages
+
+
+def test_cgroup_cpu_limit(tmp_path):
+    """Test the cgroup v2 and v1 CPU quota parsing."""
+    proc_cgroup = tmp_path / 'cgroup'
+    proc_cgroup.write_text('0::/app\n')
+    (tmp_path / 'app').mkdir()
+    (tmp_path / 'app' / 'cpu.max').write_text('150000 100000\n')
+    assert get_cgroup_cpu_limit(str(tmp_path), str(proc_cgroup)) == 1.5
+    (tmp_path / 'app' / 'cpu.max').write_text('max 100000\n')
+    assert get_cgroup_cpu_limit(str(tmp_path), str(proc_cgroup)) is None
+    v1_root = tmp_path / 'v1'
+    (v1_root / 'cpu').mkdir(parents=True)
+    (v1_root / 'cpu' / 'cpu.cfs_quota_us').write_text('200000\n')
+    (v1_root / 'cpu' / 'cpu.cfs_period_us').write_text('100000\n')
+    assert get_cgroup_cpu_limit(str(v1_root), str(tmp_path / 'missing')) == 2.0
@@ -0,0 +1,61 @@
+# tests/test_queue_monitor.py
+import time
+import pytest
+
+pytest.importorskip("gi")
+from gi.repository import Gst
+from hailo_apps_infra.queue_monitor import QueueMonitor, QueueStats
+
+
+def make_stats(name, saturation, next_factory='videoconvert'):
+    stats = QueueStats(name, f'{name}_next', next_factory, history=10)
+    stats.samples = 100
+    stats.full_samples = int(saturation * 100)
+    return stats
+
+
+def test_bottleneck_is_the_most_downstream_saturated_queue():
+    """Test that the saturated queue without saturated downstream queues is reported, with its hint."""
+    monitor = QueueMonitor(None)
+    monitor.order = ['source_q', 'scale_q', 'convert_q', 'display_q']
+    monitor.links = {
+        'source_q': [('scale_q', [])],
+        'scale_q': [('convert_q', [])],
+        'convert_q': [('display_q', [])],
+        'display_q': [],
+    }
+    monitor.stats = {
+        'source_q': make_stats('source_q', 0.99),
+        'scale_q': make_stats('scale_q', 0.95, 'videoscale'),
+        'convert_q': make_stats('convert_q', 0.2),
+        'display_q': make_stats('display_q', 0.0),
+    }
+    assert monitor.find_bottleneck().name == 'scale_q'
+    report = monitor.get_report()
+    assert report['bottleneck'] == {'queue': 'scale_q', 'element': 'scale_q_next', 'factory': 'videoscale', 'saturation': 0.95}
+    assert report['recommendation'].endswith('increase n-threads on the videoscale or scale at the source')
+
+    for stats in monitor.stats.values():
+        stats.full_samples = 0
+    assert monitor.find_bottleneck() is None
+    assert monitor.get_report()['bottleneck'] is None
+
+
+def test_monitor_finds_slow_element():
+    """Test sampling a running pipeline: the queue before a slow identity (after a caps filter) fills up."""
+    Gst.init(None)
+    pipeline = Gst.parse_launch(
+        'videotestsrc is-live=false ! video/x-raw, width=64, height=48 ! queue name=input_q max-size-buffers=3 ! '
+        'video/x-raw ! identity name=slow sleep-time=20000 ! queue name=output_q ! fakesink sync=false')
+    monitor = QueueMonitor(pipeline, interval_ms=5)
+    pipeline.set_state(Gst.State.PLAYING)
+    pipeline.get_state(5 * Gst.SECOND)
+    monitor.start()
+    time.sleep(0.5)
+    monitor.stop()
+    pipeline.set_state(Gst.State.NULL)
+    assert monitor.stats['input_q'].samples > 10
+    assert monitor.stats['input_q'].series.maxlen == monitor.history
+    bottleneck = monitor.find_bottleneck()
+    assert bottleneck is not None and bottleneck.name == 'input_q'
+    assert (bottleneck.next_element, bottleneck.next_factory) == ('slow', 'identity')
@@ -0,0 +1,80 @@
+# tests/test_shared_frame_ring.py
+import multiprocessing
+import numpy as np
+import pytest
+from hailo_apps_infra.shared_frame_ring import SharedFrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(slot_size=64 * 48 * 3, num_slots=3)
+    yield ring
+    ring.close()
+
+
+def make_frame(value, shape=(48, 64, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_read_empty(ring):
+    """Test that reading before any write returns None."""
+    assert ring.read() is None
+
+
+def test_latest_frame_wins(ring):
+    """Test that only the most recent frame is returned, and only once."""
+    for value in range(5):
+        ring.write(make_frame(value))
+    frame = ring.read(copy=True)
+    assert frame.shape == (48, 64, 3)
+    assert np.all(frame == 4)
+    assert ring.read() is None
+    ring.write(make_frame(7, shape=(10, 10)))
+    assert ring.read().shape == (10, 10)
+
+
+def test_writer_context(ring):
+    """Test writing straight into a slot."""
+    with ring.writer((48, 64, 3)) as slot:
+        slot[:] = 9
+    assert np.all(ring.read() == 9)
+
+
+def test_frame_too_large(ring):
+    """Test that frames larger than a slot are rejected."""
+    with pytest.raises(ValueError):
+        ring.write(make_frame(1, shape=(480, 640, 3)))
+
+
+def read_in_child(ring, result_queue):
+    frame = ring.read(copy=True)
+    result_queue.put(None if frame is None else (frame.shape, int(frame[0, 0, 0])))
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_cross_process(ring, start_method):
+    """Test that a frame written in the parent is read in a child process."""
+    ring.write(make_frame(42))
+    context = multiprocessing.get_context(start_method)
+    result_queue = context.Queue()
+    process = context.Process(target=read_in_child, args=(ring, result_queue))
+    process.start()
+    result = result_queue.get(timeout=30)
+    process.join()
+    assert result == ((48, 64, 3), 42)
+
+
+def test_set_frame_converts_yuv_planes():
+    """Test that set_frame converts the (Y, UV) planes of NV12 frames to RGB for the display ring."""
+    pytest.importorskip("gi")
+    from hailo_apps_infra.gstreamer_app import app_callback_class
+    user_data = app_callback_class()
+    y_plane = np.full((48, 64), 235, dtype=np.uint8)
+    uv_plane = np.full((24, 32, 2), 128, dtype=np.uint8)
+    try:
+        user_data.set_frame((y_plane, uv_plane))
+        frame = user_data.get_frame()
+        assert frame.shape == (48, 64, 3)
+        assert np.all(frame >= 250)
+    finally:
+        user_data.close_frame_ring()
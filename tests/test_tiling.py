@@ -0,0 +1,33 @@
+# tests/test_tiling.py
+import io
+import pytest
+from hailo_apps_infra.gstreamer_helper_pipelines import TILING_PIPELINE
+from hailo_apps_infra.tiling import get_tile_count, get_tile_size, get_tiling_stats, print_tiling_report
+
+
+def test_tile_geometry():
+    """Test the tile count of the scale levels and the tile size with overlap."""
+    assert get_tile_count(3, 2) == 6
+    assert get_tile_count(3, 2, scale_level=2) == 6 + 1 + 4
+    width, height = get_tile_size(1900, 1000, 2, 1, overlap_x=0.1)
+    assert width == pytest.approx(1000) and height == 1000
+    # 2x2 tiles of a 4K frame scale twice less than the whole frame
+    whole = get_tiling_stats(3840, 2160, 640, 640, 1, 1)
+    tiled = get_tiling_stats(3840, 2160, 640, 640, 2, 2, overlap_x=0, overlap_y=0)
+    assert tiled.scale == pytest.approx(2 * whole.scale)
+    assert tiled.min_object == pytest.approx(whole.min_object / 2)
+    assert tiled.relative_fps == 0.25
+
+    report = io.StringIO()
+    print_tiling_report(3840, 2160, 640, 640, 5, 3, scale_level=1, file=report)
+    assert '* 5x3 +L1' in report.getvalue()
+
+
+def test_tiling_pipeline():
+    """Test the tile cropper settings of TILING_PIPELINE."""
+    pipeline = TILING_PIPELINE('identity name=inner', tiles_x=3, tiles_y=2, overlap_x=0.2, scale_level=2)
+    assert 'tiles-along-x-axis=3 tiles-along-y-axis=2 overlap-x-axis=0.2 overlap-y-axis=0.1 tiling-mode=1 scale-level=2 ' in pipeline
+    assert 'tiling_wrapper_cropper. ! identity name=inner ! tiling_wrapper_agg.sink_1 ' in pipeline
+    assert 'tiling-mode=0 hailotileaggregator' in TILING_PIPELINE('identity')
+    with pytest.raises(ValueError):
+        TILING_PIPELINE('identity', scale_level=4)
@@ -0,0 +1,69 @@
+# tests/test_video_frame.py
+import pytest
+import numpy as np
+
+pytest.importorskip("gi")
+cv2 = pytest.importorskip("cv2")
+from hailo_apps_infra.video_frame import nv12_to_rgb, yuyv_to_rgb, i420_to_rgb
+
+
+def make_i420(height=72, width=96):
+    rng = np.random.default_rng(0)
+    rgb = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    i420 = cv2.cvtColor(rgb, cv2.COLOR_RGB2YUV_I420)
+    y = i420[:height]
+    u = i420[height:height + height // 4].reshape(height // 2, width // 2)
+    v = i420[height + height // 4:].reshape(height // 2, width // 2)
+    return i420, y, u, v
+
+
+def test_i420_to_rgb_matches_opencv():
+    """Test the vectorized conversion against OpenCV (rounding differences only)."""
+    i420, y, u, v = make_i420()
+    reference = cv2.cvtColor(i420, cv2.COLOR_YUV2RGB_I420)
+    assert np.abs(i420_to_rgb(y, u, v).astype(int) - reference).max() <= 1
+
+
+def test_nv12_downscale_on_read():
+    """Test that sampling while converting equals converting then subsampling."""
+    _, y, u, v = make_i420()
+    uv = np.stack([u, v], axis=-1)
+    full = nv12_to_rgb(y, uv)
+    assert np.array_equal(full, i420_to_rgb(y, u, v))
+    for step in (2, 3, 4):
+        assert np.array_equal(nv12_to_rgb(y, uv, step=step), full[::step, ::step])
+
+
+def test_yuyv_to_rgb():
+    """Test packed YUYV conversion, including a strided (padded rows) view."""
+    _, y, u, v = make_i420()
+    height, width = y.shape
+    rows = np.arange(height) // 2
+    padded = np.zeros((height, width + 8, 2), dtype=np.uint8)
+    yuyv = padded[:, :width]
+    yuyv[..., 0] = y
+    yuyv[:, 0::2, 1] = u[rows]
+    yuyv[:, 1::2, 1] = v[rows]
+    expected = i420_to_rgb(y, u, v)
+    assert np.array_equal(yuyv_to_rgb(yuyv), expected)
+    assert np.array_equal(yuyv_to_rgb(yuyv, step=3), expected[::3, ::3])
+
+
+def test_map_frame_honors_video_meta_stride():
+    """Test that rows padded beyond the default stride (announced by a GstVideoMeta) are read correctly."""
+    from gi.repository import Gst, GstVideo
+    from hailo_apps_infra.hailo_rpi_common import map_frame
+    from hailo_apps_infra.video_frame import get_frame_layout_for_format
+    Gst.init(None)
+    width, height, stride = 5, 3, 32
+    assert get_frame_layout_for_format('RGB', width, height).planes[0].stride != stride
+    rgb = np.arange(height * width * 3, dtype=np.uint8).reshape(height, width, 3)
+    padded = np.zeros((height, stride), dtype=np.uint8)
+    padded[:, :width * 3] = rgb.reshape(height, -1)
+    buffer = Gst.Buffer.new_wrapped(padded.tobytes())
+    GstVideo.buffer_add_video_meta_full(buffer, GstVideo.VideoFrameFlags.NONE, GstVideo.VideoFormat.RGB,
+                                        width, height, 1, [0, 0, 0, 0], [stride, 0, 0, 0])
+    caps = Gst.Caps.from_string(f'video/x-raw, format=RGB, width={width}, height={height}')
+    with map_frame(buffer, 'RGB', width, height, caps=caps) as frame:
+        assert np.array_equal(frame, rgb)
+        assert not frame.flags.writeable